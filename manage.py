@@ -6,7 +6,10 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tms_core.settings')
+    from tms_core import settings_module
+
+    # TMS_ENV=production selects tms_core/settings_production.py
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module())
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
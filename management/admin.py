@@ -1,8 +1,20 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.utils.functional import cached_property
+
+from .archive import restore_trips
+from .invoicing import cancel_invoices, render_invoices
+from .search import search_pks
 from .models import (
     Vehicle, Driver, Trip, TripExpense, PartyMaster, 
     ExpenseCategory, AccountMaster, MaintenanceExpense, 
-    DocketTable, AccountTransaction
+    DocketTable, AccountTransaction, DriverAdvance, PayrollRun, Payslip, LaneRate,
+    Location, LocationAlias, CommissionRecompute, BankStatement, WalletStatement, RouteDistance,
+    AccountingPeriod, AccountBalanceSnapshot, ArchivedAccountTransaction, ArchivedTrip, Invoice, InvoiceLine,
+    Branch, UserBranch, ScheduledJob, JobRun
 )
 
 # --- INLINE ADMINS ---
@@ -12,6 +24,114 @@ from .models import (
 #     model = TripExpense
 #     extra = 1 # Number of empty forms to display
 
+# --- SEARCH ---
+
+class FullTextSearchMixin:
+    """Answers the changelist search box from the FTS index instead of icontains scans."""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search_pks(self.search_kind, search_term)), False
+
+
+# --- LARGE TABLES ---
+
+# Planner row estimates per database vendor; SQLite's come from sqlite_stat1 (written by ANALYZE).
+ROW_ESTIMATE_SQL = {
+    'sqlite': "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+    'postgresql': "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+    'mysql': "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+}
+
+
+def estimated_row_count(model):
+    """The planner's estimate of the model's row count, or None when the database has none."""
+    sql = ROW_ESTIMATE_SQL.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:  # e.g. no sqlite_stat1 before the first ANALYZE
+        return None
+    if row is None or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner's row estimate instead of COUNT(*) for an unfiltered
+    changelist over ADMIN_ESTIMATED_COUNT_THRESHOLD rows. Filtered lists
+    (search, list_filter, date_hierarchy) are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_THRESHOLD', 10000):
+                return estimate
+        return super().count
+
+
+class PaginatedRelatedFilter(admin.RelatedFieldListFilter):
+    """
+    Related-object list filter that shows ADMIN_FILTER_PAGE_SIZE choices at a
+    time, with links to the previous and next page, instead of every row of
+    the related table.
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.page_param = f'{field_path}__fpage'
+        try:
+            self.page = max(int(params.pop(self.page_param, ['0'])[0]), 0)
+        except ValueError:
+            self.page = 0
+        self.page_size = getattr(settings, 'ADMIN_FILTER_PAGE_SIZE', 20)
+        self.has_next = False
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        related = field.remote_field.model._default_manager.complex_filter(field.get_limit_choices_to())
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        related = related.order_by(*(ordering or ('pk',)))
+        start = self.page * self.page_size
+        rows = list(related[start:start + self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        choices = [(row.pk, str(row)) for row in rows[:self.page_size]]
+        # Keep the active choice visible when it is on another page
+        selected = [value for value in (self.lookup_val or []) if str(value) not in {str(pk) for pk, _ in choices}]
+        choices += [(row.pk, str(row)) for row in related.model._default_manager.filter(pk__in=selected)]
+        return choices
+
+    def choices(self, changelist):
+        yield from super().choices(changelist)
+        if self.page:
+            yield {
+                'selected': False,
+                'query_string': changelist.get_query_string({self.page_param: self.page - 1}),
+                'display': '« Previous',
+            }
+        if self.has_next:
+            yield {
+                'selected': False,
+                'query_string': changelist.get_query_string({self.page_param: self.page + 1}),
+                'display': 'More »',
+            }
+
+
+class LargeTableMixin:
+    """Changelist settings for the big transactional tables: estimated counts, no second COUNT(*)."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 # --- BASE ADMIN MODELS ---
 
 # 1. Vehicle Admin
@@ -22,7 +142,8 @@ class VehicleAdmin(admin.ModelAdmin):
         'tax_expiry'
     )
     search_fields = ('vehicle_no', 'owner_name')
-    list_filter = ('ownership',)
+    list_filter = ('ownership', 'branch')
+    ordering = ('vehicle_no',)  # autocomplete widgets and paginated filters page through this
     date_hierarchy = 'reg_date'
 
 
@@ -31,7 +152,8 @@ class VehicleAdmin(admin.ModelAdmin):
 class DriverAdmin(admin.ModelAdmin):
     list_display = ('driver_id', 'name', 'mobile', 'license_expiry', 'is_active')
     search_fields = ('driver_id', 'name', 'mobile')
-    list_filter = ('is_active',)
+    list_filter = ('is_active', 'branch')
+    ordering = ('name',)
 
 
 # --- NEW MASTER DATA ADMINS ---
@@ -40,13 +162,14 @@ class DriverAdmin(admin.ModelAdmin):
 @admin.register(PartyMaster)
 class PartyMasterAdmin(admin.ModelAdmin):
     list_display = ('name', 'party_type', 'nick_name', 'commission_rate', 'orai_charge')
-    list_filter = ('party_type',)
+    list_filter = ('party_type', 'branch')
     search_fields = ('name', 'nick_name', 'pan_number')
+    ordering = ('name',)
     
     # Fieldsets to group related fields for a cleaner interface
     fieldsets = (
         ('Party Identification', {
-            'fields': ('party_type', 'name', 'nick_name', 'contact_person', 'address'),
+            'fields': ('party_type', 'name', 'nick_name', 'contact_person', 'address', 'branch'),
         }),
         ('Financial/Tax Details', {
             'fields': ('pan_number', 'bank_account_no', 'ifsc_code'),
@@ -63,67 +186,368 @@ class PartyMasterAdmin(admin.ModelAdmin):
 class ExpenseCategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'is_trip_expense')
     list_filter = ('is_trip_expense',)
+    search_fields = ('name',)
+    ordering = ('name',)
 
 
 # 5. AccountMaster Admin
 @admin.register(AccountMaster)
 class AccountMasterAdmin(admin.ModelAdmin):
     list_display = ('account_name', 'account_type', 'initial_balance', 'is_active')
-    list_filter = ('account_type', 'is_active')
+    list_filter = ('account_type', 'is_active', 'branch')
     search_fields = ('account_name',)
+    ordering = ('account_name',)
 
 
 # --- TRANSACTION & OPERATIONAL ADMINS ---
 
 # 6. Trip Admin (Modified)
 @admin.register(Trip)
-class TripAdmin(admin.ModelAdmin):
+class TripAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'trip'
     list_display = (
         'trip_id', 'date', 'vehicle', 'driver', 'transporter', 'origin', 
         'destination', 'total_freight', 'advance', 'status'
     )
+    list_select_related = ('vehicle', 'driver', 'transporter')
     # The calculated fields are readonly
     readonly_fields = ('trip_id', 'total_freight', 'commission_amount', 'orai_amount')
-    list_filter = ('status', 'vehicle', 'transporter')
+    list_filter = ('status', 'branch', ('vehicle', PaginatedRelatedFilter), ('transporter', PaginatedRelatedFilter))
     search_fields = ('trip_id', 'vehicle__vehicle_no', 'driver__name', 'origin', 'destination')
+    autocomplete_fields = ('vehicle', 'driver', 'client', 'transporter')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
     # inlines = [TripExpenseInline] # Uncomment this line if you want the inline form
 
 # 7. Trip Expense Admin (FIXED the ERROR by removing total_trip_expense)
 @admin.register(TripExpense)
-class TripExpenseAdmin(admin.ModelAdmin):
+class TripExpenseAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'expense'
     list_display = ('trip', 'date', 'expense_category', 'amount', 'paid_via_account')
+    list_select_related = ('trip', 'expense_category', 'paid_via_account')
     search_fields = ('trip__trip_id', 'description')
-    list_filter = ('expense_category', 'paid_via_account')
+    list_filter = ('branch', 'expense_category', 'paid_via_account')
+    autocomplete_fields = ('trip', 'expense_category', 'paid_via_account')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
 
 
 # 8. MaintenanceExpense Admin
 @admin.register(MaintenanceExpense)
-class MaintenanceExpenseAdmin(admin.ModelAdmin):
+class MaintenanceExpenseAdmin(LargeTableMixin, admin.ModelAdmin):
     list_display = (
         'date', 'vehicle', 'workshop', 'amount', 'is_paid', 'payment_date', 'paid_via_account'
     )
-    list_filter = ('is_paid', 'workshop', 'expense_category')
+    list_select_related = ('vehicle', 'workshop', 'paid_via_account')
+    list_filter = ('is_paid', 'branch', ('workshop', PaginatedRelatedFilter), 'expense_category')
+    autocomplete_fields = ('vehicle', 'workshop', 'expense_category')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
     search_fields = ('vehicle__vehicle_no', 'workshop__name', 'description')
     readonly_fields = ('payment_date', 'paid_via_account') # These are auto-filled on payment via AccountTransaction
 
 
 # 9. DocketTable Admin
 @admin.register(DocketTable)
-class DocketTableAdmin(admin.ModelAdmin):
+class DocketTableAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'docket'
     list_display = (
         'docket_no', 'trip', 'send_date', 'challan_received', 'received_date'
     )
-    list_filter = ('challan_received',)
+    list_select_related = ('trip',)
+    list_filter = ('challan_received', 'branch')
+    autocomplete_fields = ('trip', 'driver', 'transporter')
+    ordering = ('-send_date',)
     search_fields = ('docket_no', 'trip__trip_id')
     date_hierarchy = 'send_date'
 
 
 # 10. AccountTransaction Admin
 @admin.register(AccountTransaction)
-class AccountTransactionAdmin(admin.ModelAdmin):
+class AccountTransactionAdmin(LargeTableMixin, FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'ledger'
     list_display = (
         'date', 'description', 'from_account', 'to_account', 'deposit', 'withdrawal'
     )
+    list_select_related = ('from_account', 'to_account')
     search_fields = ('description', 'from_account__account_name', 'to_account__account_name')
-    list_filter = ('from_account', 'to_account')
-    date_hierarchy = 'date'
\ No newline at end of file
+    list_filter = ('branch', 'from_account', 'to_account')
+    autocomplete_fields = (
+        'from_account', 'to_account', 'related_trip', 'related_trip_expense',
+        'related_maintenance', 'related_maintenance_expense',
+    )
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+
+
+# --- PAYROLL ADMINS ---
+
+# 11. DriverAdvance Admin
+@admin.register(DriverAdvance)
+class DriverAdvanceAdmin(LargeTableMixin, admin.ModelAdmin):
+    list_display = ('date', 'driver', 'amount', 'paid_via_account', 'payroll_run')
+    list_select_related = ('driver', 'paid_via_account', 'payroll_run')
+    list_filter = ('branch', ('payroll_run', PaginatedRelatedFilter))
+    autocomplete_fields = ('driver', 'paid_via_account')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+    search_fields = ('driver__name', 'driver__driver_id', 'description')
+    readonly_fields = ('payroll_run',) # Filled when a payroll run recovers the advance
+
+
+# 12. Payroll Run Admin (payslips are produced by `manage.py run_payroll`)
+class PayslipInline(admin.TabularInline):
+    model = Payslip
+    extra = 0
+    can_delete = False
+    readonly_fields = (
+        'driver', 'fixed_salary', 'trip_count', 'wage_rate', 'trip_wages',
+        'advances', 'cash_expenses', 'net_pay', 'carried_forward', 'ledger_transaction'
+    )
+
+
+@admin.register(PayrollRun)
+class PayrollRunAdmin(admin.ModelAdmin):
+    list_display = ('period_start', 'period_end', 'paid_via_account', 'total_net_pay', 'created_at')
+    list_select_related = ('paid_via_account',)
+    readonly_fields = ('total_net_pay',)
+    autocomplete_fields = ('paid_via_account',)
+    inlines = [PayslipInline]
+
+
+# --- DERIVED TABLE ADMINS ---
+
+# 13. Lane Rate Admin (read-only; maintained by management.lanes / `manage.py rebuild_lane_rates`)
+@admin.register(LaneRate)
+class LaneRateAdmin(admin.ModelAdmin):
+    list_display = ('origin', 'destination', 'trip_count', 'rate_median', 'last_rate', 'last_trip_date')
+    search_fields = ('origin_key', 'destination_key')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# 14. Location Admin (aliases are the other spellings matched to this location)
+class LocationAliasInline(admin.TabularInline):
+    model = LocationAlias
+    extra = 1
+
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'state')
+    search_fields = ('name', 'aliases__alias')
+    inlines = [LocationAliasInline]
+
+
+# 15. Commission Recompute Admin (read-only audit; written by management.commissions)
+@admin.register(CommissionRecompute)
+class CommissionRecomputeAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'transporter', 'trigger', 'old_commission_rate', 'new_commission_rate',
+        'trip_count', 'commission_before', 'commission_after',
+    )
+    list_filter = ('trigger',)
+    list_select_related = ('transporter',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# 16. Bank Statement Admin (lines are reconciled from the Bank Reconciliation pages)
+@admin.register(BankStatement)
+class BankStatementAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'account', 'file_format', 'period_start', 'period_end', 'line_count', 'imported_at')
+    list_filter = ('account', 'file_format')
+    list_select_related = ('account',)
+    readonly_fields = ('line_count', 'imported_at', 'reconciled_at')
+    autocomplete_fields = ('account',)
+
+
+# 17. Wallet Statement Admin (unbooked lines are handled in the Wallet Review Queue)
+@admin.register(WalletStatement)
+class WalletStatementAdmin(admin.ModelAdmin):
+    list_display = ('file_name', 'account', 'period_start', 'period_end', 'line_count', 'duplicate_count', 'imported_at')
+    list_filter = ('account',)
+    list_select_related = ('account',)
+    readonly_fields = ('line_count', 'duplicate_count', 'imported_at')
+    autocomplete_fields = ('account',)
+
+
+# 18. Route Distance Admin (trip distances are filled in from these on save)
+@admin.register(RouteDistance)
+class RouteDistanceAdmin(admin.ModelAdmin):
+    list_display = ('origin', 'destination', 'distance_km')
+    list_select_related = ('origin', 'destination')
+    search_fields = ('origin__name', 'destination__name')
+    autocomplete_fields = ('origin', 'destination')
+
+
+# 19. Accounting Period Admin (read-only; periods are closed and reopened from the Period Close page)
+class AccountBalanceSnapshotInline(admin.TabularInline):
+    model = AccountBalanceSnapshot
+    fields = ('account', 'opening_balance', 'deposits', 'withdrawals', 'closing_balance')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AccountingPeriod)
+class AccountingPeriodAdmin(admin.ModelAdmin):
+    list_display = ('name', 'period_start', 'period_end', 'archived_count', 'closed_at')
+    inlines = [AccountBalanceSnapshotInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# 20. Archived Account Transaction Admin (read-only; moved here by management.periods)
+@admin.register(ArchivedAccountTransaction)
+class ArchivedAccountTransactionAdmin(LargeTableMixin, admin.ModelAdmin):
+    list_display = ('id', 'date', 'description', 'from_account', 'to_account', 'withdrawal', 'deposit', 'period')
+    list_filter = ('period', 'from_account')
+    list_select_related = ('from_account', 'to_account', 'period')
+    search_fields = ('description',)
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# 21. Archived Trip Admin (read-only; trips are archived by `manage.py archive_trips`)
+@admin.register(ArchivedTrip)
+class ArchivedTripAdmin(LargeTableMixin, admin.ModelAdmin):
+    list_display = ('trip_id', 'date', 'vehicle', 'client', 'origin', 'destination', 'total_freight', 'archived_at')
+    list_select_related = ('vehicle', 'client')
+    list_filter = ('branch',)
+    search_fields = ('trip_id',)
+    date_hierarchy = 'date'
+    actions = ['restore_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Restore selected trips to the live tables")
+    def restore_selected(self, request, queryset):
+        try:
+            restored = restore_trips(list(queryset.values_list('trip_id', flat=True)))
+        except ValidationError as exc:
+            self.message_user(request, ' '.join(exc.messages), messages.ERROR)
+        else:
+            self.message_user(request, f"Restored {restored} trips.", messages.SUCCESS)
+
+
+# 22. Invoice Admin (raised by management.invoicing; cancelled, not edited)
+class InvoiceLineInline(admin.TabularInline):
+    model = InvoiceLine
+    fields = ('trip_code', 'date', 'vehicle_no', 'origin', 'destination', 'freight', 'halting', 'shortage', 'amount')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(Invoice)
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ('number', 'invoice_date', 'client', 'period_start', 'period_end', 'taxable_amount', 'total')
+    list_filter = (('client', PaginatedRelatedFilter),)
+    list_select_related = ('client',)
+    search_fields = ('number', 'client__name', 'lines__trip_code')
+    date_hierarchy = 'invoice_date'
+    inlines = [InvoiceLineInline]
+    actions = ['cancel_selected', 'render_selected']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Cancel selected invoices (trips become billable again)")
+    def cancel_selected(self, request, queryset):
+        try:
+            cancelled = cancel_invoices(queryset)
+        except ValidationError as exc:
+            self.message_user(request, ' '.join(exc.messages), messages.ERROR)
+        else:
+            self.message_user(request, f"Cancelled {cancelled} invoices.", messages.SUCCESS)
+
+    @admin.action(description="Render selected invoice documents again")
+    def render_selected(self, request, queryset):
+        rendered = render_invoices(queryset.select_related('client'))
+        self.message_user(request, f"Rendered {rendered} invoices.", messages.SUCCESS)
+
+
+# 23. Branch Admin (users assigned here only see this branch's rows; see management.branches)
+class UserBranchInline(admin.TabularInline):
+    model = UserBranch
+    autocomplete_fields = ('user',)
+    extra = 0
+
+
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('code', 'name')
+    ordering = ('code',)
+    inlines = [UserBranchInline]
+
+
+# 24. Scheduled Job Admins (locks and run history of `manage.py run_scheduler`; read-only)
+@admin.register(ScheduledJob)
+class ScheduledJobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'last_slot', 'locked_by', 'locked_until')
+    search_fields = ('name',)
+    ordering = ('name',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(JobRun)
+class JobRunAdmin(LargeTableMixin, admin.ModelAdmin):
+    list_display = ('job', 'scheduled_for', 'started_at', 'duration', 'status', 'worker')
+    list_filter = ('status', 'job')
+    list_select_related = ('job',)
+    date_hierarchy = 'started_at'
+    ordering = ('-started_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'management'
+
+    def ready(self):
+        # Connects the KPI tile, lane rate, search index, commission and fleet stat receivers.
+        from . import commissions, fleet, kpis, lanes, search  # noqa: F401
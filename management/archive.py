@@ -0,0 +1,187 @@
+# management/archive.py
+
+"""
+Archival of completed trips to cold tables.
+
+archive_trips() moves COMPLETED trips dated before a cutoff, with their
+TripExpense and DocketTable rows, into ArchivedTrip, ArchivedTripExpense and
+ArchivedDocket. Rows keep their ids (and trips their trip_id), so
+restore_trips() can move them back unchanged. Each chunk of
+TRIP_ARCHIVE_CHUNK_SIZE trips is its own transaction: three INSERT ... SELECT
+statements into the archive tables and three DELETEs from the live ones; no
+row is loaded into Python.
+
+Ledger rows are not moved: they are the books, and leave the live ledger only
+when their accounting period is closed and archived (management.periods).
+Their related_trip / related_trip_expense links, and those of wallet
+statement lines, have no database constraint and keep pointing at the
+archived ids.
+
+Reads that need the whole history go through both tables:
+  * /trip/<trip_id>/ shows an archived trip read-only (find_trip());
+  * fleet statistics and lane rates count archived trips alongside live ones;
+  * the trips-by-status tile counts them as completed.
+Search entries of archived rows are dropped and re-created on restore.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Value
+from django.utils import timezone
+
+from .cache import bump_version
+from .kpis import refresh_tiles, tiles_for
+from .models import (
+    ArchivedDocket, ArchivedTrip, ArchivedTripExpense, DocketTable, SearchEntry, Trip, TripExpense,
+)
+from .search import SEARCH_SOURCES, reindex
+
+# Live model -> archive model, parents first (inserts go in this order, deletes in reverse)
+ARCHIVE_TABLES = ((Trip, ArchivedTrip), (TripExpense, ArchivedTripExpense), (DocketTable, ArchivedDocket))
+LABELS = tuple(live._meta.label for live, _ in ARCHIVE_TABLES)
+
+
+def columns(model):
+    """The model's column names; an archive table has the same ones (plus its own extras)."""
+    return tuple(field.column for field in model._meta.concrete_fields)
+
+
+def chunk_size():
+    return getattr(settings, 'TRIP_ARCHIVE_CHUNK_SIZE', 500)
+
+
+# ----------------------------------------------------------------------
+# Set-based copy and delete (also used by management.periods)
+# ----------------------------------------------------------------------
+def insert_select(queryset, target_model, column_names, extra_columns=()):
+    """
+    INSERT INTO target (columns) SELECT columns FROM queryset in one statement.
+    `extra_columns` are (column, expression) pairs appended to both lists.
+    Returns the number of rows inserted.
+    """
+    quote = connection.ops.quote_name
+    values = [*column_names, *(expression for _, expression in extra_columns)]
+    select_sql, params = queryset.order_by().values_list(*values).query.sql_with_params()
+    names = ', '.join(quote(column) for column in (*column_names, *(column for column, _ in extra_columns)))
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {quote(target_model._meta.db_table)} ({names}) {select_sql}", params)
+        return cursor.rowcount
+
+
+def delete_where(model, queryset):
+    """DELETE FROM model WHERE id IN (queryset's ids), without loading the rows or sending signals."""
+    quote = connection.ops.quote_name
+    ids_sql, params = queryset.order_by().values_list('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {quote(model._meta.db_table)} WHERE {quote('id')} IN ({ids_sql})", params)
+        return cursor.rowcount
+
+
+def _unindex(trip_pks):
+    """Drops the search entries of the trips, their expenses and dockets."""
+    for live, _ in ARCHIVE_TABLES:
+        kind = SEARCH_SOURCES[live._meta.label][0]
+        pks = [str(pk) for pk in _rows(live, trip_pks).values_list('pk', flat=True)]
+        SearchEntry.objects.filter(kind=kind, object_pk__in=pks).delete()
+
+
+def _rows(model, trip_pks):
+    """Rows of a live or archive table belonging to the given trips."""
+    if model in (Trip, ArchivedTrip):
+        return model.objects.filter(pk__in=trip_pks)
+    return model.objects.filter(trip_id__in=trip_pks)
+
+
+def _after_commit():
+    # Raw INSERT/DELETE skip the receivers, so refresh what they would have.
+    for label in LABELS:
+        bump_version(label)
+    refresh_tiles(tiles_for(*LABELS))
+
+
+# ----------------------------------------------------------------------
+# Archiving and restoring
+# ----------------------------------------------------------------------
+def archivable(cutoff):
+    """Trips that archive_trips(cutoff) would move: completed and dated before the cutoff."""
+    return Trip.objects.filter(status='COMPLETED', date__lt=cutoff)
+
+
+@transaction.atomic
+def _archive_chunk(trip_pks):
+    # Re-checked under the row locks: a trip may have been reopened since the chunk was picked
+    trip_pks = list(
+        Trip.objects.select_for_update().filter(pk__in=trip_pks, status='COMPLETED').values_list('pk', flat=True)
+    )
+    if not trip_pks:
+        return 0
+    _unindex(trip_pks)
+    archived_at = Value(timezone.now(), output_field=DateTimeField())
+    for live, cold in ARCHIVE_TABLES:
+        extra = [('archived_at', archived_at)] if cold is ArchivedTrip else []
+        insert_select(_rows(live, trip_pks), cold, columns(live), extra)
+    for live, cold in reversed(ARCHIVE_TABLES):
+        delete_where(live, _rows(cold, trip_pks))
+    transaction.on_commit(_after_commit)
+    return len(trip_pks)
+
+
+def archive_trips(cutoff, limit=None, size=None, progress=None):
+    """
+    Moves completed trips dated before `cutoff` (with their expenses and
+    dockets) to the archive tables, one transaction per chunk. Stops after
+    `limit` trips if given. Returns the number archived.
+    """
+    size, moved = size or chunk_size(), 0
+    while limit is None or moved < limit:
+        take = size if limit is None else min(size, limit - moved)
+        trip_pks = list(archivable(cutoff).order_by('pk').values_list('pk', flat=True)[:take])
+        if not trip_pks:
+            break
+        moved += _archive_chunk(trip_pks)
+        if progress:
+            progress(moved)
+    return moved
+
+
+@transaction.atomic
+def _restore_chunk(trip_pks):
+    conflicts = list(
+        DocketTable.objects.filter(
+            docket_no__in=ArchivedDocket.objects.filter(trip_id__in=trip_pks).values('docket_no')
+        ).values_list('docket_no', flat=True)
+    )
+    if conflicts:
+        raise ValidationError(
+            f"Docket numbers already used by live dockets: {', '.join(conflicts[:10])}. Rename them before restoring."
+        )
+    for live, cold in ARCHIVE_TABLES:
+        insert_select(_rows(cold, trip_pks), live, columns(live))
+    for live, cold in reversed(ARCHIVE_TABLES):
+        delete_where(cold, _rows(live, trip_pks))
+    for live, _ in ARCHIVE_TABLES:
+        reindex(live, _rows(live, trip_pks).values_list('pk', flat=True))
+    transaction.on_commit(_after_commit)
+    return len(trip_pks)
+
+
+def restore_trips(trip_ids, size=None):
+    """Moves the archived trips with these trip_ids (and their expenses and dockets) back. Returns the number restored."""
+    size, restored = size or chunk_size(), 0
+    trip_pks = list(ArchivedTrip.objects.filter(trip_id__in=trip_ids).order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(trip_pks), size):
+        restored += _restore_chunk(trip_pks[start:start + size])
+    return restored
+
+
+# ----------------------------------------------------------------------
+# Read-through
+# ----------------------------------------------------------------------
+def find_trip(trip_id, scoped=False):
+    """The live Trip with this trip_id, else the ArchivedTrip, else None (only the current branch's when scoped)."""
+    manager = 'scoped' if scoped else 'objects'
+    return (
+        getattr(Trip, manager).filter(trip_id=trip_id).first()
+        or getattr(ArchivedTrip, manager).filter(trip_id=trip_id).first()
+    )
@@ -0,0 +1,193 @@
+# management/async_views.py
+
+"""
+Async versions of the read-heavy views (dashboard, trip detail, account overview)
+for deployment under an ASGI server (see tms_core/asgi.py and settings.ASYNC_VIEWS).
+
+Django's async ORM methods (aaggregate, acount, ...) all run on one shared
+thread, so awaiting several of them in asyncio.gather() still executes them
+one after another. gather_queries() instead gives each independent query its
+own worker thread and database connection, so the aggregates really overlap
+while the event loop stays free for other requests. The workers come from one
+bounded pool (settings.ASYNC_QUERY_WORKERS) and keep their connections between
+jobs, subject to CONN_MAX_AGE like any request thread.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Sum
+from django.shortcuts import render
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.csrf import ensure_csrf_cookie
+
+from .cache import cache_page_versioned, masterdata
+from .forms import TripExpenseForm
+from .kpis import load_tiles, tiles_expire_at
+from .money import from_paise, to_paise
+from .periods import deposit_totals, latest_period, open_transactions, opening_balances, withdrawal_totals
+from .models import (
+    AccountMaster, Driver, ExpenseCategory, KpiTile, PartyMaster,
+    Trip, TripExpense, Vehicle,
+)
+from . import views
+
+
+@functools.cache
+def query_executor():
+    """The worker pool gather_queries() runs on, created on first use."""
+    return ThreadPoolExecutor(max_workers=settings.ASYNC_QUERY_WORKERS, thread_name_prefix='gather-queries')
+
+
+async def gather_queries(**jobs):
+    """
+    Runs independent, synchronous ORM callables concurrently and returns
+    their results by name:
+        totals = await gather_queries(advance=lambda: ..., halting=lambda: ...)
+    """
+    def isolated(job):
+        def run():
+            # As around a request: drop this worker's connections that are broken or past CONN_MAX_AGE
+            close_old_connections()
+            try:
+                return job()
+            finally:
+                close_old_connections()
+        return sync_to_async(run, thread_sensitive=False, executor=query_executor())()
+
+    names = list(jobs)
+    results = await asyncio.gather(*(isolated(jobs[name]) for name in names))
+    return dict(zip(names, results))
+
+
+def _sum(queryset, field):
+    return queryset.aggregate(total=Sum(field))['total'] or Decimal('0.00')
+
+
+# ----------------------------------------------------------------------
+# 1. Dashboard (async trip_list)
+# ----------------------------------------------------------------------
+# The bulk status bar reads the CSRF token from its cookie (the cached page must not embed one)
+@ensure_csrf_cookie
+@cache_page_versioned(Trip, Vehicle, Driver, PartyMaster, KpiTile)
+async def dashboard(request):
+    """KPI tiles and the trip list with status and freight totals, computed concurrently."""
+    month_start = date.today().replace(day=1)
+    # Scoped here, in the request's branch context, rather than inside the worker threads
+    branch_trips = Trip.scoped.all()
+    trips = branch_trips.select_related('vehicle', 'driver', 'transporter').order_by('-date')
+
+    results = await gather_queries(
+        # The KPI tiles are company-wide, so only shown when viewing all branches
+        kpi_tiles=load_tiles if request.branch_id is None else dict,
+        trips=lambda: list(trips),
+        status_counts=lambda: list(
+            branch_trips.values('status').annotate(count=Count('pk'), freight=Sum('total_freight')).order_by('status')
+        ),
+        month_freight=lambda: _sum(branch_trips.filter(date__gte=month_start), 'total_freight'),
+    )
+    context = {
+        'kpi_tiles': results['kpi_tiles'],
+        'trips': results['trips'],
+        'status_counts': results['status_counts'],
+        'month_freight': results['month_freight'],
+        'title': 'Trip List & Dashboard',
+    }
+    response = await sync_to_async(render)(request, 'management/trip_list.html', context)
+    response.cache_expires_at = tiles_expire_at(results['kpi_tiles'])
+    return response
+
+
+# ----------------------------------------------------------------------
+# 2. Trip Detail (async, read path only)
+# ----------------------------------------------------------------------
+async def trip_detail(request, trip_id):
+    """Same page as views.trip_detail, with the three sums run concurrently."""
+    if request.method == 'POST':
+        # Expense submission is a write; the sync view handles it.
+        return await sync_to_async(views.trip_detail)(request, trip_id)
+
+    try:
+        trip = await Trip.scoped.select_related('vehicle', 'driver', 'transporter').aget(trip_id=trip_id)
+    except Trip.DoesNotExist:
+        # Archived trips (or none at all): the sync view reads through the archive
+        return await sync_to_async(views.trip_detail)(request, trip_id)
+
+    halting_category = await sync_to_async(masterdata.get_by)(ExpenseCategory, 'name', 'Halting Charges')
+    trip_expenses = TripExpense.objects.filter(trip=trip).order_by('date')
+    advance_receipts = trip.transactions_from_trip.filter(deposit__gt=0).order_by('date')
+    deductible = trip_expenses.exclude(expense_category=halting_category) if halting_category else trip_expenses
+
+    results = await gather_queries(
+        advance_receipts=lambda: list(advance_receipts),
+        total_advance_received=lambda: _sum(advance_receipts, 'deposit'),
+        halting_amount=lambda: _sum(trip_expenses.filter(expense_category=halting_category), 'amount')
+        if halting_category else Decimal('0.00'),
+        deductible_sum=lambda: _sum(deductible, 'amount'),
+    )
+    # Built lazily, as in the sync view: when the cached expense table fragment is served, this never runs.
+    display_expenses = SimpleLazyObject(lambda: views.build_display_expenses(trip, trip_expenses))
+
+    total_freight = trip.total_freight or Decimal('0.00')
+    total_advance_received = results['total_advance_received']
+    advance_agreed_percent = Decimal('0.00')
+    received_percent = Decimal('0.00')
+    if total_freight > 0:
+        advance_agreed_percent = (trip.advance / total_freight) * 100
+        received_percent = (total_advance_received / total_freight) * 100
+
+    total_revenue = trip.total_freight + results['halting_amount']
+    deductible_sum = results['deductible_sum']
+    profit_loss = total_revenue - trip.commission_amount - trip.orai_amount - deductible_sum
+
+    context = {
+        'trip': trip,
+        'trip_expenses': display_expenses,
+        'advance_receipts': results['advance_receipts'],
+        'total_advance_received': total_advance_received,
+        'advance_agreed_percent': advance_agreed_percent,
+        'received_percent': received_percent,
+        'total_revenue': total_revenue,
+        'total_expenses': deductible_sum,
+        'profit_loss': profit_loss,
+        'expense_form': TripExpenseForm(),
+        'halting_amount': results['halting_amount'],
+        'title': f'Details for Trip: {trip.trip_id}',
+    }
+    return await sync_to_async(render)(request, 'management/trip_detail.html', context)
+
+
+# ----------------------------------------------------------------------
+# 3. Account Overview (async account_list with live balances)
+# ----------------------------------------------------------------------
+async def account_overview(request):
+    """Account list with current balances; deposits and withdrawals are grouped concurrently."""
+    period = await sync_to_async(latest_period)()
+    # With no closed period, open_transactions() asks the master-data cache, which may query
+    open_rows = await sync_to_async(open_transactions)(period.period_end if period else None)
+    accounts = AccountMaster.scoped.order_by('account_name')
+    results = await gather_queries(
+        accounts=lambda: list(accounts),
+        # The latest closing snapshot (or the initial balance), plus the open-period movements
+        openings=lambda: opening_balances(period),
+        deposits=lambda: deposit_totals(open_rows),
+        withdrawals=lambda: withdrawal_totals(open_rows),
+    )
+
+    accounts = results['accounts']
+    deposits, withdrawals = results['deposits'], results['withdrawals']
+    for account in accounts:
+        account.current_balance = from_paise(
+            results['openings'].get(account.pk, to_paise(account.initial_balance))
+            + (deposits.get(account.pk) or 0)
+            - (withdrawals.get(account.pk) or 0)
+        )
+
+    context = {'accounts': accounts, 'show_balances': True, 'title': 'Account List & Balances'}
+    return await sync_to_async(render)(request, 'management/account_list.html', context)
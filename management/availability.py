@@ -0,0 +1,69 @@
+# management/availability.py
+
+"""
+Vehicle and driver availability.
+
+A vehicle or driver is booked while it is on a trip in one of the
+ACTIVE_TRIP_STATUSES, and stays booked until that trip is completed or
+cancelled. Every lookup here filters on status and reads only the vehicle or
+driver and the date, so SQLite answers it from the (status, vehicle, date) and
+(status, driver, date) indexes on Trip without reading the trips table.
+"""
+
+from .branches import in_scope
+from .cache import masterdata
+from .models import ACTIVE_TRIP_STATUSES, Driver, Trip, Vehicle
+
+# Resource -> (Trip foreign key, master model)
+RESOURCES = {
+    'vehicle': ('vehicle', Vehicle),
+    'driver': ('driver', Driver),
+}
+
+
+def busy_ids(resource, on_date=None):
+    """Primary keys of the vehicles or drivers on an active trip (started by `on_date`, if given)."""
+    field = RESOURCES[resource][0]
+    trips = Trip.objects.filter(status__in=ACTIVE_TRIP_STATUSES)
+    if on_date is not None:
+        trips = trips.filter(date__lte=on_date)
+    return set(trips.values_list(f'{field}_id', flat=True).distinct().order_by())
+
+
+def available(resource, on_date=None):
+    """
+    Vehicles or drivers of the current branch (and shared ones) free on `on_date`,
+    from the master-data cache. Inactive drivers are left out.
+    """
+    model = RESOURCES[resource][1]
+    # Bookings count in every branch: a shared vehicle on another branch's trip is not free
+    busy = busy_ids(resource, on_date)
+    rows = masterdata.filter(model, is_active=True) if model is Driver else masterdata.all(model)
+    return [row for row in in_scope(rows) if row.pk not in busy]
+
+
+def conflicting_trip(resource, pk, exclude_pk=None):
+    """The active trip (other than `exclude_pk`) already holding this vehicle or driver, or None."""
+    field = RESOURCES[resource][0]
+    trips = Trip.objects.filter(status__in=ACTIVE_TRIP_STATUSES, **{f'{field}_id': pk})
+    if exclude_pk is not None:
+        trips = trips.exclude(pk=exclude_pk)
+    return trips.only('trip_id', 'date', 'status').order_by('date').first()
+
+
+def booking_conflicts(status, exclude_pk=None, **resources):
+    """
+    Error messages, keyed by field, for every resource a trip with this status
+    would double-book, e.g. booking_conflicts('PENDING', vehicle='MH12AB1234').
+    """
+    if status not in ACTIVE_TRIP_STATUSES:
+        return {}
+    errors = {}
+    for resource, pk in resources.items():
+        other = conflicting_trip(resource, pk, exclude_pk=exclude_pk) if pk else None
+        if other:
+            errors[RESOURCES[resource][0]] = (
+                f"{resource.capitalize()} {pk} is already on trip {other.trip_id} "
+                f"({other.get_status_display()}, {other.date:%d-%m-%Y})."
+            )
+    return errors
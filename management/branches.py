@@ -0,0 +1,201 @@
+# management/branches.py
+
+"""
+Branch offices sharing one instance.
+
+Operational rows (trips, expenses, dockets, ledger rows, advances) carry the
+Branch they belong to; master rows (vehicles, drivers, parties, accounts)
+carry one too, or none when they are shared by every branch.
+
+The current branch is a context variable, set per request by BranchMiddleware
+and for any other block of code by `branch_scope()`:
+  * a user with a UserBranch assignment always works in that branch;
+  * everyone else is head office: all branches, or the one picked with the
+    branch switcher (kept in the session).
+
+Each branch model has two managers. `objects` stays the default and is never
+scoped, so ID generation, uniqueness checks, signals, admin and background jobs
+see every row. `scoped` applies the current branch:
+
+    Trip.scoped.order_by('-date')         # this branch's trips
+    PartyMaster.scoped.all()              # this branch's parties plus the shared ones
+
+New rows get their branch on save (pre_save below) from the row they hang off
+(a trip from its vehicle, an expense from its trip, ...), else the current
+branch. Writes that bypass save() (bulk_create) must set branch_id themselves.
+"""
+
+import contextvars
+from contextlib import ContextDecorator
+
+from django.db import models
+from django.db.models.signals import pre_save
+
+from .cache import MASTER_MODELS, masterdata
+
+SESSION_KEY = 'branch_id'
+
+_current_branch = contextvars.ContextVar('current_branch', default=None)
+
+# Model label -> foreign keys a new row takes its branch from, in order of preference.
+# The masters have none: they belong to the branch that creates them (shared when head office does).
+BRANCH_SOURCES = {
+    'management.Vehicle': (),
+    'management.Driver': (),
+    'management.PartyMaster': (),
+    'management.AccountMaster': (),
+    'management.Trip': ('vehicle',),
+    'management.TripExpense': ('trip',),
+    'management.MaintenanceExpense': ('vehicle',),
+    'management.DocketTable': ('trip',),
+    'management.AccountTransaction': ('related_trip', 'from_account'),
+    'management.DriverAdvance': ('driver', 'paid_via_account'),
+}
+
+
+def current_branch():
+    """The pk of the branch in scope, or None for all branches."""
+    return _current_branch.get()
+
+
+class branch_scope(ContextDecorator):
+    """
+    Scopes `.scoped` queries (and the branch of new rows) to one branch:
+
+        with branch_scope(branch):
+            Trip.scoped.count()
+
+    `branch` is a Branch, its pk, or None for all branches.
+    """
+
+    def __init__(self, branch):
+        self.branch_id = getattr(branch, 'pk', branch)
+        self._token = None
+
+    def _recreate_cm(self):
+        return type(self)(self.branch_id)
+
+    def __enter__(self):
+        self._token = _current_branch.set(self.branch_id)
+        return self.branch_id
+
+    def __exit__(self, *exc):
+        _current_branch.reset(self._token)
+        return False
+
+
+# ----------------------------------------------------------------------
+# Managers
+# ----------------------------------------------------------------------
+class BranchQuerySet(models.QuerySet):
+
+    def for_branch(self, branch):
+        """Rows of `branch` (a Branch or pk; None means every branch), plus shared rows on master tables."""
+        branch_id = getattr(branch, 'pk', branch)
+        if branch_id is None:
+            return self
+        condition = models.Q(branch_id=branch_id)
+        if not BRANCH_SOURCES.get(self.model._meta.label, True):
+            condition |= models.Q(branch__isnull=True)
+        return self.filter(condition)
+
+
+class BranchScopedManager(models.Manager.from_queryset(BranchQuerySet)):
+    """Restricts every query to the current branch (see current_branch())."""
+
+    def get_queryset(self):
+        return super().get_queryset().for_branch(current_branch())
+
+
+def in_scope(objs):
+    """Filters already-loaded rows (e.g. cached master data) to the current branch and the shared ones."""
+    branch_id = current_branch()
+    if branch_id is None:
+        return list(objs)
+    return [obj for obj in objs if getattr(obj, 'branch_id', None) in (None, branch_id)]
+
+
+# ----------------------------------------------------------------------
+# Branch of new rows
+# ----------------------------------------------------------------------
+def parent_branch(instance, field_name):
+    """The branch_id of the row `instance.<field_name>` points to, or None."""
+    field = instance._meta.get_field(field_name)
+    parent_id = getattr(instance, field.attname)
+    if parent_id is None:
+        return None
+    if field.is_cached(instance):
+        return getattr(field.get_cached_value(instance), 'branch_id', None)
+    model = field.related_model
+    if model._meta.label in MASTER_MODELS:
+        return getattr(masterdata.get(model, parent_id), 'branch_id', None)
+    return model._default_manager.filter(pk=parent_id).values_list('branch_id', flat=True).first()
+
+
+def assign_branch(instance):
+    """Sets a new row's branch from its parent rows, else the current branch."""
+    if instance.branch_id is not None:
+        return
+    for field_name in BRANCH_SOURCES[instance._meta.label]:
+        branch_id = parent_branch(instance, field_name)
+        if branch_id is not None:
+            instance.branch_id = branch_id
+            return
+    instance.branch_id = current_branch()
+
+
+def _on_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or not instance._state.adding:
+        return
+    assign_branch(instance)
+
+
+for _model_label in BRANCH_SOURCES:
+    pre_save.connect(_on_pre_save, sender=_model_label, dispatch_uid=f'branch_pre_save_{_model_label}')
+
+
+# ----------------------------------------------------------------------
+# Requests
+# ----------------------------------------------------------------------
+def request_branch(request):
+    """
+    (branch pk or None, locked) for a request: an assigned user is locked to
+    their branch; head office uses the branch picked in the session, if any.
+    """
+    from .models import Branch, UserBranch
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        assigned = UserBranch.objects.filter(user_id=user.pk).values_list('branch_id', flat=True).first()
+        if assigned is not None:
+            return assigned, True
+    picked = request.session.get(SESSION_KEY)
+    if picked is not None and masterdata.get(Branch, picked) is None:
+        picked = None
+    return picked, False
+
+
+class BranchMiddleware:
+    """Runs each request inside branch_scope() of the user's branch. Goes after AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.branch_id, request.branch_locked = request_branch(request)
+        with branch_scope(request.branch_id):
+            return self.get_response(request)
+
+
+def branch_context(request):
+    """Template context processor: the current branch, and the branches head office can switch to."""
+    from .models import Branch
+
+    branch_id = getattr(request, 'branch_id', None)
+    locked = getattr(request, 'branch_locked', True)
+    return {
+        'current_branch': masterdata.get(Branch, branch_id),
+        'switchable_branches': [] if locked else [
+            branch for branch in masterdata.all(Branch) if branch.is_active or branch.pk == branch_id
+        ],
+    }
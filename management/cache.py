@@ -0,0 +1,289 @@
+# management/cache.py
+
+"""
+Master-data cache for the small, rarely-changing reference tables
+(Vehicle, Driver, PartyMaster, ExpenseCategory, AccountMaster, Location, Branch).
+
+Two tiers:
+  1. An in-process table per model (dict lookups, no I/O at all).
+  2. A shared Django cache (settings.MASTERDATA_CACHE_ALIAS, file-backed by
+     default) so every worker process re-uses one database load.
+
+Each model has a version counter in the shared cache. Saving or deleting a
+row bumps the counter (after the transaction commits), which makes every
+process reload that table on its next lookup. The same counters are used to
+key cached pages and template fragments (cache_page_versioned below and the
+{% model_versions %} template tag), so those are dropped as soon as their rows change.
+
+Writes that bypass signals (QuerySet.update, bulk_create) must call
+bump_version() for the affected models themselves.
+"""
+
+import threading
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.http import HttpResponse
+from django.utils import timezone
+
+# Model label -> fields that can be used as natural keys (matched case-insensitively).
+MASTER_MODELS = {
+    'management.Vehicle': ('vehicle_no',),
+    'management.Driver': ('license_no',),
+    'management.PartyMaster': (),
+    'management.ExpenseCategory': ('name',),
+    'management.AccountMaster': ('account_name',),
+    'management.Location': ('name',),
+    'management.LocationAlias': ('alias',),
+    'management.RouteDistance': ('route_key',),
+    'management.AccountingPeriod': (),
+    'management.Branch': ('code',),
+}
+
+VERSION_KEY = 'version:{label}'
+TABLE_KEY = 'masterdata:{label}:{version}'
+
+
+def _label(model):
+    if isinstance(model, str):
+        return model
+    return model._meta.label
+
+
+def _natural(value):
+    return str(value).strip().casefold()
+
+
+def _shared_cache():
+    return caches[getattr(settings, 'MASTERDATA_CACHE_ALIAS', 'default')]
+
+
+# ----------------------------------------------------------------------
+# Version counters (shared by every cache built on model versions)
+# ----------------------------------------------------------------------
+def model_version(model):
+    """Returns the current version counter for a model label or class."""
+    cache = _shared_cache()
+    key = VERSION_KEY.format(label=_label(model))
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a flushed cache never re-uses an old number.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def model_versions(*models):
+    """Returns a single token combining the version counters of several models."""
+    cache = _shared_cache()
+    labels = [_label(model) for model in models]
+    keys = [VERSION_KEY.format(label=label) for label in labels]
+    found = cache.get_many(keys)
+    versions = [found.get(key) or model_version(label) for key, label in zip(keys, labels)]
+    return '-'.join(str(version) for version in versions)
+
+
+def versioned_key(prefix, *models, vary_on=()):
+    """Builds a cache key that changes whenever any of `models` is written."""
+    parts = [prefix, model_versions(*models)] + [str(value) for value in vary_on]
+    return ':'.join(parts)
+
+
+def bump_version(model):
+    """Increments a model's version counter, invalidating anything keyed on it."""
+    cache = _shared_cache()
+    key = VERSION_KEY.format(label=_label(model))
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+        return cache.get(key)
+
+
+class _Table:
+    """One loaded master table with its pk and natural-key indexes."""
+
+    def __init__(self, rows, natural_fields):
+        self.rows = rows
+        self.by_pk = {str(row.pk): row for row in rows}
+        self.by_natural = {
+            field: {_natural(getattr(row, field)): row for row in rows}
+            for field in natural_fields
+        }
+
+
+class MasterDataCache:
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _table(self, model):
+        label = _label(model)
+        if label not in MASTER_MODELS:
+            raise KeyError(f"{label} is not a cached master-data model.")
+
+        local = self._local.get(label)
+        now = time.monotonic()
+        ttl = getattr(settings, 'MASTERDATA_LOCAL_TTL', 2)
+        # Within the TTL the in-process copy is trusted without touching the shared cache.
+        if local and now - local['checked_at'] < ttl:
+            return local['table']
+
+        version = model_version(label)
+        if local and local['version'] == version:
+            local['checked_at'] = now
+            return local['table']
+
+        with self._lock:
+            shared = _shared_cache()
+            key = TABLE_KEY.format(label=label, version=version)
+            rows = shared.get(key)
+            if rows is None:
+                rows = list(apps.get_model(label).objects.order_by('pk'))
+                shared.set(key, rows, None)
+            table = _Table(rows, MASTER_MODELS[label])
+            self._local[label] = {'version': version, 'checked_at': now, 'table': table}
+        return table
+
+    def get(self, model, pk):
+        """Returns the cached instance with this primary key, or None."""
+        if pk is None:
+            return None
+        return self._table(model).by_pk.get(str(pk))
+
+    def get_by(self, model, field, value):
+        """Returns the cached instance whose natural key `field` matches `value`, or None."""
+        if value is None:
+            return None
+        return self._table(model).by_natural[field].get(_natural(value))
+
+    def all(self, model):
+        return list(self._table(model).rows)
+
+    def filter(self, model, **lookups):
+        """Exact-match filtering in Python. Supports `field=value` and `field__in=[...]`."""
+        rows = self._table(model).rows
+        for lookup, value in lookups.items():
+            if lookup.endswith('__in'):
+                field, allowed = lookup[:-4], set(value)
+                rows = [row for row in rows if getattr(row, field) in allowed]
+            else:
+                rows = [row for row in rows if getattr(row, lookup) == value]
+        return list(rows)
+
+    def invalidate(self, model):
+        """Bumps the model's version; also used for models that are versioned but not cached here."""
+        label = _label(model)
+        self._local.pop(label, None)
+        bump_version(label)
+
+
+masterdata = MasterDataCache()
+
+
+# ----------------------------------------------------------------------
+# Signal-based invalidation
+# ----------------------------------------------------------------------
+# Every model whose writes should bump its version counter. Page and fragment
+# caches (see management.templatetags.versioned_cache) key on these counters.
+VERSIONED_MODELS = tuple(MASTER_MODELS) + (
+    'management.Trip',
+    'management.TripExpense',
+    'management.MaintenanceExpense',
+    'management.DocketTable',
+    'management.AccountTransaction',
+    'management.KpiTile',
+    'management.DriverAdvance',
+    'management.PayrollRun',
+    'management.Payslip',
+)
+
+
+def _on_model_write(sender, **kwargs):
+    label = sender._meta.label
+    masterdata._local.pop(label, None)
+    # Bump only once the write is visible, so no process can re-cache stale rows.
+    transaction.on_commit(lambda: masterdata.invalidate(label))
+
+
+for _model_label in VERSIONED_MODELS:
+    post_save.connect(_on_model_write, sender=_model_label, dispatch_uid=f'version_save_{_model_label}')
+    post_delete.connect(_on_model_write, sender=_model_label, dispatch_uid=f'version_delete_{_model_label}')
+
+
+# ----------------------------------------------------------------------
+# Versioned page caching
+# ----------------------------------------------------------------------
+def cache_page_versioned(*models, timeout=None):
+    """
+    Caches a view's rendered GET response until any of `models` is written
+    (or `timeout` seconds pass, or the response's `cache_expires_at`).
+    Responses are skipped when the request has pending flash messages, since
+    base.html renders those into the page. Pages are kept per branch and
+    per head office / branch user (request.branch_id and branch_locked, set
+    by management.branches.BranchMiddleware), and dropped when a branch changes.
+    Works on sync and async views.
+    """
+    def cache_key(view_func, request):
+        # base.html shows the branch name, and the branch switcher only to head office
+        return versioned_key(
+            f'page:{view_func.__name__}', *models, 'management.Branch',
+            vary_on=(
+                request.get_full_path(), getattr(request, 'branch_id', None), getattr(request, 'branch_locked', None),
+            ),
+        )
+
+    def cacheable(request):
+        return request.method in ('GET', 'HEAD') and not len(messages.get_messages(request))
+
+    def store(key, response):
+        if response.status_code != 200 or response.streaming:
+            return
+        # A view may end its page's life sooner (response.cache_expires_at, an aware datetime)
+        expires_at = getattr(response, 'cache_expires_at', None)
+        page_timeout = timeout
+        if expires_at is not None:
+            remaining = int((expires_at - timezone.now()).total_seconds())
+            if remaining <= 0:
+                return
+            page_timeout = remaining if timeout is None else min(timeout, remaining)
+        caches['default'].set(key, response.content, page_timeout)
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped_async(request, *args, **kwargs):
+                # Message storage may load the session, which is a sync ORM call.
+                if not await sync_to_async(cacheable)(request):
+                    return await view_func(request, *args, **kwargs)
+                key = await sync_to_async(cache_key)(view_func, request)
+                content = await caches['default'].aget(key)
+                if content is not None:
+                    return HttpResponse(content)
+                response = await view_func(request, *args, **kwargs)
+                await sync_to_async(store)(key, response)
+                return response
+            return _wrapped_async
+
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if not cacheable(request):
+                return view_func(request, *args, **kwargs)
+            key = cache_key(view_func, request)
+            content = caches['default'].get(key)
+            if content is not None:
+                return HttpResponse(content)
+            response = view_func(request, *args, **kwargs)
+            store(key, response)
+            return response
+        return _wrapped
+    return decorator
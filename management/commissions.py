@@ -0,0 +1,106 @@
+# management/commissions.py
+
+"""
+Transporter commission and orai recomputes.
+
+Trip.commission_amount and Trip.orai_amount are copied from the transporter's
+PartyMaster row when the trip is saved. When a transporter's commission_rate
+or orai_charge changes, recompute_commissions() rewrites every trip of that
+transporter that is not yet COMPLETED with a single UPDATE whose SET clause is
+an SQL expression over total_freight; no trip is loaded into Python. Only
+trips whose stored amounts differ are touched, and each recompute that
+changes something is recorded as a CommissionRecompute row.
+
+Editing a transporter's rates (admin or form) triggers it through the
+post_save receiver below, inside the same transaction. `manage.py
+recompute_commissions` does the same for every transporter, e.g. after a
+bulk import of rates.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Round
+from django.db.models.signals import post_save
+
+from .cache import bump_version
+from .kpis import refresh_tiles, tiles_for
+from .models import CommissionRecompute, Trip
+from .money import MoneyField
+
+ZERO = Decimal('0.00')
+RATE_FIELDS = ('commission_rate', 'orai_charge')
+
+
+def open_trips(transporter):
+    """The transporter's trips whose commission and orai still follow the master rates."""
+    return Trip.objects.filter(transporter=transporter).exclude(status='COMPLETED')
+
+
+def commission_expression(commission_rate):
+    """
+    total_freight * commission_rate / 100 in paise, rounded half up to the paisa.
+    The rate goes in as whole basis points so the product stays an exact integer.
+    """
+    basis_points = int(commission_rate * 100)
+    return Round(
+        F('total_freight') * Value(basis_points) / Value(10000.0),
+        output_field=MoneyField(),
+    )
+
+
+@transaction.atomic
+def recompute_commissions(transporter, trigger='COMMAND', old_rates=None):
+    """
+    Brings the transporter's open trips in line with its current rates.
+    `old_rates` is {'commission_rate': ..., 'orai_charge': ...} before the edit, when known.
+    Returns the CommissionRecompute, or None if no trip needed changing.
+    """
+    commission = commission_expression(transporter.commission_rate)
+    orai = Value(transporter.orai_charge, output_field=MoneyField())
+    stale = open_trips(transporter).exclude(commission_amount=commission, orai_amount=orai)
+
+    totals = stale.aggregate(
+        trips=Count('pk'),
+        commission_before=Sum('commission_amount'),
+        commission_after=Sum(commission),
+        orai_before=Sum('orai_amount'),
+    )
+    if not totals['trips']:
+        return None
+
+    changed = stale.update(commission_amount=commission, orai_amount=orai)
+    old_rates = old_rates or {}
+    audit = CommissionRecompute.objects.create(
+        transporter=transporter,
+        trigger=trigger,
+        old_commission_rate=old_rates.get('commission_rate'),
+        new_commission_rate=transporter.commission_rate,
+        old_orai_charge=old_rates.get('orai_charge'),
+        new_orai_charge=transporter.orai_charge,
+        trip_count=changed,
+        commission_before=totals['commission_before'] or ZERO,
+        commission_after=totals['commission_after'] or ZERO,
+        orai_before=totals['orai_before'] or ZERO,
+        orai_after=transporter.orai_charge * changed,
+    )
+
+    # QuerySet.update skips post_save, so refresh what the receivers would have.
+    def after_commit():
+        bump_version('management.Trip')
+        refresh_tiles(tiles_for('management.Trip'))
+    transaction.on_commit(after_commit)
+    return audit
+
+
+def _on_party_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created or not instance.has_changed(*RATE_FIELDS):
+        return
+    recompute_commissions(
+        instance, trigger='SAVE',
+        old_rates={name: instance.loaded_value(name) for name in RATE_FIELDS} if instance.is_tracked() else None,
+    )
+
+
+post_save.connect(_on_party_save, sender='management.PartyMaster', dispatch_uid='commission_recompute_party')
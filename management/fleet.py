@@ -0,0 +1,374 @@
+# management/fleet.py
+
+"""
+Fuel efficiency and cost-per-km analytics per vehicle.
+
+Trip.distance_km comes from the RouteDistance table (see
+locations.route_distance). Fuel is every TripExpense whose category is in
+settings.FUEL_EXPENSE_CATEGORIES, counted in the month of its trip.
+
+MonthlyVehicleStat holds one row per vehicle per month: trips, distance,
+tonnes, tonne-km, freight, fuel and all trip expenses. The rows are built
+with two grouped queries (one over trips, one over expenses) per refresh, and
+the fleet-wide figures are then sums over a few hundred stat rows instead of
+the trip and expense tables:
+
+    fuel per km       = fuel on trips with a distance / their km
+    fuel per tonne-km = fuel on trips with a distance / their tonne-km
+    fuel per tonne    = fuel / tonnes carried
+    fuel per trip     = fuel / trips
+    cost per km       = all expenses on trips with a distance / their km
+
+Rows are kept current incrementally: saving or deleting a trip or trip
+expense refreshes just the affected vehicle-months after the transaction
+commits. Bulk writes (wallet imports, status transitions) queue their
+vehicle-months with mark_vehicle_months(). Saving a RouteDistance fills in
+the distance of the trips on that route that have none.
+`manage.py rebuild_vehicle_stats` rebuilds everything. Archived trips
+(management.archive) are read alongside the live ones, so archiving a month
+does not change its row.
+"""
+
+import threading
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .cache import bump_version
+from .models import ArchivedTrip, ArchivedTripExpense, MonthlyVehicleStat, RouteDistance, Trip, TripExpense
+from .money import PaiseSum, from_paise, round_money
+
+ZERO = Decimal('0.00')
+# Trailing windows (in months, ending with the current month) offered by the fleet view
+ROLLING_WINDOWS = (1, 3, 6, 12)
+GROUPINGS = {'vehicle': 'vehicle_id', 'vehicle_type': 'vehicle_type'}
+
+# Trip / TripExpense fields the stats depend on
+TRIP_STAT_FIELDS = frozenset({'date', 'vehicle', 'weight', 'distance_km', 'rate', 'total_freight', 'status'})
+EXPENSE_STAT_FIELDS = frozenset({'trip', 'amount', 'expense_category'})
+
+
+def fuel_categories():
+    return getattr(settings, 'FUEL_EXPENSE_CATEGORIES', ('Diesel',))
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(month, months):
+    """First day of the month `months` after (or before, if negative) `month`."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# ----------------------------------------------------------------------
+# Building the monthly rows
+# ----------------------------------------------------------------------
+# Live and archived trips (management.archive) count alike; archiving leaves the stats unchanged.
+STAT_SOURCES = ((Trip, TripExpense), (ArchivedTrip, ArchivedTripExpense))
+TRIP_TOTALS = ('trip_count', 'measured_trips', 'distance', 'tonnes', 'tonne_km', 'freight')
+COST_TOTALS = ('total', 'measured_total', 'fuel', 'measured_fuel')
+
+
+def _grouped_rows(trip_model, expense_model, start, end, vehicle_ids):
+    """Two grouped queries over one trip/expense table pair: (trip rows, expense rows)."""
+    trips = trip_model.objects.exclude(status='CANCELLED')
+    expenses = expense_model.objects.exclude(trip__status='CANCELLED')
+    if start:
+        trips, expenses = trips.filter(date__gte=start), expenses.filter(trip__date__gte=start)
+    if end:
+        next_month = add_months(month_start(end), 1)
+        trips, expenses = trips.filter(date__lt=next_month), expenses.filter(trip__date__lt=next_month)
+    if vehicle_ids is not None:
+        trips, expenses = trips.filter(vehicle_id__in=vehicle_ids), expenses.filter(trip__vehicle_id__in=vehicle_ids)
+
+    measured = Q(distance_km__isnull=False)
+    trip_rows = (
+        trips.annotate(month=TruncMonth('date'))
+        .values('vehicle_id', 'vehicle__vehicle_type', 'month')
+        .annotate(
+            trip_count=Count('pk'),
+            measured_trips=Count('pk', filter=measured),
+            distance=Sum('distance_km'),
+            tonnes=Sum('weight'),
+            tonne_km=Sum(F('weight') * F('distance_km'), output_field=DecimalField()),
+            freight=PaiseSum('total_freight'),
+        )
+        .order_by()
+    )
+    fuel = Q(expense_category__name__in=fuel_categories())
+    on_measured_trip = Q(trip__distance_km__isnull=False)
+    expense_rows = (
+        expenses.annotate(month=TruncMonth('trip__date'))
+        .values('trip__vehicle_id', 'month')
+        .annotate(
+            total=PaiseSum('amount'),
+            measured_total=PaiseSum('amount', filter=on_measured_trip),
+            fuel=PaiseSum('amount', filter=fuel),
+            measured_fuel=PaiseSum('amount', filter=fuel & on_measured_trip),
+        )
+        .order_by()
+    )
+    return trip_rows, expense_rows
+
+
+def compute_stats(start=None, end=None, vehicle_ids=None):
+    """Unsaved MonthlyVehicleStat rows for the trips dated between two months (inclusive)."""
+    totals, costs = {}, defaultdict(lambda: dict.fromkeys(COST_TOTALS, 0))
+    for trip_model, expense_model in STAT_SOURCES:
+        trip_rows, expense_rows = _grouped_rows(trip_model, expense_model, start, end, vehicle_ids)
+        for row in trip_rows:
+            total = totals.setdefault(
+                (row['vehicle_id'], row['month']),
+                {'vehicle_type': row['vehicle__vehicle_type'], **dict.fromkeys(TRIP_TOTALS, 0)},
+            )
+            for name in TRIP_TOTALS:
+                total[name] += row[name] or 0
+        for row in expense_rows:
+            cost = costs[(row['trip__vehicle_id'], row['month'])]
+            for name in COST_TOTALS:
+                cost[name] += row[name] or 0
+
+    stats = []
+    for (vehicle_id, month), row in totals.items():
+        cost = costs.get((vehicle_id, month), {})
+        stats.append(MonthlyVehicleStat(
+            vehicle_id=vehicle_id,
+            vehicle_type=row['vehicle_type'],
+            month=month,
+            trip_count=row['trip_count'],
+            measured_trips=row['measured_trips'],
+            distance_km=row['distance'],
+            tonnes=round_money(row['tonnes']),
+            tonne_km=round_money(row['tonne_km']),
+            freight=from_paise(row['freight']),
+            fuel_cost=from_paise(cost.get('fuel') or 0),
+            measured_fuel_cost=from_paise(cost.get('measured_fuel') or 0),
+            trip_expenses=from_paise(cost.get('total') or 0),
+            measured_trip_expenses=from_paise(cost.get('measured_total') or 0),
+        ))
+    return stats
+
+
+@transaction.atomic
+def rebuild_stats(start=None, end=None, vehicle_ids=None):
+    """Replaces the stat rows in the given month range / vehicles. Returns the number of rows."""
+    existing = MonthlyVehicleStat.objects.all()
+    if start:
+        existing = existing.filter(month__gte=month_start(start))
+    if end:
+        existing = existing.filter(month__lte=month_start(end))
+    if vehicle_ids is not None:
+        existing = existing.filter(vehicle_id__in=vehicle_ids)
+    stats = compute_stats(start and month_start(start), end, vehicle_ids)
+    existing.delete()
+    MonthlyVehicleStat.objects.bulk_create(stats, batch_size=500)
+    return len(stats)
+
+
+def refresh_vehicle_months(pairs):
+    """Recomputes the given (vehicle_id, month) stat rows, one rebuild per month."""
+    by_month = defaultdict(set)
+    for vehicle_id, month in pairs:
+        if vehicle_id and month:
+            by_month[month_start(month)].add(vehicle_id)
+    for month, vehicle_ids in by_month.items():
+        rebuild_stats(month, month, vehicle_ids)
+
+
+def fill_trip_distances(route=None):
+    """
+    Sets distance_km on trips without one from the RouteDistance table (one
+    UPDATE per route). Returns the affected (vehicle_id, month) pairs.
+    """
+    routes = [route] if route else RouteDistance.objects.all()
+    touched = set()
+    for route in routes:
+        trips = Trip.objects.filter(distance_km__isnull=True).filter(
+            Q(origin_location_id=route.origin_id, destination_location_id=route.destination_id)
+            | Q(origin_location_id=route.destination_id, destination_location_id=route.origin_id)
+        )
+        rows = list(trips.values_list('pk', 'vehicle_id', 'date'))
+        if rows:
+            Trip.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(distance_km=route.distance_km)
+            touched.update((vehicle_id, month_start(day)) for _, vehicle_id, day in rows)
+    return touched
+
+
+# ----------------------------------------------------------------------
+# Reading
+# ----------------------------------------------------------------------
+def _ratio(paise, quantity):
+    if not paise or not quantity:
+        return None
+    return round_money(from_paise(paise) / Decimal(quantity))
+
+
+def efficiency(group_by='vehicle', start=None, end=None, vehicle_ids=None):
+    """
+    Per vehicle (or vehicle_type) totals and fuel ratios over the stat rows
+    between two months, most fuel per tonne-km first. One grouped query.
+    """
+    group_field = GROUPINGS[group_by]
+    stats = MonthlyVehicleStat.objects.all()
+    if start:
+        stats = stats.filter(month__gte=month_start(start))
+    if end:
+        stats = stats.filter(month__lte=month_start(end))
+    if vehicle_ids is not None:
+        stats = stats.filter(vehicle_id__in=vehicle_ids)
+    rows = (
+        stats.values(group_field)
+        .annotate(
+            vehicles=Count('vehicle_id', distinct=True),
+            trips=Sum('trip_count'),
+            measured_trips=Sum('measured_trips'),
+            distance=Sum('distance_km'),
+            tonnes=Sum('tonnes'),
+            tonne_km=Sum('tonne_km'),
+            freight=PaiseSum('freight'),
+            fuel=PaiseSum('fuel_cost'),
+            measured_fuel=PaiseSum('measured_fuel_cost'),
+            expenses=PaiseSum('trip_expenses'),
+            measured_expenses=PaiseSum('measured_trip_expenses'),
+        )
+        .order_by()
+    )
+    results = []
+    for row in rows:
+        results.append({
+            'key': row[group_field],
+            'vehicles': row['vehicles'],
+            'trips': row['trips'],
+            'measured_trips': row['measured_trips'],
+            'distance_km': row['distance'],
+            'tonnes': row['tonnes'],
+            'tonne_km': row['tonne_km'],
+            'freight': from_paise(row['freight']),
+            'fuel_cost': from_paise(row['fuel']),
+            'trip_expenses': from_paise(row['expenses']),
+            'fuel_per_km': _ratio(row['measured_fuel'], row['distance']),
+            'fuel_per_tonne_km': (
+                (from_paise(row['measured_fuel']) / row['tonne_km']).quantize(Decimal('0.0001'))
+                if row['measured_fuel'] and row['tonne_km'] else None
+            ),
+            'fuel_per_tonne': _ratio(row['fuel'], row['tonnes']),
+            'fuel_per_trip': _ratio(row['fuel'], row['trips']),
+            'cost_per_km': _ratio(row['measured_expenses'], row['distance']),
+        })
+    results.sort(key=lambda result: (result['fuel_per_tonne_km'] is None, -(result['fuel_per_tonne_km'] or 0)))
+    return results
+
+
+def rolling_efficiency(group_by='vehicle', months=3, today=None):
+    """efficiency() over the trailing `months` months, including the current one."""
+    end = month_start(today or date.today())
+    return efficiency(group_by, add_months(end, 1 - months), end)
+
+
+def vehicle_trend(vehicle_id, months=12, window=3, today=None):
+    """
+    Month by month fuel per km for one vehicle over the last `months` months,
+    with the rolling `window`-month figure (total fuel / total km of the window).
+    """
+    end = month_start(today or date.today())
+    start = add_months(end, 1 - months - (window - 1))
+    by_month = {
+        stat.month: stat for stat in MonthlyVehicleStat.objects.filter(vehicle_id=vehicle_id, month__range=(start, end))
+    }
+    trend = []
+    for offset in range(months - 1, -1, -1):
+        month = add_months(end, -offset)
+        stat = by_month.get(month)
+        window_stats = [
+            by_month[add_months(month, -back)] for back in range(window) if add_months(month, -back) in by_month
+        ]
+        window_fuel = sum((s.measured_fuel_cost for s in window_stats), ZERO)
+        window_km = sum(s.distance_km for s in window_stats)
+        trend.append({
+            'month': month,
+            'trips': stat.trip_count if stat else 0,
+            'distance_km': stat.distance_km if stat else 0,
+            'fuel_cost': stat.fuel_cost if stat else ZERO,
+            'fuel_per_km': round_money(stat.measured_fuel_cost / stat.distance_km) if stat and stat.distance_km else None,
+            'rolling_fuel_per_km': round_money(window_fuel / window_km) if window_km else None,
+        })
+    return trend
+
+
+# ----------------------------------------------------------------------
+# Incremental refresh on trip / expense / route writes
+# ----------------------------------------------------------------------
+_pending = threading.local()
+
+
+def _flush_pending():
+    pairs = getattr(_pending, 'pairs', set())
+    _pending.pairs = set()
+    refresh_vehicle_months(pairs)
+
+
+def mark_vehicle_months(pairs):
+    """Queues (vehicle_id, month) pairs for one refresh after the current transaction commits."""
+    if not hasattr(_pending, 'pairs'):
+        _pending.pairs = set()
+    _pending.pairs.update((vehicle_id, month_start(day)) for vehicle_id, day in pairs if vehicle_id and day)
+    transaction.on_commit(_flush_pending)
+
+
+def _remember_trip_month(sender, instance, raw=False, **kwargs):
+    instance._stat_month_before = None
+    if raw or not instance.pk:
+        return
+    if instance.is_tracked():
+        if instance.has_changed('vehicle', 'date'):
+            instance._stat_month_before = (instance.loaded_value('vehicle'), instance.loaded_value('date'))
+    else:
+        instance._stat_month_before = Trip.objects.filter(pk=instance.pk).values_list('vehicle_id', 'date').first()
+
+
+def _on_trip_write(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not TRIP_STAT_FIELDS & set(update_fields)):
+        return
+    pairs = [(instance.vehicle_id, instance.date)]
+    if getattr(instance, '_stat_month_before', None):
+        pairs.append(instance._stat_month_before)
+    mark_vehicle_months(pairs)
+
+
+def _remember_expense_trip(sender, instance, raw=False, **kwargs):
+    instance._stat_trip_before = None
+    if not raw and instance.pk and instance.is_tracked() and instance.has_changed('trip'):
+        instance._stat_trip_before = instance.loaded_value('trip')
+
+
+def _on_expense_write(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not EXPENSE_STAT_FIELDS & set(update_fields)):
+        return
+    trip_ids = {instance.trip_id, getattr(instance, '_stat_trip_before', None)} - {None}
+    mark_vehicle_months(Trip.objects.filter(pk__in=trip_ids).values_list('vehicle_id', 'date'))
+
+
+def _on_route_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    touched = fill_trip_distances(instance)
+    if touched:
+        mark_vehicle_months(touched)
+        transaction.on_commit(lambda: bump_version('management.Trip'))
+
+
+pre_save.connect(_remember_trip_month, sender='management.Trip', dispatch_uid='fleet_pre_save_trip')
+post_save.connect(_on_trip_write, sender='management.Trip', dispatch_uid='fleet_save_trip')
+post_delete.connect(_on_trip_write, sender='management.Trip', dispatch_uid='fleet_delete_trip')
+pre_save.connect(_remember_expense_trip, sender='management.TripExpense', dispatch_uid='fleet_pre_save_expense')
+post_save.connect(_on_expense_write, sender='management.TripExpense', dispatch_uid='fleet_save_expense')
+post_delete.connect(_on_expense_write, sender='management.TripExpense', dispatch_uid='fleet_delete_expense')
+post_save.connect(_on_route_save, sender='management.RouteDistance', dispatch_uid='fleet_save_route')
@@ -13,6 +13,58 @@ from .models import (
     AccountTransaction,
     MaintenanceExpense
 )
+from .branches import in_scope
+from .cache import masterdata
+from .availability import booking_conflicts
+from .lanes import suggest_rate, suggestion_text
+
+# ----------------------------------------------------------------------
+# 0. Cached Choice Fields (master data served from management.cache)
+# ----------------------------------------------------------------------
+class CachedModelChoiceIterator(forms.models.ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.cached_objects():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.cached_objects()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.cached_objects())
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField that renders and validates against the master-data cache,
+    so building a form does not query the master tables.
+    `cache_filter` takes the same exact-match lookups as masterdata.filter().
+    Only rows of the current branch (and shared ones) are offered.
+    """
+    iterator = CachedModelChoiceIterator
+
+    def __init__(self, queryset, *, cache_filter=None, **kwargs):
+        super().__init__(queryset, **kwargs)
+        self.cache_filter = cache_filter or {}
+
+    def cached_objects(self):
+        return in_scope(masterdata.filter(self.queryset.model, **self.cache_filter))
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            value = value.pk
+        obj = masterdata.get(self.queryset.model, value)
+        if obj is None or obj not in self.cached_objects():
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
+
 
 # ----------------------------------------------------------------------
 # 1. Trip Creation Form
@@ -21,27 +73,29 @@ class TripForm(forms.ModelForm):
     # Explicitly define date field to use the HTML5 date picker
     date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
     
-    client = forms.ModelChoiceField(
+    client = CachedModelChoiceField(
         queryset=PartyMaster.objects.filter(party_type='CLIENT'),
+        cache_filter={'party_type': 'CLIENT'},
         required=True,
         empty_label="Select Client (Consignor)",
         label="Client (Consignor)",
         widget=forms.Select(attrs={'class': 'form-control'}),
     )
-    vehicle = forms.ModelChoiceField(
+    vehicle = CachedModelChoiceField(
         queryset=Vehicle.objects.all(), 
         required=True, 
         empty_label="Select Vehicle",
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    driver = forms.ModelChoiceField(
+    driver = CachedModelChoiceField(
         queryset=Driver.objects.all(), 
         required=True, 
         empty_label="Select Driver",
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    transporter = forms.ModelChoiceField(
+    transporter = CachedModelChoiceField(
         queryset=PartyMaster.objects.filter(party_type='TRANSPORTER'), 
+        cache_filter={'party_type': 'TRANSPORTER'},
         required=True, 
         empty_label="Select Transporter",
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -55,14 +109,39 @@ class TripForm(forms.ModelForm):
         ]
         
         widgets = {
-            'origin': forms.TextInput(attrs={'class': 'form-control'}),
-            'destination': forms.TextInput(attrs={'class': 'form-control'}),
+            'origin': forms.TextInput(attrs={'class': 'form-control', 'list': 'location-options', 'autocomplete': 'off'}),
+            'destination': forms.TextInput(attrs={'class': 'form-control', 'list': 'location-options', 'autocomplete': 'off'}),
             'rate': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'weight': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'advance': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'status': forms.Select(attrs={'class': 'form-control'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Suggest a rate from the lane statistics (one indexed lookup, no trip scan)
+        self.lane_suggestion = suggest_rate(
+            self['origin'].value(), self['destination'].value(),
+            client_id=self['client'].value(), transporter_id=self['transporter'].value(),
+        )
+        if self.lane_suggestion:
+            self.fields['rate'].help_text = suggestion_text(self.lane_suggestion)
+            self.fields['rate'].widget.attrs['placeholder'] = self.lane_suggestion['rate']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # A vehicle or driver can only be on one pending/in-transit trip at a time
+        vehicle, driver = cleaned_data.get('vehicle'), cleaned_data.get('driver')
+        conflicts = booking_conflicts(
+            cleaned_data.get('status'),
+            exclude_pk=self.instance.pk,
+            vehicle=vehicle.pk if vehicle else None,
+            driver=driver.pk if driver else None,
+        )
+        for field, message in conflicts.items():
+            self.add_error(field, message)
+        return cleaned_data
+
 # ----------------------------------------------------------------------
 # 2. Trip Expense Form
 # ----------------------------------------------------------------------
@@ -78,6 +157,10 @@ class TripExpenseForm(forms.ModelForm):
             'paid_via_account', 
             'description'
         ]
+        field_classes = {
+            'expense_category': CachedModelChoiceField,
+            'paid_via_account': CachedModelChoiceField,
+        }
         
         widgets = {
             'expense_category': forms.Select(attrs={'class': 'form-control'}),
@@ -109,8 +192,9 @@ class ExpenseCategoryForm(forms.ModelForm):
 class MaintenanceExpenseForm(forms.ModelForm):
     date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
     
-    workshop = forms.ModelChoiceField(
+    workshop = CachedModelChoiceField(
         queryset=PartyMaster.objects.filter(party_type__in=['WORKSHOP', 'OTHER']),
+        cache_filter={'party_type__in': ['WORKSHOP', 'OTHER']},
         label="Workshop/Vendor",
         empty_label="Select Workshop/Vendor",
         widget=forms.Select(attrs={'class': 'form-control'}),
@@ -123,6 +207,11 @@ class MaintenanceExpenseForm(forms.ModelForm):
             'date', 'vehicle', 'workshop', 'expense_category', 'description', 
             'shop', 'amount', 'is_paid', 'payment_date', 'paid_via_account'
         ]
+        field_classes = {
+            'vehicle': CachedModelChoiceField,
+            'expense_category': CachedModelChoiceField,
+            'paid_via_account': CachedModelChoiceField,
+        }
         widgets = {
             'vehicle': forms.Select(attrs={'class': 'form-control'}),
             'expense_category': forms.Select(attrs={'class': 'form-control'}),
@@ -152,12 +241,12 @@ class AccountMasterForm(forms.ModelForm):
 # 6. Account Transfer Form
 # ----------------------------------------------------------------------
 class AccountTransferForm(forms.ModelForm):
-    from_account = forms.ModelChoiceField(
+    from_account = CachedModelChoiceField(
         queryset=AccountMaster.objects.all(),
         label="From Account (Source)",
         widget=forms.Select(attrs={'class': 'form-control'})
     )
-    to_account = forms.ModelChoiceField(
+    to_account = CachedModelChoiceField(
         queryset=AccountMaster.objects.all(),
         label="To Account (Destination)",
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -204,7 +293,7 @@ class AdvanceReceiptForm(forms.Form):
         widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
         required=True
     )
-    account = forms.ModelChoiceField(
+    account = CachedModelChoiceField(
         queryset=AccountMaster.objects.all(),
         label="Deposit Into Account",
         required=True,
@@ -315,8 +404,9 @@ class TripSettlementForm(forms.Form):
         initial=date.today
     )
     
-    account = forms.ModelChoiceField(
+    account = CachedModelChoiceField(
         queryset=AccountMaster.objects.filter(is_active=True),
+        cache_filter={'is_active': True},
         label="Deposit into Account",
         widget=forms.Select(attrs={'class': 'form-control'})
     )
@@ -324,4 +414,100 @@ class TripSettlementForm(forms.Form):
     remarks = forms.CharField(
         required=False,
         widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 2, 'placeholder': 'Any settlement notes...'})
-    )
\ No newline at end of file
+    )
+
+# ----------------------------------------------------------------------
+# 12. Bank Statement Upload Form
+# ----------------------------------------------------------------------
+class BankStatementUploadForm(forms.Form):
+    account = CachedModelChoiceField(
+        queryset=AccountMaster.objects.filter(account_type='BANK', is_active=True),
+        cache_filter={'account_type': 'BANK', 'is_active': True},
+        label="Bank Account",
+        empty_label="Select Account",
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    statement_file = forms.FileField(
+        label="Statement File (CSV or OFX)",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.ofx,.qfx'})
+    )
+    reconcile = forms.BooleanField(
+        label="Suggest matches straight away", required=False, initial=True,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+
+# ----------------------------------------------------------------------
+# 13. Wallet Statement Upload Form (Fastag / diesel-card)
+# ----------------------------------------------------------------------
+class WalletStatementUploadForm(forms.Form):
+    account = CachedModelChoiceField(
+        queryset=AccountMaster.objects.filter(account_type__in=['FASTAG', 'DIESELCARD'], is_active=True),
+        cache_filter={'account_type__in': ['FASTAG', 'DIESELCARD'], 'is_active': True},
+        label="Fastag / Diesel Card Account",
+        empty_label="Select Account",
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    statement_file = forms.FileField(
+        label="Statement File (CSV)",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'})
+    )
+
+
+# ----------------------------------------------------------------------
+# 14. Wallet Review Assign Form (book review-queue lines to a trip)
+# ----------------------------------------------------------------------
+class WalletAssignForm(forms.Form):
+    trip = forms.CharField(
+        label="Trip ID", max_length=15,
+        widget=forms.TextInput(attrs={'class': 'form-control form-control-sm', 'placeholder': 'Trip ID'})
+    )
+
+    def clean_trip(self):
+        trip_id = self.cleaned_data['trip'].strip()
+        trip = Trip.scoped.filter(trip_id__iexact=trip_id).first()
+        if trip is None:
+            raise ValidationError(f"No trip {trip_id}.")
+        return trip
+
+
+# ----------------------------------------------------------------------
+# 15. Period Close Form (freeze the books through a date)
+# ----------------------------------------------------------------------
+class PeriodCloseForm(forms.Form):
+    period_end = forms.DateField(
+        label="Close Books Through",
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    name = forms.CharField(
+        label="Name", max_length=50, required=False,
+        help_text="Defaults to the month or fiscal year, e.g. 'Mar 2026' or 'FY 2025-26'.",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    archive = forms.BooleanField(
+        label="Move the period's ledger rows to the archive", required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+
+# ----------------------------------------------------------------------
+# 16. Invoice Batch Form (invoice every client's completed trips for a month)
+# ----------------------------------------------------------------------
+class InvoiceBatchForm(forms.Form):
+    month = forms.DateField(
+        label="Billing Month", input_formats=['%Y-%m'],
+        widget=forms.DateInput(attrs={'type': 'month', 'class': 'form-control'}, format='%Y-%m')
+    )
+    client = CachedModelChoiceField(
+        queryset=PartyMaster.objects.filter(party_type='CLIENT'),
+        cache_filter={'party_type': 'CLIENT'},
+        required=False,
+        empty_label="All Clients",
+        label="Client",
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    invoice_date = forms.DateField(
+        label="Invoice Date", required=False,
+        help_text="Defaults to the last day of the month.",
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
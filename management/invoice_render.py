@@ -0,0 +1,33 @@
+# management/invoice_render.py
+
+"""
+Invoice rendering worker (see management.invoicing.render_invoices).
+
+Runs in spawned pool processes, which unpickle these functions before
+Django is set up: this module must not import models at import time.
+"""
+
+import django
+from django.conf import settings
+from django.template.loader import render_to_string
+
+
+def document_path(name):
+    return settings.INVOICE_OUTPUT_DIR / name
+
+
+def setup_worker():
+    django.setup()
+
+
+def render_document(job, fmt):
+    """Renders one invoice and writes it under INVOICE_OUTPUT_DIR. Returns (invoice pk, file name)."""
+    pk, name, context = job
+    html = render_to_string('management/invoice_document.html', context)
+    path = document_path(name)
+    if fmt == 'pdf':
+        from weasyprint import HTML  # optional dependency, checked by invoicing.output_format()
+        HTML(string=html).write_pdf(path)
+    else:
+        path.write_text(html, encoding='utf-8')
+    return pk, name
@@ -0,0 +1,339 @@
+# management/invoicing.py
+
+"""
+Batch client invoicing.
+
+An invoice bills one client for its COMPLETED trips dated in a billing
+period (normally a month) that are not on an invoice yet. Each trip is a line:
+
+    amount = freight + halting - shortage deduction
+
+where halting is the trip's Halting Charges expenses (revenue, as on the trip
+page) and the shortage deduction is what the client held back at settlement.
+GST is charged on the lines' total at INVOICE_GST_RATE: CGST and SGST halves
+when the client's GSTIN (PartyMaster.gst_number) is in the seller's state,
+IGST when it is in another one. A client without a GSTIN is billed as local.
+
+create_invoices() builds a whole batch with two queries (trips, halting
+totals) and, in one transaction:
+  * reserves the batch's invoice numbers from InvoiceSequence with a single
+    UPDATE, so numbers run on without gaps or duplicates per fiscal year
+    (INV/2025-26/0001) even when two batches run at once;
+  * posts every invoice total as a receipt into the INVOICE_RECEIVABLE_ACCOUNT
+    (one bulk INSERT), then the invoices and their lines (one each).
+Money received from the client is still recorded as before; clear the
+receivable with a transfer from that account.
+
+render_invoices() then writes the documents (HTML, or PDF with WeasyPrint),
+PDFs in a pool of worker processes, after the transaction has committed, so a
+slow render never holds the database lock. Invoices whose document is missing
+are rendered again on request.
+"""
+
+import importlib.util
+import multiprocessing
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import repeat
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from .cache import bump_version, masterdata
+from .invoice_render import document_path, render_document, setup_worker
+from .kpis import refresh_tiles, tiles_for
+from .models import (
+    AccountingPeriod, AccountMaster, AccountTransaction, ExpenseCategory, Invoice, InvoiceLine, InvoiceSequence,
+    PartyMaster, Trip, TripExpense,
+)
+from .money import from_paise, paise_totals, round_money
+from .periods import fiscal_year_bounds, period_name
+from .search import index_objects
+
+ZERO = Decimal('0.00')
+GSTIN_PATTERN = re.compile(r'^(\d{2})[0-9A-Z]{13}$')
+CONTENT_TYPES = {'html': 'text/html; charset=utf-8', 'pdf': 'application/pdf'}
+
+
+# ----------------------------------------------------------------------
+# Numbers and tax
+# ----------------------------------------------------------------------
+def gst_state(gst_number):
+    """The two-digit state code of a GSTIN ('27AAACB1234C1Z5' -> '27'), or None."""
+    match = GSTIN_PATTERN.match((gst_number or '').strip().upper())
+    return match.group(1) if match else None
+
+
+def gst_split(taxable, client_gst_number):
+    """(rate, cgst, sgst, igst) on a taxable amount for a client with this GSTIN."""
+    rate = Decimal(getattr(settings, 'INVOICE_GST_RATE', ZERO))
+    tax = round_money(taxable * rate / 100)
+    seller, buyer = gst_state(getattr(settings, 'INVOICE_COMPANY_GST_NUMBER', '')), gst_state(client_gst_number)
+    if seller and buyer and seller != buyer:
+        return rate, ZERO, ZERO, tax
+    cgst = round_money(tax / 2)
+    return rate, cgst, tax - cgst, ZERO
+
+
+def fiscal_year_label(day):
+    """'2025-26' for any day of the fiscal year starting in April 2025."""
+    start, end = fiscal_year_bounds(day)
+    return f"{start.year}-{str(end.year)[-2:]}"
+
+
+def allocate_numbers(day, count):
+    """
+    Reserves `count` consecutive invoice numbers in `day`'s fiscal year. Must
+    run inside the transaction that saves the invoices: the UPDATE holds the
+    sequence row until it commits, and a rollback gives the numbers back.
+    """
+    year = fiscal_year_label(day)
+    InvoiceSequence.objects.get_or_create(fiscal_year=year)
+    InvoiceSequence.objects.filter(fiscal_year=year).update(last_number=F('last_number') + count)
+    last = InvoiceSequence.objects.get(fiscal_year=year).last_number
+    return [f"INV/{year}/{number:04d}" for number in range(last - count + 1, last + 1)]
+
+
+def receivable_account():
+    name = getattr(settings, 'INVOICE_RECEIVABLE_ACCOUNT', 'Sundry Debtors')
+    account = masterdata.get_by(AccountMaster, 'account_name', name)
+    if account is None:
+        account, _ = AccountMaster.objects.get_or_create(account_name=name, defaults={'account_type': 'RECEIVABLE'})
+    return account
+
+
+# ----------------------------------------------------------------------
+# Building a batch
+# ----------------------------------------------------------------------
+def billable_trips(period_start, period_end, clients=None):
+    """Completed trips dated in the period that are not on an invoice yet."""
+    trips = Trip.objects.filter(
+        status='COMPLETED', date__range=(period_start, period_end), invoice_line__isnull=True
+    )
+    return trips.filter(client__in=clients) if clients else trips
+
+
+def build_invoices(period_start, period_end, invoice_date, clients=None):
+    """
+    Unsaved (Invoice, [InvoiceLine]) pairs, one per client with billable trips,
+    in client name order. Clients whose lines do not add up to anything are left out.
+    """
+    trips = billable_trips(period_start, period_end, clients)
+    halting_category = masterdata.get_by(ExpenseCategory, 'name', 'Halting Charges')
+    halting = paise_totals(
+        TripExpense.objects.filter(trip__in=trips, expense_category=halting_category), 'trip', 'amount'
+    ) if halting_category else {}
+
+    lines_by_client = defaultdict(list)
+    for trip in trips.order_by('date', 'pk').values(
+        'pk', 'trip_id', 'date', 'client_id', 'vehicle_id', 'origin', 'destination', 'weight', 'rate',
+        'total_freight', 'shortage_deduction',
+    ):
+        trip_halting = from_paise(halting.get(trip['pk']) or 0)
+        lines_by_client[trip['client_id']].append(InvoiceLine(
+            trip_id=trip['pk'],
+            trip_code=trip['trip_id'],
+            date=trip['date'],
+            vehicle_no=trip['vehicle_id'],
+            origin=trip['origin'],
+            destination=trip['destination'],
+            weight=trip['weight'],
+            rate=trip['rate'],
+            freight=trip['total_freight'],
+            halting=trip_halting,
+            shortage=trip['shortage_deduction'],
+            amount=trip['total_freight'] + trip_halting - trip['shortage_deduction'],
+        ))
+
+    batch = []
+    for client in sorted(PartyMaster.objects.filter(pk__in=list(lines_by_client)), key=lambda party: party.name):
+        lines = lines_by_client[client.pk]
+        taxable = sum((line.amount for line in lines), ZERO)
+        if taxable <= 0:
+            continue
+        rate, cgst, sgst, igst = gst_split(taxable, client.gst_number)
+        batch.append((Invoice(
+            client=client,
+            invoice_date=invoice_date,
+            period_start=period_start,
+            period_end=period_end,
+            client_gst_number=(client.gst_number or '').strip().upper(),
+            freight=sum((line.freight for line in lines), ZERO),
+            halting=sum((line.halting for line in lines), ZERO),
+            shortage=sum((line.shortage for line in lines), ZERO),
+            taxable_amount=taxable,
+            gst_rate=rate,
+            cgst=cgst,
+            sgst=sgst,
+            igst=igst,
+            total=taxable + cgst + sgst + igst,
+        ), lines))
+    return batch
+
+
+@transaction.atomic
+def create_invoices(period_start, period_end, invoice_date=None, clients=None):
+    """
+    Invoices every client's billable trips in the period, numbers the invoices
+    and posts their totals to the receivables account. Returns the invoices.
+    """
+    invoice_date = invoice_date or period_end
+    if invoice_date < period_end:
+        raise ValidationError("The invoice date cannot be before the end of the billing period.")
+    AccountingPeriod.check_open(invoice_date)
+
+    batch = build_invoices(period_start, period_end, invoice_date, clients)
+    if not batch:
+        return []
+    numbers = allocate_numbers(invoice_date, len(batch))
+    account = receivable_account()
+    billed = period_name(period_start, period_end)
+
+    # The totals come into the receivables account: a receipt row (from and to the same account)
+    postings = AccountTransaction.objects.bulk_create([
+        AccountTransaction(
+            date=invoice_date,
+            description=f"Invoice {number}: {invoice.client.name} ({billed})"[:255],
+            from_account=account,
+            to_account=account,
+            deposit=invoice.total,
+            branch_id=account.branch_id,
+        )
+        for number, (invoice, _) in zip(numbers, batch)
+    ], batch_size=500)
+
+    invoices = [invoice for invoice, _ in batch]
+    for invoice, number, posting in zip(invoices, numbers, postings):
+        invoice.number, invoice.receivable_entry = number, posting
+    Invoice.objects.bulk_create(invoices, batch_size=500)
+    for invoice, lines in batch:
+        for line in lines:
+            line.invoice = invoice
+    InvoiceLine.objects.bulk_create([line for _, lines in batch for line in lines], batch_size=500)
+
+    # bulk_create skips the post_save receivers, so refresh what they would have.
+    for chunk_at in range(0, len(postings), 500):
+        index_objects(postings[chunk_at:chunk_at + 500])
+
+    def after_commit():
+        bump_version('management.AccountTransaction')
+        refresh_tiles(tiles_for('management.AccountTransaction'))
+    transaction.on_commit(after_commit)
+    return invoices
+
+
+@transaction.atomic
+def cancel_invoices(invoices):
+    """
+    Deletes the invoices with their receivable postings; their trips become
+    billable again. Invoice numbers are not reused. Returns the number cancelled.
+    """
+    invoices = list(invoices)
+    for invoice in invoices:
+        AccountingPeriod.check_open(invoice.invoice_date)
+    AccountTransaction.objects.filter(invoice__in=invoices).delete()
+    documents = [invoice.document for invoice in invoices if invoice.document]
+    Invoice.objects.filter(pk__in=[invoice.pk for invoice in invoices]).delete()
+    transaction.on_commit(lambda: [document_path(name).unlink(missing_ok=True) for name in documents])
+    return len(invoices)
+
+
+# ----------------------------------------------------------------------
+# Rendering
+# ----------------------------------------------------------------------
+def output_format():
+    fmt = getattr(settings, 'INVOICE_FORMAT', 'html')
+    if fmt not in CONTENT_TYPES:
+        raise ImproperlyConfigured(f"INVOICE_FORMAT must be one of {', '.join(CONTENT_TYPES)}, not {fmt!r}.")
+    if fmt == 'pdf' and importlib.util.find_spec('weasyprint') is None:
+        raise ImproperlyConfigured("INVOICE_FORMAT = 'pdf' needs WeasyPrint (pip install weasyprint).")
+    return fmt
+
+
+def invoice_context(invoice, lines):
+    """Everything the invoice template shows, as plain values (it is sent to a worker process)."""
+    client = invoice.client
+    return {
+        'company': {
+            'name': getattr(settings, 'INVOICE_COMPANY_NAME', ''),
+            'address': getattr(settings, 'INVOICE_COMPANY_ADDRESS', ''),
+            'gst_number': getattr(settings, 'INVOICE_COMPANY_GST_NUMBER', ''),
+        },
+        'client': {'name': client.name, 'address': client.address or '', 'gst_number': invoice.client_gst_number},
+        'invoice': {
+            field: getattr(invoice, field) for field in (
+                'number', 'invoice_date', 'period_start', 'period_end', 'freight', 'halting', 'shortage',
+                'taxable_amount', 'gst_rate', 'cgst', 'sgst', 'igst', 'total',
+            )
+        },
+        'lines': [
+            {
+                field: getattr(line, field) for field in (
+                    'trip_code', 'date', 'vehicle_no', 'origin', 'destination', 'weight', 'rate', 'freight',
+                    'halting', 'shortage', 'amount',
+                )
+            }
+            for line in lines
+        ],
+    }
+
+
+def render_invoices(invoices, workers=None):
+    """
+    Writes the invoices' documents, in parallel over `workers` processes
+    (INVOICE_RENDER_WORKERS; one per CPU for PDF, in-process for HTML), and
+    records their file names. Returns the number rendered.
+    """
+    invoices = list(invoices)
+    if not invoices:
+        return 0
+    fmt = output_format()
+    settings.INVOICE_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    lines = defaultdict(list)
+    for chunk_at in range(0, len(invoices), 500):
+        chunk = [invoice.pk for invoice in invoices[chunk_at:chunk_at + 500]]
+        for line in InvoiceLine.objects.filter(invoice__in=chunk).order_by('date', 'pk'):
+            lines[line.invoice_id].append(line)
+    jobs = [
+        (invoice.pk, f"{invoice.number.replace('/', '-')}.{fmt}", invoice_context(invoice, lines[invoice.pk]))
+        for invoice in invoices
+    ]
+
+    # HTML takes milliseconds an invoice, less than starting a worker; PDF layout is what needs the pool.
+    workers = workers or getattr(settings, 'INVOICE_RENDER_WORKERS', None) or (
+        multiprocessing.cpu_count() if fmt == 'pdf' else 1
+    )
+    workers = min(workers, len(jobs))
+    if workers == 1:
+        results = [render_document(job, fmt) for job in jobs]
+    else:
+        # Spawned, not forked: a worker never shares the parent's database connection.
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=setup_worker,
+        ) as pool:
+            results = list(pool.map(render_document, jobs, repeat(fmt), chunksize=max(1, len(jobs) // (workers * 4))))
+
+    names = dict(results)
+    for invoice in invoices:
+        invoice.document = names[invoice.pk]
+    Invoice.objects.bulk_update(invoices, ['document'], batch_size=500)
+    return len(invoices)
+
+
+def generate_invoices(period_start, period_end, invoice_date=None, clients=None, workers=None):
+    """create_invoices() and then render_invoices() for the new invoices. Returns the invoices."""
+    invoices = create_invoices(period_start, period_end, invoice_date, clients)
+    render_invoices(invoices, workers)
+    return invoices
+
+
+def ensure_document(invoice):
+    """Path of the invoice's document, rendering it first if it is missing."""
+    if not invoice.document or not document_path(invoice.document).exists():
+        render_invoices([invoice], workers=1)
+    return document_path(invoice.document)
@@ -0,0 +1,81 @@
+# management/jobs.py
+
+"""
+The built-in scheduled jobs, run by `manage.py run_scheduler` (management.scheduler).
+
+Each does what an existing command or receiver does, so nothing here is only
+reachable through the scheduler. Default schedules are below; change or disable
+them with settings.SCHEDULED_JOBS, e.g. {'sqlite_backup': '0 1 * * *', 'lane_rates': None}.
+"""
+
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .fleet import add_months, fill_trip_distances, month_start, rebuild_stats
+from .kpis import refresh_tiles
+from .lanes import rebuild_lanes
+from .routers import refresh_snapshot
+from .scheduler import job, prune_history
+
+
+@job('reporting_snapshot', '*/5 * * * *', lock_timeout=600)
+def reporting_snapshot():
+    """Refreshes the reporting snapshot read by the ledger and report pages."""
+    if not getattr(settings, 'REPORTING_SNAPSHOT_PATH', None):
+        return "Skipped: the reporting replica is managed externally."
+    return f"Snapshot written to {refresh_snapshot()}"
+
+
+@job('kpi_tiles', '*/15 * * * *', lock_timeout=600)
+def kpi_tiles():
+    """Recomputes every dashboard tile, account balances included."""
+    return f"Refreshed {len(refresh_tiles())} tiles."
+
+
+@job('document_expiry', '0 6 * * *', lock_timeout=600)
+def document_expiry():
+    """Checks vehicle documents and driver licences for (near) expiry and refreshes their tile."""
+    tile = refresh_tiles(['expiring_documents'])['expiring_documents']
+    window = getattr(settings, 'KPI_EXPIRY_WINDOW_DAYS', 30)
+    lines = [f"{tile.count} documents expire within {window} days, {tile.payload['expired']} already expired."]
+    lines += [f"{item['expiry']}  {item['subject']}: {item['document']}" for item in tile.payload['items']]
+    return '\n'.join(lines)
+
+
+@job('vehicle_stats', '30 1 * * *')
+def vehicle_stats():
+    """Fills missing trip distances and rebuilds last and this month's vehicle stats."""
+    touched = fill_trip_distances()
+    rows = rebuild_stats(start=add_months(month_start(timezone.localdate()), -1))
+    return f"Filled distances in {len(touched)} vehicle-months, rebuilt {rows} stat rows."
+
+
+@job('lane_rates', '0 2 * * *')
+def lane_rates():
+    """Rebuilds the lane rate statistics from all trips."""
+    return f"Rebuilt {rebuild_lanes()} lanes."
+
+
+@job('sqlite_backup', '0 3 * * *')
+def sqlite_backup():
+    """Copies the database to SQLITE_BACKUP_DIR with the online backup API, keeping the newest SQLITE_BACKUP_KEEP."""
+    if connection.vendor != 'sqlite':
+        return f"Skipped: the database is {connection.vendor}; back it up with its own tools."
+    backup_dir = settings.SQLITE_BACKUP_DIR
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    path = refresh_snapshot(path=backup_dir / f"db-{datetime.now():%Y%m%d-%H%M%S}.sqlite3")
+    # The timestamped names sort oldest first
+    backups = sorted(backup_dir.glob('db-*.sqlite3'))
+    expired = backups[:-settings.SQLITE_BACKUP_KEEP] if settings.SQLITE_BACKUP_KEEP else []
+    for old in expired:
+        old.unlink()
+    return f"Backed up to {path}, removed {len(expired)} old backups."
+
+
+@job('prune_job_history', '0 4 * * 0', lock_timeout=600)
+def prune_job_history():
+    """Deletes job runs older than SCHEDULER_HISTORY_DAYS."""
+    return f"Deleted {prune_history()} job runs."
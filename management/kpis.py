@@ -0,0 +1,369 @@
+# management/kpis.py
+
+"""
+Precomputed KPI tiles for the home dashboard.
+
+Each tile is one KpiTile row, computed by a small function below. The page reads
+all tiles with a single query. Tiles are kept current three ways:
+  * `manage.py refresh_kpis` recomputes every tile (nightly, or after imports).
+  * Saving or deleting a trip, ledger row or maintenance bill adds the
+    difference it makes to the stored tiles (see "Incremental updates" below).
+  * Saving or deleting a master row (account, vehicle, driver) recomputes the
+    tiles that depend on that model, once per transaction, after it commits.
+Tiles that depend on today's date also carry an `expires_at`, and load_tiles()
+recomputes them once that moment has passed.
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from .models import (
+    ACTIVE_TRIP_STATUSES, AccountMaster, ArchivedTrip, AccountTransaction, Driver, KpiTile, MaintenanceExpense,
+    Trip, TRIP_STATUS_CHOICES, Vehicle,
+)
+from .money import from_paise
+
+VEHICLE_EXPIRY_FIELDS = ('fitness_expiry', 'permit_expiry', 'insurance_expiry', 'puc_expiry', 'tax_expiry')
+
+
+def _next_midnight():
+    tomorrow = timezone.localdate() + timedelta(days=1)
+    return timezone.make_aware(datetime.combine(tomorrow, time.min))
+
+
+# ----------------------------------------------------------------------
+# Tile computations: each returns (value, count, payload, expires_at)
+# ----------------------------------------------------------------------
+def trips_by_status():
+    counts = dict(Trip.objects.values_list('status').annotate(n=Count('pk')).order_by())
+    # Archived trips (management.archive) are all completed ones
+    archived = ArchivedTrip.objects.count()
+    if archived:
+        counts['COMPLETED'] = counts.get('COMPLETED', 0) + archived
+    payload = {label: counts.get(status, 0) for status, label in TRIP_STATUS_CHOICES}
+    return Decimal('0.00'), sum(counts.values()), payload, None
+
+
+def freight_this_month():
+    today = timezone.localdate()
+    month_start = today.replace(day=1)
+    totals = Trip.objects.filter(date__gte=month_start).exclude(status='CANCELLED').aggregate(
+        freight=Sum('total_freight'), trips=Count('pk')
+    )
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    expires_at = timezone.make_aware(datetime.combine(next_month, time.min))
+    return totals['freight'] or Decimal('0.00'), totals['trips'], {'month': month_start.strftime('%b %Y')}, expires_at
+
+
+def advances_outstanding():
+    """Agreed advance on open trips minus the advance receipts already booked against them."""
+    open_trips = Trip.objects.filter(status__in=ACTIVE_TRIP_STATUSES)
+    agreed = open_trips.aggregate(total=Sum('advance'), trips=Count('pk'))
+    received = AccountTransaction.objects.filter(
+        related_trip__status__in=ACTIVE_TRIP_STATUSES, deposit__gt=0
+    ).aggregate(total=Sum('deposit'))['total'] or Decimal('0.00')
+    agreed_total = agreed['total'] or Decimal('0.00')
+    payload = {'agreed': agreed_total, 'received': received}
+    return max(agreed_total - received, Decimal('0.00')), agreed['trips'], payload, None
+
+
+def unpaid_maintenance():
+    totals = MaintenanceExpense.objects.filter(is_paid=False).aggregate(total=Sum('amount'), bills=Count('pk'))
+    return totals['total'] or Decimal('0.00'), totals['bills'], {}, None
+
+
+def account_balances():
+    """Current balance per active account: the last closing snapshot plus the open-period ledger rows."""
+    from .periods import current_balances  # periods imports payroll, which imports this module
+
+    # Summed as integer paise, converted to rupees once per account
+    current = current_balances()
+    balances, total = [], 0
+    accounts = AccountMaster.objects.filter(is_active=True).order_by('account_name')
+    for pk, name, account_type in accounts.values_list('pk', 'account_name', 'account_type'):
+        balance = current[pk]
+        total += balance
+        balances.append({'id': pk, 'account': name, 'type': account_type, 'balance': from_paise(balance)})
+    return from_paise(total), len(balances), {'accounts': balances}, None
+
+
+def expiring_documents():
+    """Vehicle documents and driver licences expired or expiring within KPI_EXPIRY_WINDOW_DAYS."""
+    today = timezone.localdate()
+    limit = today + timedelta(days=getattr(settings, 'KPI_EXPIRY_WINDOW_DAYS', 30))
+    items = []
+    for field in VEHICLE_EXPIRY_FIELDS:
+        label = Vehicle._meta.get_field(field).verbose_name
+        for vehicle_no, expiry in Vehicle.objects.filter(**{f'{field}__lte': limit}).values_list('vehicle_no', field):
+            items.append({'subject': vehicle_no, 'document': label, 'expiry': expiry})
+    for name, expiry in Driver.objects.filter(is_active=True, license_expiry__lte=limit).values_list('name', 'license_expiry'):
+        items.append({'subject': name, 'document': 'Driving Licence', 'expiry': expiry})
+
+    items.sort(key=lambda item: item['expiry'])
+    expired = sum(1 for item in items if item['expiry'] < today)
+    return Decimal('0.00'), len(items), {'expired': expired, 'items': items[:20]}, _next_midnight()
+
+
+# Tile key -> (computation, models whose writes change it)
+TILES = {
+    'trips_by_status': (trips_by_status, ('management.Trip',)),
+    'freight_this_month': (freight_this_month, ('management.Trip',)),
+    'advances_outstanding': (advances_outstanding, ('management.Trip', 'management.AccountTransaction')),
+    'unpaid_maintenance': (unpaid_maintenance, ('management.MaintenanceExpense',)),
+    'account_balances': (account_balances, ('management.AccountMaster', 'management.AccountTransaction')),
+    'expiring_documents': (expiring_documents, ('management.Vehicle', 'management.Driver')),
+}
+
+
+def tiles_for(*labels):
+    """Keys of the tiles computed from any of these model labels."""
+    return [key for key, (_, sources) in TILES.items() if set(labels) & set(sources)]
+
+
+def refresh_tiles(keys=None):
+    """Recomputes the given tiles (all of them by default) and returns them by key."""
+    tiles = {}
+    for key in keys or TILES:
+        value, count, payload, expires_at = TILES[key][0]()
+        tiles[key], _ = KpiTile.objects.update_or_create(
+            key=key,
+            defaults={'value': value, 'count': count, 'payload': payload, 'expires_at': expires_at},
+        )
+    return tiles
+
+
+def load_tiles():
+    """All tiles by key in one query; missing or expired tiles are recomputed first."""
+    tiles = {tile.key: tile for tile in KpiTile.objects.all()}
+    now = timezone.now()
+    stale = [
+        key for key in TILES
+        if key not in tiles or (tiles[key].expires_at and tiles[key].expires_at <= now)
+    ]
+    if stale:
+        tiles.update(refresh_tiles(stale))
+    return tiles
+
+
+def tiles_expire_at(tiles):
+    """The earliest expires_at among `tiles` (when a page showing them goes stale), or None."""
+    return min((tile.expires_at for tile in tiles.values() if tile.expires_at), default=None)
+
+
+# ----------------------------------------------------------------------
+# Incremental updates on writes
+# ----------------------------------------------------------------------
+# Each trip, ledger row and maintenance bill adds fixed amounts ("parts") to the
+# tiles: a trip adds 1 to its status count, its freight to this month's, its
+# advance to the outstanding advances while open. A write changes the tiles by
+# the row's parts after it minus its parts before it. That difference is applied
+# to the KpiTile rows in the writer's own transaction (a rollback undoes it too),
+# so no tile aggregate runs on a save. Writes to the master tables (accounts,
+# vehicles, drivers) are rare and recompute their tiles after commit instead.
+
+# Source model -> the fields its parts are computed from
+DELTA_FIELDS = {
+    'management.Trip': ('status', 'date', 'total_freight', 'advance'),
+    'management.AccountTransaction': ('from_account', 'to_account', 'withdrawal', 'deposit', 'related_trip'),
+    'management.MaintenanceExpense': ('is_paid', 'amount'),
+}
+
+STATUS_LABELS = dict(TRIP_STATUS_CHOICES)
+
+
+def _trip_parts(row):
+    parts = Counter()
+    parts['trips_by_status', 'count'] += 1
+    parts['trips_by_status', f"payload:{STATUS_LABELS[row['status']]}"] += 1
+    if row['status'] != 'CANCELLED' and row['date'] >= timezone.localdate().replace(day=1):
+        parts['freight_this_month', 'value'] += row['total_freight']
+        parts['freight_this_month', 'count'] += 1
+    if row['status'] in ACTIVE_TRIP_STATUSES:
+        # The receipts already booked against the trip are added by _trip_delta()
+        parts['advances_outstanding', 'count'] += 1
+        parts['advances_outstanding', 'payload:agreed'] += row['advance']
+    return parts
+
+
+def _ledger_parts(row, open_trips):
+    parts = Counter()
+    if row['to_account']:
+        parts['account_balances', f"account:{row['to_account']}"] += row['deposit']
+    # A row whose from and to accounts are equal is a receipt, not a withdrawal (as in periods.withdrawal_totals)
+    if row['to_account'] != row['from_account']:
+        parts['account_balances', f"account:{row['from_account']}"] -= row['withdrawal']
+    if row['deposit'] > 0 and row['related_trip'] in open_trips:
+        parts['advances_outstanding', 'payload:received'] += row['deposit']
+    return parts
+
+
+def _maintenance_parts(row):
+    parts = Counter()
+    if not row['is_paid']:
+        parts['unpaid_maintenance', 'value'] += row['amount']
+        parts['unpaid_maintenance', 'count'] += 1
+    return parts
+
+
+def _trip_delta(pk, before, after):
+    delta = _trip_parts(after) if after else Counter()
+    delta.subtract(_trip_parts(before) if before else Counter())
+    # Opening or closing a trip moves the receipts booked against it in or out of the tile
+    was_open = bool(before) and before['status'] in ACTIVE_TRIP_STATUSES
+    is_open = bool(after) and after['status'] in ACTIVE_TRIP_STATUSES
+    if was_open != is_open:
+        received = AccountTransaction.objects.filter(related_trip_id=pk, deposit__gt=0).aggregate(
+            total=Sum('deposit')
+        )['total'] or Decimal('0.00')
+        delta['advances_outstanding', 'payload:received'] += received if is_open else -received
+    return delta
+
+
+def _ledger_delta(pk, before, after):
+    trip_ids = {row['related_trip'] for row in (before, after) if row and row['related_trip'] and row['deposit'] > 0}
+    open_trips = set(
+        Trip.objects.filter(pk__in=trip_ids, status__in=ACTIVE_TRIP_STATUSES).values_list('pk', flat=True)
+    ) if trip_ids else set()
+    delta = _ledger_parts(after, open_trips) if after else Counter()
+    delta.subtract(_ledger_parts(before, open_trips) if before else Counter())
+    return delta
+
+
+def _maintenance_delta(pk, before, after):
+    delta = _maintenance_parts(after) if after else Counter()
+    delta.subtract(_maintenance_parts(before) if before else Counter())
+    return delta
+
+
+DELTAS = {
+    'management.Trip': _trip_delta,
+    'management.AccountTransaction': _ledger_delta,
+    'management.MaintenanceExpense': _maintenance_delta,
+}
+
+
+def _add(current, amount):
+    if isinstance(current, int) and isinstance(amount, int):
+        return current + amount
+    # Decimals in the payload come back from JSON as strings
+    return Decimal(str(current)) + amount
+
+
+def apply_delta(delta):
+    """Adds {(tile key, part): amount} to the stored tiles, in the current transaction."""
+    delta = {key_part: amount for key_part, amount in delta.items() if amount}
+    if not delta:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        stale = []
+        for tile in KpiTile.objects.select_for_update().filter(key__in={key for key, _ in delta}):
+            if tile.expires_at and tile.expires_at <= now:
+                continue  # load_tiles() recomputes it on the next read
+            if _apply_parts(tile, [(part, amount) for (key, part), amount in delta.items() if key == tile.key]):
+                tile.save(update_fields=['value', 'count', 'payload', 'updated_at'])
+            else:
+                stale.append(tile.key)
+        if stale:
+            refresh_tiles(stale)
+
+
+def _apply_parts(tile, parts):
+    """Adds the parts to one tile in memory; False when its payload predates a part (recompute it instead)."""
+    accounts = tile.payload.get('accounts', [])
+    if any(part.startswith('account:') for part, _ in parts) and not all('id' in row for row in accounts):
+        return False
+    accounts = {f"account:{row['id']}": row for row in accounts}
+    for part, amount in parts:
+        kind, _, name = part.partition(':')
+        if kind in ('value', 'count'):
+            setattr(tile, kind, _add(getattr(tile, kind), amount))
+        elif kind == 'payload':
+            if name not in tile.payload:
+                return False
+            tile.payload[name] = _add(tile.payload[name], amount)
+        elif part in accounts:
+            # Inactive accounts are not on the tile, and not in its total
+            accounts[part]['balance'] = _add(accounts[part]['balance'], amount)
+            tile.value = _add(tile.value, amount)
+    if tile.key == 'advances_outstanding':
+        outstanding = _add(tile.payload['agreed'], 0) - _add(tile.payload['received'], 0)
+        tile.value = max(outstanding, Decimal('0.00'))
+    return True
+
+
+def _stored_values(instance):
+    """The instance's DELTA_FIELDS as they are in the database (before this write)."""
+    names = DELTA_FIELDS[instance._meta.label]
+    if hasattr(instance, 'is_tracked') and instance.is_tracked():
+        return {name: instance.loaded_value(name) for name in names}
+    attnames = [instance._meta.get_field(name).attname for name in names]
+    row = type(instance)._default_manager.filter(pk=instance.pk).values(*attnames).first()
+    return {name: row[attname] for name, attname in zip(names, attnames)} if row else None
+
+
+def _current_values(instance):
+    names = DELTA_FIELDS[instance._meta.label]
+    return {name: getattr(instance, instance._meta.get_field(name).attname) for name in names}
+
+
+def _remember_source_row(sender, instance, raw=False, **kwargs):
+    instance._kpi_before = None if raw or instance._state.adding or instance.pk is None else _stored_values(instance)
+
+
+def _on_source_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_kpi_before', None)
+    apply_delta(DELTAS[sender._meta.label](instance.pk, before, _current_values(instance)))
+
+
+def _remember_deleted_row(sender, instance, **kwargs):
+    # Computed before the delete: a trip's receipts are unlinked (SET_NULL) before post_delete
+    before = _stored_values(instance)
+    instance._kpi_delta = DELTAS[sender._meta.label](instance.pk, before, None) if before else {}
+
+
+def _on_source_delete(sender, instance, **kwargs):
+    apply_delta(getattr(instance, '_kpi_delta', {}))
+
+
+_pending = threading.local()
+
+
+def _flush_pending():
+    keys = getattr(_pending, 'keys', set())
+    _pending.keys = set()
+    if keys:
+        refresh_tiles(sorted(keys))
+
+
+def _on_master_write(sender, **kwargs):
+    if kwargs.get('raw'):
+        return
+    keys = set(tiles_for(sender._meta.label))
+    if not hasattr(_pending, 'keys'):
+        _pending.keys = set()
+    _pending.keys.update(keys)
+    # The first callback after commit recomputes everything pending; the rest find
+    # nothing to do, so a transaction touching many rows refreshes each tile once.
+    transaction.on_commit(_flush_pending)
+
+
+for _label in DELTA_FIELDS:
+    pre_save.connect(_remember_source_row, sender=_label, dispatch_uid=f'kpi_pre_save_{_label}')
+    post_save.connect(_on_source_save, sender=_label, dispatch_uid=f'kpi_save_{_label}')
+    pre_delete.connect(_remember_deleted_row, sender=_label, dispatch_uid=f'kpi_pre_delete_{_label}')
+    post_delete.connect(_on_source_delete, sender=_label, dispatch_uid=f'kpi_delete_{_label}')
+
+for _label in sorted({label for _, sources in TILES.values() for label in sources} - set(DELTA_FIELDS)):
+    post_save.connect(_on_master_write, sender=_label, dispatch_uid=f'kpi_save_{_label}')
+    post_delete.connect(_on_master_write, sender=_label, dispatch_uid=f'kpi_delete_{_label}')
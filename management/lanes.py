@@ -0,0 +1,217 @@
+# management/lanes.py
+
+"""
+Lane rate statistics.
+
+A lane is an origin -> destination pair, matched case-insensitively with
+surrounding spaces ignored. Each lane has one LaneRate row with its trip
+count, rate and weight percentiles, and the latest rate per client and per
+transporter. TripForm reads only that row to suggest a rate.
+
+Rows are maintained incrementally: saving or deleting a trip recomputes just
+the lane(s) it was on, once per transaction, after it commits. Saves that
+touch none of LANE_FIELDS are ignored. Each recompute reads that lane's trips
+through the trip_lane_idx expression index. Archived trips
+(management.archive) stay in their lanes' history.
+`manage.py rebuild_lane_rates` rebuilds every lane in one pass; run it after
+bulk imports, since bulk_create and QuerySet.update skip the signals.
+"""
+
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.functions import Lower, Trim
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .locations import canonical_place
+from .models import ArchivedTrip, LaneRate, Trip
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+
+def lane_key(value):
+    """Normalises an origin or destination the same way as the trip_lane_idx index (TRIM, then LOWER)."""
+    return (value or '').strip(' ').lower()
+
+
+def lane_trips(origin, destination, model=Trip):
+    """Non-cancelled trips on a lane, looked up through the trip_lane_idx index (archived_trip_lane_idx for ArchivedTrip)."""
+    return model.objects.alias(
+        origin_key=Lower(Trim('origin')), destination_key=Lower(Trim('destination')),
+    ).filter(
+        origin_key=lane_key(origin), destination_key=lane_key(destination),
+    ).exclude(status='CANCELLED')
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile (0 <= q <= 1) of an already sorted list."""
+    if not values:
+        return ZERO
+    position = (len(values) - 1) * Decimal(q)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    value = values[lower] + (values[upper] - values[lower]) * (position - lower)
+    return value.quantize(CENT)
+
+
+def lane_stats(rows):
+    """LaneRate field values for one lane's trips, given as (trip_id, date, rate, weight, client, transporter, origin, destination) rows."""
+    rows = sorted(rows, key=lambda row: (row[1], row[0]))
+    rates = sorted(row[2] for row in rows)
+    weights = sorted(row[3] for row in rows)
+    client_rates, transporter_rates = {}, {}
+    for trip_id, trip_date, rate, _, client_id, transporter_id, _, _ in rows:
+        latest = {'rate': rate, 'date': trip_date, 'trip_id': trip_id}
+        client_rates[str(client_id)] = latest
+        transporter_rates[str(transporter_id)] = latest
+
+    last = rows[-1]
+    return {
+        'origin': last[6].strip(),
+        'destination': last[7].strip(),
+        'trip_count': len(rows),
+        'rate_p25': percentile(rates, '0.25'),
+        'rate_median': percentile(rates, '0.5'),
+        'rate_p75': percentile(rates, '0.75'),
+        'weight_p25': percentile(weights, '0.25'),
+        'weight_median': percentile(weights, '0.5'),
+        'weight_p75': percentile(weights, '0.75'),
+        'last_rate': last[2],
+        'last_trip_date': last[1],
+        'client_rates': client_rates,
+        'transporter_rates': transporter_rates,
+    }
+
+
+STAT_FIELDS = (
+    'trip_id', 'date', 'rate', 'weight', 'client_id', 'transporter_id', 'origin', 'destination',
+)
+# Trip fields a lane's statistics depend on (status, because cancelled trips are left out)
+LANE_FIELDS = frozenset({'date', 'rate', 'weight', 'client', 'transporter', 'origin', 'destination', 'status'})
+
+
+def refresh_lane(origin, destination):
+    """Recomputes one lane's LaneRate row (deleting it once the lane has no trips)."""
+    keys = {'origin_key': lane_key(origin), 'destination_key': lane_key(destination)}
+    rows = [
+        row for model in (Trip, ArchivedTrip)
+        for row in lane_trips(origin, destination, model).values_list(*STAT_FIELDS)
+    ]
+    if not rows:
+        LaneRate.objects.filter(**keys).delete()
+        return None
+    lane, _ = LaneRate.objects.update_or_create(**keys, defaults=lane_stats(rows))
+    return lane
+
+
+@transaction.atomic
+def rebuild_lanes():
+    """Rebuilds every LaneRate row from a single pass over the trips. Returns the number of lanes."""
+    by_lane = defaultdict(list)
+    for model in (Trip, ArchivedTrip):
+        for row in model.objects.exclude(status='CANCELLED').values_list(*STAT_FIELDS).iterator():
+            by_lane[(lane_key(row[6]), lane_key(row[7]))].append(row)
+
+    LaneRate.objects.all().delete()
+    LaneRate.objects.bulk_create([
+        LaneRate(origin_key=origin_key, destination_key=destination_key, **lane_stats(rows))
+        for (origin_key, destination_key), rows in by_lane.items()
+    ], batch_size=500)
+    return len(by_lane)
+
+
+def suggest_rate(origin, destination, client_id=None, transporter_id=None):
+    """
+    Rate suggestion for a lane from its LaneRate row (one indexed lookup).
+    Prefers the client's last rate on the lane, then the transporter's, then the lane median.
+    Places are canonicalised first, as trips store them, so 'Bombay' finds the Mumbai lane.
+    Returns None for an unknown lane.
+    """
+    if not lane_key(origin) or not lane_key(destination):
+        return None
+    origin, destination = canonical_place(origin)[0], canonical_place(destination)[0]
+    lane = LaneRate.objects.filter(
+        origin_key=lane_key(origin), destination_key=lane_key(destination)
+    ).first()
+    if lane is None:
+        return None
+
+    suggestion = {
+        'origin': lane.origin,
+        'destination': lane.destination,
+        'trip_count': lane.trip_count,
+        'rate_p25': lane.rate_p25,
+        'rate_median': lane.rate_median,
+        'rate_p75': lane.rate_p75,
+        'weight_median': lane.weight_median,
+        'last_rate': lane.last_rate,
+        'client_rate': lane.client_rates.get(str(client_id)) if client_id else None,
+        'transporter_rate': lane.transporter_rates.get(str(transporter_id)) if transporter_id else None,
+    }
+    if suggestion['client_rate']:
+        suggestion['rate'], suggestion['basis'] = Decimal(suggestion['client_rate']['rate']), 'client'
+    elif suggestion['transporter_rate']:
+        suggestion['rate'], suggestion['basis'] = Decimal(suggestion['transporter_rate']['rate']), 'transporter'
+    else:
+        suggestion['rate'], suggestion['basis'] = lane.rate_median, 'median'
+    return suggestion
+
+
+def suggestion_text(suggestion):
+    """One-line summary of a suggest_rate() result, shown under the rate field."""
+    text = (
+        f"{suggestion['origin']} \u2192 {suggestion['destination']}: median {suggestion['rate_median']} "
+        f"(p25 {suggestion['rate_p25']}, p75 {suggestion['rate_p75']}) over {suggestion['trip_count']} trips"
+    )
+    if suggestion['basis'] in ('client', 'transporter'):
+        latest = suggestion[f"{suggestion['basis']}_rate"]
+        text += f"; last rate for this {suggestion['basis']} {latest['rate']} on {latest['date']}"
+    return text + '.'
+
+
+# ----------------------------------------------------------------------
+# Incremental refresh on trip writes
+# ----------------------------------------------------------------------
+_pending = threading.local()
+
+
+def _flush_pending():
+    lanes = getattr(_pending, 'lanes', {})
+    _pending.lanes = {}
+    for origin, destination in lanes.values():
+        refresh_lane(origin, destination)
+
+
+def _mark(origin, destination):
+    if not hasattr(_pending, 'lanes'):
+        _pending.lanes = {}
+    _pending.lanes[(lane_key(origin), lane_key(destination))] = (origin, destination)
+    transaction.on_commit(_flush_pending)
+
+
+def _remember_old_lane(sender, instance, raw=False, **kwargs):
+    # An edit can move a trip to another lane, which then needs recomputing too.
+    instance._lane_before = None
+    if raw or not instance.pk:
+        return
+    if instance.is_tracked():
+        if instance.has_changed('origin', 'destination'):
+            instance._lane_before = (instance.loaded_value('origin'), instance.loaded_value('destination'))
+    else:
+        instance._lane_before = Trip.objects.filter(pk=instance.pk).values_list('origin', 'destination').first()
+
+
+def _on_trip_write(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not LANE_FIELDS & update_fields):
+        return
+    _mark(instance.origin, instance.destination)
+    if getattr(instance, '_lane_before', None):
+        _mark(*instance._lane_before)
+
+
+pre_save.connect(_remember_old_lane, sender='management.Trip', dispatch_uid='lane_pre_save_trip')
+post_save.connect(_on_trip_write, sender='management.Trip', dispatch_uid='lane_save_trip')
+post_delete.connect(_on_trip_write, sender='management.Trip', dispatch_uid='lane_delete_trip')
@@ -0,0 +1,153 @@
+# management/locations.py
+
+"""
+Place-name matching against the Location master.
+
+Every Location name and LocationAlias is normalised (case-folded, punctuation
+dropped, spaces collapsed) and broken into character trigrams. An in-memory
+inverted index (trigram -> entries) then scores a typed name against only the
+entries that share a trigram with it, so a lookup costs microseconds to a few
+milliseconds regardless of how many trips exist.
+
+The index is built from the master-data cache and rebuilt in each process
+whenever a Location or LocationAlias is written (same version counters as
+management.cache).
+
+Trip and DocketTable saves only accept exact matches (name or alias); fuzzy
+matches are offered as suggestions and used by `manage.py normalize_locations`
+above an explicit score threshold.
+
+Road distances between two Locations (RouteDistance, either direction) are
+read from the same cache by route_distance(), which Trip.save() uses to fill
+in the trip distance.
+"""
+
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .cache import masterdata, model_versions
+
+LOCATION = 'management.Location'
+LOCATION_ALIAS = 'management.LocationAlias'
+ROUTE = 'management.RouteDistance'
+
+_NON_WORD = re.compile(r'[^\w\s]+')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_place(text):
+    """'  Navi-Mumbai (MH) ' -> 'navi mumbai mh'"""
+    text = _NON_WORD.sub(' ', str(text or '').casefold())
+    return _SPACES.sub(' ', text).strip()
+
+
+def trigrams(normalized):
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Inverted trigram index over (normalised text, location) entries."""
+
+    def __init__(self, entries):
+        self.exact = {}
+        self.entries = []
+        self.postings = defaultdict(list)
+        for text, location in entries:
+            if not text or text in self.exact:
+                continue
+            self.exact[text] = location
+            grams = trigrams(text)
+            position = len(self.entries)
+            self.entries.append((location, len(grams)))
+            for gram in grams:
+                self.postings[gram].append(position)
+
+    def match(self, text, limit=5, min_score=0.3):
+        """Best (location, score) pairs for `text`, one per location, highest score first."""
+        normalized = normalize_place(text)
+        if not normalized:
+            return []
+        if normalized in self.exact:
+            return [(self.exact[normalized], 1.0)]
+
+        grams = trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        best = {}
+        for position, count in shared.items():
+            location, size = self.entries[position]
+            score = 2 * count / (len(grams) + size)  # Dice coefficient
+            if score >= min_score and score > best.get(location.pk, (None, 0))[1]:
+                best[location.pk] = (location, score)
+        return sorted(best.values(), key=lambda pair: -pair[1])[:limit]
+
+
+_state = {'token': None, 'checked_at': 0.0, 'index': None}
+_lock = threading.Lock()
+
+
+def place_index():
+    """The current process's TrigramIndex, rebuilt when locations or aliases change."""
+    now = time.monotonic()
+    if _state['index'] is not None and now - _state['checked_at'] < getattr(settings, 'MASTERDATA_LOCAL_TTL', 2):
+        return _state['index']
+
+    token = model_versions(LOCATION, LOCATION_ALIAS)
+    with _lock:
+        if token != _state['token']:
+            locations = {location.pk: location for location in masterdata.all(LOCATION)}
+            entries = [(normalize_place(location.name), location) for location in locations.values()]
+            entries += [
+                (normalize_place(alias.alias), locations[alias.location_id])
+                for alias in masterdata.all(LOCATION_ALIAS) if alias.location_id in locations
+            ]
+            _state['index'] = TrigramIndex(entries)
+            _state['token'] = token
+        _state['checked_at'] = now
+    return _state['index']
+
+
+def match_places(text, limit=5, min_score=0.3):
+    return place_index().match(text, limit=limit, min_score=min_score)
+
+
+def resolve_place(text, min_score=None):
+    """
+    The Location for a typed place name, or None.
+    Only exact name/alias matches count unless `min_score` allows fuzzy ones.
+    """
+    matches = place_index().match(text, limit=1, min_score=min_score or 1.0)
+    return matches[0][0] if matches else None
+
+
+def canonical_place(text):
+    """(canonical name, location) for an exact match, otherwise (the text as typed, None)."""
+    location = resolve_place(text)
+    if location is None:
+        return text, None
+    return location.name, location
+
+
+def route_key(origin_id, destination_id):
+    """'3-7' for the route between two Location pks, whichever way round."""
+    if not origin_id or not destination_id:
+        return None
+    low, high = sorted((int(origin_id), int(destination_id)))
+    return f'{low}-{high}'
+
+
+def route_distance(origin_id, destination_id):
+    """Road distance in km between two Locations from the RouteDistance table (cached), or None."""
+    key = route_key(origin_id, destination_id)
+    if key is None:
+        return None
+    route = masterdata.get_by(ROUTE, 'route_key', key)
+    return route.distance_km if route else None
+
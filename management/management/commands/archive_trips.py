@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from management.archive import archivable, archive_trips, restore_trips
+from management.fleet import add_months, month_start
+
+
+class Command(BaseCommand):
+    help = "Moves completed trips (with their expenses and dockets) to the archive tables, or restores them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help="Archive trips dated before this day (YYYY-MM-DD).")
+        parser.add_argument(
+            '--months', type=int,
+            help="Archive trips older than this many months (default TRIP_ARCHIVE_AFTER_MONTHS).",
+        )
+        parser.add_argument('--limit', type=int, help="Archive at most this many trips.")
+        parser.add_argument('--chunk-size', type=int, help="Trips per transaction (default TRIP_ARCHIVE_CHUNK_SIZE).")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the trips that would be archived.")
+        parser.add_argument('--restore', nargs='+', metavar='TRIP_ID', help="Restore these archived trips instead.")
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            try:
+                restored = restore_trips(options['restore'], size=options['chunk_size'])
+            except ValidationError as exc:
+                raise CommandError(exc.messages[0])
+            self.stdout.write(f"Restored {restored} trips")
+            return
+
+        if options['before']:
+            try:
+                cutoff = datetime.strptime(options['before'], '%Y-%m-%d').date()
+            except ValueError as exc:
+                raise CommandError(str(exc))
+        else:
+            months = options['months'] or getattr(settings, 'TRIP_ARCHIVE_AFTER_MONTHS', 24)
+            cutoff = add_months(month_start(timezone.localdate()), -months)
+
+        if options['dry_run']:
+            self.stdout.write(f"{archivable(cutoff).count()} completed trips dated before {cutoff} would be archived")
+            return
+
+        moved = archive_trips(
+            cutoff, limit=options['limit'], size=options['chunk_size'],
+            progress=(lambda count: self.stdout.write(f"  {count} trips archived")) if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(f"Archived {moved} completed trips dated before {cutoff}")
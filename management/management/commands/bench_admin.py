@@ -0,0 +1,98 @@
+import time
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Counts the queries, time and response size of every management admin changelist "
+        "(plus its date drill-down and add form) against the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help="Run ANALYZE first so estimated counts have statistics.")
+        parser.add_argument('--max-queries', type=int, help="Fail if any page runs more queries than this.")
+        parser.add_argument('--model', action='append', help="Only these models (by name, repeatable).")
+
+    def handle(self, *args, **options):
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        models = [
+            (model, model_admin) for model, model_admin in admin.site._registry.items()
+            if model._meta.app_label == 'management'
+            and (not options['model'] or model.__name__.lower() in {m.lower() for m in options['model']})
+        ]
+        results = []
+        try:
+            # The throwaway superuser (and anything a page writes) is rolled back
+            with transaction.atomic():
+                user = get_user_model().objects.create_superuser('bench-admin', password=None)
+                # The test client's default host, 'testserver', is not in ALLOWED_HOSTS
+                host = next(
+                    (host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost'
+                )
+                client = Client(HTTP_HOST=host)
+                client.force_login(user)
+                request = RequestFactory().get('/')
+                request.user = user
+                for model, model_admin in sorted(models, key=lambda item: item[0].__name__):
+                    for label, url in self.pages(model, model_admin, request):
+                        results.append((model.__name__, label, *self.measure(client, url)))
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{'model':<30}{'page':<14}{'status':>7}{'queries':>9}{'ms':>9}{'KB':>8}")
+        for name, label, status, queries, elapsed, size in results:
+            self.stdout.write(f"{name:<30}{label:<14}{status:>7}{queries:>9}{elapsed * 1000:>9.1f}{size / 1024:>8.1f}")
+
+        # A page that did not render measured nothing; add forms of read-only models are refused (403)
+        failed = [
+            row for row in results if row[2] != 200 and not (row[1] == 'add' and row[2] == 403)
+        ]
+        if failed:
+            raise CommandError(
+                f"{len(failed)} page(s) did not render: "
+                + ', '.join(f"{name} {label} ({status})" for name, label, status, _, _, _ in failed)
+            )
+
+        over = [row for row in results if options['max_queries'] is not None and row[3] > options['max_queries']]
+        if over:
+            raise CommandError(
+                f"{len(over)} page(s) over {options['max_queries']} queries: "
+                + ', '.join(f"{name} {label} ({queries})" for name, label, _, queries, _, _ in over)
+            )
+
+    def pages(self, model, model_admin, request):
+        info = (model._meta.app_label, model._meta.model_name)
+        changelist = reverse('admin:%s_%s_changelist' % info)
+        yield 'changelist', changelist
+        field = model_admin.date_hierarchy
+        if field:
+            latest = model._default_manager.order_by(f'-{field}').values_list(field, flat=True).first()
+            if latest:
+                yield 'drill-down', f"{changelist}?{field}__year={latest.year}&{field}__month={latest.month}"
+        if model_admin.has_add_permission(request):
+            yield 'add', reverse('admin:%s_%s_add' % info)
+
+    def measure(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            content = response.content
+            elapsed = time.perf_counter() - started
+        return response.status_code, len(queries), elapsed, len(content)
+
@@ -0,0 +1,128 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from management.routers import refresh_snapshot
+
+PROFILES = ['tms_core.settings', 'tms_core.settings_production']
+
+PAGES = [
+    'trip_list', 'account_list', 'party_list', 'vehicle_list', 'driver_list',
+    'maintenance_expense_list', 'invoice_list', 'payroll_list', 'fleet_efficiency',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares request throughput, latency, response size and SQL kept in memory of the "
+        "development and production settings profiles, each serving the list pages from a copy "
+        "of the current database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Timed requests per profile.")
+        parser.add_argument('--url', action='append', help="Only these URL names (repeatable).")
+        parser.add_argument(
+            '--settings-module', action='append', dest='profiles', metavar='MODULE',
+            help=f"Settings modules to compare (repeatable; default {' and '.join(PROFILES)}).",
+        )
+        # Internal: one profile, run by the parent in a fresh process
+        parser.add_argument('--child', action='store_true', help="(internal)")
+
+    def handle(self, *args, **options):
+        pages = options['url'] or PAGES
+        if options['child']:
+            self.stdout.write(json.dumps(self.measure(pages, options['requests'])))
+            return
+
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            # Every profile works on its own copy, so the benchmark never writes to the real database
+            source = refresh_snapshot(path=os.path.join(tmp, 'source.sqlite3'))
+            for profile in options['profiles'] or PROFILES:
+                work = os.path.join(tmp, profile)
+                os.makedirs(work)
+                db_path = os.path.join(work, 'db.sqlite3')
+                with open(source, 'rb') as src, open(db_path, 'wb') as dst:
+                    dst.write(src.read())
+                env = {
+                    **os.environ,
+                    'DJANGO_SETTINGS_MODULE': profile,
+                    'TMS_DATABASE_PATH': db_path,
+                    'TMS_STATIC_ROOT': os.path.join(work, 'static'),
+                    'TMS_CACHE_DIR': os.path.join(work, 'cache'),
+                }
+                command = [
+                    sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'bench_settings', '--child',
+                    '--requests', str(options['requests']), *(f'--url={name}' for name in pages),
+                ]
+                self.stderr.write(f"Benchmarking {profile} ...")
+                done = subprocess.run(command, env=env, capture_output=True, text=True)
+                if done.returncode:
+                    raise CommandError(f"{profile} failed:\n{done.stderr}")
+                results.append((profile, json.loads(done.stdout.strip().splitlines()[-1])))
+
+        self.stdout.write(
+            f"{'profile':<32}{'req/s':>8}{'mean ms':>9}{'p95 ms':>9}{'KB/resp':>9}{'SQL kept':>10}{'errors':>8}"
+        )
+        for profile, r in results:
+            self.stdout.write(
+                f"{profile:<32}{r['per_second']:>8.1f}{r['mean'] * 1000:>9.1f}{r['p95'] * 1000:>9.1f}"
+                f"{r['bytes'] / 1024:>9.1f}{r['queries_kept']:>10.1f}{r['errors']:>8}"
+            )
+        if len(results) > 1 and results[0][1]['per_second']:
+            base, last = results[0], results[-1]
+            self.stdout.write(
+                f"{last[0]} serves {last[1]['per_second'] / base[1]['per_second']:.2f}x the requests of {base[0]}."
+            )
+
+    def measure(self, pages, requests):
+        if getattr(settings, 'STATIC_ROOT', None):
+            # The hashed manifest must exist before any page renders {% static %}
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+        user = get_user_model().objects.create_superuser('bench-settings', password=None)
+        connections.close_all()
+        host = next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+        client = Client(HTTP_HOST=host, HTTP_ACCEPT_ENCODING='br, gzip')
+        client.force_login(user)
+        urls = [reverse(name) for name in pages]
+
+        # Warm up: template compilation, master-data and page caches, persistent connections
+        for url in urls * 2:
+            client.get(url)
+
+        latencies, sizes, kept, errors = [], [], [], 0
+        started = time.perf_counter()
+        for n in range(requests):
+            begun = time.perf_counter()
+            response = client.get(urls[n % len(urls)])
+            content = response.content
+            latencies.append(time.perf_counter() - begun)
+            sizes.append(len(content))
+            # Statements the connection keeps in memory for the request (only with DEBUG)
+            kept.append(len(connection.queries_log))
+            errors += response.status_code != 200
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'per_second': requests / elapsed,
+            'mean': statistics.mean(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'bytes': statistics.mean(sizes),
+            'queries_kept': statistics.mean(kept),
+            'errors': errors,
+        }
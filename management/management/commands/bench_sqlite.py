@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from tms_core.settings_production import SQLITE_PRAGMAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks concurrent SQLite access with the default settings versus the "
+        "production profile (WAL, busy_timeout, IMMEDIATE transactions, persistent connections)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--rows', type=int, default=20000, help="Rows seeded before the run.")
+
+    def handle(self, *args, **options):
+        profiles = [
+            # Django defaults: rollback journal, deferred transactions, a new
+            # connection per request (CONN_MAX_AGE = 0).
+            ('default', [], 'DEFERRED', False),
+            ('production', SQLITE_PRAGMAS, 'IMMEDIATE', True),
+        ]
+        results = []
+        for name, pragmas, mode, persistent in profiles:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'bench.sqlite3')
+                self.seed(path, options['rows'])
+                results.append((name, self.run(path, pragmas, mode, persistent, options)))
+
+        self.stdout.write(f"{'profile':<12}{'writes/s':>10}{'reads/s':>10}{'locked':>9}{'p95 ms':>9}")
+        for name, r in results:
+            self.stdout.write(
+                f"{name:<12}{r['writes'] / r['elapsed']:>10.0f}{r['reads'] / r['elapsed']:>10.0f}"
+                f"{r['locked']:>9}{r['p95'] * 1000:>9.1f}"
+            )
+
+    def seed(self, path, rows):
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE trip (id INTEGER PRIMARY KEY, trip_id TEXT, vehicle TEXT, "
+            "status TEXT, total_freight REAL)"
+        )
+        conn.executemany(
+            "INSERT INTO trip (trip_id, vehicle, status, total_freight) VALUES (?, ?, ?, ?)",
+            ((f"TRP-{i:06d}", f"MH12-{i % 50}", 'PENDING', i * 10.0) for i in range(rows)),
+        )
+        conn.execute("CREATE INDEX trip_vehicle ON trip (vehicle)")
+        conn.commit()
+        conn.close()
+
+    def run(self, path, pragmas, mode, persistent, options):
+        stop = time.monotonic() + options['seconds']
+        lock = threading.Lock()
+        totals = {'writes': 0, 'reads': 0, 'locked': 0, 'latencies': []}
+
+        def connect():
+            # Same driver timeout in both profiles: the difference is the pragmas and lock mode.
+            conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            for pragma in pragmas:
+                conn.execute(pragma)
+            return conn
+
+        def write(conn, n):
+            # Mirrors Trip.generate_trip_id(): read the last id, then insert.
+            conn.execute(f"BEGIN {mode}")
+            last = conn.execute("SELECT MAX(trip_id) FROM trip").fetchone()[0]
+            conn.execute(
+                "INSERT INTO trip (trip_id, vehicle, status, total_freight) VALUES (?, ?, ?, ?)",
+                (f"{last}-{n}", f"MH12-{n % 50}", 'PENDING', 100.0),
+            )
+            conn.execute("COMMIT")
+
+        def read(conn, n):
+            conn.execute(
+                "SELECT status, COUNT(*), SUM(total_freight) FROM trip WHERE vehicle = ? GROUP BY status",
+                (f"MH12-{n % 50}",),
+            ).fetchall()
+
+        def worker(kind, op):
+            conn = connect() if persistent else None
+            n = 0
+            latencies, done, locked = [], 0, 0
+            while time.monotonic() < stop:
+                n += 1
+                started = time.monotonic()
+                c = conn or connect()
+                try:
+                    op(c, n)
+                    done += 1
+                except sqlite3.OperationalError as exc:
+                    if 'locked' not in str(exc) and 'busy' not in str(exc):
+                        raise
+                    locked += 1
+                    if c.in_transaction:
+                        c.execute("ROLLBACK")
+                finally:
+                    if not persistent:
+                        c.close()
+                latencies.append(time.monotonic() - started)
+            if conn:
+                conn.close()
+            with lock:
+                totals[kind] += done
+                totals['locked'] += locked
+                totals['latencies'].extend(latencies)
+
+        threads = [threading.Thread(target=worker, args=('writes', write)) for _ in range(options['writers'])]
+        threads += [threading.Thread(target=worker, args=('reads', read)) for _ in range(options['readers'])]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        totals['elapsed'] = time.monotonic() - started
+
+        latencies = sorted(totals.pop('latencies')) or [0]
+        totals['p95'] = latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0]
+        return totals
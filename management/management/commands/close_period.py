@@ -0,0 +1,52 @@
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from management.models import AccountingPeriod
+from management.payroll import month_bounds
+from management.periods import close_period, fiscal_year_bounds, reopen_period
+
+
+class Command(BaseCommand):
+    help = "Closes the books through a date, snapshotting account balances (optionally archiving the ledger rows)."
+
+    def add_arguments(self, parser):
+        through = parser.add_mutually_exclusive_group(required=True)
+        through.add_argument('--through', help="Last day of the period (YYYY-MM-DD).")
+        through.add_argument('--month', help="Close through the end of this month (YYYY-MM).")
+        through.add_argument('--fiscal-year', type=int, help="Close through the end of the fiscal year starting in this year.")
+        through.add_argument('--reopen', action='store_true', help="Reopen the latest closed period instead.")
+        parser.add_argument('--name', help="Period name; defaults to the month or fiscal year.")
+        parser.add_argument('--archive', action='store_true', help="Move the period's ledger rows to the archive table.")
+
+    def handle(self, *args, **options):
+        if options['reopen']:
+            period = AccountingPeriod.objects.order_by('-period_end').first()
+            if period is None:
+                raise CommandError("No period has been closed.")
+            restored = reopen_period(period)
+            self.stdout.write(f"Reopened {period.name}: {restored} archived ledger rows restored")
+            return
+
+        try:
+            if options['through']:
+                end = datetime.strptime(options['through'], '%Y-%m-%d').date()
+            elif options['month']:
+                end = month_bounds(datetime.strptime(options['month'], '%Y-%m').date())[1]
+            else:
+                start_month = getattr(settings, 'FISCAL_YEAR_START_MONTH', 4)
+                end = fiscal_year_bounds(date(options['fiscal_year'], start_month, 1))[1]
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        try:
+            period = close_period(end, name=options['name'], archive=options['archive'])
+        except ValidationError as exc:
+            raise CommandError(exc.messages[0])
+
+        self.stdout.write(
+            f"Closed {period.name} ({period.period_start} to {period.period_end}): "
+            f"{period.balances.count()} account balances, {period.archived_count} ledger rows archived"
+        )
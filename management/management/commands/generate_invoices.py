@@ -0,0 +1,69 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from management.invoicing import billable_trips, create_invoices, render_invoices
+from management.models import Invoice, PartyMaster
+from management.payroll import month_bounds
+
+
+class Command(BaseCommand):
+    help = (
+        "Invoices every client's completed, uninvoiced trips for a month (default: last month), "
+        "posts the totals to the receivables account and renders the invoices in parallel."
+    )
+
+    def add_arguments(self, parser):
+        period = parser.add_mutually_exclusive_group()
+        period.add_argument('--month', help="Billing month (YYYY-MM).")
+        period.add_argument('--render-missing', action='store_true', help="Only render invoices without a document.")
+        parser.add_argument('--client', action='append', type=int, help="Only this client (PartyMaster id, repeatable).")
+        parser.add_argument('--invoice-date', help="Invoice date (YYYY-MM-DD); defaults to the month end.")
+        parser.add_argument('--workers', type=int, help="Render processes (default INVOICE_RENDER_WORKERS, else one per CPU).")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the billable trips per client.")
+
+    def handle(self, *args, **options):
+        if options['render_missing']:
+            started = time.monotonic()
+            rendered = render_invoices(Invoice.objects.filter(document='').select_related('client'), options['workers'])
+            self.stdout.write(f"Rendered {rendered} invoices in {time.monotonic() - started:.1f}s")
+            return
+
+        try:
+            if options['month']:
+                month = datetime.strptime(options['month'], '%Y-%m').date()
+            else:
+                month = timezone.localdate().replace(day=1) - timedelta(days=1)
+            invoice_date = (
+                datetime.strptime(options['invoice_date'], '%Y-%m-%d').date() if options['invoice_date'] else None
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        period_start, period_end = month_bounds(month)
+        clients = PartyMaster.objects.filter(pk__in=options['client']) if options['client'] else None
+
+        if options['dry_run']:
+            trips = billable_trips(period_start, period_end, clients)
+            counts = trips.values_list('client__name').order_by('client__name')
+            for name, count in counts.annotate(n=Count('pk')):
+                self.stdout.write(f"{name:<40}{count:>6} trips")
+            return
+
+        started = time.monotonic()
+        try:
+            invoices = create_invoices(period_start, period_end, invoice_date, clients)
+        except ValidationError as exc:
+            raise CommandError(exc.messages[0])
+        created = time.monotonic()
+        rendered = render_invoices(invoices, options['workers'])
+        if not invoices:
+            self.stdout.write(f"No uninvoiced completed trips in {period_start:%b %Y}")
+            return
+        self.stdout.write(
+            f"Raised {len(invoices)} invoices for {period_start:%b %Y} ({invoices[0].number} to {invoices[-1].number}) "
+            f"in {created - started:.1f}s, rendered {rendered} in {time.monotonic() - created:.1f}s"
+        )
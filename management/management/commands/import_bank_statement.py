@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from management.models import AccountMaster
+from management.reconciliation import confirm_matches, import_statement, reconcile
+
+
+class Command(BaseCommand):
+    help = "Imports a CSV/OFX bank statement for a BANK account and suggests ledger matches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('account', help="Account name (or id) of the BANK account.")
+        parser.add_argument('path', help="Statement file (.csv, .ofx or .qfx).")
+        parser.add_argument('--no-reconcile', action='store_true', help="Only import the lines.")
+        parser.add_argument(
+            '--confirm-above', type=float,
+            help="Also confirm every suggestion scoring at least this (0-1).",
+        )
+
+    def handle(self, *args, **options):
+        account = AccountMaster.objects.filter(account_name__iexact=options['account']).first()
+        if account is None and options['account'].isdigit():
+            account = AccountMaster.objects.filter(pk=options['account']).first()
+        if account is None:
+            raise CommandError(f"No account named {options['account']!r}.")
+
+        path = Path(options['path'])
+        try:
+            statement = import_statement(account, path.read_bytes(), path.name)
+        except (OSError, ValidationError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Imported {statement.line_count} lines ({statement.period_start} to {statement.period_end}).")
+
+        if options['no_reconcile']:
+            return
+        result = reconcile(statement)
+        self.stdout.write(f"{result['suggested']} matches suggested, {result['unmatched']} lines unmatched.")
+        if options['confirm_above'] is not None:
+            confirmed = confirm_matches(statement, min_score=options['confirm_above'])
+            self.stdout.write(f"Confirmed {confirmed} matches scoring {options['confirm_above']} or more.")
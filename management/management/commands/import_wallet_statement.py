@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from management.models import AccountMaster
+from management.wallets import import_wallet_statement, rematch_lines
+
+
+class Command(BaseCommand):
+    help = "Imports a Fastag or diesel-card CSV statement and books each spend to the vehicle's trip."
+
+    def add_arguments(self, parser):
+        parser.add_argument('account', nargs='?', help="Account name (or id) of the FASTAG or DIESELCARD account.")
+        parser.add_argument('path', nargs='?', help="Statement file (.csv).")
+        parser.add_argument(
+            '--rematch', action='store_true',
+            help="Retry matching for every line in the review queue (instead of, or after, importing).",
+        )
+
+    def handle(self, *args, **options):
+        if options['account']:
+            if not options['path']:
+                raise CommandError("Give the statement file after the account.")
+            account = AccountMaster.objects.filter(account_name__iexact=options['account']).first()
+            if account is None and options['account'].isdigit():
+                account = AccountMaster.objects.filter(pk=options['account']).first()
+            if account is None:
+                raise CommandError(f"No account named {options['account']!r}.")
+
+            path = Path(options['path'])
+            try:
+                statement = import_wallet_statement(account, path.read_bytes(), path.name)
+            except (OSError, ValidationError) as e:
+                raise CommandError(str(e))
+            booked = statement.lines.filter(status='MATCHED').count()
+            self.stdout.write(
+                f"Imported {statement.line_count} spends ({statement.period_start} to {statement.period_end}): "
+                f"{booked} booked to trips, {statement.line_count - booked} to review, "
+                f"{statement.duplicate_count} duplicates skipped."
+            )
+        elif not options['rematch']:
+            raise CommandError("Give an account and a statement file, or --rematch.")
+
+        if options['rematch']:
+            self.stdout.write(f"Booked {rematch_lines()} spends from the review queue.")
@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from management.cache import bump_version
+from management.lanes import rebuild_lanes
+from management.locations import normalize_place, resolve_place
+from management.models import DocketTable, Location, LocationAlias, Trip
+from management.search import reindex
+
+
+class Command(BaseCommand):
+    help = (
+        "Links existing trips and dockets to the Location master and rewrites their "
+        "origin/destination to the canonical spelling, in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--min-score', type=float, default=1.0,
+            help="Trigram similarity (0-1) needed to accept a fuzzy match. Default 1.0: exact names/aliases only.",
+        )
+        parser.add_argument('--add-aliases', action='store_true', help="Record accepted fuzzy spellings as aliases.")
+        parser.add_argument('--create-missing', action='store_true', help="Create a Location for unmatched names.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not 0 < options['min_score'] <= 1:
+            raise CommandError("--min-score must be between 0 and 1.")
+        self.options = options
+        self.resolved = {}  # normalised text -> Location or None, for this run
+        self.unmatched = set()
+
+        for model in (Trip, DocketTable):
+            updated = self.backfill(model)
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {updated} rows updated")
+        if self.unmatched:
+            self.stdout.write(f"Unmatched names ({len(self.unmatched)}): {', '.join(sorted(self.unmatched))}")
+
+        if not options['dry_run']:
+            # bulk_update skips the post_save receivers, so refresh what they would have.
+            for label in ('management.Trip', 'management.DocketTable', 'management.Location', 'management.LocationAlias'):
+                bump_version(label)
+            self.stdout.write(f"Rebuilt {rebuild_lanes()} lanes.")
+
+    def resolve(self, text):
+        key = normalize_place(text)
+        if key in self.resolved:
+            return self.resolved[key]
+
+        location = resolve_place(text, min_score=self.options['min_score'])
+        if location is None:
+            if self.options['create_missing'] and not self.options['dry_run'] and key:
+                location, _ = Location.objects.get_or_create(name=text.strip())
+            else:
+                self.unmatched.add(text.strip())
+        elif self.options['add_aliases'] and not self.options['dry_run'] and key != normalize_place(location.name):
+            LocationAlias.objects.get_or_create(alias=text.strip(), defaults={'location': location})
+        self.resolved[key] = location
+        return location
+
+    def backfill(self, model):
+        """Walks the table in primary-key order, one transaction and one bulk UPDATE per chunk."""
+        fields = ['origin', 'destination', 'origin_location', 'destination_location']
+        last_pk, updated = 0, 0
+        while True:
+            chunk = list(model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', *fields)[:self.options['chunk_size']])
+            if not chunk:
+                return updated
+            last_pk = chunk[-1].pk
+
+            changed = []
+            for row in chunk:
+                before = [getattr(row, field) for field in fields]
+                for end in ('origin', 'destination'):
+                    location = self.resolve(getattr(row, end))
+                    if location is not None:
+                        setattr(row, end, location.name)
+                        setattr(row, f'{end}_location', location)
+                if [getattr(row, field) for field in fields] != before:
+                    changed.append(row)
+
+            if changed and not self.options['dry_run']:
+                with transaction.atomic():
+                    model.objects.bulk_update(changed, fields)
+                    reindex(model, [row.pk for row in changed])
+            updated += len(changed)
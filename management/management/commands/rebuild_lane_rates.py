@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from management.lanes import rebuild_lanes
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the lane rate statistics (origin -> destination) from all trips."
+
+    def handle(self, *args, **options):
+        lanes = rebuild_lanes()
+        self.stdout.write(f"Rebuilt {lanes} lanes.")
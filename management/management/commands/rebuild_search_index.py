@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from management.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index from trips, masters, dockets, expenses and the ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for kind, rows in rebuild_index(options['chunk_size']).items():
+            self.stdout.write(f"{kind}: {rows} entries")
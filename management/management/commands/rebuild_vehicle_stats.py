@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from management.fleet import fill_trip_distances, rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Fills missing trip distances from the route table and rebuilds the monthly vehicle stats."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-distances', action='store_true',
+            help="Do not fill in trip distances from the route table first.",
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_distances']:
+            touched = fill_trip_distances()
+            self.stdout.write(f"Filled in distances for trips in {len(touched)} vehicle-months.")
+        rows = rebuild_stats()
+        self.stdout.write(f"Rebuilt {rows} monthly vehicle stat rows.")
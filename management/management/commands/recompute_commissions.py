@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from management.commissions import recompute_commissions
+from management.models import PartyMaster
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes commission and orai on every transporter's non-completed trips "
+        "from the current PartyMaster rates, one UPDATE per transporter."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transporter', type=int, action='append', help="PartyMaster id; repeat for several.")
+
+    def handle(self, *args, **options):
+        transporters = PartyMaster.objects.filter(party_type='TRANSPORTER').order_by('name')
+        if options['transporter']:
+            transporters = transporters.filter(pk__in=options['transporter'])
+
+        total = 0
+        for transporter in transporters:
+            audit = recompute_commissions(transporter)
+            if audit:
+                total += audit.trip_count
+                self.stdout.write(
+                    f"{transporter.name}: {audit.trip_count} trips, commission "
+                    f"{audit.commission_before} -> {audit.commission_after}, orai {audit.orai_before} -> {audit.orai_after}"
+                )
+        self.stdout.write(f"Recomputed {total} trips.")
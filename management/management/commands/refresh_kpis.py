@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from management.kpis import TILES, refresh_tiles
+
+
+class Command(BaseCommand):
+    help = "Recomputes the precomputed KPI tiles shown on the dashboard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tiles', nargs='*', help=f"Tiles to refresh (default: all). One of: {', '.join(TILES)}.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['tiles']) - set(TILES)
+        if unknown:
+            raise CommandError(f"Unknown tiles: {', '.join(sorted(unknown))}")
+        tiles = refresh_tiles(options['tiles'] or None)
+        for key, tile in tiles.items():
+            self.stdout.write(f"{key}: value={tile.value} count={tile.count}")
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from management.routers import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = "Refreshes the read-only reporting snapshot from the primary database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=int, default=0,
+            help="Keep running and refresh every N seconds.",
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'REPORTING_SNAPSHOT_PATH', None):
+            raise CommandError("REPORTING_SNAPSHOT_PATH is not set; the reporting replica is managed externally.")
+
+        while True:
+            started = time.monotonic()
+            path = refresh_snapshot()
+            self.stdout.write(f"Snapshot written to {path} in {time.monotonic() - started:.2f}s")
+            if not options['every']:
+                break
+            time.sleep(options['every'])
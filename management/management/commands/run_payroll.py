@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from management.cache import masterdata
+from management.models import AccountMaster
+from management.payroll import month_bounds, run_payroll
+
+
+class Command(BaseCommand):
+    help = "Runs the monthly driver payroll: payslips for every driver and one bulk salary posting."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', required=True, help="Payroll month as YYYY-MM.")
+        parser.add_argument('--account', required=True, help="Name of the account salaries are paid from.")
+        parser.add_argument('--payment-date', help="Posting date (YYYY-MM-DD); defaults to the month end.")
+
+    def handle(self, *args, **options):
+        try:
+            month = datetime.strptime(options['month'], '%Y-%m').date()
+            payment_date = (
+                datetime.strptime(options['payment_date'], '%Y-%m-%d').date()
+                if options['payment_date'] else None
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        account = masterdata.get_by(AccountMaster, 'account_name', options['account'])
+        if account is None:
+            raise CommandError(f"No account named {options['account']!r}.")
+
+        period_start, period_end = month_bounds(month)
+        try:
+            run = run_payroll(period_start, period_end, account, payment_date)
+        except ValidationError as exc:
+            raise CommandError(exc.messages[0])
+
+        self.stdout.write(
+            f"{run}: {run.payslips.count()} payslips, net pay {run.total_net_pay} from {account.account_name}"
+        )
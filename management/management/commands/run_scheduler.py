@@ -0,0 +1,110 @@
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from management.models import ScheduledJob
+from management.scheduler import (
+    due_jobs, load_jobs, local_datetime, run_in_worker, run_job, slots_between, worker_name,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the periodic maintenance jobs (snapshots, KPI tiles, expiry checks, rollups, backups) "
+        "on their cron schedules in a thread pool, recording each run."
+    )
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--list', action='store_true', help="Show the jobs, their schedules and next runs.")
+        action.add_argument('--run', action='append', metavar='JOB', help="Run this job now and exit (repeatable).")
+        action.add_argument('--once', action='store_true', help="Run the jobs due this minute and exit.")
+        parser.add_argument('--workers', type=int, help="Worker threads (default SCHEDULER_WORKERS).")
+
+    def handle(self, *args, **options):
+        try:
+            jobs = load_jobs()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['list']:
+            return self.list_jobs(jobs)
+
+        if options['run']:
+            unknown = set(options['run']) - set(jobs)
+            if unknown:
+                raise CommandError(f"Unknown jobs: {', '.join(sorted(unknown))}. One of: {', '.join(jobs)}")
+            for name in options['run']:
+                self.report(jobs[name], run_job(jobs[name]))
+            return
+
+        workers = options['workers'] or getattr(settings, 'SCHEDULER_WORKERS', 2)
+        stop = threading.Event()
+        if not options['once']:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: stop.set())
+            self.stdout.write(f"Scheduler {worker_name()} started with {workers} workers; Ctrl-C stops it.")
+
+        worker = worker_name()
+        running = {}
+        last_slot = None
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job') as executor:
+            while True:
+                now = timezone.now()
+                for slot in slots_between(last_slot, now):
+                    for due in due_jobs(slot):
+                        # Still busy from an earlier slot in this process: skip rather than queue up
+                        if due.name in running and not running[due.name].done():
+                            continue
+                        future = executor.submit(run_in_worker, due, slot, worker)
+                        future.add_done_callback(lambda done, due=due: self.finished(due, done))
+                        running[due.name] = future
+                    last_slot = slot
+                if options['once'] or stop.wait(60 - timezone.now().second + 0.5):
+                    break
+            if not options['once']:
+                self.stdout.write("Stopping: waiting for running jobs to finish.")
+
+    def finished(self, registered, future):
+        # Failures inside the job are recorded on its run; this is the scheduler's own (e.g. the database)
+        if future.exception() is not None:
+            self.stderr.write(f"{registered.name}: could not run: {future.exception()}")
+        else:
+            self.report(registered, future.result())
+
+    def report(self, registered, run):
+        if run is None:
+            self.stdout.write(f"{registered.name}: skipped, locked or already run by another scheduler")
+            return
+        style = self.style.SUCCESS if run.status == 'SUCCESS' else self.style.ERROR
+        summary = (run.result or run.error).strip().splitlines()
+        self.stdout.write(style(
+            f"{registered.name}: {run.get_status_display().lower()} in {run.duration:.1f}s"
+            + (f" - {summary[-1 if run.error else 0]}" if summary else '')
+        ))
+
+    def list_jobs(self, jobs):
+        now = timezone.now()
+        states = {state.name: state for state in ScheduledJob.objects.all()}
+        last_runs = {}
+        for state in states.values():
+            run = state.runs.order_by('-started_at').first()
+            if run:
+                last_runs[state.name] = run
+        self.stdout.write(f"{'job':<22}{'schedule':<16}{'next run':<18}{'last run':<18}{'status':<10}{'secs':>7}")
+        for name, registered in jobs.items():
+            cron = registered.cron
+            run = last_runs.get(name)
+            self.stdout.write(
+                f"{name:<22}{registered.schedule or 'disabled':<16}"
+                f"{local_datetime(cron.next_run(now) if cron else None):<18}"
+                f"{local_datetime(run.started_at if run else None):<18}"
+                f"{run.status if run else '-':<10}"
+                f"{f'{run.duration:.1f}' if run and run.duration is not None else '-':>7}"
+            )
+            if registered.description:
+                self.stdout.write(f"  {registered.description}")
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:58
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0002_kpitile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('total_net_pay', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('paid_via_account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='payroll_runs', to='management.accountmaster', verbose_name='Salary Paid From')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DriverAdvance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='advances', to='management.driver')),
+                ('paid_via_account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='driver_advances', to='management.accountmaster', verbose_name='Paid From Account')),
+                ('payroll_run', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recovered_advances', to='management.payrollrun')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Payslip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fixed_salary', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('wage_rate', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('trip_count', models.IntegerField(default=0)),
+                ('trip_wages', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('advances', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('cash_expenses', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Trip costs the driver paid in cash, settled against their advances.', max_digits=12)),
+                ('net_pay', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='payslips', to='management.driver')),
+                ('ledger_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payslip', to='management.accounttransaction')),
+                ('payroll_run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payslips', to='management.payrollrun')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='payrollrun',
+            constraint=models.UniqueConstraint(fields=('period_start', 'period_end'), name='unique_payroll_period'),
+        ),
+        migrations.AddConstraint(
+            model_name='payslip',
+            constraint=models.UniqueConstraint(fields=('payroll_run', 'driver'), name='unique_payslip_per_driver'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0003_driver_payroll'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', 'vehicle', 'date'], name='trip_status_vehicle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', 'driver', 'date'], name='trip_status_driver_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:04
+
+import django.core.serializers.json
+import django.db.models.functions.text
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0004_trip_availability_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LaneRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin_key', models.CharField(max_length=100)),
+                ('destination_key', models.CharField(max_length=100)),
+                ('origin', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('trip_count', models.PositiveIntegerField(default=0)),
+                ('rate_p25', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('rate_median', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('rate_p75', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('weight_p25', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('weight_median', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('weight_p75', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('last_rate', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('last_trip_date', models.DateField(blank=True, null=True)),
+                ('client_rates', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('transporter_rates', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('origin')), django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('destination')), name='trip_lane_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='lanerate',
+            constraint=models.UniqueConstraint(fields=('origin_key', 'destination_key'), name='unique_lane'),
+        ),
+    ]
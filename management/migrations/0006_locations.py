@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0005_lane_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('state', models.CharField(blank=True, max_length=50, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dockettable',
+            name='destination_location',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dockets_to', to='management.location'),
+        ),
+        migrations.AddField(
+            model_name='dockettable',
+            name='origin_location',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dockets_from', to='management.location'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='destination_location',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trips_to', to='management.location'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='origin_location',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trips_from', to='management.location'),
+        ),
+        migrations.CreateModel(
+            name='LocationAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100, unique=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='management.location')),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0006_locations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_pk', models.CharField(max_length=50)),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('tags', models.CharField(blank=True, max_length=50)),
+                ('date', models.DateField(blank=True, null=True)),
+                ('url', models.CharField(max_length=255)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_pk'), name='unique_search_entry')],
+            },
+        ),
+        # External-content FTS5 index over SearchEntry, kept in step by triggers.
+        # Populate it for existing rows with `manage.py rebuild_search_index`.
+        migrations.RunSQL(
+            sql=[
+                """CREATE VIRTUAL TABLE management_search_fts USING fts5(
+                    title, body, tags,
+                    content='management_searchentry', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                )""",
+                """CREATE TRIGGER management_searchentry_ai AFTER INSERT ON management_searchentry BEGIN
+                    INSERT INTO management_search_fts(rowid, title, body, tags) VALUES (new.id, new.title, new.body, new.tags);
+                END""",
+                """CREATE TRIGGER management_searchentry_ad AFTER DELETE ON management_searchentry BEGIN
+                    INSERT INTO management_search_fts(management_search_fts, rowid, title, body, tags)
+                    VALUES ('delete', old.id, old.title, old.body, old.tags);
+                END""",
+                """CREATE TRIGGER management_searchentry_au AFTER UPDATE ON management_searchentry BEGIN
+                    INSERT INTO management_search_fts(management_search_fts, rowid, title, body, tags)
+                    VALUES ('delete', old.id, old.title, old.body, old.tags);
+                    INSERT INTO management_search_fts(rowid, title, body, tags) VALUES (new.id, new.title, new.body, new.tags);
+                END""",
+            ],
+            reverse_sql=[
+                'DROP TRIGGER IF EXISTS management_searchentry_au',
+                'DROP TRIGGER IF EXISTS management_searchentry_ad',
+                'DROP TRIGGER IF EXISTS management_searchentry_ai',
+                'DROP TABLE IF EXISTS management_search_fts',
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripStatusBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_status', models.CharField(choices=[('PENDING', 'Pending'), ('IN_TRANSIT', 'In-transit'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('previous_statuses', models.JSONField(default=dict)),
+                ('trip_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('undone_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:21
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0008_trip_status_batches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommissionRecompute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigger', models.CharField(choices=[('SAVE', 'Transporter edited'), ('COMMAND', 'recompute_commissions command')], max_length=10)),
+                ('old_commission_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('new_commission_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('old_orai_charge', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('new_orai_charge', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('trip_count', models.PositiveIntegerField(default=0)),
+                ('commission_before', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('commission_after', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('orai_before', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('orai_after', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('transporter', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='commission_recomputes', to='management.partymaster')),
+            ],
+        ),
+    ]
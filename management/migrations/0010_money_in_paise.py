@@ -0,0 +1,96 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:24
+
+import management.money
+from decimal import Decimal
+from django.db import migrations
+
+# Columns converted from DECIMAL rupees to integer paise
+MONEY_COLUMNS = {
+    'accountmaster': ['initial_balance'],
+    'accounttransaction': ['withdrawal', 'deposit'],
+    'maintenanceexpense': ['amount'],
+    'trip': ['rate', 'total_freight', 'commission_amount', 'orai_amount', 'halting', 'advance'],
+    'tripexpense': ['amount'],
+}
+
+
+def _rescale(expression):
+    def rescale(apps, schema_editor):
+        quote = schema_editor.quote_name
+        for model_name, columns in MONEY_COLUMNS.items():
+            table = apps.get_model('management', model_name)._meta.db_table
+            assignments = ', '.join(f'{quote(column)} = {expression.format(quote(column))}' for column in columns)
+            schema_editor.execute(f'UPDATE {quote(table)} SET {assignments}')
+    return rescale
+
+
+# Runs while the columns are still DECIMAL, so the rebuilt integer columns receive whole paise
+to_paise = _rescale('ROUND({} * 100)')
+# Runs after the columns are DECIMAL again on the way back
+to_rupees = _rescale('{} / 100.0')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0009_commission_recomputes'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_paise, to_rupees),
+        migrations.AlterField(
+            model_name='accountmaster',
+            name='initial_balance',
+            field=management.money.MoneyField(default=Decimal('0.00')),
+        ),
+        migrations.AlterField(
+            model_name='accounttransaction',
+            name='deposit',
+            field=management.money.MoneyField(default=Decimal('0.00')),
+        ),
+        migrations.AlterField(
+            model_name='accounttransaction',
+            name='withdrawal',
+            field=management.money.MoneyField(default=Decimal('0.00')),
+        ),
+        migrations.AlterField(
+            model_name='maintenanceexpense',
+            name='amount',
+            field=management.money.MoneyField(verbose_name='Total Bill Amount'),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='advance',
+            field=management.money.MoneyField(default=Decimal('0.00')),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='commission_amount',
+            field=management.money.MoneyField(default=Decimal('0.00'), editable=False),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='halting',
+            field=management.money.MoneyField(default=Decimal('0.00')),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='orai_amount',
+            field=management.money.MoneyField(default=Decimal('0.00'), editable=False),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='rate',
+            field=management.money.MoneyField(),
+        ),
+        migrations.AlterField(
+            model_name='trip',
+            name='total_freight',
+            field=management.money.MoneyField(default=Decimal('0.00'), editable=False),
+        ),
+        migrations.AlterField(
+            model_name='tripexpense',
+            name='amount',
+            field=management.money.MoneyField(),
+        ),
+    ]
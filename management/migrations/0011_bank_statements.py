@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:28
+
+import django.db.models.deletion
+import management.money
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0010_money_in_paise'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BankStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_format', models.CharField(choices=[('CSV', 'CSV'), ('OFX', 'OFX')], max_length=3)),
+                ('period_start', models.DateField(blank=True, null=True)),
+                ('period_end', models.DateField(blank=True, null=True)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.ForeignKey(limit_choices_to={'account_type': 'BANK'}, on_delete=django.db.models.deletion.PROTECT, related_name='bank_statements', to='management.accountmaster')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BankStatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_no', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('amount', management.money.MoneyField()),
+                ('status', models.CharField(choices=[('UNMATCHED', 'Unmatched'), ('SUGGESTED', 'Suggested'), ('MATCHED', 'Matched')], default='UNMATCHED', max_length=10)),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('matched_at', models.DateTimeField(blank=True, null=True)),
+                ('matched_transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statement_lines', to='management.accounttransaction')),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='management.bankstatement')),
+            ],
+            options={
+                'ordering': ['statement', 'line_no'],
+                'indexes': [models.Index(fields=['statement', 'status', 'line_no'], name='stmt_line_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('statement', 'line_no'), name='unique_statement_line'), models.UniqueConstraint(condition=models.Q(('status', 'MATCHED')), fields=('matched_transaction',), name='unique_confirmed_match')],
+            },
+        ),
+    ]
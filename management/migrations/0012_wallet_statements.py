@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:34
+
+import django.db.models.deletion
+import management.money
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0011_bank_statements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('period_start', models.DateField(blank=True, null=True)),
+                ('period_end', models.DateField(blank=True, null=True)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('duplicate_count', models.PositiveIntegerField(default=0)),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(limit_choices_to={'account_type__in': ['FASTAG', 'DIESELCARD']}, on_delete=django.db.models.deletion.PROTECT, related_name='wallet_statements', to='management.accountmaster')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WalletStatementLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_no', models.PositiveIntegerField()),
+                ('transacted_at', models.DateTimeField()),
+                ('vehicle_text', models.CharField(blank=True, max_length=30, verbose_name='Vehicle (as on statement)')),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('reference', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('amount', management.money.MoneyField()),
+                ('kind', models.CharField(choices=[('TOLL', 'Toll'), ('FUEL', 'Fuel')], max_length=4)),
+                ('status', models.CharField(choices=[('MATCHED', 'Matched to trip'), ('REVIEW', 'Needs review'), ('IGNORED', 'Ignored')], default='REVIEW', max_length=10)),
+                ('review_reason', models.CharField(blank=True, max_length=100)),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='management.walletstatement')),
+                ('trip', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wallet_lines', to='management.trip')),
+                ('trip_expense', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wallet_line', to='management.tripexpense')),
+                ('vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='management.vehicle')),
+            ],
+            options={
+                'ordering': ['statement', 'line_no'],
+                'indexes': [models.Index(fields=['status', 'transacted_at'], name='wallet_line_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('statement', 'line_no'), name='unique_wallet_line')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:43
+
+import django.db.models.deletion
+import management.money
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0012_wallet_statements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='distance_km',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Distance (km)'),
+        ),
+        migrations.CreateModel(
+            name='MonthlyVehicleStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_type', models.CharField(max_length=50)),
+                ('month', models.DateField(help_text='First day of the month (trips are counted by trip date).')),
+                ('trip_count', models.PositiveIntegerField(default=0)),
+                ('measured_trips', models.PositiveIntegerField(default=0)),
+                ('distance_km', models.PositiveBigIntegerField(default=0)),
+                ('tonnes', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('tonne_km', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=18)),
+                ('freight', management.money.MoneyField(default=Decimal('0.00'))),
+                ('fuel_cost', management.money.MoneyField(default=Decimal('0.00'))),
+                ('measured_fuel_cost', management.money.MoneyField(default=Decimal('0.00'))),
+                ('trip_expenses', management.money.MoneyField(default=Decimal('0.00'))),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_stats', to='management.vehicle')),
+            ],
+            options={
+                'ordering': ['-month', 'vehicle'],
+                'indexes': [models.Index(fields=['month', 'vehicle_type'], name='vehicle_stat_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('vehicle', 'month'), name='unique_vehicle_month')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RouteDistance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.PositiveIntegerField(verbose_name='Distance (km)')),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes_to', to='management.location')),
+                ('origin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes_from', to='management.location')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('origin', 'destination'), name='unique_route')],
+            },
+        ),
+    ]
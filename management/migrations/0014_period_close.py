@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:49
+
+import django.db.models.deletion
+import management.money
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0013_fleet_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountingPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField(unique=True)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('archived_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-period_end'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AccountBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('opening_balance', management.money.MoneyField(default=Decimal('0.00'))),
+                ('deposits', management.money.MoneyField(default=Decimal('0.00'))),
+                ('withdrawals', management.money.MoneyField(default=Decimal('0.00'))),
+                ('closing_balance', management.money.MoneyField(default=Decimal('0.00'))),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='management.accountmaster')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='management.accountingperiod')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'account'), name='unique_period_account')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedAccountTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('description', models.CharField(max_length=255)),
+                ('withdrawal', management.money.MoneyField(default=Decimal('0.00'))),
+                ('deposit', management.money.MoneyField(default=Decimal('0.00'))),
+                ('related_trip_id', models.BigIntegerField(blank=True, null=True)),
+                ('related_maintenance_id', models.BigIntegerField(blank=True, null=True)),
+                ('related_maintenance_expense_id', models.BigIntegerField(blank=True, null=True)),
+                ('related_trip_expense_id', models.BigIntegerField(blank=True, null=True)),
+                ('from_account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.accountmaster')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_transactions', to='management.accountingperiod')),
+                ('to_account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.accountmaster')),
+            ],
+            options={
+                'ordering': ['date', 'id'],
+                'indexes': [models.Index(fields=['from_account', 'date'], name='archived_txn_from_idx'), models.Index(fields=['to_account', 'date'], name='archived_txn_to_idx')],
+            },
+        ),
+    ]
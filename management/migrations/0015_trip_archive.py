@@ -0,0 +1,107 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:55
+
+import django.db.models.deletion
+import django.db.models.functions.text
+import management.money
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0014_period_close'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accounttransaction',
+            name='related_trip',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Links to the source Trip (e.g., for receipts).', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions_from_trip', to='management.trip'),
+        ),
+        migrations.AlterField(
+            model_name='accounttransaction',
+            name='related_trip_expense',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Links to the source Trip Expense.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions_from_trip_expense', to='management.tripexpense'),
+        ),
+        migrations.AlterField(
+            model_name='walletstatementline',
+            name='trip',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wallet_lines', to='management.trip'),
+        ),
+        migrations.AlterField(
+            model_name='walletstatementline',
+            name='trip_expense',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wallet_line', to='management.tripexpense'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedTrip',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('trip_id', models.CharField(max_length=15, unique=True, verbose_name='Trip ID')),
+                ('date', models.DateField()),
+                ('origin', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('rate', management.money.MoneyField()),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_freight', management.money.MoneyField(default=Decimal('0.00'))),
+                ('commission_amount', management.money.MoneyField(default=Decimal('0.00'))),
+                ('orai_amount', management.money.MoneyField(default=Decimal('0.00'))),
+                ('halting', management.money.MoneyField(default=Decimal('0.00'))),
+                ('advance', management.money.MoneyField(default=Decimal('0.00'))),
+                ('distance_km', models.PositiveIntegerField(blank=True, null=True, verbose_name='Distance (km)')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('IN_TRANSIT', 'In-transit'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.partymaster', verbose_name='Client (Consignor)')),
+                ('destination_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='management.location')),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.driver')),
+                ('origin_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='management.location')),
+                ('transporter', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.partymaster', verbose_name='Transporter (Carrier)')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.vehicle')),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedDocket',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('origin', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('docket_no', models.CharField(max_length=50, unique=True)),
+                ('send_date', models.DateField(verbose_name='Docket Sent Date')),
+                ('challan_received', models.BooleanField(default=False, verbose_name='Challan/Docket Received')),
+                ('received_date', models.DateField(blank=True, null=True, verbose_name='Received Date')),
+                ('destination_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='management.location')),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.driver')),
+                ('origin_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='management.location')),
+                ('transporter', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.partymaster')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dockets', to='management.archivedtrip')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedTripExpense',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('amount', management.money.MoneyField()),
+                ('bill_no', models.CharField(blank=True, max_length=50, null=True)),
+                ('expense_category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.expensecategory')),
+                ('paid_via_account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='management.accountmaster', verbose_name='Paid Via Account')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='expenses', to='management.archivedtrip')),
+            ],
+            options={
+                'ordering': ['date', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedtrip',
+            index=models.Index(fields=['vehicle', 'date'], name='archived_trip_vehicle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtrip',
+            index=models.Index(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('origin')), django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('destination')), name='archived_trip_lane_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0015_trip_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accounttransaction',
+            index=models.Index(fields=['date'], name='ledger_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dockettable',
+            index=models.Index(fields=['send_date'], name='docket_send_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driveradvance',
+            index=models.Index(fields=['date'], name='driver_advance_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenanceexpense',
+            index=models.Index(fields=['date'], name='maintenance_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['date'], name='trip_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripexpense',
+            index=models.Index(fields=['date'], name='trip_expense_date_idx'),
+        ),
+    ]
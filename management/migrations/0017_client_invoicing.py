@@ -0,0 +1,92 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:06
+
+import django.db.models.deletion
+import management.money
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0016_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fiscal_year', models.CharField(help_text='e.g. 2025-26', max_length=7, unique=True)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedtrip',
+            name='shortage_deduction',
+            field=management.money.MoneyField(default=Decimal('0.00')),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='shortage_deduction',
+            field=management.money.MoneyField(default=Decimal('0.00')),
+        ),
+        migrations.AlterField(
+            model_name='accountmaster',
+            name='account_type',
+            field=models.CharField(choices=[('BANK', 'Bank Account'), ('CASH', 'Cash / Petty Cash'), ('FASTAG', 'Fastag Wallet'), ('DIESELCARD', 'Diesel Card Wallet'), ('RECEIVABLE', 'Receivables (Sundry Debtors)')], default='BANK', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='Invoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.CharField(max_length=30, unique=True)),
+                ('invoice_date', models.DateField()),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('client_gst_number', models.CharField(blank=True, max_length=15, verbose_name='Client GST Number')),
+                ('freight', management.money.MoneyField(default=Decimal('0.00'))),
+                ('halting', management.money.MoneyField(default=Decimal('0.00'))),
+                ('shortage', management.money.MoneyField(default=Decimal('0.00'), help_text='Shortage/damage deductions')),
+                ('taxable_amount', management.money.MoneyField(default=Decimal('0.00'))),
+                ('gst_rate', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=5, verbose_name='GST %')),
+                ('cgst', management.money.MoneyField(default=Decimal('0.00'))),
+                ('sgst', management.money.MoneyField(default=Decimal('0.00'))),
+                ('igst', management.money.MoneyField(default=Decimal('0.00'))),
+                ('total', management.money.MoneyField(default=Decimal('0.00'))),
+                ('document', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('client', models.ForeignKey(limit_choices_to={'party_type': 'CLIENT'}, on_delete=django.db.models.deletion.PROTECT, related_name='invoices', to='management.partymaster', verbose_name='Client (Consignor)')),
+                ('receivable_entry', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoice', to='management.accounttransaction')),
+            ],
+            options={
+                'ordering': ['-invoice_date', '-number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InvoiceLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trip_code', models.CharField(max_length=15, verbose_name='Trip ID')),
+                ('date', models.DateField()),
+                ('vehicle_no', models.CharField(max_length=15)),
+                ('origin', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('weight', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('rate', management.money.MoneyField()),
+                ('freight', management.money.MoneyField(default=Decimal('0.00'))),
+                ('halting', management.money.MoneyField(default=Decimal('0.00'))),
+                ('shortage', management.money.MoneyField(default=Decimal('0.00'))),
+                ('amount', management.money.MoneyField(default=Decimal('0.00'), help_text='Freight + halting - shortage')),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='management.invoice')),
+                ('trip', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, related_name='invoice_line', to='management.trip')),
+            ],
+            options={
+                'ordering': ['date', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['client', 'period_start'], name='invoice_client_period_idx'),
+        ),
+    ]
@@ -0,0 +1,163 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0017_client_invoicing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name_plural': 'branches',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserBranch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='accountmaster',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='accounttransaction',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='archivedaccounttransaction',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='archiveddocket',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='archivedtrip',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='archivedtripexpense',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='dockettable',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='driveradvance',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='maintenanceexpense',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='partymaster',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='tripexpense',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='branch',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='management.branch'),
+        ),
+        migrations.AddIndex(
+            model_name='accountmaster',
+            index=models.Index(fields=['branch', 'account_name'], name='account_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accounttransaction',
+            index=models.Index(fields=['branch', 'date'], name='ledger_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtrip',
+            index=models.Index(fields=['branch', 'date'], name='archived_trip_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dockettable',
+            index=models.Index(fields=['branch', 'send_date'], name='docket_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['branch', 'driver_id'], name='driver_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driveradvance',
+            index=models.Index(fields=['branch', 'date'], name='driver_advance_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenanceexpense',
+            index=models.Index(fields=['branch', 'date'], name='maintenance_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='partymaster',
+            index=models.Index(fields=['branch', 'party_type', 'name'], name='party_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['branch', 'date'], name='trip_branch_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['branch', 'status', 'date'], name='trip_branch_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripexpense',
+            index=models.Index(fields=['branch', 'date'], name='trip_expense_branch_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['branch', 'vehicle_no'], name='vehicle_branch_idx'),
+        ),
+        migrations.AddField(
+            model_name='userbranch',
+            name='branch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='user_assignments', to='management.branch'),
+        ),
+        migrations.AddField(
+            model_name='userbranch',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='branch_assignment', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:33
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0019_scheduled_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslip',
+            name='carried_forward',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Deductions beyond the gross pay, carried into the next payroll as a new advance.', max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='payslip',
+            name='cash_expenses',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Trip costs paid in cash (no paying account), deducted from the pay.', max_digits=12),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:05
+
+from django.db import migrations
+
+# Search kind -> (source model, whether a row without a branch is shared by every branch)
+SOURCES = {
+    'trip': ('trip', False),
+    'party': ('partymaster', True),
+    'vehicle': ('vehicle', True),
+    'driver': ('driver', True),
+    'docket': ('dockettable', False),
+    'expense': ('tripexpense', False),
+    'ledger': ('accounttransaction', False),
+}
+
+
+def add_branch_tags(apps, schema_editor):
+    """Appends each entry's branch token (management.search.branch_tag) to its tags."""
+    quote = schema_editor.quote_name
+    entries = quote(apps.get_model('management', 'searchentry')._meta.db_table)
+    for kind, (model_name, shared) in SOURCES.items():
+        model = apps.get_model('management', model_name)
+        table, pk = quote(model._meta.db_table), quote(model._meta.pk.column)
+        source = f"FROM {table} s WHERE CAST(s.{pk} AS TEXT) = {entries}.object_pk"
+        if shared:
+            tag, condition = "CASE WHEN s.branch_id IS NULL THEN 'bshared' ELSE 'b' || s.branch_id END", ''
+        else:
+            tag, condition = "'b' || s.branch_id", ' AND s.branch_id IS NOT NULL'
+        # The update trigger re-indexes each changed entry in the FTS table
+        schema_editor.execute(
+            f"UPDATE {entries} SET tags = tags || ' ' || (SELECT {tag} {source}) "
+            f"WHERE kind = %s AND EXISTS (SELECT 1 {source}{condition})",
+            [kind],
+        )
+
+
+def remove_branch_tags(apps, schema_editor):
+    SearchEntry = apps.get_model('management', 'searchentry')
+    entries = list(SearchEntry.objects.filter(tags__contains=' b').only('pk', 'tags'))
+    for entry in entries:
+        # No kind, month or year token starts with 'b'
+        entry.tags = ' '.join(token for token in entry.tags.split() if not token.startswith('b'))
+    SearchEntry.objects.bulk_update(entries, ['tags'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0020_payslip_carried_forward'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_branch_tags, remove_branch_tags),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:13
+
+from collections import defaultdict
+from decimal import Decimal
+
+import management.money
+from django.db import migrations
+from django.db.models import BigIntegerField, Sum
+from django.db.models.functions import TruncMonth
+
+
+def fill_measured_expenses(apps, schema_editor):
+    """Sums each stat row's expenses on trips with a distance, as management.fleet.compute_stats() does."""
+    MonthlyVehicleStat = apps.get_model('management', 'monthlyvehiclestat')
+    totals = defaultdict(int)
+    for model_name in ('tripexpense', 'archivedtripexpense'):
+        expenses = apps.get_model('management', model_name).objects.exclude(trip__status='CANCELLED')
+        rows = (
+            expenses.filter(trip__distance_km__isnull=False)
+            .annotate(month=TruncMonth('trip__date'))
+            .values_list('trip__vehicle_id', 'month')
+            .annotate(total=Sum('amount', output_field=BigIntegerField()))
+            .order_by()
+        )
+        for vehicle_id, month, total in rows:
+            totals[(vehicle_id, month)] += total or 0
+
+    stats = list(MonthlyVehicleStat.objects.only('pk', 'vehicle_id', 'month'))
+    for stat in stats:
+        stat.measured_trip_expenses = management.money.from_paise(totals.get((stat.vehicle_id, stat.month), 0))
+    MonthlyVehicleStat.objects.bulk_update(stats, ['measured_trip_expenses'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0021_search_branch_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlyvehiclestat',
+            name='measured_trip_expenses',
+            field=management.money.MoneyField(default=Decimal('0.00')),
+        ),
+        migrations.RunPython(fill_measured_expenses, migrations.RunPython.noop),
+    ]
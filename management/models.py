@@ -1,9 +1,18 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.db.models import Max
+from django.db.models.functions import Lower, Trim
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.translation import gettext_lazy as _
 from decimal import Decimal
 
+from .branches import BranchQuerySet, BranchScopedManager
+from .cache import masterdata
+from .locations import canonical_place, route_distance, route_key
+from .money import MoneyField, round_money
+from .tracking import TrackedFieldsMixin
+
 # --- CONSTANTS ---
 PARTY_TYPE_CHOICES = [
     ('TRANSPORTER', 'Transporter (Hired Carrier)'),
@@ -17,6 +26,7 @@ ACCOUNT_TYPE_CHOICES = [
     ('CASH', 'Cash / Petty Cash'),
     ('FASTAG', 'Fastag Wallet'),
     ('DIESELCARD', 'Diesel Card Wallet'),
+    ('RECEIVABLE', 'Receivables (Sundry Debtors)'),
 ]
 
 TRIP_STATUS_CHOICES = [
@@ -26,6 +36,9 @@ TRIP_STATUS_CHOICES = [
     ('CANCELLED', 'Cancelled'),
 ]
 
+# A vehicle or driver on a trip in one of these statuses is not available
+ACTIVE_TRIP_STATUSES = ('PENDING', 'IN_TRANSIT')
+
 
 # =========================================================================
 # A. MASTER DATA TABLES
@@ -49,6 +62,17 @@ class Vehicle(models.Model):
     national_permit = models.CharField(max_length=50, blank=True, null=True)
     puc_expiry = models.DateField(blank=True, null=True, verbose_name="PUC Expiry")
     tax_expiry = models.DateField(blank=True, null=True, verbose_name="Tax Expiry")
+    # Branch office (management.branches); empty when shared by every branch
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['branch', 'vehicle_no'], name='vehicle_branch_idx'),
+        ]
 
     def __str__(self):
         return self.vehicle_no
@@ -69,13 +93,24 @@ class Driver(models.Model):
     fixed_salary = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     wage_rate = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
     is_active = models.BooleanField(default=True)
+    # Branch office (management.branches); empty when shared by every branch
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['branch', 'driver_id'], name='driver_branch_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.driver_id})"
 
 
 # --- 3. Party Master ---
-class PartyMaster(models.Model):
+class PartyMaster(TrackedFieldsMixin, models.Model):
     party_type = models.CharField(
         max_length=20, choices=PARTY_TYPE_CHOICES, default='OTHER', verbose_name="Party Type (Role)"
     )
@@ -101,6 +136,17 @@ class PartyMaster(models.Model):
     orai_charge = models.DecimalField(
         max_digits=10, decimal_places=2, default=Decimal('0.00'), verbose_name="Orai Fixed Charge"
     )
+    # Branch office (management.branches); empty when shared by every branch
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['branch', 'party_type', 'name'], name='party_branch_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.party_type})"
@@ -121,18 +167,47 @@ class ExpenseCategory(models.Model):
 class AccountMaster(models.Model):
     account_name = models.CharField(max_length=100, unique=True)
     account_type = models.CharField(max_length=20, choices=ACCOUNT_TYPE_CHOICES, default='BANK')
-    initial_balance = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    initial_balance = MoneyField(default=Decimal('0.00'))
     is_active = models.BooleanField(default=True)
+    # Branch office (management.branches); empty when shared by every branch
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['branch', 'account_name'], name='account_branch_idx'),
+        ]
 
     def __str__(self):
         return f"{self.account_name} ({self.account_type})"
 
+# --- 6. Location Master (Canonical place names for origin/destination) ---
+class Location(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    state = models.CharField(max_length=50, blank=True, null=True)
+
+    def __str__(self):
+        return self.name
+
+
+# --- 7. Location Alias (Other spellings of a Location, matched by management.locations) ---
+class LocationAlias(models.Model):
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='aliases')
+    alias = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return f"{self.alias} -> {self.location}"
+
+
 # =========================================================================
 # B. CORE OPERATIONAL TABLES
 # =========================================================================
 
-# --- 6. Trip (Added Client FK and calculation logic) ---
-class Trip(models.Model):
+# --- 8. Trip (Added Client FK and calculation logic) ---
+class Trip(TrackedFieldsMixin, models.Model):
     trip_id = models.CharField(
         max_length=15, unique=True, blank=True, editable=False, verbose_name="Trip ID"
     )
@@ -162,35 +237,66 @@ class Trip(models.Model):
     
     origin = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
+    # Set on save when origin/destination match a Location name or alias exactly
+    origin_location = models.ForeignKey(
+        Location, on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name='trips_from'
+    )
+    destination_location = models.ForeignKey(
+        Location, on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name='trips_to'
+    )
     
     # Revenue Fields
-    rate = models.DecimalField(max_digits=10, decimal_places=2)
+    rate = MoneyField()
     weight = models.DecimalField(max_digits=10, decimal_places=2)
     
     # Calculated Fields
-    total_freight = models.DecimalField(
-        max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False
-    )
-    commission_amount = models.DecimalField(
-        max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False
-    )
-    orai_amount = models.DecimalField(
-        max_digits=12, decimal_places=2, default=Decimal('0.00'), editable=False
-    )
+    total_freight = MoneyField(default=Decimal('0.00'), editable=False)
+    commission_amount = MoneyField(default=Decimal('0.00'), editable=False)
+    orai_amount = MoneyField(default=Decimal('0.00'), editable=False)
 
     # Other Financial
-    halting = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
-    advance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    halting = MoneyField(default=Decimal('0.00'))
+    advance = MoneyField(default=Decimal('0.00'))
+    # Deducted by the client for short or damaged delivery (entered at settlement, billed on the invoice)
+    shortage_deduction = MoneyField(default=Decimal('0.00'))
+
+    # Filled from the RouteDistance table on save unless entered by hand (see management.fleet)
+    distance_km = models.PositiveIntegerField(blank=True, null=True, verbose_name="Distance (km)")
 
     # Status
     status = models.CharField(
         max_length=20, choices=TRIP_STATUS_CHOICES, default='PENDING'
     )
+    # Branch office (management.branches); filled on save from the vehicle, else the creating user's branch
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            # Availability checks (management/availability.py) filter on status and
+            # read vehicle/driver and date, so they are answered from these indexes alone.
+            # (SQLite ignores partial indexes for parameterised queries, hence full ones.)
+            models.Index(fields=['status', 'vehicle', 'date'], name='trip_status_vehicle_idx'),
+            models.Index(fields=['status', 'driver', 'date'], name='trip_status_driver_idx'),
+            # Lane lookups (management/lanes.py) match origin/destination case-insensitively.
+            models.Index(Lower(Trim('origin')), Lower(Trim('destination')), name='trip_lane_idx'),
+            # Admin changelist: date_hierarchy drill-down and newest-first ordering.
+            models.Index(fields=['date'], name='trip_date_idx'),
+            # Branch-scoped lists: newest first, and by status.
+            models.Index(fields=['branch', 'date'], name='trip_branch_date_idx'),
+            models.Index(fields=['branch', 'status', 'date'], name='trip_branch_status_idx'),
+        ]
 
-    
     def generate_trip_id(self):
         """Generates a sequential Trip ID: TRP-0001, TRP-0002, etc."""
-        last_id = Trip.objects.all().aggregate(Max('trip_id'))['trip_id__max']
+        # Archived trips keep their IDs, so they count too
+        last_ids = [
+            model.objects.aggregate(Max('trip_id'))['trip_id__max'] for model in (Trip, ArchivedTrip)
+        ]
+        last_id = max(filter(None, last_ids), default=None)
         
         if last_id:
             try:
@@ -206,27 +312,44 @@ class Trip(models.Model):
         return f"TRP-{new_number:04d}"
 
     def save(self, *args, **kwargs):
+        # Derived fields are only recomputed when their inputs changed since the
+        # trip was loaded (TrackedFieldsMixin); new trips compute everything.
+
         # 1. Generate ID on initial creation
         if not self.trip_id:
             self.trip_id = self.generate_trip_id()
 
-        # 2. Calculate Total Freight
-        self.total_freight = self.rate * self.weight
+        # 2. Normalise origin/destination to their Location master spelling
+        if self.has_changed('origin'):
+            self.origin, self.origin_location = canonical_place(self.origin)
+        if self.has_changed('destination'):
+            self.destination, self.destination_location = canonical_place(self.destination)
 
-        # 3. Calculate Commission and Orai from TransporterMaster
-        if self.transporter:
-            # Get the Decimal value from the PartyMaster instance
-            commission_rate = self.transporter.commission_rate
-            orai_charge = self.transporter.orai_charge
+        # 2b. Road distance for the route, unless it was entered by hand
+        if self.distance_km is None or (
+            self.is_tracked() and self.has_changed('origin', 'destination') and not self.has_changed('distance_km')
+        ):
+            self.distance_km = route_distance(self.origin_location_id, self.destination_location_id)
+
+        # 3. Calculate Total Freight
+        if self.has_changed('rate', 'weight'):
+            self.total_freight = round_money(self.rate * self.weight)
+
+        # 4. Calculate Commission and Orai from TransporterMaster
+        if self.transporter_id and self.has_changed('rate', 'weight', 'transporter'):
+            # Read the rates from the master-data cache instead of re-querying PartyMaster
+            transporter = masterdata.get(PartyMaster, self.transporter_id) or self.transporter
+            commission_rate = transporter.commission_rate
+            orai_charge = transporter.orai_charge
             
             # Calculations
             rate_percentage = commission_rate / Decimal(100)
-            self.commission_amount = self.total_freight * rate_percentage
+            self.commission_amount = round_money(self.total_freight * rate_percentage)
             self.orai_amount = orai_charge
         
-        # 4. NEW: Calculate Advance as 80% of Total Freight
-        if self.advance == Decimal('0.00'):
-             self.advance = self.total_freight * Decimal('0.80')
+        # 5. NEW: Calculate Advance as 80% of Total Freight
+        if self.advance == Decimal('0.00') and self.has_changed('rate', 'weight', 'advance'):
+            self.advance = round_money(self.total_freight * Decimal('0.80'))
 
         super().save(*args, **kwargs)
 
@@ -234,8 +357,8 @@ class Trip(models.Model):
         return f"{self.trip_id}: {self.origin} to {self.destination}"
     
 
-# --- 7. Trip Expense (Automatic Transaction Logic Included) ---
-class TripExpense(models.Model):
+# --- 9. Trip Expense (Automatic Transaction Logic Included) ---
+class TripExpense(TrackedFieldsMixin, models.Model):
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE)
     date = models.DateField()
     
@@ -252,11 +375,30 @@ class TripExpense(models.Model):
     )
     
     description = models.CharField(max_length=255, blank=True)
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField()
     bill_no = models.CharField(max_length=50, blank=True, null=True)
+    # Branch office (management.branches); filled on save from the trip
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            # Admin changelist: date_hierarchy drill-down and newest-first ordering.
+            models.Index(fields=['date'], name='trip_expense_date_idx'),
+            models.Index(fields=['branch', 'date'], name='trip_expense_branch_idx'),
+        ]
 
+    def clean(self):
+        AccountingPeriod.check_open(self.date, self.loaded_value('date'))
+
+    @transaction.atomic
     def save(self, *args, **kwargs):
         is_new = self.pk is None # Check if object is being created for the first time
+        if self.has_changed():
+            self.clean()  # no expense (or its ledger withdrawal) inside a closed period
         
         # Save the TripExpense object first to get the PK
         super().save(*args, **kwargs)
@@ -275,14 +417,21 @@ class TripExpense(models.Model):
                 from_account=self.paid_via_account,
                 withdrawal=self.amount,
                 related_trip=self.trip,
+                related_trip_expense=self,
             )
 
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        # Its ledger withdrawal goes with it
+        AccountingPeriod.check_open(self.loaded_value('date'))
+        return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"Exp for {self.trip.trip_id} - {self.expense_category.name}"
 
 
-# --- 8. Maintenance Expense (Tracks Credit/Debit) ---
-class MaintenanceExpense(models.Model):
+# --- 10. Maintenance Expense (Tracks Credit/Debit) ---
+class MaintenanceExpense(TrackedFieldsMixin, models.Model):
     date = models.DateField()
     
     # Links to vehicle and the workshop
@@ -298,7 +447,7 @@ class MaintenanceExpense(models.Model):
     
     description = models.CharField(max_length=255)
     shop = models.CharField(max_length=100, blank=True, null=True, verbose_name="Workshop Location/Name")
-    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Total Bill Amount")
+    amount = MoneyField(verbose_name="Total Bill Amount")
     
     # Credit Tracking Fields
     is_paid = models.BooleanField(default=False, verbose_name="Payment Status")
@@ -309,13 +458,45 @@ class MaintenanceExpense(models.Model):
         AccountMaster, on_delete=models.SET_NULL, blank=True, null=True, 
         related_name='maintenance_payments', verbose_name="Paid From Account"
     )
+    # Branch office (management.branches); filled on save from the vehicle, else the creating user's branch
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            # Admin changelist: date_hierarchy drill-down and newest-first ordering.
+            models.Index(fields=['date'], name='maintenance_date_idx'),
+            models.Index(fields=['branch', 'date'], name='maintenance_branch_idx'),
+        ]
+
+    def clean(self):
+        # The bill belongs to its date and the payment to its payment date, so a
+        # bill from a closed period can still be paid in an open one.
+        if self.has_changed('date', 'vehicle', 'expense_category', 'amount'):
+            AccountingPeriod.check_open(self.date, self.loaded_value('date'))
+        if self.has_changed('is_paid', 'payment_date', 'paid_via_account'):
+            AccountingPeriod.check_open(self.payment_date, self.loaded_value('payment_date'))
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        if self.has_changed():
+            self.clean()  # no bill (or its payment) inside a closed period
+        super().save(*args, **kwargs)
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        AccountingPeriod.check_open(self.loaded_value('date'), self.loaded_value('payment_date'))
+        return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"Maint: {self.vehicle.vehicle_no} - {self.workshop.name}"
 
 
-# --- 9. Docket Table ---
-class DocketTable(models.Model):
+# --- 11. Docket Table ---
+class DocketTable(TrackedFieldsMixin, models.Model):
     # Links
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE)
     driver = models.ForeignKey(Driver, on_delete=models.PROTECT)
@@ -328,19 +509,45 @@ class DocketTable(models.Model):
 
     origin = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
+    origin_location = models.ForeignKey(
+        Location, on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name='dockets_from'
+    )
+    destination_location = models.ForeignKey(
+        Location, on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name='dockets_to'
+    )
     docket_no = models.CharField(max_length=50, unique=True)
     send_date = models.DateField(verbose_name="Docket Sent Date")
     
     # Tracking Status
     challan_received = models.BooleanField(default=False, verbose_name="Challan/Docket Received")
     received_date = models.DateField(blank=True, null=True, verbose_name="Received Date")
+    # Branch office (management.branches); filled on save from the trip
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            # Admin changelist: date_hierarchy drill-down on the sent date.
+            models.Index(fields=['send_date'], name='docket_send_date_idx'),
+            models.Index(fields=['branch', 'send_date'], name='docket_branch_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.has_changed('origin'):
+            self.origin, self.origin_location = canonical_place(self.origin)
+        if self.has_changed('destination'):
+            self.destination, self.destination_location = canonical_place(self.destination)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.docket_no
 
 
-# --- 10. Account Transaction (Financial Ledger) ---
-class AccountTransaction(models.Model):
+# --- 12. Account Transaction (Financial Ledger) ---
+class AccountTransaction(TrackedFieldsMixin, models.Model):
     date = models.DateField()
     description = models.CharField(max_length=255)
     
@@ -355,8 +562,8 @@ class AccountTransaction(models.Model):
     )
     
     # Amount Details
-    withdrawal = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
-    deposit = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    withdrawal = MoneyField(default=Decimal('0.00'))
+    deposit = MoneyField(default=Decimal('0.00'))
     
     # Optional links for automated payments
     related_trip = models.ForeignKey('Trip', on_delete=models.SET_NULL, null=True, blank=True,
@@ -368,6 +575,8 @@ class AccountTransaction(models.Model):
     )
 
     def clean(self):
+        AccountingPeriod.check_open(self.date, self.loaded_value('date'))
+
         if self.withdrawal > 0 and self.deposit > 0:
             raise ValidationError(
                 _('A single transaction cannot have both a Deposit and a Withdrawal.')
@@ -391,20 +600,28 @@ class AccountTransaction(models.Model):
             raise ValidationError(_('A Deposit requires a "To Account".'))
 
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
-        # Validate before saving
-        self.full_clean() # Use full_clean() to call clean() and validate model fields
+        # Validate before saving (unchanged rows are not saved at all, so skip them)
+        if self.has_changed():
+            self.full_clean() # Use full_clean() to call clean() and validate model fields
+        maintenance_changed = self.has_changed('related_maintenance')
         
         super().save(*args, **kwargs)
         
         # --- AUTOMATIC DEBT CLOSURE LOGIC ---
         # If this transaction is related to a Maintenance Expense and that expense is not yet paid, mark it as paid.
-        if self.related_maintenance and not self.related_maintenance.is_paid:
+        if maintenance_changed and self.related_maintenance and not self.related_maintenance.is_paid:
             self.related_maintenance.is_paid = True
             self.related_maintenance.payment_date = self.date
             # Assuming the payment came FROM the account specified in the transaction
             self.related_maintenance.paid_via_account = self.from_account 
-            self.related_maintenance.save()
+            self.related_maintenance.save(update_fields=['is_paid', 'payment_date', 'paid_via_account'])
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        AccountingPeriod.check_open(self.loaded_value('date'))
+        return super().delete(*args, **kwargs)
 
     def __str__(self):
         if self.withdrawal > 0 and self.to_account:
@@ -423,13 +640,16 @@ class AccountTransaction(models.Model):
         help_text="Links to the source Maintenance Expense."
     )
     
+    # The trip links have no database constraint: archived trips and expenses
+    # (management.archive) keep their ids, so the ledger row still names them.
     related_trip_expense = models.ForeignKey(
         'TripExpense', 
         on_delete=models.SET_NULL, 
         null=True, 
         blank=True, 
         related_name='transactions_from_trip_expense',
-        help_text="Links to the source Trip Expense."
+        help_text="Links to the source Trip Expense.",
+        db_constraint=False,
     )
     
     related_trip = models.ForeignKey(
@@ -438,6 +658,790 @@ class AccountTransaction(models.Model):
         null=True, 
         blank=True, 
         related_name='transactions_from_trip',
-        help_text="Links to the source Trip (e.g., for receipts)."
+        help_text="Links to the source Trip (e.g., for receipts).",
+        db_constraint=False,
+    )
+    # Branch office (management.branches); filled on save from the trip, else the account
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            # Admin changelist date_hierarchy, and the open-period reads of management.periods.
+            models.Index(fields=['date'], name='ledger_date_idx'),
+            models.Index(fields=['branch', 'date'], name='ledger_branch_idx'),
+        ]
+
+
+# --- 13. Trip Status Batch (One bulk status change, kept so it can be undone) ---
+class TripStatusBatch(models.Model):
+    target_status = models.CharField(max_length=20, choices=TRIP_STATUS_CHOICES)
+    # {previous status: [trip pks]} for the trips this batch actually changed
+    previous_statuses = models.JSONField(default=dict)
+    trip_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    undone_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.trip_count} trips -> {self.get_target_status_display()} ({self.created_at:%d-%m-%Y %H:%M})"
+
+
+# --- 14. Commission Recompute (Audit of one transporter rate change applied to open trips) ---
+class CommissionRecompute(models.Model):
+    TRIGGER_CHOICES = [
+        ('SAVE', 'Transporter edited'),
+        ('COMMAND', 'recompute_commissions command'),
+    ]
+
+    transporter = models.ForeignKey(PartyMaster, on_delete=models.PROTECT, related_name='commission_recomputes')
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    # Rates before the change are only known when triggered by an edit
+    old_commission_rate = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True)
+    new_commission_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    old_orai_charge = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    new_orai_charge = models.DecimalField(max_digits=10, decimal_places=2)
+    # Totals over the trips that were actually rewritten
+    trip_count = models.PositiveIntegerField(default=0)
+    commission_before = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    commission_after = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    orai_before = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    orai_after = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.transporter.name}: {self.trip_count} trips recomputed ({self.created_at:%d-%m-%Y %H:%M})"
+
+
+# =========================================================================
+# C. PRECOMPUTED / DERIVED TABLES
+# =========================================================================
+
+# --- 15. KPI Tile (Dashboard headline figures, maintained by management.kpis) ---
+class KpiTile(models.Model):
+    key = models.CharField(max_length=50, unique=True)
+    value = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    count = models.IntegerField(default=0)
+    payload = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    # Time-dependent tiles (this month's freight, expiring documents) go stale at this moment.
+    expires_at = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.value} ({self.count})"
+
+
+# --- 16. Lane Rate (Rate/weight statistics per origin -> destination, maintained by management.lanes) ---
+class LaneRate(models.Model):
+    # Lower-cased, trimmed origin/destination; the display spellings are from the latest trip.
+    origin_key = models.CharField(max_length=100)
+    destination_key = models.CharField(max_length=100)
+    origin = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+
+    trip_count = models.PositiveIntegerField(default=0)
+    rate_p25 = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    rate_median = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    rate_p75 = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    weight_p25 = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    weight_median = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    weight_p75 = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+
+    last_rate = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    last_trip_date = models.DateField(blank=True, null=True)
+    # {party pk: {"rate": ..., "date": ..., "trip_id": ...}} for the latest trip per party
+    client_rates = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    transporter_rates = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['origin_key', 'destination_key'], name='unique_lane'),
+        ]
+
+    def __str__(self):
+        return f"{self.origin} -> {self.destination} ({self.trip_count} trips)"
+
+
+# --- 17. Search Entry (One searchable document per indexed row, see management.search) ---
+class SearchEntry(models.Model):
+    # Mirrored into the management_search_fts FTS5 table by triggers (migration 0007).
+    kind = models.CharField(max_length=20)
+    object_pk = models.CharField(max_length=50)
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    tags = models.CharField(max_length=50, blank=True)  # kind, month and year tokens for filtering
+    date = models.DateField(blank=True, null=True)
+    url = models.CharField(max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_pk'], name='unique_search_entry'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.title}"
+
+
+# =========================================================================
+# D. PAYROLL
+# =========================================================================
+
+# --- 18. Driver Advance (Cash handed to a driver, recovered through payroll) ---
+class DriverAdvance(TrackedFieldsMixin, models.Model):
+    driver = models.ForeignKey(Driver, on_delete=models.PROTECT, related_name='advances')
+    date = models.DateField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.CharField(max_length=255, blank=True)
+    paid_via_account = models.ForeignKey(
+        AccountMaster, on_delete=models.SET_NULL, blank=True, null=True,
+        related_name='driver_advances', verbose_name="Paid From Account"
+    )
+    # Set by the payroll run that deducted this advance
+    payroll_run = models.ForeignKey(
+        'PayrollRun', on_delete=models.SET_NULL, blank=True, null=True,
+        related_name='recovered_advances'
+    )
+    # Branch office (management.branches); filled on save from the driver, else the paying account
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        indexes = [
+            # Admin changelist: date_hierarchy drill-down and newest-first ordering.
+            models.Index(fields=['date'], name='driver_advance_date_idx'),
+            models.Index(fields=['branch', 'date'], name='driver_advance_branch_idx'),
+        ]
+
+    def clean(self):
+        AccountingPeriod.check_open(self.date, self.loaded_value('date'))
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        is_new = self.pk is None
+        if self.has_changed('date', 'amount', 'paid_via_account', 'driver'):
+            self.clean()
+        super().save(*args, **kwargs)
+
+        # Money leaves the paying account when the advance is handed over
+        if is_new and self.paid_via_account:
+            AccountTransaction.objects.create(
+                date=self.date,
+                description=f"Driver Advance: {self.driver.name} ({self.driver_id}) - {self.description}",
+                from_account=self.paid_via_account,
+                withdrawal=self.amount,
+            )
+
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        AccountingPeriod.check_open(self.loaded_value('date'))
+        return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"Advance {self.amount} to {self.driver_id} on {self.date}"
+
+
+# --- 19. Payroll Run (One monthly run over the whole driver roster) ---
+class PayrollRun(models.Model):
+    period_start = models.DateField()
+    period_end = models.DateField()
+    paid_via_account = models.ForeignKey(
+        AccountMaster, on_delete=models.PROTECT, related_name='payroll_runs',
+        verbose_name="Salary Paid From"
     )
+    total_net_pay = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period_start', 'period_end'], name='unique_payroll_period'),
+        ]
+
+    def __str__(self):
+        return f"Payroll {self.period_start:%b %Y}"
+
+
+# --- 20. Payslip (One driver's line in a payroll run) ---
+class Payslip(models.Model):
+    payroll_run = models.ForeignKey(PayrollRun, on_delete=models.CASCADE, related_name='payslips')
+    driver = models.ForeignKey(Driver, on_delete=models.PROTECT, related_name='payslips')
+
+    fixed_salary = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    wage_rate = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    trip_count = models.IntegerField(default=0)
+    trip_wages = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    advances = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    cash_expenses = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'),
+        help_text="Trip costs paid in cash (no paying account), deducted from the pay."
+    )
+    net_pay = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    carried_forward = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'),
+        help_text="Deductions beyond the gross pay, carried into the next payroll as a new advance."
+    )
+
+    ledger_transaction = models.OneToOneField(
+        AccountTransaction, on_delete=models.SET_NULL, blank=True, null=True, related_name='payslip'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['payroll_run', 'driver'], name='unique_payslip_per_driver'),
+        ]
+
+    @property
+    def gross_pay(self):
+        return self.fixed_salary + self.trip_wages
+
+    def __str__(self):
+        return f"Payslip {self.driver_id} - {self.payroll_run}"
+
+
+# =========================================================================
+# E. STATEMENT IMPORTS (BANK RECONCILIATION, FASTAG / DIESEL-CARD WALLETS)
+# =========================================================================
+
+STATEMENT_LINE_STATUS_CHOICES = [
+    ('UNMATCHED', 'Unmatched'),
+    ('SUGGESTED', 'Suggested'),
+    ('MATCHED', 'Matched'),
+]
+
+
+# --- 21. Bank Statement (One imported CSV/OFX statement file for a BANK account) ---
+class BankStatement(models.Model):
+    FORMAT_CHOICES = [('CSV', 'CSV'), ('OFX', 'OFX')]
+
+    account = models.ForeignKey(
+        AccountMaster, on_delete=models.PROTECT, related_name='bank_statements',
+        limit_choices_to={'account_type': 'BANK'}
+    )
+    file_name = models.CharField(max_length=255)
+    file_format = models.CharField(max_length=3, choices=FORMAT_CHOICES)
+    period_start = models.DateField(blank=True, null=True)
+    period_end = models.DateField(blank=True, null=True)
+    line_count = models.PositiveIntegerField(default=0)
+    imported_at = models.DateTimeField(auto_now_add=True)
+    reconciled_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.account.account_name}: {self.file_name}"
+
+
+# --- 22. Bank Statement Line (One statement entry and the ledger row it is matched to) ---
+class BankStatementLine(models.Model):
+    statement = models.ForeignKey(BankStatement, on_delete=models.CASCADE, related_name='lines')
+    line_no = models.PositiveIntegerField()
+    date = models.DateField()
+    description = models.CharField(max_length=255, blank=True)
+    reference = models.CharField(max_length=100, blank=True)
+    # Signed: money into the account is positive, money out is negative
+    amount = MoneyField()
+
+    status = models.CharField(max_length=10, choices=STATEMENT_LINE_STATUS_CHOICES, default='UNMATCHED')
+    matched_transaction = models.ForeignKey(
+        AccountTransaction, on_delete=models.SET_NULL, blank=True, null=True, related_name='statement_lines'
+    )
+    score = models.FloatField(blank=True, null=True)
+    matched_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['statement', 'line_no']
+        indexes = [
+            models.Index(fields=['statement', 'status', 'line_no'], name='stmt_line_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['statement', 'line_no'], name='unique_statement_line'),
+            # A ledger row can be confirmed against only one statement line
+            models.UniqueConstraint(
+                fields=['matched_transaction'], condition=models.Q(status='MATCHED'),
+                name='unique_confirmed_match',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.statement_id}/{self.line_no}: {self.amount} on {self.date}"
+
+
+WALLET_LINE_STATUS_CHOICES = [
+    ('MATCHED', 'Matched to trip'),
+    ('REVIEW', 'Needs review'),
+    ('IGNORED', 'Ignored'),
+]
+
+
+# --- 23. Wallet Statement (One imported Fastag or diesel-card statement, see management.wallets) ---
+class WalletStatement(models.Model):
+    account = models.ForeignKey(
+        AccountMaster, on_delete=models.PROTECT, related_name='wallet_statements',
+        limit_choices_to={'account_type__in': ['FASTAG', 'DIESELCARD']}
+    )
+    file_name = models.CharField(max_length=255)
+    period_start = models.DateField(blank=True, null=True)
+    period_end = models.DateField(blank=True, null=True)
+    line_count = models.PositiveIntegerField(default=0)
+    # Lines skipped because the same transaction id was imported before
+    duplicate_count = models.PositiveIntegerField(default=0)
+    imported_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.account.account_name}: {self.file_name}"
+
+
+# --- 24. Wallet Statement Line (One toll or fuel spend, and the trip expense booked for it) ---
+class WalletStatementLine(models.Model):
+    KIND_CHOICES = [('TOLL', 'Toll'), ('FUEL', 'Fuel')]
+
+    statement = models.ForeignKey(WalletStatement, on_delete=models.CASCADE, related_name='lines')
+    line_no = models.PositiveIntegerField()
+    transacted_at = models.DateTimeField()
+    vehicle_text = models.CharField(max_length=30, blank=True, verbose_name="Vehicle (as on statement)")
+    vehicle = models.ForeignKey('management.Vehicle', on_delete=models.SET_NULL, blank=True, null=True)
+    description = models.CharField(max_length=255, blank=True)
+    reference = models.CharField(max_length=100, blank=True, db_index=True)
+    amount = MoneyField()
+    kind = models.CharField(max_length=4, choices=KIND_CHOICES)
+
+    status = models.CharField(max_length=10, choices=WALLET_LINE_STATUS_CHOICES, default='REVIEW')
+    review_reason = models.CharField(max_length=100, blank=True)
+    # No database constraint, like AccountTransaction's trip links: archived trips keep their ids
+    trip = models.ForeignKey(
+        Trip, on_delete=models.SET_NULL, blank=True, null=True, related_name='wallet_lines', db_constraint=False
+    )
+    trip_expense = models.OneToOneField(
+        TripExpense, on_delete=models.SET_NULL, blank=True, null=True, related_name='wallet_line', db_constraint=False
+    )
+
+    class Meta:
+        ordering = ['statement', 'line_no']
+        indexes = [
+            models.Index(fields=['status', 'transacted_at'], name='wallet_line_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['statement', 'line_no'], name='unique_wallet_line'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.amount} {self.vehicle_text} at {self.transacted_at:%d-%m-%Y %H:%M}"
+
+
+# =========================================================================
+# F. ROUTES AND FLEET ANALYTICS
+# =========================================================================
+
+# --- 25. Route Distance (Road distance between two Locations, either direction) ---
+class RouteDistance(models.Model):
+    origin = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='routes_from')
+    destination = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='routes_to')
+    distance_km = models.PositiveIntegerField(verbose_name="Distance (km)")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['origin', 'destination'], name='unique_route'),
+        ]
+
+    @property
+    def route_key(self):
+        """Same for both directions; the master-data cache looks routes up by it."""
+        return route_key(self.origin_id, self.destination_id)
+
+    def clean(self):
+        if self.origin_id and self.origin_id == self.destination_id:
+            raise ValidationError(_('Origin and destination must be different.'))
+        reverse = RouteDistance.objects.filter(origin_id=self.destination_id, destination_id=self.origin_id)
+        if reverse.exclude(pk=self.pk).exists():
+            raise ValidationError(_('This route is already entered in the other direction.'))
+
+    def __str__(self):
+        return f"{self.origin} - {self.destination}: {self.distance_km} km"
+
+
+# --- 26. Monthly Vehicle Stat (Trips, distance, tonnage and costs per vehicle per month, see management.fleet) ---
+class MonthlyVehicleStat(models.Model):
+    vehicle = models.ForeignKey('management.Vehicle', on_delete=models.CASCADE, related_name='monthly_stats')
+    vehicle_type = models.CharField(max_length=50)
+    month = models.DateField(help_text="First day of the month (trips are counted by trip date).")
+
+    trip_count = models.PositiveIntegerField(default=0)
+    # Distance and tonne-km cover only the trips with a known distance (measured_trips)
+    measured_trips = models.PositiveIntegerField(default=0)
+    distance_km = models.PositiveBigIntegerField(default=0)
+    tonnes = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    tonne_km = models.DecimalField(max_digits=18, decimal_places=2, default=Decimal('0.00'))
+
+    freight = MoneyField(default=Decimal('0.00'))
+    fuel_cost = MoneyField(default=Decimal('0.00'))
+    # Fuel spent on the measured trips, the numerator for per-km and per-tonne-km figures
+    measured_fuel_cost = MoneyField(default=Decimal('0.00'))
+    trip_expenses = MoneyField(default=Decimal('0.00'))
+    # All expenses of the measured trips, the numerator for cost per km
+    measured_trip_expenses = MoneyField(default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-month', 'vehicle']
+        indexes = [
+            models.Index(fields=['month', 'vehicle_type'], name='vehicle_stat_month_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle', 'month'], name='unique_vehicle_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} {self.month:%b %Y}: {self.trip_count} trips, {self.distance_km} km"
+
+
+# =========================================================================
+# G. PERIOD CLOSE (see management.periods)
+# =========================================================================
+
+# --- 27. Accounting Period (A closed stretch of the books, ending on period_end) ---
+class AccountingPeriod(models.Model):
+    name = models.CharField(max_length=50)
+    period_start = models.DateField()
+    period_end = models.DateField(unique=True)
+    closed_at = models.DateTimeField(auto_now_add=True)
+    # Ledger rows moved to ArchivedAccountTransaction when the period was closed
+    archived_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-period_end']
+
+    @classmethod
+    def closed_through(cls):
+        """The last day of the latest closed period (from the master-data cache), or None."""
+        periods = masterdata.all(cls)
+        return max(period.period_end for period in periods) if periods else None
+
+    @classmethod
+    def check_open(cls, *days):
+        """
+        Raises ValidationError if any of `days` falls in a closed period.
+        Reads the closed date from the database, not the cache, so a write that
+        calls it inside its transaction cannot slip past a period closed meanwhile.
+        """
+        days = [day for day in days if day]
+        if not days:
+            return
+        closed = cls.objects.aggregate(closed=Max('period_end'))['closed']
+        if closed and any(day <= closed for day in days):
+            raise ValidationError(
+                _('The books are closed through %(date)s. Entries on or before that date cannot be added, changed or deleted.'),
+                code='period_closed', params={'date': closed.strftime('%d-%m-%Y')},
+            )
+
+    def __str__(self):
+        return f"{self.name} ({self.period_start} to {self.period_end})"
+
+
+# --- 28. Account Balance Snapshot (Each account's closing balance at the end of a period) ---
+class AccountBalanceSnapshot(models.Model):
+    period = models.ForeignKey(AccountingPeriod, on_delete=models.CASCADE, related_name='balances')
+    account = models.ForeignKey(AccountMaster, on_delete=models.CASCADE, related_name='balance_snapshots')
+    opening_balance = MoneyField(default=Decimal('0.00'))
+    deposits = MoneyField(default=Decimal('0.00'))
+    withdrawals = MoneyField(default=Decimal('0.00'))
+    closing_balance = MoneyField(default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'account'], name='unique_period_account'),
+        ]
+
+    def __str__(self):
+        return f"{self.account.account_name} at {self.period.period_end}: {self.closing_balance}"
+
+
+# --- 29. Archived Account Transaction (Ledger rows of a closed period, moved out of AccountTransaction) ---
+class ArchivedAccountTransaction(models.Model):
+    # Same id as the live row it was moved from, so a reopened period restores it unchanged
+    id = models.BigIntegerField(primary_key=True)
+    period = models.ForeignKey(AccountingPeriod, on_delete=models.PROTECT, related_name='archived_transactions')
+    date = models.DateField()
+    description = models.CharField(max_length=255)
+    from_account = models.ForeignKey(AccountMaster, on_delete=models.PROTECT, related_name='+')
+    to_account = models.ForeignKey(AccountMaster, on_delete=models.PROTECT, blank=True, null=True, related_name='+')
+    withdrawal = MoneyField(default=Decimal('0.00'))
+    deposit = MoneyField(default=Decimal('0.00'))
+    # Plain ids: the rows they point to may be archived or deleted independently
+    related_trip_id = models.BigIntegerField(blank=True, null=True)
+    related_maintenance_id = models.BigIntegerField(blank=True, null=True)
+    related_maintenance_expense_id = models.BigIntegerField(blank=True, null=True)
+    related_trip_expense_id = models.BigIntegerField(blank=True, null=True)
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+
+    class Meta:
+        ordering = ['date', 'id']
+        indexes = [
+            models.Index(fields=['from_account', 'date'], name='archived_txn_from_idx'),
+            models.Index(fields=['to_account', 'date'], name='archived_txn_to_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.description}"
+
+
+# =========================================================================
+# H. TRIP ARCHIVE (see management.archive)
+# =========================================================================
+
+# --- 30. Archived Trip (A completed trip moved out of Trip, with the same id and trip_id) ---
+class ArchivedTrip(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    trip_id = models.CharField(max_length=15, unique=True, verbose_name="Trip ID")
+    date = models.DateField()
+    vehicle = models.ForeignKey('management.Vehicle', on_delete=models.PROTECT, related_name='+')
+    driver = models.ForeignKey(Driver, on_delete=models.PROTECT, related_name='+')
+    client = models.ForeignKey(PartyMaster, on_delete=models.PROTECT, related_name='+', verbose_name="Client (Consignor)")
+    transporter = models.ForeignKey(
+        PartyMaster, on_delete=models.PROTECT, related_name='+', verbose_name="Transporter (Carrier)"
+    )
+    origin = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    origin_location = models.ForeignKey(Location, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    destination_location = models.ForeignKey(Location, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    rate = MoneyField()
+    weight = models.DecimalField(max_digits=10, decimal_places=2)
+    total_freight = MoneyField(default=Decimal('0.00'))
+    commission_amount = MoneyField(default=Decimal('0.00'))
+    orai_amount = MoneyField(default=Decimal('0.00'))
+    halting = MoneyField(default=Decimal('0.00'))
+    advance = MoneyField(default=Decimal('0.00'))
+    shortage_deduction = MoneyField(default=Decimal('0.00'))
+    distance_km = models.PositiveIntegerField(blank=True, null=True, verbose_name="Distance (km)")
+    status = models.CharField(max_length=20, choices=TRIP_STATUS_CHOICES)
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+    archived_at = models.DateTimeField(auto_now_add=True)
+    objects = BranchQuerySet.as_manager()
+    scoped = BranchScopedManager()
+
+    class Meta:
+        ordering = ['-date', '-id']
+        indexes = [
+            models.Index(fields=['vehicle', 'date'], name='archived_trip_vehicle_idx'),
+            models.Index(fields=['branch', 'date'], name='archived_trip_branch_idx'),
+            # Lane history (management/lanes.py) reads archived trips by lane too
+            models.Index(Lower(Trim('origin')), Lower(Trim('destination')), name='archived_trip_lane_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.trip_id}: {self.origin} to {self.destination} (archived)"
+
+
+# --- 31. Archived Trip Expense (An archived trip's expenses; the ledger rows stay in the ledger) ---
+class ArchivedTripExpense(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    trip = models.ForeignKey(ArchivedTrip, on_delete=models.CASCADE, related_name='expenses')
+    date = models.DateField()
+    expense_category = models.ForeignKey(ExpenseCategory, on_delete=models.PROTECT, related_name='+')
+    paid_via_account = models.ForeignKey(
+        AccountMaster, on_delete=models.SET_NULL, blank=True, null=True, related_name='+', verbose_name="Paid Via Account"
+    )
+    description = models.CharField(max_length=255, blank=True)
+    amount = MoneyField()
+    bill_no = models.CharField(max_length=50, blank=True, null=True)
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+
+    class Meta:
+        ordering = ['date', 'id']
+
+    def __str__(self):
+        return f"{self.expense_category_id} - {self.amount}"
+
+
+# --- 32. Archived Docket (An archived trip's dockets) ---
+class ArchivedDocket(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    trip = models.ForeignKey(ArchivedTrip, on_delete=models.CASCADE, related_name='dockets')
+    driver = models.ForeignKey(Driver, on_delete=models.PROTECT, related_name='+')
+    transporter = models.ForeignKey(PartyMaster, on_delete=models.PROTECT, related_name='+')
+    origin = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    origin_location = models.ForeignKey(Location, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    destination_location = models.ForeignKey(Location, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    docket_no = models.CharField(max_length=50, unique=True)
+    send_date = models.DateField(verbose_name="Docket Sent Date")
+    challan_received = models.BooleanField(default=False, verbose_name="Challan/Docket Received")
+    received_date = models.DateField(blank=True, null=True, verbose_name="Received Date")
+    branch = models.ForeignKey(
+        'management.Branch', on_delete=models.PROTECT, blank=True, null=True, db_index=False, related_name='+'
+    )
+
+    def __str__(self):
+        return self.docket_no
+
+
+# =========================================================================
+# I. CLIENT INVOICING (see management.invoicing)
+# =========================================================================
+
+# --- 33. Invoice Sequence (Last invoice number issued in each fiscal year) ---
+class InvoiceSequence(models.Model):
+    fiscal_year = models.CharField(max_length=7, unique=True, help_text="e.g. 2025-26")
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fiscal_year}: {self.last_number}"
+
+
+# --- 34. Invoice (One client's completed trips in a billing period) ---
+class Invoice(models.Model):
+    number = models.CharField(max_length=30, unique=True)
+    client = models.ForeignKey(
+        PartyMaster, on_delete=models.PROTECT, related_name='invoices',
+        limit_choices_to={'party_type': 'CLIENT'}, verbose_name="Client (Consignor)"
+    )
+    invoice_date = models.DateField()
+    period_start = models.DateField()
+    period_end = models.DateField()
+    # The client's GSTIN when the invoice was raised (it decides CGST+SGST or IGST)
+    client_gst_number = models.CharField(max_length=15, blank=True, verbose_name="Client GST Number")
+
+    freight = MoneyField(default=Decimal('0.00'))
+    halting = MoneyField(default=Decimal('0.00'))
+    shortage = MoneyField(default=Decimal('0.00'), help_text="Shortage/damage deductions")
+    taxable_amount = MoneyField(default=Decimal('0.00'))
+    gst_rate = models.DecimalField(max_digits=5, decimal_places=2, default=Decimal('0.00'), verbose_name="GST %")
+    cgst = MoneyField(default=Decimal('0.00'))
+    sgst = MoneyField(default=Decimal('0.00'))
+    igst = MoneyField(default=Decimal('0.00'))
+    total = MoneyField(default=Decimal('0.00'))
+
+    # The deposit into the receivables account posted for this invoice
+    receivable_entry = models.OneToOneField(
+        AccountTransaction, on_delete=models.SET_NULL, blank=True, null=True, related_name='invoice'
+    )
+    # Rendered file, relative to INVOICE_OUTPUT_DIR (empty until rendered)
+    document = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-invoice_date', '-number']
+        indexes = [
+            models.Index(fields=['client', 'period_start'], name='invoice_client_period_idx'),
+        ]
+
+    @property
+    def gst_total(self):
+        return self.cgst + self.sgst + self.igst
+
+    def __str__(self):
+        return f"{self.number} ({self.client.name})"
+
+
+# --- 35. Invoice Line (One trip on an invoice; a trip is invoiced at most once) ---
+class InvoiceLine(models.Model):
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='lines')
+    # No database constraint: an invoiced trip may later be archived (management.archive) with the same id.
+    trip = models.OneToOneField(
+        Trip, on_delete=models.PROTECT, related_name='invoice_line', db_constraint=False
+    )
+    # Copied from the trip, so the invoice reads the same after the trip is edited or archived
+    trip_code = models.CharField(max_length=15, verbose_name="Trip ID")
+    date = models.DateField()
+    vehicle_no = models.CharField(max_length=15)
+    origin = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    weight = models.DecimalField(max_digits=10, decimal_places=2)
+    rate = MoneyField()
+    freight = MoneyField(default=Decimal('0.00'))
+    halting = MoneyField(default=Decimal('0.00'))
+    shortage = MoneyField(default=Decimal('0.00'))
+    amount = MoneyField(default=Decimal('0.00'), help_text="Freight + halting - shortage")
+
+    class Meta:
+        ordering = ['date', 'id']
+
+    def __str__(self):
+        return f"{self.invoice_id}: {self.trip_code}"
+
+
+# =========================================================================
+# J. BRANCH OFFICES (see management.branches)
+# =========================================================================
+
+# --- 36. Branch (One branch office; its users only see its rows) ---
+class Branch(models.Model):
+    code = models.CharField(max_length=10, unique=True)
+    name = models.CharField(max_length=100)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['code']
+        verbose_name_plural = 'branches'
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+
+# --- 37. User Branch (Ties a user to one branch; users without one are head office) ---
+class UserBranch(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='branch_assignment')
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name='user_assignments')
+
+    def __str__(self):
+        return f"{self.user} -> {self.branch.code}"
+
+
+# =========================================================================
+# K. SCHEDULED JOBS (see management.scheduler)
+# =========================================================================
+
+JOB_RUN_STATUS_CHOICES = [
+    ('RUNNING', 'Running'),
+    ('SUCCESS', 'Succeeded'),
+    ('FAILED', 'Failed'),
+]
+
+
+# --- 38. Scheduled Job (A job's database lock and the last scheduled run claimed for it) ---
+class ScheduledJob(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    # The scheduled minute last claimed, so each slot runs once however many schedulers are up
+    last_slot = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    # Held while running; a crashed run's lock lapses at this time
+    locked_until = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+# --- 39. Job Run (One execution of a scheduled job, with its duration and outcome) ---
+class JobRun(models.Model):
+    job = models.ForeignKey(ScheduledJob, on_delete=models.CASCADE, related_name='runs')
+    # Empty for runs started by hand (`manage.py run_scheduler --run`)
+    scheduled_for = models.DateTimeField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=10, choices=JOB_RUN_STATUS_CHOICES, default='RUNNING')
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(blank=True, null=True)
+    duration = models.FloatField(blank=True, null=True, help_text="Seconds")
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['job', 'started_at'], name='job_run_job_idx'),
+            # History pruning and the admin's date drill-down
+            models.Index(fields=['started_at'], name='job_run_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job.name} at {self.started_at:%Y-%m-%d %H:%M} ({self.status})"
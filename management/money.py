@@ -0,0 +1,100 @@
+# management/money.py
+
+"""
+Money stored as integer paise.
+
+MoneyField keeps the Python side unchanged (amounts are Decimals in rupees,
+rounded to the paisa) but stores an integer number of paise. SQLite then
+sums and compares plain integers instead of text/real DECIMAL values, so
+aggregates are exact and every row is no longer turned into a Decimal.
+
+- Sum('amount') over a MoneyField still returns rupees as a Decimal: the
+  database adds integers and the single result is converted once.
+- PaiseSum / paise_totals() / Paise() return the raw integer paise, for
+  ledgers and reports that keep adding things up in Python; convert the end
+  result with from_paise().
+- SQL expressions over a MoneyField work in paise. Multiply or divide with
+  integers or floats (see commissions.commission_expression), never with
+  Value(Decimal), which SQLite casts back to an integer.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django import forms
+from django.core import exceptions
+from django.db import models
+from django.db.models import ExpressionWrapper, F, Sum
+from django.utils.translation import gettext_lazy as _
+
+PAISE_PER_RUPEE = 100
+CENT = Decimal('0.01')
+
+
+def round_money(amount):
+    """Rounds a Decimal amount to the paisa, half up (the same rounding MoneyField stores)."""
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_paise(amount):
+    """Decimal('12.345') -> 1235"""
+    if isinstance(amount, float):
+        amount = repr(amount)
+    return int((Decimal(amount) * PAISE_PER_RUPEE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_paise(paise):
+    """1235 -> Decimal('12.35')"""
+    if paise is None:
+        return None
+    return (Decimal(int(round(paise))) / PAISE_PER_RUPEE).quantize(CENT)
+
+
+class MoneyField(models.BigIntegerField):
+    """A rupee amount: a Decimal with two places in Python, integer paise in the database."""
+
+    description = _("Amount of money (stored as integer paise)")
+
+    def from_db_value(self, value, expression, connection):
+        return from_paise(value)
+
+    def to_python(self, value):
+        if value is None:
+            return value
+        try:
+            return round_money(repr(value) if isinstance(value, float) else value)
+        except (InvalidOperation, TypeError, ValueError):
+            raise exceptions.ValidationError(
+                _('“%(value)s” value must be a decimal number.'), code='invalid', params={'value': value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return None
+        try:
+            return to_paise(value)
+        except (InvalidOperation, TypeError, ValueError) as e:
+            raise e.__class__(f"Field '{self.name}' expected an amount but got {value!r}.") from e
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'decimal_places': 2,
+            **kwargs,
+        })
+
+
+class PaiseSum(Sum):
+    """SUM of a MoneyField as raw integer paise."""
+
+    output_field = models.BigIntegerField()
+
+
+def Paise(field):
+    """A MoneyField column as raw integer paise, for values()/annotate()."""
+    return ExpressionWrapper(F(field), output_field=models.BigIntegerField())
+
+
+def paise_totals(queryset, group_by, field):
+    """{group_by value: SUM(field) in paise}, one GROUP BY query."""
+    return dict(queryset.values_list(group_by).annotate(total=PaiseSum(field)).order_by())
@@ -0,0 +1,149 @@
+# management/payroll.py
+
+"""
+Monthly driver payroll.
+
+For every driver on the roster:
+    gross   = fixed_salary + wage_rate x trips driven in the period
+    net pay = gross - unrecovered advances - trip costs paid in cash
+
+Cash trip costs are TripExpenses in the period without a paying account,
+excluding Halting Charges, which are revenue.
+
+When the deductions exceed the gross pay, the driver is paid nothing and the
+shortfall is carried forward: a new DriverAdvance dated the day after the
+period, recovered by the next payroll. So every open advance is closed by the
+run, and none of it is lost.
+
+The whole roster is computed with three grouped queries. All payslips, salary
+withdrawals and carried-forward advances are then written with one bulk insert
+each, and the recovered advances are closed with one UPDATE.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .cache import bump_version, masterdata
+from .kpis import refresh_tiles
+from .search import index_objects
+from .models import (
+    AccountingPeriod, AccountTransaction, Driver, DriverAdvance, ExpenseCategory, Payslip, PayrollRun, Trip,
+    TripExpense,
+)
+
+ZERO = Decimal('0.00')
+
+
+def month_bounds(month):
+    """First and last day of the month containing `month` (a date)."""
+    start = month.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def compute_payslips(period_start, period_end):
+    """Unsaved Payslip rows (plus the advance ids they recover) for the whole roster."""
+    trip_counts = dict(
+        Trip.objects.filter(date__range=(period_start, period_end))
+        .exclude(status='CANCELLED')
+        .values_list('driver').annotate(n=Count('pk')).order_by()
+    )
+
+    open_advances = DriverAdvance.objects.filter(payroll_run__isnull=True, date__lte=period_end)
+    advance_totals = dict(open_advances.values_list('driver').annotate(total=Sum('amount')).order_by())
+
+    cash_expenses = TripExpense.objects.filter(
+        date__range=(period_start, period_end), paid_via_account__isnull=True
+    )
+    halting_category = masterdata.get_by(ExpenseCategory, 'name', 'Halting Charges')
+    if halting_category:
+        cash_expenses = cash_expenses.exclude(expense_category=halting_category)
+    cash_totals = dict(cash_expenses.values_list('trip__driver').annotate(total=Sum('amount')).order_by())
+
+    drivers = Driver.objects.filter(
+        Q(is_active=True) | Q(pk__in=list(trip_counts)) | Q(pk__in=list(advance_totals))
+    ).order_by('driver_id')
+
+    payslips = []
+    for driver in drivers:
+        trips = trip_counts.get(driver.pk, 0)
+        trip_wages = driver.wage_rate * trips
+        advances = advance_totals.get(driver.pk) or ZERO
+        cash = cash_totals.get(driver.pk) or ZERO
+        net_pay = driver.fixed_salary + trip_wages - advances - cash
+        payslips.append(Payslip(
+            driver=driver,
+            fixed_salary=driver.fixed_salary,
+            wage_rate=driver.wage_rate,
+            trip_count=trips,
+            trip_wages=trip_wages,
+            advances=advances,
+            cash_expenses=cash,
+            net_pay=max(net_pay, ZERO),
+            carried_forward=max(-net_pay, ZERO),
+        ))
+    advance_ids = list(open_advances.values_list('pk', flat=True))
+    return payslips, advance_ids
+
+
+@transaction.atomic
+def run_payroll(period_start, period_end, paid_via_account, payment_date=None):
+    """Creates the PayrollRun, its payslips and the salary withdrawals in one transaction."""
+    if PayrollRun.objects.filter(period_start__lte=period_end, period_end__gte=period_start).exists():
+        raise ValidationError(f"Payroll already run for a period overlapping {period_start} to {period_end}.")
+
+    payment_date = payment_date or period_end
+    carry_date = period_end + timedelta(days=1)
+    AccountingPeriod.check_open(payment_date, carry_date)
+    payslips, advance_ids = compute_payslips(period_start, period_end)
+
+    run = PayrollRun.objects.create(
+        period_start=period_start,
+        period_end=period_end,
+        paid_via_account=paid_via_account,
+        total_net_pay=sum((slip.net_pay for slip in payslips), ZERO),
+    )
+
+    # One salary withdrawal per driver with something to pay, in a single INSERT
+    payable = [slip for slip in payslips if slip.net_pay > 0]
+    postings = AccountTransaction.objects.bulk_create([
+        AccountTransaction(
+            date=payment_date,
+            description=f"Salary {period_start:%b %Y}: {slip.driver.name} ({slip.driver_id})",
+            from_account=paid_via_account,
+            withdrawal=slip.net_pay,
+            branch_id=paid_via_account.branch_id,
+        )
+        for slip in payable
+    ])
+    for slip, posting in zip(payable, postings):
+        slip.ledger_transaction = posting
+    index_objects(postings)
+
+    for slip in payslips:
+        slip.payroll_run = run
+    Payslip.objects.bulk_create(payslips)
+    DriverAdvance.objects.filter(pk__in=advance_ids).update(payroll_run=run)
+    # No money moves for a carried-forward balance, so these advances have no ledger posting
+    DriverAdvance.objects.bulk_create([
+        DriverAdvance(
+            driver=slip.driver,
+            date=carry_date,
+            amount=slip.carried_forward,
+            description=f"Carried forward from payroll {period_start:%b %Y}",
+            branch_id=slip.driver.branch_id,
+        )
+        for slip in payslips if slip.carried_forward > 0
+    ])
+
+    # bulk_create/update skip the post_save receivers, so refresh what they would have.
+    def after_commit():
+        for label in ('management.AccountTransaction', 'management.DriverAdvance'):
+            bump_version(label)
+        refresh_tiles(['account_balances'])
+    transaction.on_commit(after_commit)
+    return run
@@ -0,0 +1,213 @@
+# management/periods.py
+
+"""
+Accounting period close.
+
+Closing the books through a date (a month end, or a fiscal year end) creates
+an AccountingPeriod from the day after the previous close up to that date and
+an AccountBalanceSnapshot per account: opening balance, deposits,
+withdrawals and closing balance, computed with one grouped query per side
+(the same rules as the account ledger in views.account_detail).
+
+From then on:
+  * balances start from the latest closing snapshot and only add the ledger
+    rows dated after it (open_transactions()), so balance queries no longer
+    scan the whole history;
+  * AccountTransaction, TripExpense, MaintenanceExpense (bill and payment
+    dates) and DriverAdvance refuse to be added, changed or deleted on or
+    before the closed date (AccountingPeriod.check_open), and so do wallet
+    imports and payroll runs;
+  * optionally, the period's ledger rows are moved to
+    ArchivedAccountTransaction with one INSERT ... SELECT and one DELETE.
+    Rows still referenced elsewhere (bank statement matches, payslips) stay in
+    the live table, outside every open-period query.
+
+Only the latest period can be reopened; its archived rows are moved back
+with their original ids. An account's initial_balance only counts until its
+first snapshot.
+"""
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Min, Q, Value
+from django.utils import timezone
+
+from .archive import delete_where, insert_select
+from .cache import bump_version
+from .models import (
+    AccountBalanceSnapshot, AccountingPeriod, AccountMaster, AccountTransaction, ArchivedAccountTransaction,
+    SearchEntry,
+)
+from .money import Paise, from_paise, paise_totals
+from .payroll import month_bounds
+from .search import reindex
+
+# Columns copied between AccountTransaction and ArchivedAccountTransaction (same names in both)
+ARCHIVE_COLUMNS = (
+    'id', 'date', 'description', 'from_account_id', 'to_account_id', 'withdrawal', 'deposit',
+    'related_trip_id', 'related_maintenance_id', 'related_maintenance_expense_id', 'related_trip_expense_id',
+    'branch_id',
+)
+
+
+def fiscal_year_bounds(day):
+    """First and last day of the fiscal year containing `day` (FISCAL_YEAR_START_MONTH, April by default)."""
+    start_month = getattr(settings, 'FISCAL_YEAR_START_MONTH', 4)
+    year = day.year if day.month >= start_month else day.year - 1
+    start = date(year, start_month, 1)
+    return start, date(year + 1, start_month, 1) - timedelta(days=1)
+
+
+def period_name(start, end):
+    """'Apr 2025', 'FY 2025-26', or '01-04-2025 to 15-04-2025'."""
+    if (start, end) == month_bounds(start):
+        return f"{start:%b %Y}"
+    if (start, end) == fiscal_year_bounds(start):
+        return f"FY {start.year}-{str(end.year)[-2:]}"
+    return f"{start:%d-%m-%Y} to {end:%d-%m-%Y}"
+
+
+# ----------------------------------------------------------------------
+# Balances
+# ----------------------------------------------------------------------
+def latest_period():
+    return AccountingPeriod.objects.order_by('-period_end').first()
+
+
+def open_transactions(closed_through=None):
+    """Live ledger rows dated after the last close (the only ones balances need)."""
+    closed_through = closed_through or AccountingPeriod.closed_through()
+    rows = AccountTransaction.objects.all()
+    return rows.filter(date__gt=closed_through) if closed_through else rows
+
+
+def deposit_totals(rows):
+    """{account pk: deposits in paise} over ledger rows, one GROUP BY query."""
+    return paise_totals(rows.filter(to_account__isnull=False), 'to_account', 'deposit')
+
+
+def withdrawal_totals(rows):
+    """{account pk: withdrawals in paise}; a row whose from and to accounts are equal is a receipt, not a withdrawal."""
+    return paise_totals(rows.exclude(to_account=F('from_account')), 'from_account', 'withdrawal')
+
+
+def movements(rows):
+    """(deposit_totals, withdrawal_totals) over ledger rows (the same rules as views.account_detail)."""
+    return deposit_totals(rows), withdrawal_totals(rows)
+
+
+def opening_balances(period=None):
+    """
+    {account pk: balance in paise} at the end of `period` (default: the latest
+    closed period); accounts opened since then start from their initial balance.
+    """
+    period = period or latest_period()
+    balances = dict(AccountMaster.objects.values_list('pk', Paise('initial_balance')))
+    if period:
+        balances.update(period.balances.values_list('account', Paise('closing_balance')))
+    return balances
+
+
+def current_balances():
+    """{account pk: current balance in paise}: the last closing snapshot plus the open-period rows."""
+    period = latest_period()
+    balances = opening_balances(period)
+    deposits, withdrawals = movements(open_transactions(period.period_end if period else None))
+    return {
+        pk: opening + (deposits.get(pk) or 0) - (withdrawals.get(pk) or 0)
+        for pk, opening in balances.items()
+    }
+
+
+# ----------------------------------------------------------------------
+# Closing and reopening
+# ----------------------------------------------------------------------
+@transaction.atomic
+def close_period(end, name=None, archive=False):
+    """
+    Closes the books from the day after the previous close through `end`.
+    Returns the AccountingPeriod.
+    """
+    previous = AccountingPeriod.objects.select_for_update().order_by('-period_end').first()
+    if previous and end <= previous.period_end:
+        raise ValidationError(f"The books are already closed through {previous.period_end:%d-%m-%Y}.")
+    if end >= timezone.localdate():
+        raise ValidationError("Only periods that have already ended can be closed.")
+
+    if previous:
+        start = previous.period_end + timedelta(days=1)
+    else:
+        start = AccountTransaction.objects.aggregate(first=Min('date'))['first'] or end
+        start = min(start, end)
+
+    openings = opening_balances(previous)
+    deposits, withdrawals = movements(AccountTransaction.objects.filter(date__range=(start, end)))
+    period = AccountingPeriod.objects.create(name=name or period_name(start, end), period_start=start, period_end=end)
+    AccountBalanceSnapshot.objects.bulk_create([
+        AccountBalanceSnapshot(
+            period=period,
+            account_id=pk,
+            opening_balance=from_paise(opening),
+            deposits=from_paise(deposits.get(pk) or 0),
+            withdrawals=from_paise(withdrawals.get(pk) or 0),
+            closing_balance=from_paise(opening + (deposits.get(pk) or 0) - (withdrawals.get(pk) or 0)),
+        )
+        for pk, opening in openings.items()
+    ], batch_size=500)
+
+    if archive:
+        archive_period(period)
+    return period
+
+
+def _referenced_elsewhere():
+    """Q matching ledger rows that another table still points at (they cannot leave the live table)."""
+    condition = Q()
+    for relation in AccountTransaction._meta.related_objects:
+        condition |= Q(**{f'{relation.name}__isnull': False})
+    return condition
+
+
+@transaction.atomic
+def archive_period(period):
+    """
+    Moves the period's ledger rows to ArchivedAccountTransaction. Returns the
+    number moved. The rows' search entries are dropped with them.
+    """
+    rows = (
+        AccountTransaction.objects.filter(date__range=(period.period_start, period.period_end))
+        .exclude(_referenced_elsewhere())
+    )
+    moved = insert_select(rows, ArchivedAccountTransaction, ARCHIVE_COLUMNS, [('period_id', Value(period.pk))])
+    archived = ArchivedAccountTransaction.objects.filter(period=period)
+    delete_where(AccountTransaction, archived)
+    for chunk_at in range(0, moved, 2000):
+        ids = [str(pk) for pk in archived.order_by('pk').values_list('pk', flat=True)[chunk_at:chunk_at + 2000]]
+        SearchEntry.objects.filter(kind='ledger', object_pk__in=ids).delete()
+
+    period.archived_count += moved
+    period.save(update_fields=['archived_count'])
+    transaction.on_commit(lambda: bump_version('management.AccountTransaction'))
+    return moved
+
+
+@transaction.atomic
+def reopen_period(period):
+    """Reopens the latest closed period, moving its archived rows back to the live ledger."""
+    latest = AccountingPeriod.objects.select_for_update().order_by('-period_end').first()
+    if latest is None or latest.pk != period.pk:
+        raise ValidationError("Only the most recently closed period can be reopened.")
+
+    archived = ArchivedAccountTransaction.objects.filter(period=period)
+    ids = list(archived.values_list('pk', flat=True))
+    if ids:
+        insert_select(archived, AccountTransaction, ARCHIVE_COLUMNS)
+        archived.delete()
+    period.delete()  # and its balance snapshots
+    for chunk_at in range(0, len(ids), 2000):
+        reindex(AccountTransaction, ids[chunk_at:chunk_at + 2000])
+    transaction.on_commit(lambda: bump_version('management.AccountTransaction'))
+    return len(ids)
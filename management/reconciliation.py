@@ -0,0 +1,375 @@
+# management/reconciliation.py
+
+"""
+Bank statement import and reconciliation against the AccountTransaction ledger.
+
+Statements (CSV exports or OFX files) are stored as BankStatementLine rows
+with a signed amount: money into the account is positive, money out negative,
+matching how views.account_detail signs the ledger.
+
+reconcile() never compares every line with every ledger row. The account's
+ledger rows in the statement period (plus the date window) are loaded once
+into a LedgerIndex: a dict keyed by the exact amount in paise, each bucket
+sorted by date. A line looks up its amount bucket and bisects to the rows
+within RECONCILE_DATE_WINDOW_DAYS, then scores only those on date distance,
+description similarity (trigram Dice, as in management.locations) and
+whether the amount is unique in the window.
+Pairs are assigned best score first, one ledger row per line. Lines with a
+candidate become SUGGESTED; confirm_matches() turns suggestions into MATCHED
+with one UPDATE, so statements with tens of thousands of lines can be
+confirmed in bulk. Ledger rows already confirmed against any statement are
+left out of later runs.
+"""
+
+import csv
+import io
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .locations import normalize_place, trigrams
+from .models import AccountTransaction, BankStatement, BankStatementLine
+from .money import Paise
+
+ParsedLine = namedtuple('ParsedLine', 'date description reference amount')
+
+# Normalised header -> column role, for the CSV exports of the usual Indian banks
+CSV_HEADERS = {
+    'date': ('date', 'txn date', 'transaction date', 'tran date', 'value date', 'posting date', 'value dt'),
+    'description': ('description', 'narration', 'particulars', 'details', 'remarks', 'transaction remarks'),
+    'reference': (
+        'reference', 'ref no', 'reference no', 'chq no', 'cheque no', 'chq ref no', 'ref no cheque no',
+        'chq ref number', 'cheque number', 'utr', 'utr no',
+    ),
+    'debit': ('debit', 'withdrawal', 'withdrawals', 'withdrawal amt', 'withdrawal amount', 'debit amount', 'dr'),
+    'credit': ('credit', 'deposit', 'deposits', 'deposit amt', 'deposit amount', 'credit amount', 'cr'),
+    'amount': ('amount', 'transaction amount'),
+}
+DATE_FORMATS = ('%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%y', '%d-%b-%Y', '%d %b %Y', '%d-%b-%y', '%d.%m.%Y')
+HEADER_SEARCH_ROWS = 30  # bank exports often start with a few lines of account details
+
+_OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.IGNORECASE | re.DOTALL)
+_OFX_ELEMENT = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def default_window():
+    return getattr(settings, 'RECONCILE_DATE_WINDOW_DAYS', 3)
+
+
+def default_min_score():
+    return getattr(settings, 'RECONCILE_MIN_SCORE', 0.5)
+
+
+# ----------------------------------------------------------------------
+# Parsing
+# ----------------------------------------------------------------------
+def parse_date(text):
+    text = (text or '').strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_amount(text):
+    """'1,23,456.50' / '(500.00)' / '' -> Decimal or None"""
+    text = (text or '').strip().replace(',', '').replace('₹', '')
+    negative = text.startswith('(') and text.endswith(')')
+    text = text.strip('()').strip()
+    if text.upper().endswith(('CR', 'DR')):
+        negative = negative or text.upper().endswith('DR')
+        text = text[:-2].strip()
+    if not text:
+        return None
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        return None
+    return -amount if negative else amount
+
+
+def header_roles(row, headers):
+    """{role: column position} for the cells of `row` named in `headers` ({role: normalised names})."""
+    roles = {}
+    for position, cell in enumerate(row):
+        name = normalize_place(cell)
+        for role, names in headers.items():
+            if name in names and role not in roles:
+                roles[role] = position
+    return roles
+
+
+def find_header(rows, headers):
+    """(index of the header row, its roles) for the first row with a date and an amount, debit or credit column."""
+    for header_at, row in enumerate(rows[:HEADER_SEARCH_ROWS]):
+        roles = header_roles(row, headers)
+        if 'date' in roles and ('amount' in roles or 'debit' in roles or 'credit' in roles):
+            return header_at, roles
+    raise ValidationError("Could not find a header row with a date and an amount (or debit/credit) column.")
+
+
+def parse_csv(text):
+    """ParsedLines from a CSV statement with a date column and either debit/credit or signed amount columns."""
+    rows = list(csv.reader(io.StringIO(text)))
+    header_at, roles = find_header(rows, CSV_HEADERS)
+
+    def cell(row, role):
+        position = roles.get(role)
+        return row[position] if position is not None and position < len(row) else ''
+
+    lines = []
+    for row in rows[header_at + 1:]:
+        line_date = parse_date(cell(row, 'date'))
+        if line_date is None:
+            continue  # blank lines, page footers, opening/closing balance rows
+        if 'amount' in roles:
+            amount = parse_amount(cell(row, 'amount'))
+        else:
+            amount = (parse_amount(cell(row, 'credit')) or 0) - (parse_amount(cell(row, 'debit')) or 0)
+        if not amount:
+            continue
+        lines.append(ParsedLine(
+            line_date, cell(row, 'description').strip()[:255], cell(row, 'reference').strip()[:100], amount,
+        ))
+    return lines
+
+
+def parse_ofx(text):
+    """ParsedLines from the <STMTTRN> records of an OFX (SGML or XML) file."""
+    lines = []
+    for block in _OFX_TRANSACTION.findall(text):
+        fields = {tag.upper(): value.strip() for tag, value in _OFX_ELEMENT.findall(block)}
+        line_date = _parse_date_ofx(fields.get('DTPOSTED', ''))
+        amount = parse_amount(fields.get('TRNAMT'))
+        if line_date is None or not amount:
+            continue
+        description = ' '.join(part for part in (fields.get('NAME'), fields.get('MEMO')) if part)
+        reference = fields.get('CHECKNUM') or fields.get('REFNUM') or fields.get('FITID', '')
+        lines.append(ParsedLine(line_date, description[:255], reference[:100], amount))
+    return lines
+
+
+def _parse_date_ofx(text):
+    try:
+        return datetime.strptime(text[:8], '%Y%m%d').date()
+    except ValueError:
+        return None
+
+
+def read_statement(data, file_name):
+    """(file format, ParsedLines) for the uploaded bytes."""
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        text = data.decode('latin-1')
+    if file_name.lower().endswith(('.ofx', '.qfx')) or '<OFX>' in text[:2000].upper():
+        file_format, lines = 'OFX', parse_ofx(text)
+    else:
+        file_format, lines = 'CSV', parse_csv(text)
+    if not lines:
+        raise ValidationError("The statement has no transactions.")
+    return file_format, lines
+
+
+@transaction.atomic
+def import_statement(account, data, file_name):
+    """Stores a statement file's lines for `account` (a BANK account). Returns the BankStatement."""
+    if account.account_type != 'BANK':
+        raise ValidationError("Statements can only be imported for BANK accounts.")
+    file_format, lines = read_statement(data, file_name)
+    statement = BankStatement.objects.create(
+        account=account, file_name=file_name[:255], file_format=file_format,
+        period_start=min(line.date for line in lines), period_end=max(line.date for line in lines),
+        line_count=len(lines),
+    )
+    BankStatementLine.objects.bulk_create([
+        BankStatementLine(statement=statement, line_no=number, **line._asdict())
+        for number, line in enumerate(lines, start=1)
+    ], batch_size=1000)
+    return statement
+
+
+# ----------------------------------------------------------------------
+# Matching
+# ----------------------------------------------------------------------
+def _grams(text):
+    return trigrams(normalize_place(text)) if text else set()
+
+
+def text_similarity(grams, other_grams):
+    """Dice coefficient of two trigram sets."""
+    if not grams or not other_grams:
+        return 0.0
+    return 2 * len(grams & other_grams) / (len(grams) + len(other_grams))
+
+
+class LedgerIndex:
+    """Ledger rows bucketed by exact signed amount in paise, each bucket sorted by date."""
+
+    def __init__(self, rows):
+        buckets = defaultdict(list)
+        self.descriptions = {}
+        for pk, row_date, amount, description in rows:
+            buckets[amount].append((row_date.toordinal(), pk))
+            self.descriptions[pk] = description
+        self.buckets = {}
+        for amount, entries in buckets.items():
+            entries.sort()
+            self.buckets[amount] = ([day for day, _ in entries], [pk for _, pk in entries])
+        self._texts = {}
+
+    def candidates(self, amount, day, window):
+        """(pk, days apart) for the rows with this amount dated within `window` days of `day`."""
+        bucket = self.buckets.get(amount)
+        if bucket is None:
+            return []
+        days, pks = bucket
+        start, end = bisect_left(days, day - window), bisect_right(days, day + window)
+        return [(pks[i], abs(days[i] - day)) for i in range(start, end)]
+
+    def text(self, pk):
+        """(normalised description, its trigrams), computed once per row."""
+        if pk not in self._texts:
+            normalized = normalize_place(self.descriptions[pk])
+            self._texts[pk] = (normalized, trigrams(normalized) if normalized else set())
+        return self._texts[pk]
+
+
+def account_ledger(account, start, end):
+    """(pk, date, signed paise, description) for the account's unconfirmed ledger rows between two dates."""
+    rows = (
+        AccountTransaction.objects
+        .filter(Q(from_account=account) | Q(to_account=account), date__range=(start, end))
+        .exclude(statement_lines__status='MATCHED')
+        .values_list('pk', 'date', 'from_account_id', 'to_account_id', Paise('deposit'), Paise('withdrawal'), 'description')
+    )
+    for pk, row_date, from_id, to_id, deposit, withdrawal, description in rows:
+        # Same signs as the ledger in views.account_detail
+        if to_id == account.pk:
+            amount = deposit
+        elif from_id == account.pk:
+            amount = -withdrawal
+        else:
+            continue
+        if amount:
+            yield pk, row_date, amount, description
+
+
+def score_pair(days_apart, window, only_candidate, line_grams, reference, ledger_text, ledger_grams):
+    """
+    0-1 for a pair whose amounts already agree: 50% date closeness, 30%
+    description similarity, 20% for being the only ledger row with that amount
+    in the window. A statement reference (cheque/UTR number) that appears in
+    the ledger description counts as identical text.
+    """
+    date_score = 1 - days_apart / (window + 1)
+    if len(reference) >= 4 and reference in ledger_text:
+        text_score = 1.0
+    else:
+        text_score = text_similarity(line_grams, ledger_grams)
+    return round(0.5 * date_score + 0.3 * text_score + (0.2 if only_candidate else 0), 4)
+
+
+def _write_suggestions(suggestions):
+    """
+    One parameterised UPDATE per line via executemany. bulk_update() builds a
+    CASE expression per batch, which takes seconds of Python time at this size.
+    """
+    quote = connection.ops.quote_name
+    table = quote(BankStatementLine._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {table} SET {quote('status')} = 'SUGGESTED', {quote('matched_transaction_id')} = %s, "
+            f"{quote('score')} = %s WHERE {quote('id')} = %s",
+            [(ledger_pk, score, pk) for pk, (ledger_pk, score) in suggestions.items()],
+        )
+
+
+@transaction.atomic
+def reconcile(statement, window=None, threshold=None):
+    """
+    Suggests a ledger row for every statement line that is not yet MATCHED.
+    Returns {'suggested': n, 'unmatched': n}.
+    """
+    window = default_window() if window is None else window
+    threshold = default_min_score() if threshold is None else threshold
+    open_lines = statement.lines.exclude(status='MATCHED')
+    lines = list(open_lines.values_list('pk', 'date', Paise('amount'), 'description', 'reference'))
+
+    suggestions = {}
+    if lines:
+        first = min(line[1] for line in lines).toordinal() - window
+        last = max(line[1] for line in lines).toordinal() + window
+        index = LedgerIndex(account_ledger(
+            statement.account, datetime.fromordinal(first).date(), datetime.fromordinal(last).date(),
+        ))
+
+        pairs = []
+        for pk, line_date, amount, description, reference in lines:
+            candidates = index.candidates(amount, line_date.toordinal(), window)
+            if not candidates:
+                continue
+            line_grams = _grams(description)
+            reference = normalize_place(reference)
+            for ledger_pk, days_apart in candidates:
+                score = score_pair(
+                    days_apart, window, len(candidates) == 1, line_grams, reference, *index.text(ledger_pk),
+                )
+                if score >= threshold:
+                    pairs.append((score, pk, ledger_pk))
+
+        # Best pairs first; each line and each ledger row is used once
+        pairs.sort(key=lambda pair: (-pair[0], pair[1]))
+        used = set()
+        for score, pk, ledger_pk in pairs:
+            if pk not in suggestions and ledger_pk not in used:
+                suggestions[pk] = (ledger_pk, score)
+                used.add(ledger_pk)
+
+    open_lines.update(status='UNMATCHED', matched_transaction=None, score=None, matched_at=None)
+    _write_suggestions(suggestions)
+
+    statement.reconciled_at = timezone.now()
+    statement.save(update_fields=['reconciled_at'])
+    return {'suggested': len(suggestions), 'unmatched': len(lines) - len(suggestions)}
+
+
+@transaction.atomic
+def confirm_matches(statement, line_ids=None, min_score=None):
+    """
+    Confirms SUGGESTED lines (all of them, the given ids, and/or those scoring at
+    least `min_score`) with one UPDATE. Returns the number confirmed.
+    """
+    lines = statement.lines.filter(status='SUGGESTED', matched_transaction__isnull=False)
+    if line_ids is not None:
+        lines = lines.filter(pk__in=line_ids)
+    if min_score is not None:
+        lines = lines.filter(score__gte=min_score)
+    # A ledger row confirmed elsewhere since the suggestion was made stays suggested here
+    lines = lines.exclude(matched_transaction__statement_lines__status='MATCHED')
+    return BankStatementLine.objects.filter(pk__in=lines.values('pk')).update(
+        status='MATCHED', matched_at=timezone.now(),
+    )
+
+
+def unmatch_lines(statement, line_ids):
+    """Puts matched or suggested lines back to UNMATCHED. Returns the number changed."""
+    return statement.lines.filter(pk__in=line_ids).exclude(status='UNMATCHED').update(
+        status='UNMATCHED', matched_transaction=None, score=None, matched_at=None,
+    )
+
+
+def statement_summary(statement):
+    """{status: line count} for one statement, one GROUP BY query."""
+    counts = dict(statement.lines.values_list('status').annotate(n=Count('pk')).order_by())
+    return {status: counts.get(status, 0) for status in ('MATCHED', 'SUGGESTED', 'UNMATCHED')}
@@ -0,0 +1,138 @@
+# management/routers.py
+
+"""
+Read-only reporting database routing.
+
+Report and export code runs inside `reporting_db()` (a context manager and
+view/function decorator). While it is active, reads go to the replica named
+by settings.REPORTING_DATABASE_ALIAS; writes always go to 'default'.
+
+The replica is either:
+  * the snapshot file at settings.REPORTING_SNAPSHOT_PATH, copied from the
+    primary with SQLite's online backup API by `manage.py refresh_reporting_snapshot`, or
+  * any other database configured under that alias (REPORTING_SNAPSHOT_PATH = None),
+    which is then assumed to be kept current by whatever replicates it.
+
+Each caller states how stale its data may be (`max_staleness`, seconds). When
+the snapshot is missing or older than that, the reads fall back to the primary.
+"""
+
+import contextvars
+import os
+import time
+from contextlib import ContextDecorator
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+_read_alias = contextvars.ContextVar('reporting_read_alias', default=None)
+
+
+def reporting_alias():
+    alias = getattr(settings, 'REPORTING_DATABASE_ALIAS', None)
+    if alias and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+def snapshot_age():
+    """
+    Seconds since the reporting snapshot was refreshed, 0 for an externally
+    managed replica, or None when no replica is available.
+    """
+    if reporting_alias() is None:
+        return None
+    path = getattr(settings, 'REPORTING_SNAPSHOT_PATH', None)
+    if path is None:
+        return 0
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class reporting_db(ContextDecorator):
+    """
+    Routes reads to the reporting replica for the duration of the block.
+
+        @reporting_db(max_staleness=300)
+        def fleet_report(request): ...
+
+    Views may be forced onto the primary with ?fresh=1.
+    """
+
+    def __init__(self, max_staleness=None):
+        if max_staleness is None:
+            max_staleness = getattr(settings, 'REPORTING_MAX_STALENESS', 300)
+        self.max_staleness = max_staleness
+        self._token = None
+
+    def _recreate_cm(self):
+        # A fresh instance per decorated call keeps concurrent requests independent.
+        return type(self)(self.max_staleness)
+
+    def __call__(self, func):
+        decorated = super().__call__(func)
+
+        @wraps(func)
+        def _wrapped(*args, **kwargs):
+            request = args[0] if args else None
+            if getattr(request, 'GET', {}).get('fresh'):
+                return func(*args, **kwargs)
+            return decorated(*args, **kwargs)
+        return _wrapped
+
+    def __enter__(self):
+        age = snapshot_age()
+        alias = reporting_alias() if age is not None and age <= self.max_staleness else None
+        self._token = _read_alias.set(alias)
+        return alias or 'default'
+
+    def __exit__(self, *exc):
+        _read_alias.reset(self._token)
+        return False
+
+
+class ReportingRouter:
+    """Sends reads inside reporting_db() to the replica; everything else to 'default'."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica rows are copies of primary rows, so relations between them are fine.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == reporting_alias():
+            return False
+        return None
+
+
+def refresh_snapshot(source_alias='default', path=None):
+    """
+    Copies the primary SQLite database to REPORTING_SNAPSHOT_PATH (or `path`, as
+    the nightly backup job does) with the online backup API and atomically swaps
+    it into place. Returns the snapshot path.
+    """
+    import sqlite3
+
+    path = str(path or settings.REPORTING_SNAPSHOT_PATH)
+    tmp_path = f"{path}.tmp"
+    source = connections[source_alias]
+    source.ensure_connection()
+
+    target = sqlite3.connect(tmp_path)
+    try:
+        # Copies in steps of 1000 pages, so writers on the primary are only paused briefly.
+        source.connection.backup(target, pages=1000)
+        # The replica is opened read-only, which needs a rollback journal rather than WAL.
+        target.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        target.close()
+    os.replace(tmp_path, path)
+    return path
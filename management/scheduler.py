@@ -0,0 +1,278 @@
+# management/scheduler.py
+
+"""
+In-process scheduler for the periodic maintenance jobs (see management.jobs).
+
+`manage.py run_scheduler` wakes once a minute, finds the registered jobs whose
+cron spec matches that minute and hands them to a thread pool, so the heavy
+work (snapshots, rollups, backups) never runs on a request.
+
+  * Jobs are plain functions registered with @job(name, schedule). The spec is
+    a five-field cron expression (minute hour day-of-month month day-of-week,
+    with *, lists, ranges and steps) or one of the @hourly/@daily/... aliases.
+    settings.SCHEDULED_JOBS overrides a job's schedule by name; None disables it.
+  * Several schedulers may run against one database (one per host, or a spare).
+    Before running, a scheduler claims the job's ScheduledJob row with a single
+    conditional UPDATE: the row must be unlocked (or its lock lapsed) and the
+    minute not already claimed. So each scheduled run happens exactly once,
+    and a slow job is never started twice.
+  * Every run is recorded as a JobRun with its duration, result or traceback.
+
+Times in specs are local time (settings.TIME_ZONE).
+"""
+
+import os
+import socket
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import JobRun, ScheduledJob
+
+ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+# (name, lowest, highest) of the five cron fields
+CRON_FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+
+# next_run() gives up on specs that never match (e.g. 30 February) after this long
+SEARCH_LIMIT = timedelta(days=5 * 366)
+
+
+# ----------------------------------------------------------------------
+# Cron specs
+# ----------------------------------------------------------------------
+def _parse_field(text, name, low, high):
+    values = set()
+    for part in text.split(','):
+        base, _, step_text = part.partition('/')
+        try:
+            step = int(step_text) if step_text else 1
+            if base == '*':
+                start, end = low, high
+            elif '-' in base:
+                start, end = (int(value) for value in base.split('-', 1))
+            else:
+                start = int(base)
+                # "5/15" means every 15 from 5
+                end = high if step_text else start
+        except ValueError:
+            raise ValueError(f"Invalid {name} field '{text}'.")
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f"Invalid {name} field '{text}' (allowed {low}-{high}).")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSpec:
+    """A parsed cron expression: CronSpec('*/15 6-20 * * 1-5').matches(moment)."""
+
+    def __init__(self, spec):
+        self.spec = spec
+        fields = ALIASES.get(spec.strip().lower(), spec).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron spec '{spec}' needs five fields: minute hour day month weekday.")
+        parsed = [_parse_field(text, *field) for text, field in zip(fields, CRON_FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = frozenset(day % 7 for day in weekdays)  # 7 is Sunday too
+        # As in cron: when both day fields are restricted, a day matching either one runs
+        self.any_day = fields[2] == '*' or fields[4] == '*'
+
+    def __repr__(self):
+        return f"CronSpec({self.spec!r})"
+
+    def _day_matches(self, day):
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        return in_days and in_weekdays if self.any_day else in_days or in_weekdays
+
+    def matches(self, moment):
+        local = timezone.localtime(moment) if timezone.is_aware(moment) else moment
+        return (
+            local.minute in self.minutes and local.hour in self.hours
+            and local.month in self.months and self._day_matches(local)
+        )
+
+    def next_run(self, after):
+        """The first matching minute after `after` (aware), or None if there is none within SEARCH_LIMIT."""
+        moment = timezone.localtime(after).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + SEARCH_LIMIT
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return timezone.make_aware(moment)
+        return None
+
+
+# ----------------------------------------------------------------------
+# Job registry
+# ----------------------------------------------------------------------
+@dataclass
+class Job:
+    name: str
+    func: object
+    default_schedule: str
+    # Seconds a run may hold the lock before another scheduler may assume it crashed
+    lock_timeout: int
+    description: str = ''
+
+    @property
+    def schedule(self):
+        """The effective cron spec (settings.SCHEDULED_JOBS overrides the default), or None when disabled."""
+        overrides = getattr(settings, 'SCHEDULED_JOBS', {})
+        return overrides.get(self.name, self.default_schedule)
+
+    @property
+    def cron(self):
+        return CronSpec(self.schedule) if self.schedule else None
+
+
+JOBS = {}
+
+
+def job(name, schedule, lock_timeout=3600):
+    """
+    Registers a function as a scheduled job:
+
+        @job('lane_rates', '0 2 * * *')
+        def rebuild_lane_rates():
+            return f"{rebuild_lanes()} lanes"
+
+    The return value, if any, is stored as the run's result.
+    """
+    def register(func):
+        CronSpec(schedule)  # fail at import on a bad spec
+        doc = (func.__doc__ or '').strip()
+        JOBS[name] = Job(name, func, schedule, lock_timeout, doc.splitlines()[0] if doc else '')
+        return func
+    return register
+
+
+def load_jobs():
+    """Imports the built-in jobs and returns the registry, checking settings.SCHEDULED_JOBS."""
+    from . import jobs  # noqa: F401
+
+    unknown = set(getattr(settings, 'SCHEDULED_JOBS', {})) - set(JOBS)
+    if unknown:
+        raise ValueError(f"SCHEDULED_JOBS names unknown jobs: {', '.join(sorted(unknown))}")
+    for registered in JOBS.values():
+        registered.cron  # validates overridden specs
+    return JOBS
+
+
+def due_jobs(slot):
+    """The enabled jobs whose schedule matches the minute `slot`."""
+    return [registered for registered in JOBS.values() if registered.cron and registered.cron.matches(slot)]
+
+
+# ----------------------------------------------------------------------
+# Locking and running
+# ----------------------------------------------------------------------
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(registered, slot=None, worker=None):
+    """
+    Takes the job's lock in one UPDATE, and for a scheduled run (`slot`) also
+    claims that minute. Returns False when another run holds the lock or the
+    slot was already claimed.
+    """
+    now = timezone.now()
+    ScheduledJob.objects.get_or_create(name=registered.name)
+    rows = ScheduledJob.objects.filter(name=registered.name).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lte=now)
+    )
+    updates = {'locked_by': worker or worker_name(), 'locked_until': now + timedelta(seconds=registered.lock_timeout)}
+    if slot is not None:
+        rows = rows.filter(Q(last_slot__isnull=True) | Q(last_slot__lt=slot))
+        updates['last_slot'] = slot
+    return rows.update(**updates) == 1
+
+
+def release(registered, worker=None):
+    ScheduledJob.objects.filter(name=registered.name, locked_by=worker or worker_name()).update(
+        locked_by='', locked_until=None
+    )
+
+
+def run_job(registered, slot=None, worker=None):
+    """
+    Claims and runs one job, recording a JobRun. Returns the run, or None when
+    the job was locked or its slot already taken by another scheduler.
+    """
+    worker = worker or worker_name()
+    if not claim(registered, slot, worker):
+        return None
+    run = JobRun.objects.create(
+        job=ScheduledJob.objects.get(name=registered.name), scheduled_for=slot, worker=worker,
+        started_at=timezone.now(),
+    )
+    started = time.monotonic()
+    try:
+        result = registered.func()
+    except Exception:
+        run.status, run.error = 'FAILED', traceback.format_exc()
+    else:
+        run.status, run.result = 'SUCCESS', '' if result is None else str(result)
+    finally:
+        run.duration = time.monotonic() - started
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'result', 'error', 'duration', 'finished_at'])
+        release(registered, worker)
+    return run
+
+
+def run_in_worker(registered, slot=None, worker=None):
+    """run_job() for a pool thread, which must not keep its own database connection open."""
+    try:
+        return run_job(registered, slot, worker)
+    finally:
+        connection.close()
+
+
+def minute_slot(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def slots_between(last, now):
+    """The minute slots after `last` up to and including `now`'s (just `now`'s on the first pass)."""
+    current = minute_slot(now)
+    if last is None or last >= current:
+        return [current] if last is None else []
+    # After a stall (suspend, long GC) catch up, but at most an hour of missed minutes
+    first = max(last + timedelta(minutes=1), current - timedelta(minutes=59))
+    return [first + timedelta(minutes=step) for step in range(int((current - first).total_seconds() // 60) + 1)]
+
+
+def prune_history(days=None):
+    """Deletes job runs older than SCHEDULER_HISTORY_DAYS. Returns the number deleted."""
+    days = days if days is not None else getattr(settings, 'SCHEDULER_HISTORY_DAYS', 90)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = JobRun.objects.filter(started_at__lt=cutoff).delete()
+    return deleted
+
+
+def local_datetime(moment):
+    """For display: an aware moment in local time, without seconds."""
+    return timezone.localtime(moment).strftime('%Y-%m-%d %H:%M') if moment else '-'
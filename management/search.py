@@ -0,0 +1,343 @@
+# management/search.py
+
+"""
+Global full-text search.
+
+Each indexed row (trip, party, vehicle, driver, docket, trip expense, ledger
+transaction) has one SearchEntry holding a title, a body of searchable text, a
+date and a link. Triggers copy SearchEntry into the management_search_fts
+FTS5 table, so a search is one MATCH over the FTS index, ranked with bm25.
+Title matches weigh more than body matches. The kind and month/year of each
+entry are indexed as tag tokens, so filtering by them is part of the same
+MATCH instead of a scan over the matching rows. So is the branch of each entry
+(management.branches): 'b<pk>', or 'bshared' for master rows every branch sees,
+which search(branch=...) restricts to.
+
+Entries are written in the same transaction as their source row by the
+post_save/post_delete receivers below. Bulk writes (bulk_create, update) must
+call index_objects() themselves. `manage.py rebuild_search_index` rebuilds
+everything, e.g. after renaming a party that appears in many trip entries.
+"""
+
+import calendar
+import re
+from datetime import date
+
+from django.apps import apps
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .branches import BRANCH_SOURCES
+from .cache import masterdata
+from .models import AccountMaster, Driver, ExpenseCategory, PartyMaster, SearchEntry
+
+FTS_TABLE = 'management_search_fts'
+TITLE_WEIGHT, BODY_WEIGHT = 10.0, 1.0
+# Branch tag of master rows without a branch (shared by every branch)
+SHARED_TAG = 'bshared'
+
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def _name(model, pk):
+    row = masterdata.get(model, pk)
+    return str(row) if row else ''
+
+
+# ----------------------------------------------------------------------
+# Documents: source row -> SearchEntry fields
+# ----------------------------------------------------------------------
+def trip_document(trip):
+    return {
+        'title': f"Trip {trip.trip_id}: {trip.origin} to {trip.destination}",
+        'body': _join(
+            trip.vehicle_id, _name(Driver, trip.driver_id), _name(PartyMaster, trip.client_id),
+            _name(PartyMaster, trip.transporter_id), trip.get_status_display(),
+        ),
+        'date': trip.date,
+        'url': reverse('trip_detail', args=[trip.trip_id]),
+    }
+
+
+def party_document(party):
+    return {
+        'title': _join(party.name, f"({party.get_party_type_display()})"),
+        'body': _join(party.nick_name, party.contact_person, party.phone_number, party.email, party.gst_number, party.pan_number),
+        'date': None,
+        'url': reverse('party_detail', args=[party.pk]),
+    }
+
+
+def vehicle_document(vehicle):
+    return {
+        'title': f"Vehicle {vehicle.vehicle_no}",
+        'body': _join(vehicle.vehicle_type, vehicle.ownership, vehicle.owner_name, vehicle.national_permit),
+        'date': None,
+        'url': reverse('vehicle_update', args=[vehicle.pk]),
+    }
+
+
+def driver_document(driver):
+    return {
+        'title': f"Driver {driver.name} ({driver.driver_id})",
+        'body': _join(driver.mobile, driver.license_no),
+        'date': None,
+        'url': reverse('driver_update', args=[driver.pk]),
+    }
+
+
+def docket_document(docket):
+    trip_id = docket.trip.trip_id
+    return {
+        'title': f"Docket {docket.docket_no}: {docket.origin} to {docket.destination}",
+        'body': _join(trip_id, _name(Driver, docket.driver_id), _name(PartyMaster, docket.transporter_id)),
+        'date': docket.send_date,
+        'url': reverse('trip_detail', args=[trip_id]),
+    }
+
+
+def trip_expense_document(expense):
+    trip_id, vehicle_no = expense.trip.trip_id, expense.trip.vehicle_id
+    category = _name(ExpenseCategory, expense.expense_category_id)
+    return {
+        'title': f"{category} {expense.amount} on {trip_id}",
+        'body': _join(expense.description, vehicle_no, expense.bill_no, _name(AccountMaster, expense.paid_via_account_id)),
+        'date': expense.date,
+        'url': reverse('trip_detail', args=[trip_id]),
+    }
+
+
+def transaction_document(txn):
+    account_id = txn.from_account_id or txn.to_account_id
+    try:
+        related_trip = txn.related_trip.trip_id if txn.related_trip else ''
+    except ObjectDoesNotExist:
+        related_trip = ''  # the trip has been archived (management.archive)
+    return {
+        'title': _join(txn.description, txn.deposit or txn.withdrawal),
+        'body': _join(_name(AccountMaster, txn.from_account_id), _name(AccountMaster, txn.to_account_id), related_trip),
+        'date': txn.date,
+        'url': reverse('account_detail', args=[account_id]) if account_id else '',
+    }
+
+
+# Model label -> (kind, document builder, relations the builder reads)
+SEARCH_SOURCES = {
+    'management.Trip': ('trip', trip_document, ()),
+    'management.PartyMaster': ('party', party_document, ()),
+    'management.Vehicle': ('vehicle', vehicle_document, ()),
+    'management.Driver': ('driver', driver_document, ()),
+    'management.DocketTable': ('docket', docket_document, ('trip',)),
+    'management.TripExpense': ('expense', trip_expense_document, ('trip',)),
+    'management.AccountTransaction': ('ledger', transaction_document, ('related_trip',)),
+}
+KIND_LABELS = {
+    'trip': 'Trip', 'party': 'Party', 'vehicle': 'Vehicle', 'driver': 'Driver',
+    'docket': 'Docket', 'expense': 'Trip Expense', 'ledger': 'Ledger',
+}
+
+
+# ----------------------------------------------------------------------
+# Indexing
+# ----------------------------------------------------------------------
+def branch_tag(obj):
+    """'b3' for a row of branch 3, SHARED_TAG for a master row without a branch, else ''."""
+    if obj.branch_id is not None:
+        return f"b{obj.branch_id}"
+    # Operational rows without a branch are only seen with all branches in view
+    return SHARED_TAG if not BRANCH_SOURCES[obj._meta.label] else ''
+
+
+def entry_tags(kind, entry_date, branch=''):
+    """'ledger m202603 y2026 b3': the kind, period and branch tokens that search filters match on."""
+    if entry_date is None:
+        return _join(kind, branch)
+    return _join(kind, f"m{entry_date:%Y%m}", f"y{entry_date:%Y}", branch)
+
+
+def period_tag(date_range):
+    """FTS tag expression for a parse_query() date range (a calendar month or year)."""
+    start, end = date_range
+    if start.month == end.month:
+        return f'"m{start:%Y%m}"'
+    return f'"y{start:%Y}"'
+
+
+def _entry(obj):
+    kind, document, _ = SEARCH_SOURCES[obj._meta.label]
+    fields = document(obj)
+    tags = entry_tags(kind, fields['date'], branch_tag(obj))
+    return SearchEntry(kind=kind, object_pk=str(obj.pk), tags=tags, **fields)
+
+
+def index_object(obj):
+    entry = _entry(obj)
+    SearchEntry.objects.update_or_create(
+        kind=entry.kind, object_pk=entry.object_pk,
+        defaults={'title': entry.title, 'body': entry.body, 'tags': entry.tags, 'date': entry.date, 'url': entry.url},
+    )
+
+
+def index_objects(objs):
+    """Indexes many rows of one model with one DELETE and one bulk INSERT (for bulk writes)."""
+    entries = [_entry(obj) for obj in objs]
+    if not entries:
+        return
+    with transaction.atomic():
+        SearchEntry.objects.filter(
+            kind=entries[0].kind, object_pk__in=[entry.object_pk for entry in entries]
+        ).delete()
+        SearchEntry.objects.bulk_create(entries, batch_size=500)
+
+
+def reindex(model, pks):
+    """Re-indexes the given rows of `model`, loading them with the relations their documents read."""
+    related = SEARCH_SOURCES[model._meta.label][2]
+    index_objects(model.objects.select_related(*related).filter(pk__in=list(pks)))
+
+
+def unindex_object(obj):
+    kind = SEARCH_SOURCES[obj._meta.label][0]
+    SearchEntry.objects.filter(kind=kind, object_pk=str(obj.pk)).delete()
+
+
+def rebuild_index(chunk_size=2000):
+    """Re-creates every SearchEntry from the source tables. Returns {kind: rows}."""
+    counts = {}
+    for label, (kind, _, related) in SEARCH_SOURCES.items():
+        model = apps.get_model(label)
+        SearchEntry.objects.filter(kind=kind).delete()
+        last_pk, counts[kind] = None, 0
+        while True:
+            chunk = model.objects.select_related(*related).order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            SearchEntry.objects.bulk_create([_entry(obj) for obj in chunk], batch_size=500)
+            counts[kind] += len(chunk)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return counts
+
+
+# ----------------------------------------------------------------------
+# Querying
+# ----------------------------------------------------------------------
+_TOKEN = re.compile(r'\w+')
+_MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+CANDIDATE_LIMIT = 5000
+_STOP_WORDS = {'a', 'an', 'and', 'for', 'in', 'last', 'of', 'on', 'the', 'to'}
+
+
+def parse_query(text, today=None):
+    """
+    Splits a search box query into FTS terms and an optional date range.
+    Month names (and a 4-digit year) become a date filter, so "diesel MH12 last
+    March" searches 'diesel' and 'MH12*' within the most recent March.
+    """
+    today = today or timezone.localdate()
+    terms, month, year = [], None, None
+    for token in _TOKEN.findall(text.lower()):
+        if token in _MONTHS and month is None:
+            month = _MONTHS[token]
+        elif len(token) == 4 and token.isdigit() and 1990 <= int(token) <= 2100:
+            year = int(token)
+        elif token not in _STOP_WORDS:
+            terms.append(token)
+
+    date_range = None
+    if month:
+        year = year or (today.year if month <= today.month else today.year - 1)
+        date_range = (date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1]))
+    elif year:
+        date_range = (date(year, 1, 1), date(year, 12, 31))
+    return terms, date_range
+
+
+def _match_expression(terms, operator, tags):
+    # Terms are quoted (no FTS syntax from user input) and matched against title and body.
+    # Prefix matching is slower, so it is kept for the word being typed and for codes
+    # with digits (vehicle numbers, trip ids); kind and period filters are tag tokens.
+    text = f' {operator} '.join(
+        f'{{title body}} : "{term}"' + ('*' if position == len(terms) - 1 or any(ch.isdigit() for ch in term) else '')
+        for position, term in enumerate(terms)
+    )
+    return ' AND '.join([f'({text})'] + [f'tags : ({tag})' for tag in tags])
+
+
+def _highlight(text, terms):
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE)
+    return mark_safe(pattern.sub(lambda match: f'<mark>{match.group(0)}</mark>', escape(text)))
+
+
+def search(text, kinds=None, limit=50, branch=None):
+    """
+    Ranked SearchEntry results for a search box query, limited to one branch's
+    rows (and the shared masters) when `branch` (a pk) is given.
+    All terms must match; if nothing does, any term may match (ranked by how many do).
+    Only the newest CANDIDATE_LIMIT matches are ranked, which keeps very common
+    terms fast on large tables. Each result carries a highlighted `snippet`.
+    """
+    terms, date_range = parse_query(text)
+    if not terms:
+        return []
+
+    tags = []
+    if kinds:
+        tags.append(' OR '.join(f'"{kind}"' for kind in kinds))
+    if date_range:
+        tags.append(period_tag(date_range))
+    if branch is not None:
+        tags.append(f'"b{branch}" OR "{SHARED_TAG}"')
+
+    sql = (
+        f"SELECT e.id, e.kind, e.object_pk, e.title, e.body, e.tags, e.date, e.url FROM ("
+        f"SELECT rowid AS id, bm25({FTS_TABLE}, {TITLE_WEIGHT}, {BODY_WEIGHT}, 0) AS score "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rowid DESC LIMIT %s"
+        f") ranked JOIN management_searchentry e ON e.id = ranked.id ORDER BY ranked.score LIMIT %s"
+    )
+    for operator in ('AND', 'OR'):
+        results = list(SearchEntry.objects.raw(
+            sql, [_match_expression(terms, operator, tags), CANDIDATE_LIMIT, limit]
+        ))
+        if results or len(terms) == 1:
+            break
+
+    for entry in results:
+        entry.kind_label = KIND_LABELS.get(entry.kind, entry.kind)
+        entry.snippet = _highlight(entry.body, terms)
+    return results
+
+
+def search_pks(kind, text):
+    """Primary keys (as strings) of one kind's rows matching `text`; used by the admin changelists."""
+    return [entry.object_pk for entry in search(text, kinds=[kind], limit=1000)]
+
+
+# ----------------------------------------------------------------------
+# Sync on save and delete
+# ----------------------------------------------------------------------
+def _on_source_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_object(instance)
+
+
+def _on_source_delete(sender, instance, **kwargs):
+    unindex_object(instance)
+
+
+for _label in SEARCH_SOURCES:
+    post_save.connect(_on_source_save, sender=_label, dispatch_uid=f'search_save_{_label}')
+    post_delete.connect(_on_source_delete, sender=_label, dispatch_uid=f'search_delete_{_label}')
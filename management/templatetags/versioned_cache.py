@@ -0,0 +1,16 @@
+from django import template
+
+from ..cache import model_versions as _model_versions
+
+register = template.Library()
+
+
+@register.simple_tag
+def model_versions(*labels):
+    """
+    Version token for use as a {% cache %} vary-on argument, e.g.
+        {% model_versions "management.Trip" "management.TripExpense" as versions %}
+        {% cache None trip_expense_table trip.pk versions %} ... {% endcache %}
+    The fragment is re-rendered as soon as any listed model is written.
+    """
+    return _model_versions(*labels)
@@ -1,3 +1,1823 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import Http404
+from django.test import (
+    AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import async_views, locations, views
+from .admin import EstimatedCountPaginator
+from .archive import archive_trips, find_trip, restore_trips
+from .availability import available
+from .branches import branch_scope
+from .cache import bump_version, masterdata, model_version, versioned_key
+from .commissions import recompute_commissions
+from .forms import WalletAssignForm
+from .fleet import efficiency, rebuild_stats
+from .invoicing import (
+    allocate_numbers, cancel_invoices, create_invoices, fiscal_year_label, gst_split, render_invoices,
+)
+from .kpis import load_tiles, refresh_tiles
+from .lanes import percentile, rebuild_lanes, suggest_rate
+from .locations import match_places, normalize_place, resolve_place
+from .models import (
+    AccountMaster, AccountTransaction, AccountingPeriod, ArchivedAccountTransaction, ArchivedTrip,
+    ArchivedTripExpense, BankStatement, BankStatementLine, Branch, CommissionRecompute, DocketTable, Driver,
+    DriverAdvance, ExpenseCategory, Invoice, JobRun, KpiTile, LaneRate, Location, LocationAlias, MaintenanceExpense,
+    MonthlyVehicleStat, PartyMaster, PayrollRun, Payslip, RouteDistance, ScheduledJob, SearchEntry, Trip,
+    TripExpense, UserBranch, Vehicle, WalletStatement, WalletStatementLine,
+)
+from .money import Paise, PaiseSum, from_paise, to_paise
+from .payroll import month_bounds, run_payroll
+from .periods import close_period, current_balances, reopen_period
+from .reconciliation import confirm_matches, import_statement, parse_csv, parse_ofx, reconcile
+from .routers import ReportingRouter, reporting_db
+from .scheduler import CronSpec, Job, claim, release, run_job, slots_between
+from .search import parse_query, search
+from .transitions import apply_transition, undo_batch
+from .wallets import assign_trip, import_wallet_statement, normalize_vehicle, rematch_lines
+
+# Per-process caches, so tests never read master data cached by the dev server
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'masterdata': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-masterdata'},
+}
+
+
+class Fixtures:
+    """A transporter, a client and helpers to create vehicles, drivers and trips."""
+
+    def setUp(self):
+        super().setUp()
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        masterdata._local.clear()
+        locations._state.update(token=None, index=None)
+        self.client_party = PartyMaster.objects.create(party_type='CLIENT', name='Acme Cement')
+        self.transporter = PartyMaster.objects.create(
+            party_type='TRANSPORTER', name='Roadways', commission_rate=Decimal('5.00'), orai_charge=Decimal('100.00'),
+        )
+        self.category = ExpenseCategory.objects.create(name='Diesel', is_trip_expense=True)
+        self.account = AccountMaster.objects.create(account_name='Main Bank')
+
+    def vehicle(self, vehicle_no, **fields):
+        return Vehicle.objects.create(vehicle_no=vehicle_no, vehicle_type='Truck', **fields)
+
+    def driver(self, driver_id, **fields):
+        return Driver.objects.create(
+            driver_id=driver_id, name=f'Driver {driver_id}', mobile='9999999999', license_no=f'L-{driver_id}',
+            license_expiry=date(2030, 1, 1), **fields,
+        )
+
+    def deposit(self, day, amount, description='Deposit'):
+        # A receipt is posted from and to the receiving account
+        return AccountTransaction.objects.create(
+            date=day, description=description, from_account=self.account, to_account=self.account,
+            deposit=Decimal(amount),
+        )
+
+    def trip(self, vehicle, driver, status='PENDING', day=None, origin='Jaipur', destination='Delhi', **fields):
+        return Trip.objects.create(
+            date=day or date(2025, 1, 10), vehicle=vehicle, driver=driver,
+            client=fields.pop('client', self.client_party), transporter=fields.pop('transporter', self.transporter),
+            origin=origin, destination=destination,
+            rate=fields.pop('rate', Decimal('1000.00')), weight=fields.pop('weight', Decimal('10.00')),
+            status=status, **fields,
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FixturesTestCase(Fixtures, TestCase):
+    pass
+
+
+# ----------------------------------------------------------------------
+# Master-data cache (user-026)
+# ----------------------------------------------------------------------
+class MasterDataCacheTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.truck = self.vehicle('RJ14-1001')
+
+    def test_lookups_are_served_from_memory(self):
+        self.assertEqual(masterdata.get(Vehicle, self.truck.pk), self.truck)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(masterdata.get(Vehicle, self.truck.pk).vehicle_no, 'RJ14-1001')
+            self.assertEqual(masterdata.get_by(Vehicle, 'vehicle_no', ' rj14-1001 '), self.truck)
+            self.assertEqual(masterdata.filter(Vehicle, vehicle_type='Truck'), [self.truck])
+            self.assertIsNone(masterdata.get(Vehicle, None))
+
+    def test_a_write_bumps_the_version_once_committed(self):
+        masterdata.get(Vehicle, self.truck.pk)
+        version = model_version(Vehicle)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.truck.vehicle_type = 'Trailer'
+            self.truck.save()
+        self.assertEqual(model_version(Vehicle), version)  # nothing is visible to other processes yet
+
+        for callback in callbacks:
+            callback()
+        self.assertGreater(model_version(Vehicle), version)
+        self.assertEqual(masterdata.get(Vehicle, self.truck.pk).vehicle_type, 'Trailer')
+
+    @override_settings(MASTERDATA_LOCAL_TTL=0)
+    def test_other_processes_reload_when_the_version_changes(self):
+        masterdata.get(Vehicle, self.truck.pk)
+        # A write that skips the signals leaves every cached copy as it was ...
+        Vehicle.objects.filter(pk=self.truck.pk).update(vehicle_type='Trailer')
+        self.assertEqual(masterdata.get(Vehicle, self.truck.pk).vehicle_type, 'Truck')
+
+        # ... until the writer bumps the version
+        bump_version(Vehicle)
+        self.assertEqual(masterdata.get(Vehicle, self.truck.pk).vehicle_type, 'Trailer')
+
+    def test_trip_rates_come_from_the_cached_transporter(self):
+        trip = self.trip(self.truck, self.driver('D1'))
+
+        self.assertEqual(trip.total_freight, Decimal('10000.00'))
+        self.assertEqual(trip.commission_amount, Decimal('500.00'))
+        self.assertEqual(trip.orai_amount, Decimal('100.00'))
+
+
+# ----------------------------------------------------------------------
+# Versioned page and fragment caches (user-027)
+# ----------------------------------------------------------------------
+class PageCacheTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.trip_one = self.trip(self.vehicle('RJ14-1001'), self.driver('D1'))
+
+    def test_keys_change_with_the_model_versions(self):
+        key = versioned_key('page:trip_list', Trip, Vehicle, vary_on=('/',))
+        self.assertEqual(versioned_key('page:trip_list', Trip, Vehicle, vary_on=('/',)), key)
+        self.assertNotEqual(versioned_key('page:trip_list', Trip, Vehicle, vary_on=('/?page=2',)), key)
+
+        bump_version(Vehicle)
+        self.assertNotEqual(versioned_key('page:trip_list', Trip, Vehicle, vary_on=('/',)), key)
+
+    def test_list_pages_are_served_from_cache_until_their_models_change(self):
+        self.assertContains(self.client.get(reverse('trip_list')), self.trip_one.trip_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('trip_list')).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trip_two = self.trip(self.vehicle('RJ14-1002'), self.driver('D2'))
+        self.assertContains(self.client.get(reverse('trip_list')), trip_two.trip_id)
+
+    def test_each_query_string_is_cached_separately(self):
+        self.client.get(reverse('trip_list'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('trip_list') + '?sort=date')
+        self.assertTrue(queries.captured_queries)
+
+    def test_trip_expense_rows_are_only_loaded_when_the_fragment_renders(self):
+        TripExpense.objects.create(
+            trip=self.trip_one, date=date(2025, 1, 11), expense_category=self.category, amount=Decimal('750.00'),
+        )
+        url = reverse('trip_detail', args=[self.trip_one.trip_id])
+
+        def expense_rows_loaded():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertContains(self.client.get(url), '750')
+            return any('management_expensecategory' in query['sql'] for query in queries.captured_queries)
+
+        self.assertTrue(expense_rows_loaded())
+        self.assertFalse(expense_rows_loaded())
+
+    def test_driver_rows_are_only_loaded_when_the_fragment_renders(self):
+        def driver_rows_loaded():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertContains(self.client.get(reverse('driver_list')), 'Driver D1')
+            return any('FROM "management_driver"' in query['sql'] for query in queries.captured_queries)
+
+        self.assertTrue(driver_rows_loaded())
+        self.assertFalse(driver_rows_loaded())
+
+
+# ----------------------------------------------------------------------
+# Reporting replica routing (user-029)
+# ----------------------------------------------------------------------
+class ReportingRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.snapshot = os.path.join(directory.name, 'reporting.sqlite3')
+        settings = override_settings(REPORTING_SNAPSHOT_PATH=self.snapshot)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.router = ReportingRouter()
+
+    def read_alias(self, max_staleness=60):
+        with reporting_db(max_staleness=max_staleness) as alias:
+            return alias, self.router.db_for_read(Trip)
+
+    def test_reads_fall_back_to_the_primary_without_a_snapshot(self):
+        self.assertEqual(self.read_alias(), ('default', None))
+
+    def test_fresh_snapshots_serve_reads_and_stale_ones_do_not(self):
+        open(self.snapshot, 'w').close()
+        self.assertEqual(self.read_alias(), ('reporting', 'reporting'))
+
+        hour_ago = time.time() - 3600
+        os.utime(self.snapshot, (hour_ago, hour_ago))
+        self.assertEqual(self.read_alias(), ('default', None))
+        self.assertEqual(self.read_alias(max_staleness=7200), ('reporting', 'reporting'))
+
+    @override_settings(REPORTING_SNAPSHOT_PATH=None)
+    def test_an_external_replica_is_always_current(self):
+        self.assertEqual(self.read_alias(max_staleness=0), ('reporting', 'reporting'))
+
+    def test_writes_and_reads_outside_the_block_use_the_primary(self):
+        open(self.snapshot, 'w').close()
+        with reporting_db(max_staleness=60):
+            self.assertEqual(self.router.db_for_write(Trip), 'default')
+        self.assertIsNone(self.router.db_for_read(Trip))
+
+    def test_fresh_requests_skip_the_replica(self):
+        open(self.snapshot, 'w').close()
+
+        @reporting_db(max_staleness=60)
+        def report(request):
+            return self.router.db_for_read(Trip)
+
+        self.assertEqual(report(RequestFactory().get('/report/')), 'reporting')
+        self.assertIsNone(report(RequestFactory().get('/report/', {'fresh': 1})))
+
+
+# ----------------------------------------------------------------------
+# Async views (user-030)
+# ----------------------------------------------------------------------
+@override_settings(CACHES=TEST_CACHES)
+class AsyncViewTests(Fixtures, TransactionTestCase):
+    """gather_queries() runs each job on its own connection, so the rows must be committed."""
+
+    def setUp(self):
+        super().setUp()
+        self.trip_one = self.trip(self.vehicle('RJ14-1001'), self.driver('D1'))
+        halting = ExpenseCategory.objects.create(name='Halting Charges', is_trip_expense=True)
+        for category, amount in ((self.category, '750.00'), (halting, '200.00')):
+            TripExpense.objects.create(
+                trip=self.trip_one, date=date(2025, 1, 11), expense_category=category, amount=Decimal(amount),
+            )
+        AccountTransaction.objects.create(
+            date=date(2025, 1, 10), description='Advance', from_account=self.account, to_account=self.account,
+            deposit=Decimal('4000.00'), related_trip=self.trip_one,
+        )
+        AccountTransaction.objects.create(
+            date=date(2025, 1, 12), description='Tolls', from_account=self.account, withdrawal=Decimal('300.00'),
+        )
+
+    def get(self, path):
+        request = AsyncRequestFactory().get(path)
+        # What AuthenticationMiddleware and BranchMiddleware set for head office
+        request.user = AnonymousUser()
+        request.branch_id, request.branch_locked = None, False
+        return request
+
+    async def test_gather_queries_returns_each_result_by_name(self):
+        results = await async_views.gather_queries(
+            trips=lambda: Trip.objects.count(),
+            accounts=lambda: list(AccountMaster.objects.values_list('account_name', flat=True)),
+        )
+        self.assertEqual(results, {'trips': 1, 'accounts': ['Main Bank']})
+
+    async def test_gather_queries_workers_keep_their_connections(self):
+        def worker_connection():
+            Trip.objects.count()
+            return threading.current_thread().name, connection.connection
+
+        seen = {}
+        for _ in range(3):
+            results = await async_views.gather_queries(**{f'job{n}': worker_connection for n in range(4)})
+            for thread, conn in results.values():
+                self.assertTrue(thread.startswith('gather-queries'))
+                self.assertIs(seen.setdefault(thread, conn), conn)
+        self.assertLessEqual(len(seen), settings.ASYNC_QUERY_WORKERS)
+
+    async def test_trip_detail_totals(self):
+        response = await async_views.trip_detail(self.get('/'), self.trip_one.trip_id)
+
+        content = response.content.decode()
+        # 10000 freight + 200 halting - 500 commission - 100 orai - 750 diesel
+        self.assertIn('8850', content)
+        self.assertIn('4000', content)  # advance received
+
+    async def test_trip_detail_builds_the_expense_rows_only_for_the_fragment(self):
+        calls = []
+        build = views.build_display_expenses
+        self.addCleanup(setattr, views, 'build_display_expenses', build)
+        views.build_display_expenses = lambda *args: calls.append(args) or build(*args)
+
+        for _ in range(2):
+            response = await async_views.trip_detail(self.get('/'), self.trip_one.trip_id)
+            self.assertIn('750', response.content.decode())
+        self.assertEqual(len(calls), 1)  # the second page used the cached expense table
+
+    async def test_trip_detail_of_an_unknown_trip(self):
+        with self.assertRaises(Http404):
+            await async_views.trip_detail(self.get('/'), 'TRP-9999')
+
+    async def test_account_overview_balances(self):
+        response = await async_views.account_overview(self.get('/'))
+
+        # The receipt adds 4000 and the withdrawal takes 300
+        self.assertIn('3700', response.content.decode())
+
+    async def test_account_overview_on_a_cold_cache(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        masterdata._local.clear()
+
+        response = await async_views.account_overview(self.get('/'))
+
+        self.assertIn('3700', response.content.decode())
+
+    async def test_account_overview_after_a_period_close(self):
+        await sync_to_async(close_period)(date(2025, 1, 31))
+
+        response = await async_views.account_overview(self.get('/'))
+
+        # The balances now start from the closing snapshot
+        self.assertIn('3700', response.content.decode())
+
+    async def test_dashboard_lists_trips(self):
+        response = await async_views.dashboard(self.get('/'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.trip_one.trip_id, response.content.decode())
+
+
+# ----------------------------------------------------------------------
+# KPI tiles (user-031)
+# ----------------------------------------------------------------------
+class KpiTileTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.truck, self.ravi = self.vehicle('RJ14-1001'), self.driver('D1')
+
+    def receipt(self, trip, amount):
+        return AccountTransaction.objects.create(
+            date=self.today, description='Advance', from_account=self.account, to_account=self.account,
+            deposit=Decimal(amount), related_trip=trip,
+        )
+
+    def test_tiles_are_computed_from_the_source_rows(self):
+        open_trip = self.trip(self.truck, self.ravi, day=self.today)  # advance: 80% of 10000
+        self.trip(self.vehicle('RJ14-1002'), self.driver('D2'), status='CANCELLED', day=self.today)
+        self.receipt(open_trip, '3000.00')
+
+        tiles = refresh_tiles()
+
+        self.assertEqual(tiles['trips_by_status'].count, 2)
+        self.assertEqual(tiles['freight_this_month'].value, Decimal('10000.00'))
+        self.assertEqual(tiles['advances_outstanding'].value, Decimal('5000.00'))
+        self.assertEqual(tiles['account_balances'].value, Decimal('3000.00'))
+        self.assertEqual(tiles['unpaid_maintenance'].count, 0)
+
+    def test_writes_refresh_their_tiles_once_committed(self):
+        refresh_tiles()
+        with self.captureOnCommitCallbacks(execute=True):
+            trip = self.trip(self.truck, self.ravi, day=self.today)
+            self.receipt(trip, '1000.00')
+
+        tiles = {tile.key: tile for tile in KpiTile.objects.all()}
+        self.assertEqual(tiles['trips_by_status'].count, 1)
+        self.assertEqual(tiles['advances_outstanding'].value, Decimal('7000.00'))
+        self.assertEqual(tiles['account_balances'].value, Decimal('1000.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MaintenanceExpense.objects.create(
+                date=self.today, vehicle=self.truck, workshop=self.transporter, expense_category=self.category,
+                description='Brake pads', amount=Decimal('2500.00'),
+            )
+        self.assertEqual(KpiTile.objects.get(key='unpaid_maintenance').value, Decimal('2500.00'))
+
+    def test_expired_tiles_are_recomputed_when_loaded(self):
+        refresh_tiles()
+        Vehicle.objects.filter(pk=self.truck.pk).update(insurance_expiry=self.today)  # no signal
+        with self.assertNumQueries(1):
+            self.assertEqual(load_tiles()['expiring_documents'].count, 0)
+
+        KpiTile.objects.filter(key='expiring_documents').update(expires_at=timezone.now())
+        self.assertEqual(load_tiles()['expiring_documents'].count, 1)
+
+
+class KpiDeltaTests(FixturesTestCase):
+    """Writes adjust the stored tiles by their difference, which must equal a full recompute."""
+
+    DELTA_TILES = (
+        'trips_by_status', 'freight_this_month', 'advances_outstanding', 'account_balances', 'unpaid_maintenance',
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.truck = self.vehicle('RJ14-1001')
+        self.trip_one = self.trip(self.truck, self.driver('D1'), day=self.today)
+        refresh_tiles()
+
+    def stored(self):
+        return {
+            tile.key: (tile.value, tile.count, tile.payload)
+            for tile in KpiTile.objects.filter(key__in=self.DELTA_TILES)
+        }
+
+    def assertMatchesRecompute(self):
+        incremental = self.stored()
+        refresh_tiles(self.DELTA_TILES)
+        self.assertEqual(incremental, self.stored())
+
+    def receipt(self, trip, amount):
+        return AccountTransaction.objects.create(
+            date=self.today, description='Advance', from_account=self.account, to_account=self.account,
+            deposit=Decimal(amount), related_trip=trip,
+        )
+
+    def test_trip_writes(self):
+        second = self.trip(self.vehicle('RJ14-1002'), self.driver('D2'), day=self.today)
+        self.receipt(second, '2500.00')
+        self.assertMatchesRecompute()
+
+        second.weight = Decimal('12.00')
+        second.save()
+        self.assertMatchesRecompute()
+
+        second.status = 'COMPLETED'  # its receipt leaves the outstanding advances
+        second.save()
+        self.assertMatchesRecompute()
+        self.assertEqual(KpiTile.objects.get(key='advances_outstanding').value, Decimal('8000.00'))
+
+        self.trip_one.delete()
+        self.assertMatchesRecompute()
+
+    def test_ledger_and_maintenance_writes(self):
+        receipt = self.receipt(self.trip_one, '3000.00')
+        AccountTransaction.objects.create(
+            date=self.today, description='Rent', from_account=self.account, withdrawal=Decimal('400.00'),
+        )
+        self.assertMatchesRecompute()
+
+        receipt.deposit = Decimal('3500.00')
+        receipt.save()
+        self.assertMatchesRecompute()
+        receipt.delete()
+        self.assertMatchesRecompute()
+
+        bill = MaintenanceExpense.objects.create(
+            date=self.today, vehicle=self.truck, workshop=self.transporter, expense_category=self.category,
+            description='Brake pads', amount=Decimal('2500.00'),
+        )
+        self.assertMatchesRecompute()
+        bill.is_paid = True
+        bill.save()
+        self.assertMatchesRecompute()
+
+    def test_saves_run_no_tile_aggregates(self):
+        self.trip_one.status = 'IN_TRANSIT'
+        with CaptureQueriesContext(connection) as queries:
+            self.trip_one.save()
+        self.assertFalse([query for query in queries.captured_queries if 'SUM(' in query['sql']])
+        self.assertMatchesRecompute()
+
+    def test_rolled_back_writes_leave_the_tiles(self):
+        before = self.stored()
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.receipt(self.trip_one, '1000.00')
+            raise ValidationError('rolled back')
+        self.assertEqual(self.stored(), before)
+
+# ----------------------------------------------------------------------
+# Driver payroll (user-032)
+# ----------------------------------------------------------------------
+class PayrollTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.start, self.end = month_bounds(date(2025, 3, 17))
+        self.ravi = self.driver('D1', fixed_salary=Decimal('1000.00'), wage_rate=Decimal('100.00'))
+        self.trip(self.vehicle('RJ14-1001'), self.ravi, status='COMPLETED', day=date(2025, 3, 4))
+        self.trip(self.vehicle('RJ14-1002'), self.ravi, status='CANCELLED', day=date(2025, 3, 6))
+
+    def test_month_bounds(self):
+        self.assertEqual((self.start, self.end), (date(2025, 3, 1), date(2025, 3, 31)))
+        self.assertEqual(month_bounds(date(2024, 2, 10)), (date(2024, 2, 1), date(2024, 2, 29)))
+
+    def test_net_pay_is_withdrawn_from_the_paying_account(self):
+        DriverAdvance.objects.create(driver=self.ravi, date=date(2025, 3, 2), amount=Decimal('300.00'))
+
+        run = run_payroll(self.start, self.end, self.account)
+
+        slip = run.payslips.get(driver=self.ravi)
+        self.assertEqual(slip.trip_count, 1)  # the cancelled trip earns no wage
+        self.assertEqual(slip.trip_wages, Decimal('100.00'))
+        self.assertEqual(slip.advances, Decimal('300.00'))
+        self.assertEqual(slip.net_pay, Decimal('800.00'))
+        self.assertEqual(slip.ledger_transaction.withdrawal, Decimal('800.00'))
+        self.assertEqual(slip.ledger_transaction.date, self.end)
+        self.assertEqual(run.total_net_pay, Decimal('800.00'))
+        self.assertFalse(DriverAdvance.objects.filter(payroll_run__isnull=True).exists())
+
+    def test_a_period_is_paid_once(self):
+        run_payroll(self.start, self.end, self.account)
+        with self.assertRaises(ValidationError):
+            run_payroll(date(2025, 3, 15), date(2025, 4, 14), self.account)
+
+    def test_inactive_drivers_without_trips_are_left_out(self):
+        self.driver('D2', is_active=False, fixed_salary=Decimal('500.00'))
+
+        run = run_payroll(self.start, self.end, self.account)
+
+        self.assertEqual(list(run.payslips.values_list('driver__driver_id', flat=True)), ['D1'])
+
+    def cash_expense(self, amount):
+        # Paid in cash by the driver (no paying account), recovered from the pay
+        trip = Trip.objects.get(driver=self.ravi, status='COMPLETED')
+        return TripExpense.objects.create(
+            trip=trip, date=date(2025, 3, 5), expense_category=self.category, amount=Decimal(amount),
+        )
+
+    def test_cash_expenses_are_deducted(self):
+        self.cash_expense('50.00')
+
+        slip = run_payroll(self.start, self.end, self.account).payslips.get(driver=self.ravi)
+
+        self.assertEqual(slip.cash_expenses, Decimal('50.00'))
+        self.assertEqual(slip.net_pay, Decimal('1050.00'))
+
+    def test_advances_larger_than_pay_are_carried_forward(self):
+        self.cash_expense('50.00')
+        DriverAdvance.objects.create(driver=self.ravi, date=date(2025, 3, 2), amount=Decimal('3000.00'))
+
+        run = run_payroll(self.start, self.end, self.account)
+
+        slip = run.payslips.get(driver=self.ravi)
+        self.assertEqual(slip.net_pay, Decimal('0.00'))
+        self.assertEqual(slip.carried_forward, Decimal('1950.00'))  # 3000 + 50 - (1000 + 100)
+        self.assertIsNone(slip.ledger_transaction)
+        self.assertEqual(run.total_net_pay, Decimal('0.00'))
+
+        carried = DriverAdvance.objects.get(driver=self.ravi, payroll_run__isnull=True)
+        self.assertEqual((carried.date, carried.amount), (date(2025, 4, 1), Decimal('1950.00')))
+
+        # The next run recovers what was carried forward
+        start, end = month_bounds(date(2025, 4, 1))
+        slip = run_payroll(start, end, self.account).payslips.get(driver=self.ravi)
+        self.assertEqual(slip.advances, Decimal('1950.00'))
+        self.assertEqual(slip.carried_forward, Decimal('950.00'))
+
+
+# ----------------------------------------------------------------------
+# Lane rate statistics (user-034)
+# ----------------------------------------------------------------------
+class LaneRateTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_client = PartyMaster.objects.create(party_type='CLIENT', name='Birla Steel')
+        self.trucks = [self.vehicle(f'RJ14-10{n:02d}') for n in range(4)]
+        self.ravi = self.driver('D1')
+        with self.captureOnCommitCallbacks(execute=True):
+            for truck, rate, day in zip(self.trucks, ('900.00', '1200.00', '1000.00'), (3, 1, 2)):
+                self.trip(truck, self.ravi, status='COMPLETED', day=date(2025, 1, day), rate=Decimal(rate))
+
+    def test_percentile_interpolates(self):
+        values = [Decimal(v) for v in ('10', '20', '30', '40')]
+        self.assertEqual(percentile(values, '0.5'), Decimal('25.00'))
+        self.assertEqual(percentile(values, '0.25'), Decimal('17.50'))
+        self.assertEqual(percentile([], '0.5'), Decimal('0.00'))
+
+    def test_lane_statistics_follow_trip_writes(self):
+        lane = LaneRate.objects.get(origin_key='jaipur', destination_key='delhi')
+        self.assertEqual(lane.trip_count, 3)
+        self.assertEqual(lane.rate_median, Decimal('1000.00'))
+        self.assertEqual(lane.last_rate, Decimal('900.00'))  # the latest trip by date
+
+        # Moving the only other trips off the lane empties and removes it
+        with self.captureOnCommitCallbacks(execute=True):
+            for trip in Trip.objects.all():
+                trip.destination = 'Agra'
+                trip.save()
+        self.assertFalse(LaneRate.objects.filter(destination_key='delhi').exists())
+        self.assertEqual(LaneRate.objects.get(destination_key='agra').trip_count, 3)
+
+    def test_suggestions_prefer_the_client_then_the_lane_median(self):
+        suggestion = suggest_rate(' JAIPUR ', 'delhi', client_id=self.client_party.pk)
+        self.assertEqual((suggestion['rate'], suggestion['basis']), (Decimal('900.00'), 'client'))
+
+        suggestion = suggest_rate('Jaipur', 'Delhi', client_id=self.other_client.pk)
+        self.assertEqual((suggestion['rate'], suggestion['basis']), (Decimal('1000.00'), 'median'))
+
+        suggestion = suggest_rate('Jaipur', 'Delhi', client_id=self.other_client.pk, transporter_id=self.transporter.pk)
+        self.assertEqual(suggestion['basis'], 'transporter')
+        self.assertIsNone(suggest_rate('Jaipur', 'Kota'))
+        self.assertIsNone(suggest_rate('', 'Delhi'))
+
+    def test_lane_rate_endpoint(self):
+        response = self.client.get(reverse('lane_rate'), {'origin': 'Jaipur', 'destination': 'Delhi'})
+        self.assertEqual(response.json()['rate'], '1000.00')
+        self.assertIn('over 3 trips', response.json()['hint'])
+
+        response = self.client.get(reverse('lane_rate'), {'origin': 'Jaipur', 'destination': 'Kota'})
+        self.assertFalse(response.json()['success'])
+
+    def test_rebuild_matches_the_incremental_rows(self):
+        before = LaneRate.objects.values('origin_key', 'destination_key', 'trip_count', 'rate_median').get()
+        self.assertEqual(rebuild_lanes(), 1)
+        self.assertEqual(
+            LaneRate.objects.values('origin_key', 'destination_key', 'trip_count', 'rate_median').get(), before,
+        )
+
+
+# ----------------------------------------------------------------------
+# Location master and place matching (user-035)
+# ----------------------------------------------------------------------
+@override_settings(MASTERDATA_LOCAL_TTL=0)
+class LocationTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mumbai = Location.objects.create(name='Mumbai', state='MH')
+            self.navi_mumbai = Location.objects.create(name='Navi Mumbai', state='MH')
+            LocationAlias.objects.create(location=self.mumbai, alias='Bombay')
+
+    def test_normalize_place(self):
+        self.assertEqual(normalize_place('  Navi-Mumbai (MH) '), 'navi mumbai mh')
+        self.assertEqual(normalize_place(None), '')
+
+    def test_exact_names_and_aliases_resolve(self):
+        self.assertEqual(resolve_place(' mumbai '), self.mumbai)
+        self.assertEqual(resolve_place('BOMBAY'), self.mumbai)
+        self.assertEqual(resolve_place('navi-mumbai'), self.navi_mumbai)
+        self.assertIsNone(resolve_place('Mumbay'))  # fuzzy matches need an explicit score
+
+    def test_fuzzy_matches_are_ranked(self):
+        matches = match_places('Mumbay')
+        self.assertEqual(matches[0][0], self.mumbai)
+        self.assertGreater(matches[0][1], 0.5)
+        self.assertEqual(resolve_place('Mumbay', min_score=0.5), self.mumbai)
+        self.assertEqual(match_places(''), [])
+
+    def test_trips_store_the_canonical_place(self):
+        trip = self.trip(self.vehicle('MH01-1001'), self.driver('D1'), origin='bombay', destination='Surat')
+
+        self.assertEqual((trip.origin, trip.origin_location), ('Mumbai', self.mumbai))
+        self.assertEqual((trip.destination, trip.destination_location), ('Surat', None))
+
+    def test_rate_suggestions_use_the_canonical_place(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip(
+                self.vehicle('MH01-1001'), self.driver('D1'), status='COMPLETED', origin='Mumbai', destination='Surat',
+            )
+
+        self.assertEqual(suggest_rate(' Bombay ', 'surat')['origin'], 'Mumbai')
+        response = self.client.get(reverse('lane_rate'), {'origin': 'bombay', 'destination': 'Surat'})
+        self.assertEqual(response.json()['rate'], '1000.00')
+
+    def test_new_aliases_are_picked_up(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            LocationAlias.objects.create(location=self.navi_mumbai, alias='New Bombay')
+        self.assertEqual(resolve_place('new bombay'), self.navi_mumbai)
+
+
+# ----------------------------------------------------------------------
+# Full-text search (user-036)
+# ----------------------------------------------------------------------
+class SearchTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.kota_client = PartyMaster.objects.create(party_type='CLIENT', name='Kota Stone Works')
+        self.truck = self.vehicle('RJ14-1001')
+        self.ravi = self.driver('D1')
+        self.to_delhi = self.trip(self.truck, self.ravi, day=date(2025, 3, 5), client=self.kota_client)
+        self.from_kota = self.trip(
+            self.vehicle('RJ20-2002'), self.driver('D2'), day=date(2024, 7, 1), origin='Kota', destination='Agra',
+        )
+
+    def found(self, text, **kwargs):
+        return [(entry.kind, entry.object_pk) for entry in search(text, **kwargs)]
+
+    def test_entries_follow_saves_and_deletes(self):
+        self.assertIn(('trip', str(self.to_delhi.pk)), self.found('RJ14'))
+
+        self.to_delhi.destination = 'Ajmer'
+        self.to_delhi.save()
+        self.assertEqual(self.found('ajmer', kinds=['trip']), [('trip', str(self.to_delhi.pk))])
+        self.assertEqual(self.found('delhi', kinds=['trip']), [])
+
+        self.to_delhi.delete()
+        self.assertEqual(self.found('ajmer'), [])
+        self.assertFalse(SearchEntry.objects.filter(kind='trip', object_pk=str(self.to_delhi.pk)).exists())
+
+    def test_title_matches_rank_above_body_matches(self):
+        # "Kota" is the origin (title) of one trip and the client (body) of the other
+        self.assertEqual(
+            self.found('kota', kinds=['trip']),
+            [('trip', str(self.from_kota.pk)), ('trip', str(self.to_delhi.pk))],
+        )
+        self.assertEqual(self.found('kota stone', kinds=['party']), [('party', str(self.kota_client.pk))])
+
+    def test_period_and_kind_filters(self):
+        self.assertEqual(self.found('kota march 2025', kinds=['trip']), [('trip', str(self.to_delhi.pk))])
+        self.assertEqual(self.found('kota 2024', kinds=['trip']), [('trip', str(self.from_kota.pk))])
+        self.assertEqual({kind for kind, _ in self.found('kota')}, {'trip', 'party'})
+
+    def test_any_term_may_match_when_no_row_has_all(self):
+        self.assertEqual(
+            {pk for _, pk in self.found('ajmer agra', kinds=['trip'])}, {str(self.from_kota.pk)},
+        )
+        self.assertEqual(self.found('the of'), [])
+
+    def test_parse_query(self):
+        today = date(2025, 2, 10)
+        self.assertEqual(
+            parse_query('Diesel MH12 last March', today=today),
+            (['diesel', 'mh12'], (date(2024, 3, 1), date(2024, 3, 31))),
+        )
+        self.assertEqual(parse_query('tolls feb', today=today), (['tolls'], (date(2025, 2, 1), date(2025, 2, 28))))
+        self.assertEqual(parse_query('tolls 2023', today=today), (['tolls'], (date(2023, 1, 1), date(2023, 12, 31))))
+
+    def test_search_page_highlights_matches(self):
+        response = self.client.get(reverse('search'), {'q': 'kota'})
+        self.assertContains(response, '<mark>Kota</mark>')
+
+
+# ----------------------------------------------------------------------
+# Bulk status transitions (user-037)
+# ----------------------------------------------------------------------
+class TransitionTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.truck, self.other_truck = self.vehicle('RJ14-1001'), self.vehicle('RJ14-1002')
+        self.ravi, self.mohan = self.driver('D1'), self.driver('D2')
+
+    def test_bulk_transition_moves_allowed_trips_and_reports_the_rest(self):
+        pending = self.trip(self.truck, self.ravi)
+        cancelled = self.trip(self.other_truck, self.mohan, status='CANCELLED')
+
+        batch, changed, skipped = apply_transition([pending.trip_id, cancelled.trip_id, 'TRP-9999'], 'COMPLETED')
+
+        self.assertEqual(changed, [pending.trip_id])
+        self.assertEqual(skipped[cancelled.trip_id], "Cannot move from Cancelled to Completed.")
+        self.assertEqual(skipped['TRP-9999'], "Trip not found.")
+        self.assertEqual(batch.previous_statuses, {'PENDING': [pending.pk]})
+        self.assertEqual(Trip.objects.get(pk=pending.pk).status, 'COMPLETED')
+
+    def test_bulk_transition_refuses_double_booking(self):
+        self.trip(self.truck, self.ravi)
+        cancelled = self.trip(self.truck, self.mohan, status='CANCELLED')
+
+        batch, changed, skipped = apply_transition([cancelled.trip_id], 'PENDING')
+
+        self.assertIsNone(batch)
+        self.assertEqual(changed, [])
+        self.assertIn('Vehicle', skipped[cancelled.trip_id])
+        self.assertEqual(Trip.objects.get(pk=cancelled.pk).status, 'CANCELLED')
+
+    def test_trips_in_one_batch_cannot_book_the_same_vehicle(self):
+        first = self.trip(self.truck, self.ravi, status='CANCELLED')
+        second = self.trip(self.truck, self.mohan, status='CANCELLED')
+
+        _, changed, skipped = apply_transition([first.trip_id, second.trip_id], 'PENDING')
+
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(list(skipped), [second.trip_id if changed == [first.trip_id] else first.trip_id])
+
+    def test_undo_restores_each_previous_status(self):
+        pending = self.trip(self.truck, self.ravi)
+        in_transit = self.trip(self.other_truck, self.mohan, status='IN_TRANSIT')
+        batch, _, _ = apply_transition([pending.trip_id, in_transit.trip_id], 'COMPLETED')
+
+        restored, skipped = undo_batch(batch)
+
+        self.assertEqual(restored, sorted([pending.trip_id, in_transit.trip_id]))
+        self.assertEqual(skipped, {})
+        self.assertEqual(Trip.objects.get(pk=pending.pk).status, 'PENDING')
+        self.assertEqual(Trip.objects.get(pk=in_transit.pk).status, 'IN_TRANSIT')
+        with self.assertRaises(ValidationError):
+            undo_batch(batch)
+
+    def test_undo_skips_trips_whose_vehicle_was_booked_since(self):
+        pending = self.trip(self.truck, self.ravi)
+        batch, _, _ = apply_transition([pending.trip_id], 'COMPLETED')
+        self.trip(self.truck, self.mohan)  # the truck is booked again
+
+        restored, skipped = undo_batch(batch)
+
+        self.assertEqual(restored, [])
+        self.assertIn('Vehicle', skipped[pending.trip_id])
+        self.assertEqual(Trip.objects.get(pk=pending.pk).status, 'COMPLETED')
+
+    def test_undo_skips_trips_changed_since(self):
+        pending = self.trip(self.truck, self.ravi)
+        batch, _, _ = apply_transition([pending.trip_id], 'COMPLETED')
+        apply_transition([pending.trip_id], 'IN_TRANSIT')
+
+        restored, skipped = undo_batch(batch)
+
+        self.assertEqual(restored, [])
+        self.assertEqual(skipped, {pending.trip_id: "Changed since, now In-transit."})
+
+
+# ----------------------------------------------------------------------
+# Dirty-field tracking (user-038)
+# ----------------------------------------------------------------------
+class TrackedFieldsTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        created = self.trip(self.vehicle('RJ14-1001'), self.driver('D1'))
+        self.loaded = Trip.objects.get(pk=created.pk)
+
+    def updates(self, queries):
+        table = Trip._meta.db_table
+        return [query['sql'] for query in queries if query['sql'].startswith(f'UPDATE "{table}"')]
+
+    def test_tracks_values_as_loaded(self):
+        self.assertTrue(self.loaded.is_tracked())
+        self.assertFalse(self.loaded.has_changed())
+
+        self.loaded.status = 'IN_TRANSIT'
+
+        self.assertEqual(self.loaded.changed_fields(), {'status'})
+        self.assertTrue(self.loaded.has_changed('status', 'rate'))
+        self.assertFalse(self.loaded.has_changed('rate'))
+        self.assertEqual(self.loaded.loaded_value('status'), 'PENDING')
+
+    def test_unsaved_instances_are_untracked(self):
+        trip = Trip(origin='Jaipur')
+        self.assertFalse(trip.is_tracked())
+        self.assertIsNone(trip.changed_fields())
+        self.assertTrue(trip.has_changed('rate'))
+        self.assertEqual(trip.loaded_value('origin'), 'Jaipur')
+
+    def test_unchanged_save_writes_nothing(self):
+        with self.assertNumQueries(0):
+            self.loaded.save()
+
+    def test_status_flip_updates_only_status(self):
+        self.loaded.status = 'IN_TRANSIT'
+        with CaptureQueriesContext(connection) as queries:
+            self.loaded.save()
+
+        [update] = self.updates(queries.captured_queries)
+        self.assertIn('"status"', update)
+        self.assertNotIn('"total_freight"', update)
+        self.assertNotIn('"commission_amount"', update)
+        self.assertFalse(self.loaded.has_changed())
+        self.assertEqual(self.loaded.loaded_value('status'), 'IN_TRANSIT')
+
+    def test_derived_fields_follow_their_inputs_only(self):
+        PartyMaster.objects.filter(pk=self.transporter.pk).update(commission_rate=Decimal('10.00'))
+        masterdata._local.clear()
+        caches['masterdata'].clear()
+
+        self.loaded.status = 'IN_TRANSIT'
+        self.loaded.save()
+        self.loaded.refresh_from_db()
+        self.assertEqual(self.loaded.commission_amount, Decimal('500.00'))
+
+        self.loaded.weight = Decimal('20.00')
+        self.loaded.save()
+        self.loaded.refresh_from_db()
+        self.assertEqual(self.loaded.total_freight, Decimal('20000.00'))
+        self.assertEqual(self.loaded.commission_amount, Decimal('2000.00'))
+
+
+# ----------------------------------------------------------------------
+# Commission recomputes (user-039)
+# ----------------------------------------------------------------------
+class CommissionRecomputeTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.open_trip = self.trip(self.vehicle('RJ14-1001'), self.driver('D1'))
+        self.done_trip = self.trip(self.vehicle('RJ14-1002'), self.driver('D2'), status='COMPLETED')
+        self.transporter = PartyMaster.objects.get(pk=self.transporter.pk)
+
+    def amounts(self, trip):
+        return trip.commission_amount, trip.orai_amount
+
+    def test_rate_change_rewrites_open_trips_in_one_update(self):
+        self.transporter.commission_rate = Decimal('7.50')
+        self.transporter.orai_charge = Decimal('150.00')
+        with CaptureQueriesContext(connection) as queries:
+            self.transporter.save()
+
+        trip_table = f'UPDATE "{Trip._meta.db_table}"'
+        self.assertEqual(sum(query['sql'].startswith(trip_table) for query in queries.captured_queries), 1)
+        self.open_trip.refresh_from_db()
+        self.done_trip.refresh_from_db()
+        self.assertEqual(self.amounts(self.open_trip), (Decimal('750.00'), Decimal('150.00')))
+        self.assertEqual(self.amounts(self.done_trip), (Decimal('500.00'), Decimal('100.00')))
+
+        audit = CommissionRecompute.objects.get()
+        self.assertEqual(audit.trigger, 'SAVE')
+        self.assertEqual((audit.old_commission_rate, audit.new_commission_rate), (Decimal('5.00'), Decimal('7.50')))
+        self.assertEqual(audit.trip_count, 1)
+        self.assertEqual((audit.commission_before, audit.commission_after), (Decimal('500.00'), Decimal('750.00')))
+        self.assertEqual((audit.orai_before, audit.orai_after), (Decimal('100.00'), Decimal('150.00')))
+
+    def test_other_edits_do_not_recompute(self):
+        self.transporter.name = 'Roadways Logistics'
+        self.transporter.save()
+        self.assertFalse(CommissionRecompute.objects.exists())
+
+    def test_recompute_is_a_no_op_when_trips_match(self):
+        self.assertIsNone(recompute_commissions(self.transporter))
+
+        Trip.objects.filter(pk=self.open_trip.pk).update(commission_amount=Decimal('1.00'))
+        audit = recompute_commissions(self.transporter)
+
+        self.assertEqual((audit.trigger, audit.trip_count), ('COMMAND', 1))
+        self.open_trip.refresh_from_db()
+        self.assertEqual(self.open_trip.commission_amount, Decimal('500.00'))
+
+
+# ----------------------------------------------------------------------
+# Money in paise (user-040)
+# ----------------------------------------------------------------------
+class MoneyTests(FixturesTestCase):
+
+    def test_paise_conversion_rounds_half_up(self):
+        self.assertEqual(to_paise(Decimal('12.345')), 1235)
+        self.assertEqual(to_paise(0.1), 10)
+        self.assertEqual(from_paise(1235), Decimal('12.35'))
+        self.assertIsNone(from_paise(None))
+
+    def test_money_fields_store_integer_paise(self):
+        trip = self.trip(self.vehicle('RJ14-1001'), self.driver('D1'))
+        trip.rate, trip.halting = Decimal('1234.56'), Decimal('10.005')
+        trip.save()
+
+        trip.refresh_from_db()
+        self.assertEqual(trip.total_freight, Decimal('12345.60'))
+        self.assertEqual(trip.halting, Decimal('10.01'))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT rate, total_freight, halting FROM management_trip WHERE id = %s', [trip.pk])
+            self.assertEqual(cursor.fetchone(), (123456, 1234560, 1001))
+
+    def test_paise_aggregates_are_exact(self):
+        for amount in ('0.10', '0.20', '0.70'):
+            self.deposit(date(2025, 1, 5), amount)
+
+        totals = AccountTransaction.objects.aggregate(total=PaiseSum('deposit'))
+        self.assertEqual(totals['total'], 100)
+        self.assertEqual(
+            sorted(AccountTransaction.objects.values_list(Paise('deposit'), flat=True)), [10, 20, 70],
+        )
+
+
+class PaiseMigrationTests(TransactionTestCase):
+    """0010_money_in_paise rescales the stored amounts both ways."""
+
+    before = [('management', '0009_commission_recomputes')]
+    after = [('management', '0010_money_in_paise')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def stored_balance(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT initial_balance FROM management_accountmaster WHERE account_name = 'Cash'")
+            return cursor.fetchone()[0]
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('management'))
+        super().tearDown()
+
+    def test_round_trip(self):
+        old_apps = self.migrate(self.before)
+        old_apps.get_model('management', 'AccountMaster').objects.create(
+            account_name='Cash', initial_balance=Decimal('1234.56'),
+        )
+
+        new_apps = self.migrate(self.after)
+        self.assertEqual(self.stored_balance(), 123456)
+        account = new_apps.get_model('management', 'AccountMaster').objects.get(account_name='Cash')
+        self.assertEqual(account.initial_balance, Decimal('1234.56'))
+
+        self.migrate(self.before)
+        self.assertEqual(Decimal(str(self.stored_balance())), Decimal('1234.56'))
+
+
+# ----------------------------------------------------------------------
+# Bank reconciliation (user-041)
+# ----------------------------------------------------------------------
+STATEMENT_CSV = """Account No,50100012345678
+Statement for January 2025
+
+Txn Date,Narration,Chq/Ref No,Withdrawal Amt,Deposit Amt,Closing Balance
+06/01/2025,NEFT-ACME CEMENT LTD,N0061,,"5,000.00","15,000.00"
+08/01/2025,CHQ PAID 123456 DIESEL,123456,"1,200.00",,"13,800.00"
+09/01/2025,INTEREST,,,999.00,"14,799.00"
+,Closing balance,,,,"14,799.00"
+"""
+
+
+class ReconciliationTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.receipt = self.deposit(date(2025, 1, 5), '5000.00', 'Receipt Acme Cement')
+        self.cheque = self.withdraw(date(2025, 1, 7), '1200.00', 'Diesel chq 123456')
+        self.later_cheque = self.withdraw(date(2025, 1, 9), '1200.00', 'Diesel chq 123457')
+
+    def withdraw(self, day, amount, description):
+        return AccountTransaction.objects.create(
+            date=day, description=description, from_account=self.account, withdrawal=Decimal(amount),
+        )
+
+    def import_csv(self):
+        return import_statement(self.account, STATEMENT_CSV.encode(), 'jan.csv')
+
+    def test_parse_csv_finds_the_header_and_signs_amounts(self):
+        lines = parse_csv(STATEMENT_CSV)
+        self.assertEqual(
+            [(line.date, line.reference, line.amount) for line in lines],
+            [
+                (date(2025, 1, 6), 'N0061', Decimal('5000.00')),
+                (date(2025, 1, 8), '123456', Decimal('-1200.00')),
+                (date(2025, 1, 9), '', Decimal('999.00')),
+            ],
+        )
+        with self.assertRaises(ValidationError):
+            parse_csv('just,some\ncells,here\n')
+
+    def test_parse_ofx(self):
+        [line] = parse_ofx(
+            '<OFX><STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250108120000<TRNAMT>-1200.00'
+            '<CHECKNUM>123456<NAME>CHQ PAID</STMTTRN></OFX>'
+        )
+        self.assertEqual(line, (date(2025, 1, 8), 'CHQ PAID', '123456', Decimal('-1200.00')))
+
+    def test_reconcile_suggests_the_closest_row_with_the_same_amount(self):
+        statement = self.import_csv()
+
+        self.assertEqual(reconcile(statement), {'suggested': 2, 'unmatched': 1})
+        matches = dict(statement.lines.values_list('line_no', 'matched_transaction'))
+        self.assertEqual(matches, {1: self.receipt.pk, 2: self.cheque.pk, 3: None})
+        self.assertEqual(statement.lines.get(line_no=2).status, 'SUGGESTED')
+
+    def test_confirmed_rows_are_left_out_of_later_statements(self):
+        statement = self.import_csv()
+        reconcile(statement)
+
+        cheque_line = statement.lines.get(line_no=2)
+        self.assertEqual(confirm_matches(statement, line_ids=[cheque_line.pk]), 1)
+        self.assertEqual(confirm_matches(statement, min_score=1), 0)
+        self.assertEqual(confirm_matches(statement), 1)
+        self.assertEqual(
+            list(statement.lines.filter(status='MATCHED').values_list('matched_transaction', flat=True)),
+            [self.receipt.pk, self.cheque.pk],
+        )
+
+        again = self.import_csv()
+        reconcile(again)
+        self.assertEqual(again.lines.get(line_no=2).matched_transaction, self.later_cheque)
+        self.assertIsNone(again.lines.get(line_no=1).matched_transaction)
+
+    def test_only_bank_accounts_take_statements(self):
+        cash = AccountMaster.objects.create(account_name='Cash', account_type='CASH')
+        with self.assertRaises(ValidationError):
+            import_statement(cash, STATEMENT_CSV.encode(), 'jan.csv')
+
+
+# ----------------------------------------------------------------------
+# Fastag and diesel-card statements (user-042)
+# ----------------------------------------------------------------------
+FASTAG_CSV = """Transaction Date Time,Vehicle No,Plaza Name,Transaction ID,Amount,Transaction Type
+12/01/2025 10:15:00,mh-12 ab 1234,Shahjahanpur Plaza,FT001,450.00,Debit
+16/01/2025 22:40:00,MH12AB1234,Manoharpur Plaza,FT002,300.00,Debit
+13/01/2025 08:00:00,GJ01ZZ9999,Kherki Daula,FT003,200.00,Debit
+01/01/2025 09:00:00,MH12AB1234,Shahjahanpur Plaza,FT004,450.00,Debit
+14/01/2025 09:30:00,MH12AB1234,Recharge,FT005,5000.00,Recharge
+"""
+
+
+class WalletStatementTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.fastag = AccountMaster.objects.create(account_name='Fastag', account_type='FASTAG')
+        self.truck = self.vehicle('MH12AB1234')
+        self.first = self.trip(self.truck, self.driver('D1'), status='COMPLETED', day=date(2025, 1, 10))
+        self.second = self.trip(self.truck, self.driver('D2'), day=date(2025, 1, 15))
+
+    def import_fastag(self):
+        return import_wallet_statement(self.fastag, FASTAG_CSV.encode(), 'fastag.csv')
+
+    def lines(self, statement):
+        return {line.reference: line for line in statement.lines.select_related('trip_expense')}
+
+    def test_normalize_vehicle(self):
+        self.assertEqual(normalize_vehicle(' mh-12 ab 1234 '), 'MH12AB1234')
+
+    def test_spends_are_booked_to_the_trip_covering_their_date(self):
+        statement = self.import_fastag()
+        lines = self.lines(statement)
+
+        self.assertEqual(statement.line_count, 4)  # the recharge is not a spend
+        self.assertEqual(lines['FT001'].trip_id, self.first.pk)
+        self.assertEqual(lines['FT002'].trip_id, self.second.pk)
+        self.assertEqual(
+            (lines['FT003'].status, lines['FT003'].review_reason), ('REVIEW', "Vehicle not in the fleet."),
+        )
+        self.assertEqual(
+            (lines['FT004'].status, lines['FT004'].review_reason), ('REVIEW', "No trip for this vehicle on this date."),
+        )
+
+        expense = lines['FT001'].trip_expense
+        self.assertEqual(
+            (expense.trip_id, expense.amount, expense.date), (self.first.pk, Decimal('450.00'), date(2025, 1, 12)),
+        )
+        self.assertEqual(expense.expense_category.name, 'Toll')
+        posting = AccountTransaction.objects.get(related_trip_expense=expense)
+        self.assertEqual((posting.from_account, posting.withdrawal), (self.fastag, Decimal('450.00')))
+        self.assertEqual(TripExpense.objects.count(), 2)
+
+    def test_reimporting_skips_lines_already_imported(self):
+        self.import_fastag()
+        again = self.import_fastag()
+
+        self.assertEqual((again.line_count, again.duplicate_count), (0, 4))
+        self.assertEqual(TripExpense.objects.count(), 2)
+
+    def test_trips_starting_the_same_day_need_review(self):
+        self.trip(self.truck, self.driver('D3'), status='COMPLETED', day=date(2025, 1, 10))
+        line = self.lines(self.import_fastag())['FT001']
+        self.assertEqual(line.review_reason, "More than one trip for this vehicle started that day.")
+
+    def test_review_lines_can_be_rematched_or_assigned(self):
+        statement = self.import_fastag()
+        with self.captureOnCommitCallbacks(execute=True):
+            van = self.vehicle('GJ01ZZ9999')
+        self.trip(van, self.driver('D3'), day=date(2025, 1, 12))
+
+        self.assertEqual(rematch_lines(), 1)
+        lines = self.lines(statement)
+        self.assertEqual(lines['FT003'].status, 'MATCHED')
+        self.assertEqual(lines['FT003'].trip_expense.amount, Decimal('200.00'))
+
+        self.assertEqual(assign_trip([lines['FT004'].pk], self.first), 1)
+        self.assertEqual(self.lines(statement)['FT004'].trip_expense.trip, self.first)
+        self.assertFalse(WalletStatementLine.objects.filter(status='REVIEW').exists())
+
+    def test_expenses_entered_by_hand_link_their_posting_too(self):
+        expense = TripExpense.objects.create(
+            trip=self.second, date=date(2025, 1, 16), expense_category=self.category, paid_via_account=self.fastag,
+            amount=Decimal('300.00'),
+        )
+        posting = AccountTransaction.objects.get(related_trip_expense=expense)
+        self.assertEqual((posting.related_trip, posting.withdrawal), (self.second, Decimal('300.00')))
+
+    def test_only_wallet_accounts_take_statements(self):
+        with self.assertRaises(ValidationError):
+            import_wallet_statement(self.account, FASTAG_CSV.encode(), 'fastag.csv')
+
+
+# ----------------------------------------------------------------------
+# Fleet efficiency (user-043)
+# ----------------------------------------------------------------------
+@override_settings(MASTERDATA_LOCAL_TTL=0)
+class FleetStatTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.toll = ExpenseCategory.objects.create(name='Toll', is_trip_expense=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jaipur = Location.objects.create(name='Jaipur')
+            delhi = Location.objects.create(name='Delhi')
+            self.agra = Location.objects.create(name='Agra')
+            RouteDistance.objects.create(origin=delhi, destination=self.jaipur, distance_km=280)
+        self.truck = self.vehicle('RJ14-1001')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.measured = self.trip(self.truck, self.driver('D1'), status='COMPLETED', day=date(2025, 1, 10))
+            self.unmeasured = self.trip(
+                self.truck, self.driver('D2'), status='COMPLETED', day=date(2025, 1, 20), destination='Agra',
+            )
+            self.expense(self.measured, '2800.00')
+            self.expense(self.measured, '500.00', self.toll)
+            self.expense(self.unmeasured, '1000.00')
+
+    def expense(self, trip, amount, category=None):
+        return TripExpense.objects.create(
+            trip=trip, date=trip.date, expense_category=category or self.category, paid_via_account=self.account,
+            amount=Decimal(amount),
+        )
+
+    def stat(self):
+        return MonthlyVehicleStat.objects.get(vehicle=self.truck, month=date(2025, 1, 1))
+
+    def test_trips_take_the_route_distance(self):
+        self.assertEqual(self.measured.distance_km, 280)
+        self.assertIsNone(self.unmeasured.distance_km)
+
+    def test_monthly_row_rolls_up_trips_and_expenses(self):
+        stat = self.stat()
+        self.assertEqual((stat.trip_count, stat.measured_trips, stat.distance_km), (2, 1, 280))
+        self.assertEqual((stat.tonnes, stat.tonne_km), (Decimal('20.00'), Decimal('2800.00')))
+        self.assertEqual(stat.freight, Decimal('20000.00'))
+        self.assertEqual(
+            (stat.fuel_cost, stat.measured_fuel_cost, stat.trip_expenses),
+            (Decimal('3800.00'), Decimal('2800.00'), Decimal('4300.00')),
+        )
+        self.assertEqual(stat.measured_trip_expenses, Decimal('3300.00'))
+
+    def test_ratios_use_fuel_on_measured_trips_only(self):
+        [row] = efficiency()
+        self.assertEqual(row['key'], self.truck.pk)
+        self.assertEqual(row['fuel_per_km'], Decimal('10.00'))
+        self.assertEqual(row['fuel_per_tonne_km'], Decimal('1.0000'))
+        self.assertEqual(row['fuel_per_tonne'], Decimal('190.00'))
+        self.assertEqual(row['fuel_per_trip'], Decimal('1900.00'))
+        # Diesel and toll on the measured trip over its 280 km
+        self.assertEqual(row['cost_per_km'], Decimal('11.79'))
+
+    def test_rows_follow_trip_and_route_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RouteDistance.objects.create(origin=self.jaipur, destination=self.agra, distance_km=230)
+        self.unmeasured.refresh_from_db()
+        self.assertEqual(self.unmeasured.distance_km, 230)
+        self.assertEqual((self.stat().distance_km, self.stat().measured_fuel_cost), (510, Decimal('3800.00')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.unmeasured.status = 'CANCELLED'
+            self.unmeasured.save()
+        self.assertEqual((self.stat().trip_count, self.stat().fuel_cost), (1, Decimal('2800.00')))
+
+    def test_rebuild_matches_the_incremental_rows(self):
+        incremental = MonthlyVehicleStat.objects.values().get()
+        self.assertEqual(rebuild_stats(), 1)
+        rebuilt = MonthlyVehicleStat.objects.values().get()
+        for row in (incremental, rebuilt):
+            del row['id'], row['updated_at']
+        self.assertEqual(rebuilt, incremental)
+
+
+# ----------------------------------------------------------------------
+# Period close (user-044)
+# ----------------------------------------------------------------------
+class PeriodCloseTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.receipt = self.deposit(date(2025, 1, 10), '500.00', 'Opening deposit')
+        AccountTransaction.objects.create(
+            date=date(2025, 1, 20), description='Rent', from_account=self.account, withdrawal=Decimal('200.00'),
+        )
+
+    def close(self, **kwargs):
+        # closed_through() reads the periods from the master-data cache, which is invalidated on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return close_period(date(2025, 1, 31), **kwargs)
+
+    def test_close_snapshots_the_balances(self):
+        period = self.close()
+
+        snapshot = period.balances.get(account=self.account)
+        self.assertEqual(snapshot.deposits, Decimal('500.00'))
+        self.assertEqual(snapshot.withdrawals, Decimal('200.00'))
+        self.assertEqual(snapshot.closing_balance, Decimal('300.00'))
+        self.assertEqual(AccountingPeriod.closed_through(), date(2025, 1, 31))
+
+        self.deposit(date(2025, 2, 1), '50.00')
+        self.assertEqual(current_balances()[self.account.pk], 35000)
+
+    def test_backdated_writes_are_refused(self):
+        self.close()
+
+        with self.assertRaises(ValidationError):
+            self.deposit(date(2025, 1, 31), '1.00', 'Late')
+        self.receipt.deposit = Decimal('600.00')
+        with self.assertRaises(ValidationError):
+            self.receipt.save()
+        with self.assertRaises(ValidationError):
+            AccountTransaction.objects.get(pk=self.receipt.pk).delete()
+
+        driver = self.driver('D1')
+        with self.assertRaises(ValidationError):
+            DriverAdvance.objects.create(driver=driver, date=date(2025, 1, 15), amount=Decimal('100.00'))
+
+        # Moving an open entry into the closed period is refused too
+        advance = DriverAdvance.objects.create(driver=driver, date=date(2025, 2, 5), amount=Decimal('100.00'))
+        advance.date = date(2025, 1, 30)
+        with self.assertRaises(ValidationError):
+            advance.save()
+
+    def test_backdated_deletes_are_refused_even_with_a_stale_cache(self):
+        trip = self.trip(self.vehicle('RJ14-1001'), self.driver('D1'))
+        expense = TripExpense.objects.create(
+            trip=trip, date=date(2025, 1, 11), expense_category=self.category, amount=Decimal('750.00'),
+            paid_via_account=self.account,
+        )
+        self.assertIsNone(AccountingPeriod.closed_through())
+        close_period(date(2025, 1, 31))  # its on-commit cache invalidation never runs here
+        self.assertIsNone(AccountingPeriod.closed_through())
+
+        with self.assertRaises(ValidationError):
+            TripExpense.objects.get(pk=expense.pk).delete()
+        self.assertTrue(AccountTransaction.objects.filter(related_trip_expense=expense).exists())
+        with self.assertRaises(ValidationError):
+            self.deposit(date(2025, 1, 31), '1.00', 'Late')
+
+    def test_maintenance_bill_and_payment_dates_are_guarded(self):
+        truck = self.vehicle('RJ14-1001')
+        workshop = PartyMaster.objects.create(party_type='WORKSHOP', name='Sharma Motors')
+        bill = MaintenanceExpense.objects.create(
+            date=date(2025, 1, 5), vehicle=truck, workshop=workshop, expense_category=self.category,
+            description='Clutch plate', amount=Decimal('4000.00'),
+        )
+        self.close()
+
+        with self.assertRaises(ValidationError):
+            MaintenanceExpense.objects.create(
+                date=date(2025, 1, 25), vehicle=truck, workshop=workshop, expense_category=self.category,
+                description='Tyres', amount=Decimal('9000.00'),
+            )
+        bill.is_paid, bill.payment_date, bill.paid_via_account = True, date(2025, 1, 30), self.account
+        with self.assertRaises(ValidationError):
+            bill.save()
+
+        # A bill from the closed period can still be paid in an open one
+        bill.payment_date = date(2025, 2, 3)
+        bill.save()
+        self.assertTrue(MaintenanceExpense.objects.get(pk=bill.pk).is_paid)
+
+    def test_archive_and_reopen(self):
+        period = self.close(archive=True)
+
+        self.assertEqual(period.archived_count, 2)
+        self.assertFalse(AccountTransaction.objects.exists())
+        self.assertEqual(current_balances()[self.account.pk], 30000)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(reopen_period(period), 2)
+        self.assertFalse(ArchivedAccountTransaction.objects.exists())
+        self.assertTrue(AccountTransaction.objects.filter(pk=self.receipt.pk, deposit=Decimal('500.00')).exists())
+        self.assertIsNone(AccountingPeriod.closed_through())
+
+    def test_only_ended_periods_after_the_last_close_can_be_closed(self):
+        self.close()
+        with self.assertRaises(ValidationError):
+            close_period(date(2025, 1, 15))
+        with self.assertRaises(ValidationError):
+            close_period(date.today() + timedelta(days=1))
+
+
+# ----------------------------------------------------------------------
+# Trip archive (user-045)
+# ----------------------------------------------------------------------
+class TripArchiveTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.truck, self.ravi = self.vehicle('RJ14-1001'), self.driver('D1')
+        self.old = self.trip(self.truck, self.ravi, status='COMPLETED', day=date(2024, 5, 1))
+        self.expense = TripExpense.objects.create(
+            trip=self.old, date=date(2024, 5, 2), expense_category=self.category, amount=Decimal('750.00'),
+        )
+        DocketTable.objects.create(
+            trip=self.old, driver=self.ravi, transporter=self.transporter, origin='Jaipur', destination='Delhi',
+            docket_no='DK-1', send_date=date(2024, 5, 3),
+        )
+        self.open = self.trip(self.vehicle('RJ14-1002'), self.driver('D2'), day=date(2024, 5, 1))
+
+    def test_archive_moves_completed_trips_with_their_rows(self):
+        self.assertEqual(archive_trips(date(2025, 1, 1)), 1)
+
+        self.assertFalse(Trip.objects.filter(pk=self.old.pk).exists())
+        self.assertTrue(Trip.objects.filter(pk=self.open.pk).exists())
+        archived = ArchivedTrip.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.total_freight, self.old.total_freight)
+        self.assertEqual(ArchivedTripExpense.objects.get(pk=self.expense.pk).amount, Decimal('750.00'))
+        self.assertEqual(archived.dockets.get().docket_no, 'DK-1')
+        self.assertIsInstance(find_trip(self.old.trip_id), ArchivedTrip)
+
+    def test_restore_brings_back_the_same_rows(self):
+        archive_trips(date(2025, 1, 1))
+
+        self.assertEqual(restore_trips([self.old.trip_id]), 1)
+
+        self.assertFalse(ArchivedTrip.objects.exists())
+        trip = find_trip(self.old.trip_id)
+        self.assertIsInstance(trip, Trip)
+        self.assertEqual(trip.pk, self.old.pk)
+        self.assertEqual(trip.tripexpense_set.get().pk, self.expense.pk)
+        self.assertTrue(DocketTable.objects.filter(trip=trip, docket_no='DK-1').exists())
+
+    def test_restore_refuses_docket_numbers_reused_meanwhile(self):
+        archive_trips(date(2025, 1, 1))
+        DocketTable.objects.create(
+            trip=self.open, driver=self.ravi, transporter=self.transporter, origin='Jaipur', destination='Delhi',
+            docket_no='DK-1', send_date=date(2024, 6, 1),
+        )
+
+        with self.assertRaises(ValidationError):
+            restore_trips([self.old.trip_id])
+        self.assertTrue(ArchivedTrip.objects.filter(pk=self.old.pk).exists())
+
+
+# ----------------------------------------------------------------------
+# Admin changelists (user-046)
+# ----------------------------------------------------------------------
+class AdminChangelistTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(admin_user)
+        self.trucks = [self.vehicle(f'RJ14-{number:04d}') for number in range(1, 6)]
+
+    def add_trips(self, count):
+        for number in range(count):
+            driver = self.driver(f'D{Trip.objects.count() + 1}')
+            self.trip(self.trucks[number % len(self.trucks)], driver, status='COMPLETED')
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        urls = [
+            reverse('admin:management_trip_changelist'),
+            reverse('admin:management_tripexpense_changelist'),
+            reverse('admin:management_trip_changelist') + '?date__year=2025&date__month=1',
+        ]
+        self.add_trips(2)
+        for url in urls:
+            self.client.get(url)  # fills the master-data cache
+        few = [self.changelist_queries(url) for url in urls]
+        self.add_trips(20)
+        self.assertEqual([self.changelist_queries(url) for url in urls], few)
+
+    @override_settings(ADMIN_FILTER_PAGE_SIZE=2)
+    def test_related_filters_are_paginated(self):
+        url = reverse('admin:management_trip_changelist')
+        response = self.client.get(url)
+        self.assertContains(response, 'RJ14-0002')
+        self.assertNotContains(response, 'RJ14-0003')
+        self.assertContains(response, 'vehicle__fpage=1')
+
+        response = self.client.get(url, {'vehicle__vehicle_no__exact': self.trucks[4].pk, 'vehicle__fpage': 1})
+        self.assertContains(response, 'RJ14-0003')
+        self.assertContains(response, 'RJ14-0005')  # the selected vehicle stays visible
+        self.assertContains(response, 'vehicle__fpage=0')
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=3)
+    def test_large_unfiltered_lists_use_the_row_estimate(self):
+        self.add_trips(4)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        trips = Trip.objects.order_by('pk')
+        with self.assertNumQueries(1):
+            self.assertEqual(EstimatedCountPaginator(trips, 10).count, 4)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(EstimatedCountPaginator(trips.filter(status='COMPLETED'), 10).count, 4)
+        self.assertIn('COUNT(', queries.captured_queries[0]['sql'])
+
+
+# ----------------------------------------------------------------------
+# Client invoicing (user-047)
+# ----------------------------------------------------------------------
+@override_settings(INVOICE_COMPANY_GST_NUMBER='08AAACT1234C1Z5', INVOICE_GST_RATE=Decimal('12.00'))
+class InvoiceTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client_party.gst_number = '08AAACA1111A1Z1'  # Rajasthan, like the seller
+        self.client_party.save()
+        self.outstation = PartyMaster.objects.create(
+            party_type='CLIENT', name='Bharat Steel', gst_number='27AAACB2222B1Z2',
+        )
+        self.halting = ExpenseCategory.objects.create(name='Halting Charges', is_trip_expense=True)
+
+        self.local_trip = self.trip(
+            self.vehicle('RJ14-1001'), self.driver('D1'), status='COMPLETED', day=date(2025, 1, 10),
+            shortage_deduction=Decimal('200.00'),
+        )
+        TripExpense.objects.create(
+            trip=self.local_trip, date=date(2025, 1, 11), expense_category=self.halting, amount=Decimal('500.00'),
+        )
+        self.outstation_trip = self.trip(
+            self.vehicle('RJ14-1002'), self.driver('D2'), status='COMPLETED', day=date(2025, 1, 20),
+            client=self.outstation,
+        )
+        self.trip(self.vehicle('RJ14-1003'), self.driver('D3'), day=date(2025, 1, 25))  # not completed
+        self.trip(self.vehicle('RJ14-1004'), self.driver('D4'), status='COMPLETED', day=date(2025, 2, 1))
+
+    def invoice_january(self):
+        return create_invoices(date(2025, 1, 1), date(2025, 1, 31))
+
+    def test_gst_split_follows_the_client_state(self):
+        self.assertEqual(
+            gst_split(Decimal('100.05'), '08AAACA1111A1Z1'),
+            (Decimal('12.00'), Decimal('6.01'), Decimal('6.00'), Decimal('0.00')),
+        )
+        self.assertEqual(
+            gst_split(Decimal('1000.00'), '27AAACB2222B1Z2'),
+            (Decimal('12.00'), Decimal('0.00'), Decimal('0.00'), Decimal('120.00')),
+        )
+        self.assertEqual(gst_split(Decimal('1000.00'), '')[1:], (Decimal('60.00'), Decimal('60.00'), Decimal('0.00')))
+
+    def test_numbers_run_on_per_fiscal_year(self):
+        self.assertEqual(fiscal_year_label(date(2025, 3, 31)), '2024-25')
+        self.assertEqual(fiscal_year_label(date(2025, 4, 1)), '2025-26')
+        self.assertEqual(allocate_numbers(date(2025, 1, 31), 2), ['INV/2024-25/0001', 'INV/2024-25/0002'])
+        self.assertEqual(allocate_numbers(date(2025, 2, 28), 1), ['INV/2024-25/0003'])
+        self.assertEqual(allocate_numbers(date(2025, 4, 30), 1), ['INV/2025-26/0001'])
+
+    def test_batch_bills_each_client_once(self):
+        local, outstation = self.invoice_january()  # in client name order
+
+        self.assertEqual((local.number, outstation.number), ('INV/2024-25/0001', 'INV/2024-25/0002'))
+        self.assertEqual(local.client, self.client_party)
+        self.assertEqual(
+            (local.freight, local.halting, local.shortage, local.taxable_amount),
+            (Decimal('10000.00'), Decimal('500.00'), Decimal('200.00'), Decimal('10300.00')),
+        )
+        self.assertEqual((local.cgst, local.sgst, local.igst, local.total), (
+            Decimal('618.00'), Decimal('618.00'), Decimal('0.00'), Decimal('11536.00'),
+        ))
+        self.assertEqual((outstation.igst, outstation.total), (Decimal('1200.00'), Decimal('11200.00')))
+        self.assertEqual(list(local.lines.values_list('trip', flat=True)), [self.local_trip.pk])
+
+        posting = local.receivable_entry
+        self.assertEqual((posting.to_account.account_name, posting.deposit), ('Sundry Debtors', Decimal('11536.00')))
+        self.assertEqual(self.invoice_january(), [])
+
+    def test_cancelled_trips_are_billable_again_under_new_numbers(self):
+        invoices = self.invoice_january()
+        self.assertEqual(cancel_invoices(invoices), 2)
+        self.assertFalse(AccountTransaction.objects.filter(description__startswith='Invoice').exists())
+
+        numbers = [invoice.number for invoice in self.invoice_january()]
+        self.assertEqual(numbers, ['INV/2024-25/0003', 'INV/2024-25/0004'])
+
+    def test_invoice_date_cannot_precede_the_period_end(self):
+        with self.assertRaises(ValidationError):
+            create_invoices(date(2025, 1, 1), date(2025, 1, 31), invoice_date=date(2025, 1, 30))
+
+    def test_documents_are_rendered_to_the_output_directory(self):
+        invoices = self.invoice_january()
+        with tempfile.TemporaryDirectory() as output, override_settings(INVOICE_OUTPUT_DIR=Path(output)):
+            self.assertEqual(render_invoices(invoices, workers=1), 2)
+            local = Invoice.objects.get(pk=invoices[0].pk)
+            self.assertEqual(local.document, 'INV-2024-25-0001.html')
+            html = (Path(output) / local.document).read_text()
+        self.assertIn('INV/2024-25/0001', html)
+        self.assertIn(self.local_trip.trip_id, html)
+
+
+# ----------------------------------------------------------------------
+# Branches (user-048)
+# ----------------------------------------------------------------------
+class BranchScopeTests(FixturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pune = Branch.objects.create(code='PN', name='Pune')
+        self.mumbai = Branch.objects.create(code='MB', name='Mumbai')
+        self.pune_truck = self.vehicle('MH12-1001', branch=self.pune)
+        self.mumbai_truck = self.vehicle('MH01-2002', branch=self.mumbai)
+        self.pool_truck = self.vehicle('MH04-3003')  # shared by every branch
+        self.pune_trip = self.trip(self.pune_truck, self.driver('D1', branch=self.pune), origin='Nashik')
+        self.mumbai_trip = self.trip(self.mumbai_truck, self.driver('D2', branch=self.mumbai), origin='Nashik')
+
+    def test_new_rows_take_the_branch_of_their_source(self):
+        self.assertEqual(self.pune_trip.branch_id, self.pune.pk)
+        expense = TripExpense.objects.create(
+            trip=self.mumbai_trip, date=date(2025, 1, 11), expense_category=self.category, amount=Decimal('10.00'),
+        )
+        self.assertEqual(expense.branch_id, self.mumbai.pk)
+
+    def test_scoped_querysets(self):
+        with branch_scope(self.pune):
+            self.assertEqual(list(Trip.scoped.values_list('pk', flat=True)), [self.pune_trip.pk])
+            self.assertEqual(
+                set(Vehicle.scoped.values_list('vehicle_no', flat=True)), {'MH12-1001', 'MH04-3003'},
+            )
+        with branch_scope(None):
+            self.assertEqual(Trip.scoped.count(), 2)
+        self.assertEqual(Trip.objects.for_branch(self.mumbai).get(), self.mumbai_trip)
+
+    def test_transitions_only_move_trips_in_scope(self):
+        with branch_scope(self.pune):
+            _, changed, skipped = apply_transition([self.pune_trip.trip_id, self.mumbai_trip.trip_id], 'CANCELLED')
+        self.assertEqual(changed, [self.pune_trip.trip_id])
+        self.assertEqual(skipped, {self.mumbai_trip.trip_id: "Trip not found."})
+        self.assertEqual(Trip.objects.get(pk=self.mumbai_trip.pk).status, 'PENDING')
+
+        batch, _, _ = apply_transition([self.mumbai_trip.trip_id], 'COMPLETED')
+        with branch_scope(self.pune):
+            restored, _ = undo_batch(batch)
+        self.assertEqual(restored, [])
+        self.assertEqual(Trip.objects.get(pk=self.mumbai_trip.pk).status, 'COMPLETED')
+
+    def test_availability_and_search_stay_in_scope(self):
+        apply_transition([self.pune_trip.trip_id, self.mumbai_trip.trip_id], 'COMPLETED')
+        with branch_scope(self.pune):
+            self.assertEqual([v.vehicle_no for v in available('vehicle')], ['MH04-3003', 'MH12-1001'])
+
+        found = {entry.object_pk for entry in search('Nashik', kinds=['trip'], branch=self.pune.pk)}
+        self.assertEqual(found, {str(self.pune_trip.pk)})
+        found = {entry.object_pk for entry in search('Nashik', kinds=['trip'])}
+        self.assertEqual(found, {str(self.pune_trip.pk), str(self.mumbai_trip.pk)})
+
+    def test_branch_users_cannot_reach_other_branches_trips(self):
+        user = get_user_model().objects.create_user('pune-clerk', password='x', is_staff=True)
+        UserBranch.objects.create(user=user, branch=self.pune)
+        self.client.force_login(user)
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+        response = self.client.post(
+            reverse('trip_status_complete', args=[self.mumbai_trip.trip_id]), **ajax,
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(
+            reverse('trip_bulk_status'),
+            {'trip_ids': [self.pune_trip.trip_id, self.mumbai_trip.trip_id], 'status': 'COMPLETED'}, **ajax,
+        )
+        self.assertEqual(response.json()['skipped'], {self.mumbai_trip.trip_id: "Trip not found."})
+        self.assertEqual(Trip.objects.get(pk=self.mumbai_trip.pk).status, 'PENDING')
+
+    def test_branch_users_cannot_reach_other_branches_payroll_statements_or_invoices(self):
+        mumbai_bank = AccountMaster.objects.create(account_name='Mumbai Bank', branch=self.mumbai)
+        mumbai_fastag = AccountMaster.objects.create(
+            account_name='Mumbai Fastag', account_type='FASTAG', branch=self.mumbai,
+        )
+        run = PayrollRun.objects.create(
+            period_start=date(2025, 1, 1), period_end=date(2025, 1, 31), paid_via_account=self.account,
+        )
+        Payslip.objects.create(payroll_run=run, driver=self.mumbai_trip.driver, net_pay=Decimal('9000.00'))
+        bank = BankStatement.objects.create(account=mumbai_bank, file_name='mumbai-jan.csv', file_format='CSV')
+        wallet = WalletStatement.objects.create(account=mumbai_fastag, file_name='mumbai-tolls.csv')
+        line = WalletStatementLine.objects.create(
+            statement=wallet, line_no=1, transacted_at=at(2025, 1, 10, 9, 0), amount=Decimal('250.00'), kind='TOLL',
+        )
+        invoice = Invoice.objects.create(
+            number='INV-1', client=PartyMaster.objects.create(party_type='CLIENT', name='Harbour', branch=self.mumbai),
+            invoice_date=date(2025, 1, 31), period_start=date(2025, 1, 1), period_end=date(2025, 1, 31),
+        )
+        with branch_scope(self.pune):
+            self.assertTrue(WalletAssignForm({'trip': self.pune_trip.trip_id.lower()}).is_valid())
+            self.assertFalse(WalletAssignForm({'trip': self.mumbai_trip.trip_id}).is_valid())
+        Trip.objects.filter(pk=self.mumbai_trip.pk).update(status='COMPLETED')
+        archive_trips(date(2025, 2, 1))
+
+        clerk = get_user_model().objects.create_user('pune-clerk', password='x', is_staff=True)
+        UserBranch.objects.create(user=clerk, branch=self.pune)
+        self.client.force_login(clerk)
+        for url in (
+            reverse('payroll_detail', args=[run.pk]), reverse('bank_statement_detail', args=[bank.pk]),
+            f"{reverse('wallet_review')}?statement={wallet.pk}", reverse('invoice_document', args=[invoice.pk]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.post(reverse('trip_restore', args=[self.mumbai_trip.trip_id])).status_code, 404)
+        self.assertTrue(ArchivedTrip.objects.filter(pk=self.mumbai_trip.pk).exists())
+
+        self.assertEqual(list(self.client.get(reverse('payroll_list')).context['runs']), [])
+        self.assertNotContains(self.client.get(reverse('bank_statement_list')), 'mumbai-jan.csv')
+        self.assertNotContains(self.client.get(reverse('wallet_statement_list')), 'mumbai-tolls.csv')
+        self.assertEqual(list(self.client.get(reverse('wallet_review')).context['page']), [])
+        self.assertEqual(list(self.client.get(reverse('invoice_list')).context['page']), [])
+        self.client.post(reverse('wallet_review_action'), {'action': 'ignore', 'line': [line.pk]})
+        self.assertEqual(WalletStatementLine.objects.get(pk=line.pk).status, 'REVIEW')
+
+        owner = get_user_model().objects.create_user('owner', password='x', is_staff=True)
+        self.client.force_login(owner)
+        self.assertEqual(self.client.get(reverse('payroll_detail', args=[run.pk])).status_code, 200)
+        self.assertEqual(list(self.client.get(reverse('wallet_review')).context['page']), [line])
+
+    def test_cached_pages_are_kept_apart_for_branch_users(self):
+        owner = get_user_model().objects.create_user('owner', password='x', is_staff=True)
+        clerk = get_user_model().objects.create_user('pune-clerk', password='x', is_staff=True)
+        UserBranch.objects.create(user=clerk, branch=self.pune)
+
+        self.client.force_login(owner)
+        self.client.get(reverse('branch_switch'), {'branch': self.pune.pk})
+        self.assertContains(self.client.get(reverse('trip_list')), 'All branches')
+
+        self.client.force_login(clerk)
+        response = self.client.get(reverse('trip_list'))
+        self.assertNotContains(response, 'All branches')
+        self.assertContains(response, 'Pune')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pune.name = 'Pune City'
+            self.pune.save()
+        self.assertContains(self.client.get(reverse('trip_list')), 'Pune City')
+
+# ----------------------------------------------------------------------
+# Scheduler (user-049)
+# ----------------------------------------------------------------------
+def at(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class CronSpecTests(SimpleTestCase):
+
+    def test_fields_with_ranges_lists_and_steps(self):
+        spec = CronSpec('*/15 6-20 * * 1-5')
+        self.assertEqual(spec.minutes, {0, 15, 30, 45})
+        self.assertEqual(CronSpec('5/20,1 * * * *').minutes, {1, 5, 25, 45})
+        self.assertTrue(spec.matches(at(2025, 1, 6, 6, 15)))  # a Monday
+        self.assertFalse(spec.matches(at(2025, 1, 6, 21, 15)))
+        self.assertFalse(spec.matches(at(2025, 1, 5, 6, 15)))  # a Sunday
+
+    def test_aliases_and_sunday_as_seven(self):
+        self.assertEqual(CronSpec('@daily').hours, {0})
+        self.assertTrue(CronSpec('0 0 * * 7').matches(at(2025, 1, 5, 0, 0)))
+
+    def test_restricted_day_fields_match_either(self):
+        spec = CronSpec('0 0 13 * 5')
+        self.assertTrue(spec.matches(at(2025, 1, 13, 0, 0)))  # the 13th, a Monday
+        self.assertTrue(spec.matches(at(2025, 1, 10, 0, 0)))  # a Friday
+        self.assertFalse(spec.matches(at(2025, 1, 11, 0, 0)))
+
+    def test_invalid_specs(self):
+        for spec in ('61 * * * *', '* * *', '5-1 * * * *', '*/0 * * * *', 'x * * * *'):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                CronSpec(spec)
+
+    def test_next_run(self):
+        self.assertEqual(CronSpec('30 2 * * *').next_run(at(2025, 1, 6, 2, 30)), at(2025, 1, 7, 2, 30))
+        self.assertEqual(CronSpec('0 0 29 2 *').next_run(at(2025, 3, 1)), at(2028, 2, 29))
+        self.assertIsNone(CronSpec('0 0 30 2 *').next_run(at(2025, 3, 1)))
+
+    def test_slots_between_catches_up_at_most_an_hour(self):
+        now = at(2025, 1, 6, 10, 0, 30)
+        self.assertEqual(slots_between(None, now), [at(2025, 1, 6, 10, 0)])
+        self.assertEqual(slots_between(at(2025, 1, 6, 9, 58), now), [at(2025, 1, 6, 9, 59), at(2025, 1, 6, 10, 0)])
+        self.assertEqual(slots_between(at(2025, 1, 6, 10, 0), now), [])
+        self.assertEqual(len(slots_between(at(2025, 1, 6, 6, 0), now)), 60)
+
+
+class SchedulerTests(TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.job = Job('test_job', self.work, '* * * * *', lock_timeout=60)
+        self.slot = at(2025, 1, 6, 10, 0)
+
+    def work(self):
+        self.calls.append(1)
+        return len(self.calls)
+
+    def test_each_slot_is_claimed_once(self):
+        self.assertTrue(claim(self.job, self.slot, 'host-a'))
+        self.assertFalse(claim(self.job, self.slot, 'host-b'))  # locked
+        release(self.job, 'host-a')
+        self.assertFalse(claim(self.job, self.slot, 'host-b'))  # slot already run
+        self.assertTrue(claim(self.job, self.slot + timedelta(minutes=1), 'host-b'))
+
+    def test_lapsed_locks_can_be_taken_over(self):
+        self.assertTrue(claim(self.job, worker='host-a'))
+        self.assertFalse(claim(self.job, worker='host-b'))
+        ScheduledJob.objects.filter(name='test_job').update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(claim(self.job, worker='host-b'))
+        self.assertEqual(ScheduledJob.objects.get(name='test_job').locked_by, 'host-b')
+
+    def test_runs_are_recorded(self):
+        run = run_job(self.job, self.slot, 'host-a')
+        self.assertEqual((run.status, run.result, run.scheduled_for), ('SUCCESS', '1', self.slot))
+        self.assertIsNone(run_job(self.job, self.slot, 'host-b'))
+        self.assertEqual(ScheduledJob.objects.get(name='test_job').locked_by, '')
+
+        self.job.func = lambda: 1 / 0
+        failed = run_job(self.job, worker='host-a')
+        self.assertEqual(failed.status, 'FAILED')
+        self.assertIn('ZeroDivisionError', failed.error)
+        self.assertEqual(JobRun.objects.count(), 2)
@@ -0,0 +1,87 @@
+# management/tracking.py
+
+"""
+Dirty-field tracking for models with a custom save().
+
+TrackedFieldsMixin remembers each field's value as it was loaded from the
+database (or last saved). save() can then ask has_changed() before
+recomputing a derived field, and the UPDATE itself only writes the fields
+that actually changed: flipping a trip's status issues
+`UPDATE ... SET status = ...` and nothing else. A save with no changes is
+skipped altogether.
+
+Instances that were not loaded from the database (new objects, or objects
+built by hand with a pk) are not tracked: every field counts as changed and
+they save exactly as before.
+
+Values are compared with ==, so in-place mutation of a mutable value (a dict
+in a JSONField) is not seen; none of the tracked models have one.
+"""
+
+
+class TrackedFieldsMixin:
+    """Mix into a models.Model subclass, before models.Model."""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember(field_names)
+        return instance
+
+    def _remember(self, attnames=None):
+        if attnames is None:
+            attnames = [field.attname for field in self._meta.concrete_fields]
+        loaded = getattr(self, '_loaded_values', None) or {}
+        loaded.update({
+            attname: self.__dict__[attname] for attname in attnames if attname in self.__dict__
+        })
+        self._loaded_values = loaded
+
+    def is_tracked(self):
+        return getattr(self, '_loaded_values', None) is not None and not self._state.adding
+
+    def loaded_value(self, name):
+        """The value `name` had when loaded or last saved (the current value if untracked)."""
+        field = self._meta.get_field(name)
+        if self.is_tracked() and field.attname in self._loaded_values:
+            return self._loaded_values[field.attname]
+        return getattr(self, field.attname)
+
+    def changed_fields(self):
+        """Names of the concrete fields changed since load, or None when the instance is untracked."""
+        if not self.is_tracked():
+            return None
+        return {
+            field.name for field in self._meta.concrete_fields
+            if field.attname in self.__dict__ and (
+                field.attname not in self._loaded_values
+                or self.__dict__[field.attname] != self._loaded_values[field.attname]
+            )
+        }
+
+    def has_changed(self, *names):
+        """True if any of `names` (any field, if none given) changed. Always True when untracked."""
+        changed = self.changed_fields()
+        if changed is None:
+            return True
+        return bool(changed & set(names)) if names else bool(changed)
+
+    def _attnames(self, names):
+        if names is None:
+            return None
+        fields = (self._meta.get_field(name) for name in names)
+        return [field.attname for field in fields if field.concrete]
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember(self._attnames(fields))
+
+    def save(self, *args, **kwargs):
+        explicit = args or kwargs.get('update_fields') is not None or kwargs.get('force_insert')
+        if not explicit and self.is_tracked():
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs['update_fields'] = changed
+        super().save(*args, **kwargs)
+        self._remember(self._attnames(kwargs.get('update_fields')))
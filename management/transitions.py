@@ -0,0 +1,172 @@
+# management/transitions.py
+
+"""
+Trip status transitions, one trip or many at a time.
+
+A batch is validated against ALLOWED_TRANSITIONS and the double-booking rule
+(management.availability) with a couple of set-based queries, then applied
+with a single UPDATE. Trip.save() is not called, since status does not change
+freight, commission or advance. Each applied batch is stored as a
+TripStatusBatch, so undo_batch() can put every trip back with one UPDATE per
+previous status.
+
+Only trips in the current branch scope (management.branches) are moved or
+restored; the double-booking check still sees every branch's trips.
+
+QuerySet.update skips post_save, so this module refreshes what the receivers
+would have: cache versions, KPI tiles, lane statistics, monthly vehicle
+stats and search entries.
+"""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_version
+from .fleet import mark_vehicle_months
+from .kpis import refresh_tiles, tiles_for
+from .lanes import refresh_lane
+from .models import ACTIVE_TRIP_STATUSES, TRIP_STATUS_CHOICES, Trip, TripStatusBatch
+from .search import reindex
+
+# Current status -> statuses it may move to
+ALLOWED_TRANSITIONS = {
+    'PENDING': {'IN_TRANSIT', 'COMPLETED', 'CANCELLED'},
+    'IN_TRANSIT': {'COMPLETED', 'CANCELLED'},
+    'COMPLETED': {'IN_TRANSIT'},
+    'CANCELLED': {'PENDING'},
+}
+STATUS_LABELS = dict(TRIP_STATUS_CHOICES)
+STATUS_BADGES = {
+    'PENDING': 'bg-primary',
+    'IN_TRANSIT': 'bg-warning text-dark',
+    'COMPLETED': 'bg-success',
+    'CANCELLED': 'bg-secondary',
+}
+
+
+def _booking_conflicts(trips, moving_pks):
+    """
+    trip_id -> reason for the trips in `trips` that would double-book a vehicle
+    or driver if made active. Checked against active trips outside the batch
+    and against each other.
+    """
+    conflicts = {}
+    for field in ('vehicle', 'driver'):
+        wanted = {getattr(trip, f'{field}_id') for trip in trips}
+        busy = dict(
+            Trip.objects.filter(status__in=ACTIVE_TRIP_STATUSES, **{f'{field}_id__in': wanted})
+            .exclude(pk__in=moving_pks)
+            .values_list(f'{field}_id', 'trip_id')
+        )
+        for trip in trips:
+            key = getattr(trip, f'{field}_id')
+            if key in busy and trip.trip_id not in conflicts:
+                conflicts[trip.trip_id] = f"{field.capitalize()} {key} is already on trip {busy[key]}."
+            elif trip.trip_id not in conflicts:
+                busy[key] = trip.trip_id  # later trips in the batch conflict with this one
+    return conflicts
+
+
+def _after_update(pks):
+    """Refreshes what the post_save receivers would have after a status UPDATE."""
+    reindex(Trip, pks)
+    lanes = set(Trip.objects.filter(pk__in=pks).values_list('origin', 'destination').distinct().order_by())
+    mark_vehicle_months(Trip.objects.filter(pk__in=pks).values_list('vehicle_id', 'date').distinct().order_by())
+
+    def after_commit():
+        bump_version('management.Trip')
+        refresh_tiles(tiles_for('management.Trip'))
+        for origin, destination in lanes:
+            refresh_lane(origin, destination)
+    transaction.on_commit(after_commit)
+
+
+@transaction.atomic
+def apply_transition(trip_ids, target):
+    """
+    Moves the trips with these trip_ids to `target`. Trips that cannot move are
+    skipped with a reason. Returns (batch or None, changed trip_ids, {trip_id: reason}).
+    """
+    if target not in STATUS_LABELS:
+        raise ValidationError(f"Unknown trip status: {target}")
+
+    trips = list(
+        Trip.scoped.select_for_update()
+        .filter(trip_id__in=set(trip_ids))
+        .only('pk', 'trip_id', 'status', 'vehicle_id', 'driver_id')
+    )
+    skipped = {trip_id: 'Trip not found.' for trip_id in set(trip_ids) - {trip.trip_id for trip in trips}}
+    movable = []
+    for trip in trips:
+        if trip.status == target:
+            skipped[trip.trip_id] = f"Already {STATUS_LABELS[target]}."
+        elif target not in ALLOWED_TRANSITIONS[trip.status]:
+            skipped[trip.trip_id] = f"Cannot move from {STATUS_LABELS[trip.status]} to {STATUS_LABELS[target]}."
+        else:
+            movable.append(trip)
+
+    if target in ACTIVE_TRIP_STATUSES:
+        reactivated = [trip for trip in movable if trip.status not in ACTIVE_TRIP_STATUSES]
+        conflicts = _booking_conflicts(reactivated, [trip.pk for trip in movable])
+        skipped.update(conflicts)
+        movable = [trip for trip in movable if trip.trip_id not in conflicts]
+
+    if not movable:
+        return None, [], skipped
+
+    previous = defaultdict(list)
+    for trip in movable:
+        previous[trip.status].append(trip.pk)
+    pks = [trip.pk for trip in movable]
+
+    Trip.objects.filter(pk__in=pks).update(status=target)
+    batch = TripStatusBatch.objects.create(
+        target_status=target, previous_statuses=dict(previous), trip_count=len(pks),
+    )
+    _after_update(pks)
+    return batch, sorted(trip.trip_id for trip in movable), skipped
+
+
+@transaction.atomic
+def undo_batch(batch):
+    """
+    Restores the previous status of every trip in the batch that is still at
+    the batch's target status. One UPDATE per previous status.
+    Returns (restored trip_ids, {trip_id: reason}).
+    """
+    batch = TripStatusBatch.objects.select_for_update().get(pk=batch.pk)
+    if batch.undone_at:
+        raise ValidationError("This status change has already been undone.")
+
+    all_pks = [pk for pks in batch.previous_statuses.values() for pk in pks]
+    trips = {
+        trip.pk: trip for trip in
+        Trip.scoped.select_for_update().filter(pk__in=all_pks).only('pk', 'trip_id', 'status', 'vehicle_id', 'driver_id')
+    }
+    skipped = {
+        trip.trip_id: f"Changed since, now {STATUS_LABELS[trip.status]}."
+        for trip in trips.values() if trip.status != batch.target_status
+    }
+
+    reactivated = [
+        trips[pk] for status, pks in batch.previous_statuses.items() if status in ACTIVE_TRIP_STATUSES
+        for pk in pks if pk in trips and trips[pk].trip_id not in skipped
+    ]
+    if batch.target_status not in ACTIVE_TRIP_STATUSES:
+        skipped.update(_booking_conflicts(reactivated, [trip.pk for trip in reactivated]))
+
+    restored = []
+    for status, pks in batch.previous_statuses.items():
+        pks = [pk for pk in pks if pk in trips and trips[pk].trip_id not in skipped]
+        if pks:
+            Trip.objects.filter(pk__in=pks, status=batch.target_status).update(status=status)
+            restored += pks
+
+    batch.undone_at = timezone.now()
+    batch.save(update_fields=['undone_at'])
+    if restored:
+        _after_update(restored)
+    return sorted(trips[pk].trip_id for pk in restored), skipped
@@ -1,15 +1,29 @@
 # C:\Users\Alam\tms_project\management\urls.py
 
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Under ASGI (settings.ASYNC_VIEWS) the read-heavy pages use their async versions.
+if settings.ASYNC_VIEWS:
+    trip_list_view, trip_detail_view, account_list_view = (
+        async_views.dashboard, async_views.trip_detail, async_views.account_overview
+    )
+else:
+    trip_list_view, trip_detail_view, account_list_view = (
+        views.trip_list, views.trip_detail, views.account_list
+    )
 
 urlpatterns = [
     # 1. Dashboard / Trip List (Homepage for the app)
-    path('', views.trip_list, name='trip_list'),
+    path('', trip_list_view, name='trip_list'),
     
     # --- Trip URLs ---
     path('trip/new/', views.trip_create, name='trip_create'),
-    path('trip/<str:trip_id>/', views.trip_detail, name='trip_detail'),
+    path('trips/bulk-status/', views.trip_bulk_status, name='trip_bulk_status'),
+    path('trips/bulk-status/<int:batch_id>/undo/', views.trip_bulk_status_undo, name='trip_bulk_status_undo'),
+    path('trip/<str:trip_id>/', trip_detail_view, name='trip_detail'),
+    path('trip/<str:trip_id>/restore/', views.trip_restore, name='trip_restore'),
     path('trip/<str:trip_id>/edit/', views.trip_update, name='trip_update'),
     path('trip/<str:trip_id>/record-advance/', views.trip_record_advance, name='trip_record_advance'),
     path('trip/<str:trip_id>/complete/', views.trip_status_complete, name='trip_status_complete'),
@@ -17,7 +31,7 @@ urlpatterns = [
     path('trip/<str:trip_id>/expense/new/', views.trip_expense_create, name='trip_expense_create'),
     
     # --- Account Master URLs ---
-    path('accounts/', views.account_list, name='account_list'),
+    path('accounts/', account_list_view, name='account_list'),
     path('accounts/create/', views.account_create, name='account_create'),
     path('accounts/transfer/', views.account_transfer, name='account_transfer'),
     path('accounts/<int:account_id>/', views.account_detail, name='account_detail'),
@@ -57,6 +71,40 @@ urlpatterns = [
 
     path('trip/<str:pk>/settlement/', views.trip_final_settlement, name='trip_final_settlement'),
 
+    # --- Driver Payroll URLs ---
+    path('payroll/', views.payroll_list, name='payroll_list'),
+    path('payroll/<int:pk>/', views.payroll_detail, name='payroll_detail'),
+
+    # --- Bank Statement Reconciliation ---
+    path('bank-statements/', views.bank_statement_list, name='bank_statement_list'),
+    path('bank-statements/<int:pk>/', views.bank_statement_detail, name='bank_statement_detail'),
+    path('bank-statements/<int:pk>/action/', views.bank_statement_action, name='bank_statement_action'),
+
+    # --- Fastag / Diesel-card Statements ---
+    path('wallet-statements/', views.wallet_statement_list, name='wallet_statement_list'),
+    path('wallet-statements/review/', views.wallet_review, name='wallet_review'),
+    path('wallet-statements/review/action/', views.wallet_review_action, name='wallet_review_action'),
+
+    # --- Fleet Analytics ---
+    path('fleet/efficiency/', views.fleet_efficiency, name='fleet_efficiency'),
+
+    # --- Accounting Period Close ---
+    path('periods/', views.period_list, name='period_list'),
+    path('periods/<int:pk>/reopen/', views.period_reopen, name='period_reopen'),
+
+    # --- Client Invoicing ---
+    path('invoices/', views.invoice_list, name='invoice_list'),
+    path('invoices/<int:pk>/document/', views.invoice_document, name='invoice_document'),
+    path('branch/', views.branch_switch, name='branch_switch'),
+
+    # --- Vehicle & Driver Availability (JSON) ---
+    path('availability/', views.availability, name='availability'),
+    path('lane-rate/', views.lane_rate, name='lane_rate'),
+    path('locations/match/', views.location_match, name='location_match'),
+
+    # --- Global Search ---
+    path('search/', views.search, name='search'),
+
 
 
 
@@ -1,38 +1,71 @@
 # management/views.py (COMPLETE & FINAL FILE)
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Sum, Q
+from django.db.models import Count, Sum, Q
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import FileResponse, JsonResponse, HttpResponse, Http404
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import url_has_allowed_host_and_scheme
 from decimal import Decimal
-from datetime import date
+from datetime import date, timedelta
+from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.http import require_POST
 from .models import (
     Trip, TripExpense, Vehicle, Driver, PartyMaster,
     ExpenseCategory, MaintenanceExpense,
-    AccountMaster, AccountTransaction
+    AccountMaster, AccountTransaction, KpiTile, PayrollRun, TripStatusBatch,
+    BankStatement, STATEMENT_LINE_STATUS_CHOICES, WalletStatement, WalletStatementLine, AccountingPeriod,
+    ArchivedAccountTransaction, ArchivedTrip, Invoice, Branch
 )
+from .cache import masterdata, cache_page_versioned
+from .fleet import GROUPINGS, ROLLING_WINDOWS, rolling_efficiency, vehicle_trend
+from .routers import reporting_db
+from .kpis import load_tiles, tiles_expire_at
+from .archive import find_trip, restore_trips
+from .availability import available
+from .branches import SESSION_KEY as BRANCH_SESSION_KEY, current_branch
+from .invoicing import CONTENT_TYPES, ensure_document, generate_invoices
+from .lanes import suggest_rate, suggestion_text
+from .locations import match_places
+from .money import Paise, from_paise, to_paise
+from .payroll import month_bounds
+from .periods import close_period, latest_period, open_transactions, reopen_period
+from .reconciliation import confirm_matches, import_statement, reconcile, statement_summary, unmatch_lines
+from .search import KIND_LABELS, parse_query, search as search_entries
+from .transitions import STATUS_BADGES, STATUS_LABELS, apply_transition, undo_batch
+from .wallets import assign_trip, ignore_lines, import_wallet_statement, rematch_lines, restore_lines
 
 from .forms import (
     TripForm, TripExpenseForm, MaintenanceExpenseForm,
     ExpenseCategoryForm, AccountMasterForm, AdvanceReceiptForm, 
     VehicleForm, PartyMasterForm, AccountTransferForm, DriverForm,
-    TripSettlementForm  # Make sure this is in your forms.py!
+    TripSettlementForm,  # Make sure this is in your forms.py!
+    BankStatementUploadForm, WalletStatementUploadForm, WalletAssignForm, PeriodCloseForm, InvoiceBatchForm
 )
 
 # ----------------------------------------------------------------------
 # 1. Trip List Dashboard View
 # ----------------------------------------------------------------------
+# The bulk status bar reads the CSRF token from its cookie (the cached page must not embed one)
+@ensure_csrf_cookie
+@cache_page_versioned(Trip, Vehicle, Driver, PartyMaster, KpiTile)
 def trip_list(request):
-    """Dashboard View (Lists all trips)"""
-    trips = Trip.objects.all().select_related('vehicle', 'driver', 'transporter').order_by('-date')
+    """Dashboard View (the branch's trips; the company-wide KPI tiles only when viewing all branches)"""
+    trips = Trip.scoped.select_related('vehicle', 'driver', 'transporter').order_by('-date')
+    kpi_tiles = load_tiles() if request.branch_id is None else {}
     context = {
+        'kpi_tiles': kpi_tiles,
         'trips': trips,
         'title': 'Trip List & Dashboard'
     }
-    return render(request, 'management/trip_list.html', context)
+    response = render(request, 'management/trip_list.html', context)
+    # The cached page must not outlive its date-dependent tiles (month end, midnight)
+    response.cache_expires_at = tiles_expire_at(kpi_tiles)
+    return response
 
 # ----------------------------------------------------------------------
 # 2. Create/Update Trip Views
@@ -56,7 +89,7 @@ def trip_create(request):
 def trip_update(request, trip_id):
     """Updates an existing Trip record."""
     # Note: Using trip_id from the URL to fetch the Trip object
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = get_object_or_404(Trip.scoped, trip_id=trip_id)
 
     if request.method == 'POST':
         # Initialize form with POST data and the existing instance
@@ -82,9 +115,50 @@ def trip_update(request, trip_id):
 # ----------------------------------------------------------------------
 # 3. Trip Detail & Expense Management View
 # ----------------------------------------------------------------------
+def build_display_expenses(trip, trip_expenses):
+    """Trip expenses plus synthetic rows for commission and orai, sorted by date."""
+    SyntheticAttr = type('obj', (object,), {'name': 'N/A', 'account_name': 'N/A'})
+    display_expenses = list(trip_expenses.select_related('expense_category', 'paid_via_account'))
+
+    if trip.commission_amount > 0:
+        commission_category = SyntheticAttr()
+        commission_category.name = 'Transporter Commission'
+        commission_account = SyntheticAttr()
+        commission_account.account_name = 'N/A'
+        display_expenses.append({
+            'date': trip.date,
+            'expense_category': commission_category,
+            'description': 'Agent Commission (Pre-calculated)',
+            'amount': trip.commission_amount,
+            'paid_via_account': commission_account,
+            'is_synthetic': True, 
+        })
+
+    if trip.orai_amount > 0:
+        orai_category = SyntheticAttr()
+        orai_category.name = 'Orai Charges'
+        orai_account = SyntheticAttr()
+        orai_account.account_name = 'N/A'
+        display_expenses.append({
+            'date': trip.date,
+            'expense_category': orai_category,
+            'description': 'Fixed Orai Deduction (Pre-calculated)',
+            'amount': trip.orai_amount,
+            'paid_via_account': orai_account,
+            'is_synthetic': True,
+        })
+
+    display_expenses.sort(key=lambda x: x['date'] if isinstance(x, dict) else x.date)
+    return display_expenses
+
+
 def trip_detail(request, trip_id):
     """View to display trip details, expenses, and P&L."""
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = find_trip(trip_id, scoped=True)
+    if trip is None:
+        raise Http404(f"Trip {trip_id} not found.")
+    if isinstance(trip, ArchivedTrip):
+        return archived_trip_detail(request, trip)
     trip_expenses = TripExpense.objects.filter(trip=trip).order_by('date')
     
     # --- 1. NEW: Fetch Advance Receipts ---
@@ -106,13 +180,11 @@ def trip_detail(request, trip_id):
     halting_amount = Decimal(0)
     deductible_expenses_query = trip_expenses 
     
-    try:
-        halting_category = ExpenseCategory.objects.get(name__iexact='Halting Charges')
+    halting_category = masterdata.get_by(ExpenseCategory, 'name', 'Halting Charges')
+    if halting_category:
         halting_sum_result = trip_expenses.filter(expense_category=halting_category).aggregate(Sum('amount'))
         halting_amount = halting_sum_result['amount__sum'] or Decimal(0)
         deductible_expenses_query = trip_expenses.exclude(expense_category=halting_category)
-    except ExpenseCategory.DoesNotExist:
-        pass 
         
     # --- 3. CALCULATE FINAL FINANCIAL FIGURES ---
     total_revenue = trip.total_freight + halting_amount
@@ -127,38 +199,8 @@ def trip_detail(request, trip_id):
     )
 
     # --- 4. SYNTHETIC EXPENSES FOR DISPLAY ---
-    SyntheticAttr = type('obj', (object,), {'name': 'N/A', 'account_name': 'N/A'})
-    display_expenses = list(trip_expenses) 
-
-    if trip.commission_amount > 0:
-        commission_category = SyntheticAttr()
-        commission_category.name = 'Transporter Commission'
-        commission_account = SyntheticAttr()
-        commission_account.account_name = 'N/A'
-        display_expenses.append({
-            'date': trip.date,
-            'expense_category': commission_category,
-            'description': 'Agent Commission (Pre-calculated)',
-            'amount': trip.commission_amount,
-            'paid_via_account': commission_account,
-            'is_synthetic': True, 
-        })
-
-    if trip.orai_amount > 0:
-        orai_category = SyntheticAttr()
-        orai_category.name = 'Orai Charges'
-        orai_account = SyntheticAttr()
-        orai_account.account_name = 'N/A'
-        display_expenses.append({
-            'date': trip.date,
-            'expense_category': orai_category,
-            'description': 'Fixed Orai Deduction (Pre-calculated)',
-            'amount': trip.orai_amount,
-            'paid_via_account': orai_account,
-            'is_synthetic': True,
-        })
-    
-    display_expenses.sort(key=lambda x: x['date'] if isinstance(x, dict) else x.date)
+    # Built lazily: when the cached expense table fragment is served, this never runs.
+    display_expenses = SimpleLazyObject(lambda: build_display_expenses(trip, trip_expenses))
 
     # --- 5. HANDLE EXPENSE FORM SUBMISSION ---
     if request.method == 'POST':
@@ -192,13 +234,60 @@ def trip_detail(request, trip_id):
     }
     return render(request, 'management/trip_detail.html', context)
 
+def archived_trip_detail(request, trip):
+    """Read-only trip page for an archived trip (management.archive), with a restore button."""
+    trip_expenses = trip.expenses.order_by('date')
+    halting_category = masterdata.get_by(ExpenseCategory, 'name', 'Halting Charges')
+    halting_amount = Decimal('0.00')
+    deductible = trip_expenses
+    if halting_category:
+        halting = trip_expenses.filter(expense_category=halting_category).aggregate(Sum('amount'))
+        halting_amount = halting['amount__sum'] or Decimal('0.00')
+        deductible = trip_expenses.exclude(expense_category=halting_category)
+    deductible_sum = deductible.aggregate(Sum('amount'))['amount__sum'] or Decimal('0.00')
+    total_revenue = trip.total_freight + halting_amount
+
+    # Receipts stay in the ledger, or in the ledger archive once their period is closed
+    receipts = sorted(
+        [*AccountTransaction.objects.filter(related_trip_id=trip.pk, deposit__gt=0),
+         *ArchivedAccountTransaction.objects.filter(related_trip_id=trip.pk, deposit__gt=0)],
+        key=lambda receipt: (receipt.date, receipt.pk),
+    )
+    context = {
+        'trip': trip,
+        'trip_expenses': build_display_expenses(trip, trip_expenses),
+        'dockets': trip.dockets.all(),
+        'advance_receipts': receipts,
+        'total_advance_received': sum((receipt.deposit for receipt in receipts), Decimal('0.00')),
+        'total_revenue': total_revenue,
+        'total_expenses': deductible_sum,
+        'profit_loss': total_revenue - trip.commission_amount - trip.orai_amount - deductible_sum,
+        'halting_amount': halting_amount,
+        'title': f'Details for Trip: {trip.trip_id} (archived)',
+    }
+    return render(request, 'management/archived_trip_detail.html', context)
+
+@require_POST
+def trip_restore(request, trip_id):
+    """Moves an archived trip back to the live tables."""
+    if not ArchivedTrip.scoped.filter(trip_id=trip_id).exists():
+        raise Http404(f"Archived trip {trip_id} not found.")
+    try:
+        restored = restore_trips([trip_id])
+    except ValidationError as e:
+        messages.error(request, ' '.join(e.messages))
+    else:
+        if restored:
+            messages.success(request, f"Trip {trip_id} restored from the archive.")
+    return redirect('trip_detail', trip_id=trip_id)
+
 # ----------------------------------------------------------------------
 # 4. Record Advance Receipt View
 # ----------------------------------------------------------------------
 # In management/views.py
 
 def trip_record_advance(request, trip_id):
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = get_object_or_404(Trip.scoped, trip_id=trip_id)
     
     # 1. Fetch Advance Transactions
     # We use the related_name 'transactions_from_trip' defined in models.py
@@ -258,7 +347,7 @@ def trip_record_advance(request, trip_id):
 # 5. Trip Final Settlement View (NEW)
 # ----------------------------------------------------------------------
 def trip_final_settlement(request, pk):
-    trip = get_object_or_404(Trip, pk=pk)
+    trip = get_object_or_404(Trip.scoped, pk=pk)
     
     # 1. Calculate Financials
     total_advance = trip.transactions_from_trip.filter(deposit__gt=0).aggregate(Sum('deposit'))['deposit__sum'] or Decimal('0.00')
@@ -287,6 +376,7 @@ def trip_final_settlement(request, pk):
                 )
 
             trip.status = 'COMPLETED'
+            trip.shortage_deduction = shortage  # billed on the client invoice (management.invoicing)
             trip.save()
 
             messages.success(request, f"Trip {trip.trip_id} settled and marked as COMPLETED.")
@@ -310,7 +400,7 @@ def trip_final_settlement(request, pk):
 # 6. Account Management Views
 # ----------------------------------------------------------------------
 def account_list(request):
-    accounts = AccountMaster.objects.all().order_by('account_name')
+    accounts = AccountMaster.scoped.order_by('account_name')
     context = {'accounts': accounts, 'title': 'Account List & Balances'}
     return render(request, 'management/account_list.html', context)
 
@@ -327,7 +417,7 @@ def account_create(request):
     return render(request, 'management/account_form.html', context)
 
 def account_update(request, account_id):
-    account = get_object_or_404(AccountMaster, pk=account_id)
+    account = get_object_or_404(AccountMaster.scoped, pk=account_id)
     if request.method == 'POST':
         form = AccountMasterForm(request.POST, instance=account)
         if form.is_valid():
@@ -339,30 +429,41 @@ def account_update(request, account_id):
     return render(request, 'management/account_form.html', context)
 
 def account_detail(request, account_id):
-    account = get_object_or_404(AccountMaster, pk=account_id)
-    all_transactions = AccountTransaction.objects.filter(
-        Q(from_account=account) | Q(to_account=account)
-    ).order_by('date', 'pk')
+    account = get_object_or_404(AccountMaster.scoped, pk=account_id)
+    # The ledger is a reporting read: served from the snapshot when it is under a
+    # minute old (?fresh=1 forces the primary).
+    # Closed periods are summarised by their closing snapshot; only open-period rows are listed.
+    with reporting_db(max_staleness=0 if request.GET.get('fresh') else 60):
+        period = latest_period()
+        snapshot = period.balances.filter(account=account).first() if period else None
+        all_transactions = list(open_transactions(period.period_end if period else None).filter(
+            Q(from_account=account) | Q(to_account=account)
+        ).annotate(
+            deposit_paise=Paise('deposit'), withdrawal_paise=Paise('withdrawal'),
+        ).select_related('related_trip').order_by('date', 'pk'))
     
-    running_balance = account.initial_balance
+    # The running balance is kept in integer paise and converted per row for display
+    opening_balance = snapshot.closing_balance if snapshot else account.initial_balance
+    running_paise = to_paise(opening_balance)
     ledger_entries = []
     
     for transaction in all_transactions:
         deposit = transaction.deposit
         withdrawal = transaction.withdrawal
         
-        if transaction.from_account == account and transaction.to_account != account:
+        if transaction.from_account_id == account.pk and transaction.to_account_id != account.pk:
             # Money leaving this account
-            running_balance -= withdrawal
-        elif transaction.to_account == account:
+            running_paise -= transaction.withdrawal_paise
+        elif transaction.to_account_id == account.pk:
             # Money entering this account
-            running_balance += deposit
+            running_paise += transaction.deposit_paise
+        running_balance = from_paise(running_paise)
             
         ledger_entries.append({
             'date': transaction.date,
             'description': transaction.description,
-            'credit': deposit if transaction.to_account == account else 0,
-            'debit': withdrawal if transaction.from_account == account and transaction.to_account != account else 0,
+            'credit': deposit if transaction.to_account_id == account.pk else 0,
+            'debit': withdrawal if transaction.from_account_id == account.pk and transaction.to_account_id != account.pk else 0,
             'related_trip': transaction.related_trip,
             'current_balance': running_balance
         })
@@ -370,7 +471,9 @@ def account_detail(request, account_id):
     context = {
         'account': account,
         'ledger_entries': ledger_entries,
-        'final_balance': running_balance,
+        'opening_balance': opening_balance,
+        'closed_through': period.period_end if snapshot else None,
+        'final_balance': from_paise(running_paise),
         'title': f'Ledger for {account.account_name}'
     }
     return render(request, 'management/account_detail.html', context)
@@ -411,8 +514,9 @@ def account_transfer(request):
 # ----------------------------------------------------------------------
 # 7. Party Master Views
 # ----------------------------------------------------------------------
+@cache_page_versioned(PartyMaster)
 def party_list(request):
-    parties = PartyMaster.objects.all().order_by('party_type', 'name')
+    parties = PartyMaster.scoped.order_by('party_type', 'name')
     context = {'parties': parties, 'title': 'Party Master'}
     return render(request, 'management/party_list.html', context)
 
@@ -428,13 +532,13 @@ def party_create(request):
     return render(request, 'management/party_form.html', context)
 
 def party_detail(request, pk):
-    party = get_object_or_404(PartyMaster, pk=pk)
-    associated_trips = Trip.objects.filter(Q(client=party) | Q(transporter=party)).order_by('-date')
+    party = get_object_or_404(PartyMaster.scoped, pk=pk)
+    associated_trips = Trip.scoped.filter(Q(client=party) | Q(transporter=party)).order_by('-date')
     context = {'party': party, 'associated_trips': associated_trips, 'title': party.name}
     return render(request, 'management/party_detail.html', context)
 
 def party_update(request, pk):
-    party = get_object_or_404(PartyMaster, pk=pk)
+    party = get_object_or_404(PartyMaster.scoped, pk=pk)
     if request.method == 'POST':
         form = PartyMasterForm(request.POST, instance=party)
         if form.is_valid():
@@ -446,7 +550,7 @@ def party_update(request, pk):
     return render(request, 'management/party_form.html', context)
 
 def party_delete(request, pk):
-    party = get_object_or_404(PartyMaster, pk=pk)
+    party = get_object_or_404(PartyMaster.scoped, pk=pk)
     is_linked = Trip.objects.filter(Q(client=party) | Q(transporter=party)).exists()
     if request.method == 'POST':
         if not is_linked:
@@ -458,8 +562,9 @@ def party_delete(request, pk):
 # ----------------------------------------------------------------------
 # 8. Vehicle & Driver Views
 # ----------------------------------------------------------------------
+@cache_page_versioned(Vehicle)
 def vehicle_list(request):
-    vehicles = Vehicle.objects.all().order_by('vehicle_no')
+    vehicles = Vehicle.scoped.order_by('vehicle_no')
     context = {'vehicles': vehicles, 'title': 'Vehicle Master List'}
     return render(request, 'management/vehicle_list.html', context)
 
@@ -475,7 +580,7 @@ def vehicle_create(request):
     return render(request, 'management/vehicle_form.html', context)
 
 def vehicle_update(request, pk):
-    vehicle = get_object_or_404(Vehicle, pk=pk)
+    vehicle = get_object_or_404(Vehicle.scoped, pk=pk)
     if request.method == 'POST':
         form = VehicleForm(request.POST, instance=vehicle)
         if form.is_valid():
@@ -487,7 +592,7 @@ def vehicle_update(request, pk):
     return render(request, 'management/vehicle_form.html', context)
 
 def driver_list(request):
-    drivers = Driver.objects.all().order_by('driver_id')
+    drivers = Driver.scoped.order_by('driver_id')
     context = {'drivers': drivers, 'title': 'Driver Master List'}
     return render(request, 'management/driver_list.html', context)
 
@@ -503,7 +608,7 @@ def driver_create(request):
     return render(request, 'management/driver_form.html', context)
 
 def driver_update(request, pk):
-    driver = get_object_or_404(Driver, pk=pk)
+    driver = get_object_or_404(Driver.scoped, pk=pk)
     form_kwargs = {'instance': driver}
     if request.method == 'POST':
         form = DriverForm(request.POST, **form_kwargs)
@@ -517,7 +622,7 @@ def driver_update(request, pk):
     return render(request, 'management/driver_form.html', context)
 
 def driver_delete(request, pk):
-    driver = get_object_or_404(Driver, pk=pk)
+    driver = get_object_or_404(Driver.scoped, pk=pk)
     if request.method == 'POST':
         driver.delete()
         return redirect('driver_list')
@@ -527,6 +632,7 @@ def driver_delete(request, pk):
 # ----------------------------------------------------------------------
 # 9. Expense Category & Maintenance Views
 # ----------------------------------------------------------------------
+@cache_page_versioned(ExpenseCategory)
 def expense_category_list(request):
     categories = ExpenseCategory.objects.all().order_by('name')
     context = {'categories': categories, 'title': 'Expense Categories'}
@@ -547,7 +653,7 @@ def expense_category_update(request, pk):
     raise Http404("Expense Category Update View Not Implemented Yet.")
 
 def maintenance_expense_list(request):
-    expenses = MaintenanceExpense.objects.select_related('vehicle', 'workshop').order_by('-date')
+    expenses = MaintenanceExpense.scoped.select_related('vehicle', 'workshop').order_by('-date')
     context = {'expenses': expenses, 'title': 'Vehicle Maintenance History'}
     return render(request, 'management/maintenance_expense_list.html', context)
 
@@ -566,7 +672,7 @@ def trip_expense_create(request, trip_id):
     """
     Handle creation of an expense tied to a specific trip.
     """
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = get_object_or_404(Trip.scoped, trip_id=trip_id)
     
     if request.method == 'POST':
         form = TripExpenseForm(request.POST)
@@ -588,36 +694,44 @@ def trip_expense_create(request, trip_id):
 
 
 
+def _ajax_guard(request):
+    """401/400 JSON for unauthenticated or non-AJAX calls to the status endpoints, else None."""
+    if not request.user.is_authenticated and request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'success': False, 'message': 'Authentication required. Please log in.'}, status=401)
+    if not request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'success': False, 'message': 'Invalid request type.'}, status=400)
+    return None
+
+
+def _single_transition(trip_id, target, message):
+    """Runs one trip through apply_transition; 404 if missing, 409 if the move is not allowed."""
+    if not Trip.scoped.filter(trip_id=trip_id).exists():
+        return JsonResponse({'success': False, 'message': f'Trip {trip_id} not found.'}, status=404)
+    batch, changed, skipped = apply_transition([trip_id], target)
+    if not changed:
+        return JsonResponse({'success': False, 'message': skipped[trip_id]}, status=409)
+    return JsonResponse({
+        'success': True,
+        'message': message.format(trip_id=trip_id),
+        'new_status_display': STATUS_LABELS[target],
+        'new_status_class': STATUS_BADGES[target],
+        'trip_id': trip_id,
+        'batch_id': batch.pk,
+    })
+
+
 @require_POST
 def trip_status_revert(request, trip_id):
     """Reverts a trip from 'COMPLETED' back to 'IN_TRANSIT'."""
-    
-    # 1. CRITICAL: Authentication Check for AJAX
-    if not request.user.is_authenticated:
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            return JsonResponse({'success': False, 'message': 'Authentication required. Please log in.'}, status=401)
-            
-    if not request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        return JsonResponse({'success': False, 'message': 'Invalid request method.'}, status=400)
-        
+    denied = _ajax_guard(request)
+    if denied:
+        return denied
     try:
-        # ... (rest of the revert logic) ...
-        trip = get_object_or_404(Trip, trip_id=trip_id)
-        trip.status = 'IN_TRANSIT'
-        trip.save()
-        # ...
-        
-        return JsonResponse({
-            'success': True, 
-            'message': f'Trip {trip.trip_id} status reverted to IN-TRANSIT.',
-            'new_status_display': 'In-transit',
-            'new_status_class': 'bg-warning text-dark'
-        })
-        
-    except Http404:
-        return JsonResponse({'success': False, 'message': f'Trip {trip_id} not found.'}, status=404)
+        # Reopening the trip must not double-book a vehicle or driver taken since (409 if it would)
+        return _single_transition(trip_id, 'IN_TRANSIT', 'Trip {trip_id} status reverted to IN-TRANSIT.')
     except Exception as e:
         return JsonResponse({'success': False, 'message': f'Internal Server Error: {str(e)}'}, status=500)
+
 # We need to change the completion view to return the trip_id so the JS knows what to undo.
 @require_POST 
 def trip_status_complete(request, trip_id):
@@ -625,40 +739,477 @@ def trip_status_complete(request, trip_id):
     Updates the trip status to 'COMPLETED'. 
     Handles AJAX authentication failure by returning 401 JSON instead of redirecting.
     """
-    
-    # 1. CRITICAL: Check Authentication and AJAX Header
-    # If the user is not authenticated AND the request is AJAX, return 401 JSON.
-    # This prevents the default Django 302 redirect to the login page (which returns HTML).
-    if not request.user.is_authenticated:
-        # Check if it's an AJAX request (using the header sent by your JS)
-        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            # Return JSON with 401 status code
-            return JsonResponse({'success': False, 'message': 'Authentication required. Please log in.'}, status=401)
-        # If not AJAX, let the @login_required middleware handle the standard redirect
-        # NOTE: You can remove the @login_required decorator if you use this check, 
-        # but leaving it simplifies handling non-AJAX POSTs.
-    
-    # Optional: Redundant, but harmless, request type check
-    if not request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        return JsonResponse({'success': False, 'message': 'Invalid request type.'}, status=400)
-    
+    denied = _ajax_guard(request)
+    if denied:
+        return denied
     try:
-        trip = get_object_or_404(Trip, trip_id=trip_id)
-        
-        # Actual status change logic
-        trip.status = 'COMPLETED'
-        trip.save()
-
-        return JsonResponse({
-            'success': True, 
-            'message': f'Trip {trip.trip_id} successfully marked COMPLETED.',
-            'new_status_display': 'Completed',
-            'new_status_class': 'bg-success',
-            'trip_id': trip.trip_id
-        })
-        
-    except Http404:
-        return JsonResponse({'success': False, 'message': f'Trip {trip_id} not found.'}, status=404)
+        return _single_transition(trip_id, 'COMPLETED', 'Trip {trip_id} successfully marked COMPLETED.')
     except Exception as e:
         # Catches any unexpected server error and returns JSON 500
-        return JsonResponse({'success': False, 'message': f'Internal Server Error: {str(e)}'}, status=500)
\ No newline at end of file
+        return JsonResponse({'success': False, 'message': f'Internal Server Error: {str(e)}'}, status=500)
+
+
+@require_POST
+def trip_bulk_status(request):
+    """
+    Moves many trips to one status with a single UPDATE.
+    POST trip_ids (repeated) and status; the response carries a batch_id for undo.
+    """
+    denied = _ajax_guard(request)
+    if denied:
+        return denied
+    target = request.POST.get('status', '')
+    trip_ids = request.POST.getlist('trip_ids')
+    if target not in STATUS_LABELS or not trip_ids:
+        return JsonResponse({'success': False, 'message': 'Choose a status and at least one trip.'}, status=400)
+
+    batch, changed, skipped = apply_transition(trip_ids, target)
+    return JsonResponse({
+        'success': bool(changed),
+        'message': f'{len(changed)} trip(s) marked {STATUS_LABELS[target]}, {len(skipped)} skipped.',
+        'batch_id': batch.pk if batch else None,
+        'changed': changed,
+        'skipped': skipped,
+        'new_status_display': STATUS_LABELS[target],
+        'new_status_class': STATUS_BADGES[target],
+    })
+
+
+@require_POST
+def trip_bulk_status_undo(request, batch_id):
+    """Puts the trips of a bulk status change back to their previous statuses."""
+    denied = _ajax_guard(request)
+    if denied:
+        return denied
+    batch = TripStatusBatch.objects.filter(pk=batch_id).first()
+    # A batch that moved another branch's trips is not this user's to undo
+    batch_pks = [pk for pks in batch.previous_statuses.values() for pk in pks] if batch else []
+    if batch is None or Trip.scoped.filter(pk__in=batch_pks).count() != Trip.objects.filter(pk__in=batch_pks).count():
+        return JsonResponse({'success': False, 'message': 'Status change not found.'}, status=404)
+    try:
+        restored, skipped = undo_batch(batch)
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'message': e.messages[0]}, status=409)
+
+    statuses = dict(Trip.scoped.filter(trip_id__in=restored).values_list('trip_id', 'status'))
+    return JsonResponse({
+        'success': True,
+        'message': f'{len(restored)} trip(s) restored, {len(skipped)} skipped.',
+        'restored': {
+            trip_id: {'display': STATUS_LABELS[status], 'class': STATUS_BADGES[status]}
+            for trip_id, status in statuses.items()
+        },
+        'skipped': skipped,
+    })
+
+
+# ----------------------------------------------------------------------
+# 10. Driver Payroll Views
+# ----------------------------------------------------------------------
+def scoped_payslips():
+    """Q for the payslips of the current branch's (and shared) drivers; runs cover the whole roster."""
+    return Q(payslips__driver__in=Driver.scoped.values('pk'))
+
+def payroll_list(request):
+    runs = PayrollRun.objects.select_related('paid_via_account').annotate(
+        payslip_count=Count('payslips', filter=scoped_payslips()),
+        net_pay=Sum('payslips__net_pay', filter=scoped_payslips()),
+    ).order_by('-period_start')
+    if current_branch() is not None:
+        runs = runs.filter(payslip_count__gt=0)
+    context = {'runs': runs, 'title': 'Driver Payroll'}
+    return render(request, 'management/payroll_list.html', context)
+
+def payroll_detail(request, pk):
+    run = get_object_or_404(PayrollRun.objects.select_related('paid_via_account'), pk=pk)
+    payslips = run.payslips.filter(driver__in=Driver.scoped.values('pk')).select_related('driver').order_by('driver__name')
+    if current_branch() is not None and not payslips.exists():
+        raise Http404(f"No payslips in {run} for this branch.")
+    context = {
+        'run': run,
+        'payslips': payslips,
+        'net_pay': sum((slip.net_pay for slip in payslips), Decimal('0.00')),
+        'title': f'Payslips: {run}',
+    }
+    return render(request, 'management/payroll_detail.html', context)
+
+
+# ----------------------------------------------------------------------
+# 11. Vehicle & Driver Availability
+# ----------------------------------------------------------------------
+def availability(request):
+    """JSON list of the vehicles and drivers free on ?date=YYYY-MM-DD (default: today)."""
+    try:
+        on_date = date.fromisoformat(request.GET['date']) if request.GET.get('date') else date.today()
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Date must be YYYY-MM-DD.'}, status=400)
+
+    vehicles = available('vehicle', on_date)
+    drivers = available('driver', on_date)
+    return JsonResponse({
+        'success': True,
+        'date': on_date.isoformat(),
+        'vehicles': [{'vehicle_no': v.vehicle_no, 'vehicle_type': v.vehicle_type} for v in vehicles],
+        'drivers': [{'driver_id': d.driver_id, 'name': d.name, 'mobile': d.mobile} for d in drivers],
+    })
+
+
+# ----------------------------------------------------------------------
+# 12. Lane Rate Suggestion (JSON, used by the trip form)
+# ----------------------------------------------------------------------
+def lane_rate(request):
+    """Suggested rate for ?origin=&destination= (optionally &client=&transporter=)."""
+    suggestion = suggest_rate(
+        request.GET.get('origin'), request.GET.get('destination'),
+        client_id=request.GET.get('client') or None,
+        transporter_id=request.GET.get('transporter') or None,
+    )
+    if suggestion is None:
+        return JsonResponse({'success': False, 'message': 'No trips on this lane yet.'})
+    return JsonResponse({
+        'success': True,
+        'rate': suggestion['rate'],
+        'basis': suggestion['basis'],
+        'trip_count': suggestion['trip_count'],
+        'hint': suggestion_text(suggestion),
+    })
+
+
+# ----------------------------------------------------------------------
+# 13. Location Matching (JSON, used for origin/destination suggestions)
+# ----------------------------------------------------------------------
+def location_match(request):
+    """Closest Location names for ?q= from the in-memory trigram index."""
+    matches = match_places(request.GET.get('q', ''), limit=8)
+    return JsonResponse({
+        'success': True,
+        'matches': [{'name': location.name, 'state': location.state, 'score': round(score, 2)} for location, score in matches],
+    })
+
+
+# ----------------------------------------------------------------------
+# 14. Global Search
+# ----------------------------------------------------------------------
+def search(request):
+    """Ranked full-text search over the branch's trips, masters, dockets, expenses and ledger."""
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('kind', '')
+    kinds = [kind] if kind in KIND_LABELS else None
+    context = {
+        'query': query,
+        'kind': kind,
+        'kinds': KIND_LABELS.items(),
+        'results': search_entries(query, kinds=kinds, branch=request.branch_id) if query else [],
+        'date_range': parse_query(query)[1] if query else None,
+        'title': 'Search',
+    }
+    return render(request, 'management/search_results.html', context)
+
+
+# ----------------------------------------------------------------------
+# 15. Bank Statement Reconciliation
+# ----------------------------------------------------------------------
+def scoped_statements(model):
+    """Bank or wallet statements on the current branch's (and shared) accounts."""
+    return model.objects.filter(account__in=AccountMaster.scoped.values('pk'))
+
+def bank_statement_list(request):
+    """Imported statements with their match counts, and the upload form."""
+    if request.method == 'POST':
+        form = BankStatementUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['statement_file']
+            try:
+                statement = import_statement(form.cleaned_data['account'], upload.read(), upload.name)
+            except ValidationError as e:
+                form.add_error('statement_file', e)
+            else:
+                message = f"Imported {statement.line_count} lines from {statement.file_name}."
+                if form.cleaned_data['reconcile']:
+                    result = reconcile(statement)
+                    message += f" {result['suggested']} matches suggested, {result['unmatched']} unmatched."
+                messages.success(request, message)
+                return redirect('bank_statement_detail', pk=statement.pk)
+    else:
+        form = BankStatementUploadForm(initial={'reconcile': True})
+
+    statements = scoped_statements(BankStatement).select_related('account').annotate(
+        matched=Count('lines', filter=Q(lines__status='MATCHED')),
+        suggested=Count('lines', filter=Q(lines__status='SUGGESTED')),
+    ).order_by('-imported_at')
+    context = {'form': form, 'statements': statements, 'title': 'Bank Reconciliation'}
+    return render(request, 'management/bank_statement_list.html', context)
+
+def bank_statement_detail(request, pk):
+    """One statement's lines for a status tab (?status=SUGGESTED|UNMATCHED|MATCHED), 100 per page."""
+    statement = get_object_or_404(scoped_statements(BankStatement).select_related('account'), pk=pk)
+    statuses = dict(STATEMENT_LINE_STATUS_CHOICES)
+    status = request.GET.get('status') if request.GET.get('status') in statuses else 'SUGGESTED'
+    lines = statement.lines.filter(status=status).select_related('matched_transaction').order_by('line_no')
+    page = Paginator(lines, 100).get_page(request.GET.get('page'))
+    context = {
+        'statement': statement,
+        'summary': statement_summary(statement),
+        'statuses': statuses,
+        'status': status,
+        'page': page,
+        'title': f'Statement: {statement}',
+    }
+    return render(request, 'management/bank_statement_detail.html', context)
+
+@require_POST
+def bank_statement_action(request, pk):
+    """Re-run matching, confirm suggestions (selected, or all above a score) or unmatch selected lines."""
+    statement = get_object_or_404(scoped_statements(BankStatement), pk=pk)
+    action = request.POST.get('action')
+    line_ids = [int(value) for value in request.POST.getlist('line') if value.isdigit()]
+    status = request.POST.get('status', 'SUGGESTED')
+
+    if action == 'reconcile':
+        result = reconcile(statement)
+        messages.success(request, f"{result['suggested']} matches suggested, {result['unmatched']} lines unmatched.")
+    elif action == 'confirm_selected':
+        messages.success(request, f"Confirmed {confirm_matches(statement, line_ids=line_ids)} matches.")
+    elif action == 'confirm_all':
+        try:
+            min_score = float(request.POST.get('min_score') or 0)
+        except ValueError:
+            min_score = 0
+        messages.success(request, f"Confirmed {confirm_matches(statement, min_score=min_score)} matches.")
+    elif action == 'unmatch_selected':
+        messages.success(request, f"Unmatched {unmatch_lines(statement, line_ids)} lines.")
+    else:
+        messages.error(request, "Unknown action.")
+    return redirect(f"{reverse('bank_statement_detail', args=[statement.pk])}?status={status}")
+
+# ----------------------------------------------------------------------
+# 16. Fastag / Diesel-card Statements and Review Queue
+# ----------------------------------------------------------------------
+def wallet_statement_list(request):
+    """Imported wallet statements with their booked/review counts, and the upload form."""
+    if request.method == 'POST':
+        form = WalletStatementUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['statement_file']
+            try:
+                statement = import_wallet_statement(form.cleaned_data['account'], upload.read(), upload.name)
+            except ValidationError as e:
+                form.add_error('statement_file', e)
+            else:
+                booked = statement.lines.filter(status='MATCHED').count()
+                message = f"Imported {statement.line_count} spends from {statement.file_name}: {booked} booked to trips"
+                if statement.duplicate_count:
+                    message += f", {statement.duplicate_count} already imported skipped"
+                messages.success(request, message + ".")
+                if booked < statement.line_count:
+                    return redirect(f"{reverse('wallet_review')}?statement={statement.pk}")
+                return redirect('wallet_statement_list')
+    else:
+        form = WalletStatementUploadForm()
+
+    statements = scoped_statements(WalletStatement).select_related('account').annotate(
+        matched=Count('lines', filter=Q(lines__status='MATCHED')),
+        review=Count('lines', filter=Q(lines__status='REVIEW')),
+    ).order_by('-imported_at')
+    context = {
+        'form': form,
+        'statements': statements,
+        'review_count': scoped_wallet_lines().filter(status='REVIEW').count(),
+        'title': 'Fastag & Diesel Card Statements',
+    }
+    return render(request, 'management/wallet_statement_list.html', context)
+
+def scoped_wallet_lines():
+    """Wallet statement lines on the current branch's (and shared) accounts."""
+    return WalletStatementLine.objects.filter(statement__account__in=AccountMaster.scoped.values('pk'))
+
+def wallet_review(request):
+    """Wallet spends not booked to a trip (?status=REVIEW|IGNORED, ?statement=pk), 100 per page."""
+    status = 'IGNORED' if request.GET.get('status') == 'IGNORED' else 'REVIEW'
+    lines = scoped_wallet_lines().filter(status=status).select_related('statement__account')
+    statement = None
+    if request.GET.get('statement', '').isdigit():
+        statement = get_object_or_404(scoped_statements(WalletStatement), pk=request.GET['statement'])
+        lines = lines.filter(statement=statement)
+    page = Paginator(lines.order_by('transacted_at', 'pk'), 100).get_page(request.GET.get('page'))
+    context = {
+        'page': page,
+        'status': status,
+        'statement': statement,
+        'assign_form': WalletAssignForm(),
+        'title': 'Wallet Review Queue',
+    }
+    return render(request, 'management/wallet_review.html', context)
+
+@require_POST
+def wallet_review_action(request):
+    """Assign selected lines to a trip, retry matching, ignore or restore lines."""
+    action = request.POST.get('action')
+    selected = [int(value) for value in request.POST.getlist('line') if value.isdigit()]
+    line_ids = list(scoped_wallet_lines().filter(pk__in=selected).values_list('pk', flat=True))
+
+    if action == 'assign':
+        form = WalletAssignForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, ' '.join(form.errors['trip']))
+        else:
+            try:
+                count = assign_trip(line_ids, form.cleaned_data['trip'])
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+            else:
+                messages.success(request, f"Booked {count} spends to trip {form.cleaned_data['trip'].trip_id}.")
+    elif action == 'rematch':
+        if not selected and current_branch() is not None:
+            line_ids = list(scoped_wallet_lines().filter(status='REVIEW').values_list('pk', flat=True))
+        booked = rematch_lines(line_ids if selected or current_branch() is not None else None)
+        messages.success(request, f"Booked {booked} spends to trips.")
+    elif action == 'ignore':
+        messages.success(request, f"Ignored {ignore_lines(line_ids)} spends.")
+    elif action == 'restore':
+        messages.success(request, f"Returned {restore_lines(line_ids)} spends to the review queue.")
+    else:
+        messages.error(request, "Unknown action.")
+    return redirect(f"{reverse('wallet_review')}?{request.POST.get('query', '')}")
+
+# ----------------------------------------------------------------------
+# 17. Fleet Fuel Efficiency (from the precomputed monthly vehicle stats)
+# ----------------------------------------------------------------------
+def fleet_efficiency(request):
+    """Fuel cost per km / tonne-km / tonne / trip per vehicle or vehicle type over a trailing window."""
+    try:
+        months = int(request.GET.get('months', 3))
+    except ValueError:
+        months = 3
+    months = months if months in ROLLING_WINDOWS else 3
+    group_by = request.GET.get('group') if request.GET.get('group') in GROUPINGS else 'vehicle'
+    vehicle = masterdata.get(Vehicle, request.GET.get('vehicle')) if request.GET.get('vehicle') else None
+
+    with reporting_db():
+        rows = rolling_efficiency(group_by, months)
+        trend = vehicle_trend(vehicle.pk, window=months) if vehicle else None
+
+    context = {
+        'rows': rows,
+        'months': months,
+        'windows': ROLLING_WINDOWS,
+        'group_by': group_by,
+        'vehicle': vehicle,
+        'trend': trend,
+        'title': 'Fleet Fuel Efficiency',
+    }
+    return render(request, 'management/fleet_efficiency.html', context)
+
+
+# ----------------------------------------------------------------------
+# 18. Accounting Period Close
+# ----------------------------------------------------------------------
+def period_list(request):
+    """Closed periods with their balance totals, and the form to close the next one."""
+    if request.method == 'POST':
+        form = PeriodCloseForm(request.POST)
+        if form.is_valid():
+            try:
+                period = close_period(
+                    form.cleaned_data['period_end'], name=form.cleaned_data['name'] or None,
+                    archive=form.cleaned_data['archive'],
+                )
+            except ValidationError as e:
+                form.add_error('period_end', e)
+            else:
+                message = f"Books closed through {period.period_end:%d %b %Y} ({period.name})"
+                if period.archived_count:
+                    message += f", {period.archived_count} ledger rows archived"
+                messages.success(request, message + ".")
+                return redirect('period_list')
+    else:
+        form = PeriodCloseForm()
+
+    periods = AccountingPeriod.objects.annotate(
+        closing_total=Sum('balances__closing_balance'), account_count=Count('balances'),
+    ).order_by('-period_end')
+    context = {
+        'form': form,
+        'periods': periods,
+        'latest': latest_period(),
+        'title': 'Accounting Periods',
+    }
+    return render(request, 'management/period_list.html', context)
+
+@require_POST
+def period_reopen(request, pk):
+    """Reopens the latest closed period (restoring its archived ledger rows)."""
+    period = get_object_or_404(AccountingPeriod, pk=pk)
+    try:
+        restored = reopen_period(period)
+    except ValidationError as e:
+        messages.error(request, ' '.join(e.messages))
+    else:
+        messages.success(request, f"Reopened {period.name}; {restored} archived ledger rows restored.")
+    return redirect('period_list')
+
+
+# ----------------------------------------------------------------------
+# 19. Client Invoicing
+# ----------------------------------------------------------------------
+def scoped_invoices():
+    """Invoices of the current branch's (and shared) clients."""
+    return Invoice.objects.filter(client__in=PartyMaster.scoped.values('pk'))
+
+def invoice_list(request):
+    """Issued invoices, newest first, and the form to invoice a month's completed trips."""
+    if request.method == 'POST':
+        form = InvoiceBatchForm(request.POST)
+        if form.is_valid():
+            period_start, period_end = month_bounds(form.cleaned_data['month'])
+            client = form.cleaned_data['client']
+            try:
+                invoices = generate_invoices(
+                    period_start, period_end, invoice_date=form.cleaned_data['invoice_date'],
+                    clients=[client] if client else None,
+                )
+            except ValidationError as e:
+                form.add_error(None, e)
+            else:
+                if invoices:
+                    numbers = ' to '.join(dict.fromkeys((invoices[0].number, invoices[-1].number)))
+                    messages.success(request, f"{len(invoices)} invoice(s) raised for {period_start:%b %Y} ({numbers}).")
+                else:
+                    messages.info(request, f"No uninvoiced completed trips in {period_start:%b %Y}.")
+                return redirect('invoice_list')
+    else:
+        form = InvoiceBatchForm(initial={'month': month_bounds(date.today().replace(day=1) - timedelta(days=1))[0]})
+
+    invoices = scoped_invoices().select_related('client').annotate(trip_count=Count('lines')).order_by('-pk')
+    page = Paginator(invoices, 50).get_page(request.GET.get('page'))
+    context = {'form': form, 'page': page, 'title': 'Client Invoices'}
+    return render(request, 'management/invoice_list.html', context)
+
+def invoice_document(request, pk):
+    """The rendered invoice (HTML or PDF), rendering it first if the file is missing."""
+    invoice = get_object_or_404(scoped_invoices().select_related('client'), pk=pk)
+    path = ensure_document(invoice)
+    fmt = path.suffix.lstrip('.')
+    return FileResponse(
+        open(path, 'rb'), content_type=CONTENT_TYPES[fmt], as_attachment=fmt == 'pdf', filename=path.name
+    )
+
+# ----------------------------------------------------------------------
+# 20. Branch Switcher (head office only; see management.branches)
+# ----------------------------------------------------------------------
+def branch_switch(request):
+    """
+    Scopes head office's lists to one branch (?branch=<pk>, empty for all).
+    A GET, since cached pages carry no CSRF token and this only changes what
+    the session is shown. Users assigned to a branch cannot switch.
+    """
+    if not request.branch_locked:
+        branch = masterdata.get(Branch, request.GET.get('branch') or None)
+        if branch is None:
+            request.session.pop(BRANCH_SESSION_KEY, None)
+        else:
+            request.session[BRANCH_SESSION_KEY] = branch.pk
+    next_url = request.GET.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = reverse('trip_list')
+    return redirect(next_url)
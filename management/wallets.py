@@ -0,0 +1,445 @@
+# management/wallets.py
+
+"""
+Fastag and diesel-card statement import.
+
+A wallet statement is a CSV export of the toll or fuel spends charged to a
+FASTAG or DIESELCARD account. Every spend names a vehicle and a timestamp,
+and is booked to the trip that vehicle was on at the time: a TripExpense
+(Toll or Diesel, see WALLET_EXPENSE_CATEGORIES) plus the matching withdrawal
+from the wallet account, exactly what TripExpense.save() would have posted.
+
+Matching never scans the trips once per line. The trips of the vehicles on
+the statement are loaded with one query into a VehicleTripIndex: per vehicle,
+trip start dates in order. A trip covers its start date until the day before
+the vehicle's next trip, for at most WALLET_TRIP_MAX_DAYS days, and a spend is
+found by bisecting its date. Cancelled trips are left out.
+
+Spends that cannot be placed (unknown vehicle, no trip covering the date, two
+trips starting the same day, a date in a closed accounting period) stay in the
+review queue as REVIEW lines, where a trip can be assigned by hand, matching
+retried once the trips are entered, or the line ignored. Recharges and other credits are not trip costs and are not
+imported; the same transaction id (or, without one, the same vehicle, time and
+amount) imported twice for an account is skipped.
+
+Expenses, ledger rows and lines are written with bulk inserts, so what the
+post_save receivers maintain (search entries, cache versions, KPI tiles,
+monthly vehicle stats) is refreshed by hand afterwards.
+"""
+
+import csv
+import io
+import re
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_version, masterdata
+from .fleet import mark_vehicle_months
+from .kpis import refresh_tiles, tiles_for
+from .models import (
+    AccountingPeriod, AccountTransaction, ExpenseCategory, Trip, TripExpense, Vehicle, WalletStatement,
+    WalletStatementLine,
+)
+from .reconciliation import DATE_FORMATS, find_header, parse_amount
+from .search import index_objects
+
+ParsedSpend = namedtuple('ParsedSpend', 'transacted_at vehicle_text description reference amount')
+
+# Normalised header -> column role, for the usual Fastag issuer and fuel-card exports
+WALLET_HEADERS = {
+    'date': (
+        'date', 'transaction date', 'txn date', 'transaction date time', 'transaction datetime', 'txn date time',
+        'date time', 'date and time', 'reader read time', 'processing date time', 'transaction time stamp',
+    ),
+    'time': ('time', 'transaction time', 'txn time'),
+    'vehicle': (
+        'vehicle', 'vehicle no', 'vehicle number', 'vehicle reg no', 'vehicle registration no', 'registration no',
+        'vrn', 'truck no', 'card vehicle no',
+    ),
+    'description': (
+        'description', 'plaza name', 'toll plaza', 'toll plaza name', 'plaza', 'merchant', 'merchant name',
+        'outlet', 'outlet name', 'ro name', 'location', 'narration', 'particulars', 'remarks',
+    ),
+    'reference': (
+        'transaction id', 'txn id', 'unique transaction id', 'reference', 'reference no', 'ref no',
+        'transaction ref no', 'txn ref no', 'rrn',
+    ),
+    'debit': ('debit', 'debit amount', 'dr', 'dr amount', 'withdrawal'),
+    'credit': ('credit', 'credit amount', 'cr', 'cr amount', 'recharge', 'recharge amount'),
+    'amount': ('amount', 'transaction amount', 'txn amount', 'amount rs', 'toll amount', 'fuel amount'),
+    'type': ('type', 'transaction type', 'txn type', 'dr cr', 'cr dr'),
+}
+CREDIT_TYPES = ('cr', 'credit', 'recharge', 'top up', 'topup', 'refund', 'reversal', 'cashback', 'load')
+TIME_FORMATS = ('%H:%M:%S', '%H:%M', '%I:%M:%S %p', '%I:%M %p')
+DATETIME_FORMATS = tuple(
+    f'{date_format}{separator}{time_format}'
+    for date_format in DATE_FORMATS for separator in (' ', 'T') for time_format in TIME_FORMATS
+)
+KIND_BY_ACCOUNT_TYPE = {'FASTAG': 'TOLL', 'DIESELCARD': 'FUEL'}
+
+REASON_NO_VEHICLE = "Vehicle not in the fleet."
+REASON_NO_TRIP = "No trip for this vehicle on this date."
+REASON_SAME_DAY = "More than one trip for this vehicle started that day."
+REASON_CLOSED = "The books are closed for this date."
+
+_NON_ALNUM = re.compile(r'[^A-Z0-9]')
+
+
+def max_trip_days():
+    return getattr(settings, 'WALLET_TRIP_MAX_DAYS', 10)
+
+
+def expense_category_names():
+    return getattr(settings, 'WALLET_EXPENSE_CATEGORIES', {'TOLL': 'Toll', 'FUEL': 'Diesel'})
+
+
+# ----------------------------------------------------------------------
+# Parsing
+# ----------------------------------------------------------------------
+def normalize_vehicle(text):
+    """' mh-12 ab 1234 ' -> 'MH12AB1234'"""
+    return _NON_ALNUM.sub('', str(text or '').upper())
+
+
+def parse_timestamp(text):
+    """'03/05/2024 14:22:10' (or a bare date, taken as midnight) -> aware datetime or None"""
+    text = ' '.join((text or '').split())
+    for fmt in DATETIME_FORMATS + DATE_FORMATS:
+        try:
+            value = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return timezone.make_aware(value) if settings.USE_TZ else value
+    return None
+
+
+def _is_credit(type_text, amount_text):
+    kind = ' '.join(re.sub(r'[^a-z]', ' ', (type_text or '').casefold()).split())
+    return kind.startswith(CREDIT_TYPES) or (amount_text or '').strip().upper().endswith('CR')
+
+
+def parse_wallet_csv(text):
+    """ParsedSpends (positive amounts) for the debit rows of a wallet CSV export."""
+    rows = list(csv.reader(io.StringIO(text)))
+    header_at, roles = find_header(rows, WALLET_HEADERS)
+    if 'vehicle' not in roles:
+        raise ValidationError("Could not find a vehicle number column.")
+
+    def cell(row, role):
+        position = roles.get(role)
+        return row[position] if position is not None and position < len(row) else ''
+
+    spends = []
+    for row in rows[header_at + 1:]:
+        stamp = cell(row, 'date')
+        if 'time' in roles:
+            stamp = f"{stamp} {cell(row, 'time')}"
+        transacted_at = parse_timestamp(stamp)
+        if transacted_at is None:
+            continue  # blank lines, footers, opening/closing balance rows
+        if 'amount' in roles:
+            if _is_credit(cell(row, 'type'), cell(row, 'amount')):
+                continue
+            amount = abs(parse_amount(cell(row, 'amount')) or 0)
+        else:
+            amount = abs(parse_amount(cell(row, 'debit')) or 0)
+        if not amount:
+            continue  # recharges and other credits
+        spends.append(ParsedSpend(
+            transacted_at, cell(row, 'vehicle').strip()[:30], cell(row, 'description').strip()[:255],
+            cell(row, 'reference').strip()[:100], amount,
+        ))
+    return spends
+
+
+def read_wallet_statement(data):
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        text = data.decode('latin-1')
+    spends = parse_wallet_csv(text)
+    if not spends:
+        raise ValidationError("The statement has no toll or fuel spends.")
+    return spends
+
+
+def _dedupe_key(reference, transacted_at, vehicle_text, amount):
+    return reference or (transacted_at, normalize_vehicle(vehicle_text), amount)
+
+
+def _already_imported(account, spends):
+    """Dedupe keys of the account's lines already stored in the period of `spends`."""
+    start = min(spend.transacted_at for spend in spends)
+    end = max(spend.transacted_at for spend in spends)
+    existing = WalletStatementLine.objects.filter(
+        statement__account=account, transacted_at__range=(start, end)
+    ).values_list('reference', 'transacted_at', 'vehicle_text', 'amount')
+    return {_dedupe_key(*row) for row in existing}
+
+
+# ----------------------------------------------------------------------
+# Matching
+# ----------------------------------------------------------------------
+def vehicle_lookup():
+    """Normalised vehicle number -> vehicle_no, from the master-data cache."""
+    return {normalize_vehicle(vehicle.vehicle_no): vehicle.vehicle_no for vehicle in masterdata.all(Vehicle)}
+
+
+def local_day(moment):
+    return timezone.localtime(moment).date() if timezone.is_aware(moment) else moment.date()
+
+
+class VehicleTripIndex:
+    """Per vehicle, the non-cancelled trips by start date, each covering the days until the vehicle's next trip."""
+
+    def __init__(self, vehicle_ids, start, end, max_days=None):
+        max_days = max_days or max_trip_days()
+        rows = (
+            Trip.objects.filter(vehicle_id__in=set(vehicle_ids), date__range=(start - timedelta(days=max_days), end))
+            .exclude(status='CANCELLED')
+            .values_list('vehicle_id', 'date', 'pk', 'trip_id')
+            .order_by('vehicle_id', 'date', 'pk')
+        )
+        by_day = defaultdict(lambda: defaultdict(list))
+        for vehicle_id, trip_date, pk, trip_code in rows:
+            by_day[vehicle_id][trip_date.toordinal()].append((pk, trip_code))
+
+        self.vehicles = {}
+        for vehicle_id, days in by_day.items():
+            starts = sorted(days)
+            ends = [
+                min(day + max_days - 1, starts[i + 1] - 1 if i + 1 < len(starts) else day + max_days - 1)
+                for i, day in enumerate(starts)
+            ]
+            self.vehicles[vehicle_id] = (starts, ends, [days[day] for day in starts])
+
+    def trip_on(self, vehicle_id, day):
+        """((pk, trip_id) or None, review reason) for the vehicle's trip covering `day` (a date)."""
+        entry = self.vehicles.get(vehicle_id)
+        if entry is None:
+            return None, REASON_NO_TRIP
+        starts, ends, trips = entry
+        ordinal = day.toordinal()
+        i = bisect_right(starts, ordinal) - 1
+        if i < 0 or ordinal > ends[i]:
+            return None, REASON_NO_TRIP
+        if len(trips[i]) > 1:
+            return None, REASON_SAME_DAY
+        return trips[i][0], ''
+
+
+def match_lines(lines):
+    """
+    Sets vehicle, trip, status and review_reason on each line (saved or not).
+    Returns {trip pk: trip_id} for the trips matched. One query for the trips.
+    """
+    vehicles = vehicle_lookup()
+    for line in lines:
+        line.vehicle_id = vehicles.get(normalize_vehicle(line.vehicle_text))
+    located = [line for line in lines if line.vehicle_id]
+    index = None
+    if located:
+        days = [local_day(line.transacted_at) for line in located]
+        index = VehicleTripIndex({line.vehicle_id for line in located}, min(days), max(days))
+
+    closed_through = AccountingPeriod.closed_through()
+    trip_codes = {}
+    for line in lines:
+        if closed_through and local_day(line.transacted_at) <= closed_through:
+            trip, reason = None, REASON_CLOSED
+        elif line.vehicle_id is None:
+            trip, reason = None, REASON_NO_VEHICLE
+        else:
+            trip, reason = index.trip_on(line.vehicle_id, local_day(line.transacted_at))
+        if trip is None:
+            line.trip_id, line.status, line.review_reason = None, 'REVIEW', reason
+        else:
+            line.trip_id, line.status, line.review_reason = trip[0], 'MATCHED', ''
+            trip_codes[trip[0]] = trip[1]
+    return trip_codes
+
+
+# ----------------------------------------------------------------------
+# Booking
+# ----------------------------------------------------------------------
+def expense_categories():
+    """{line kind: ExpenseCategory}, creating Toll/Diesel the first time they are needed."""
+    categories = {}
+    for kind, name in expense_category_names().items():
+        category = masterdata.get_by(ExpenseCategory, 'name', name)
+        if category is None:
+            category, _ = ExpenseCategory.objects.get_or_create(name=name, defaults={'is_trip_expense': True})
+        categories[kind] = category
+    return categories
+
+
+def book_lines(account, lines, trip_codes):
+    """
+    Creates a TripExpense and the wallet withdrawal for every line with a trip,
+    one bulk INSERT each, and links each line to its expense. Returns the expenses.
+    """
+    lines = [line for line in lines if line.trip_id and line.trip_expense_id is None]
+    if not lines:
+        return []
+    categories = expense_categories()
+    trips = Trip.objects.in_bulk({line.trip_id for line in lines})
+
+    # Expenses and postings take the trip's branch, as the branch pre_save receiver would give them
+    expenses = TripExpense.objects.bulk_create([
+        TripExpense(
+            trip_id=line.trip_id,
+            branch_id=trips[line.trip_id].branch_id,
+            date=local_day(line.transacted_at),
+            expense_category=categories[line.kind],
+            paid_via_account=account,
+            description=' '.join(part for part in (line.description, line.vehicle_text) if part)[:255],
+            amount=line.amount,
+            bill_no=line.reference[:50] or None,
+        )
+        for line in lines
+    ], batch_size=500)
+
+    # TripExpense.save() would post this withdrawal; bulk_create does not call it
+    postings = AccountTransaction.objects.bulk_create([
+        AccountTransaction(
+            date=expense.date,
+            description=(
+                f"EXP: {categories[line.kind].name} for {trip_codes[line.trip_id]} - {expense.description}"
+            )[:255],
+            from_account=account,
+            withdrawal=expense.amount,
+            related_trip_id=line.trip_id,
+            related_trip_expense=expense,
+            branch_id=expense.branch_id,
+        )
+        for line, expense in zip(lines, expenses)
+    ], batch_size=500)
+
+    for line, expense, posting in zip(lines, expenses, postings):
+        line.trip_expense = expense
+        expense.trip = posting.related_trip = trips[line.trip_id]  # read by the search documents
+
+    # bulk_create skips the post_save receivers, so refresh what they would have.
+    for chunk_at in range(0, len(expenses), 500):
+        index_objects(expenses[chunk_at:chunk_at + 500])
+        index_objects(postings[chunk_at:chunk_at + 500])
+    mark_vehicle_months((trip.vehicle_id, trip.date) for trip in trips.values())
+
+    def after_commit():
+        for label in ('management.TripExpense', 'management.AccountTransaction'):
+            bump_version(label)
+        refresh_tiles(tiles_for('management.TripExpense', 'management.AccountTransaction'))
+    transaction.on_commit(after_commit)
+    return expenses
+
+
+def _write_lines(lines):
+    """Stores the matching result of saved lines with one executemany UPDATE (see reconciliation._write_suggestions)."""
+    quote = connection.ops.quote_name
+    columns = ('status', 'review_reason', 'vehicle_id', 'trip_id', 'trip_expense_id')
+    assignments = ', '.join(f"{quote(column)} = %s" for column in columns)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(WalletStatementLine._meta.db_table)} SET {assignments} WHERE {quote('id')} = %s",
+            [tuple(getattr(line, column) for column in columns) + (line.pk,) for line in lines],
+        )
+
+
+@transaction.atomic
+def import_wallet_statement(account, data, file_name):
+    """
+    Stores a Fastag/diesel-card statement for `account`, books every spend that
+    falls on a trip and leaves the rest for review. Returns the WalletStatement.
+    """
+    kind = KIND_BY_ACCOUNT_TYPE.get(account.account_type)
+    if kind is None:
+        raise ValidationError("Wallet statements can only be imported for FASTAG or DIESELCARD accounts.")
+    spends = read_wallet_statement(data)
+
+    seen = _already_imported(account, spends)
+    fresh = []
+    for spend in spends:
+        key = _dedupe_key(spend.reference, spend.transacted_at, spend.vehicle_text, spend.amount)
+        if key not in seen:
+            seen.add(key)
+            fresh.append(spend)
+
+    days = [local_day(spend.transacted_at) for spend in spends]
+    statement = WalletStatement.objects.create(
+        account=account, file_name=file_name[:255], period_start=min(days), period_end=max(days),
+        line_count=len(fresh), duplicate_count=len(spends) - len(fresh),
+    )
+    lines = [
+        WalletStatementLine(statement=statement, line_no=number, kind=kind, **spend._asdict())
+        for number, spend in enumerate(fresh, start=1)
+    ]
+    trip_codes = match_lines(lines)
+    book_lines(account, lines, trip_codes)
+    WalletStatementLine.objects.bulk_create(lines, batch_size=1000)
+    return statement
+
+
+# ----------------------------------------------------------------------
+# Review queue
+# ----------------------------------------------------------------------
+def review_lines():
+    return WalletStatementLine.objects.filter(status='REVIEW')
+
+
+def _by_account(lines):
+    grouped = defaultdict(list)
+    for line in lines:
+        grouped[line.statement.account].append(line)
+    return grouped.items()
+
+
+@transaction.atomic
+def rematch_lines(line_ids=None):
+    """
+    Retries matching for REVIEW lines (all, or the given ids), e.g. after the
+    missing trips or vehicles were entered. Returns the number now matched.
+    """
+    lines = review_lines().select_related('statement__account').select_for_update()
+    if line_ids is not None:
+        lines = lines.filter(pk__in=line_ids)
+    lines = list(lines)
+    if not lines:
+        return 0
+    trip_codes = match_lines(lines)
+    for account, account_lines in _by_account(lines):
+        book_lines(account, account_lines, trip_codes)
+    _write_lines(lines)
+    return sum(line.status == 'MATCHED' for line in lines)
+
+
+@transaction.atomic
+def assign_trip(line_ids, trip):
+    """Books the given REVIEW lines to `trip` regardless of vehicle and date. Returns the number booked."""
+    if trip.status == 'CANCELLED':
+        raise ValidationError(f"Trip {trip.trip_id} is cancelled.")
+    lines = list(review_lines().filter(pk__in=line_ids).select_related('statement__account').select_for_update())
+    AccountingPeriod.check_open(*(local_day(line.transacted_at) for line in lines))
+    for line in lines:
+        line.trip_id, line.status, line.review_reason = trip.pk, 'MATCHED', ''
+    for account, account_lines in _by_account(lines):
+        book_lines(account, account_lines, {trip.pk: trip.trip_id})
+    _write_lines(lines)
+    return len(lines)
+
+
+def ignore_lines(line_ids):
+    """Takes REVIEW lines out of the queue without booking them. Returns the number changed."""
+    return review_lines().filter(pk__in=line_ids).update(status='IGNORED', review_reason='Ignored by user.')
+
+
+def restore_lines(line_ids):
+    """Puts IGNORED lines back into the review queue. Returns the number changed."""
+    return WalletStatementLine.objects.filter(pk__in=line_ids, status='IGNORED').update(
+        status='REVIEW', review_reason='',
+    )
@@ -0,0 +1,16 @@
+import os
+
+# TMS_ENV -> settings module; DJANGO_SETTINGS_MODULE, when set, still wins.
+SETTINGS_MODULES = {
+    'development': 'tms_core.settings',
+    'production': 'tms_core.settings_production',
+}
+
+
+def settings_module():
+    """The settings module selected by TMS_ENV ('development' unless set)."""
+    env = os.environ.get('TMS_ENV', 'development')
+    try:
+        return SETTINGS_MODULES[env]
+    except KeyError:
+        raise RuntimeError(f"TMS_ENV must be one of {', '.join(SETTINGS_MODULES)}, not '{env}'.")
@@ -3,6 +3,9 @@ ASGI config for tms_core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Run it with any ASGI server, e.g.
+    uvicorn tms_core.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -11,6 +14,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tms_core.settings')
+from tms_core import settings_module
+
+# TMS_ENV=production selects tms_core/settings_production.py
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module())
+# Route the read-heavy pages to management/async_views.py.
+os.environ.setdefault('TMS_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import tempfile
+from decimal import Decimal
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -57,6 +59,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Scopes `.scoped` queries to the user's branch office (management.branches)
+    'management.branches.BranchMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,12 +78,20 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'management.branches.branch_context',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'tms_core.wsgi.application'
+ASGI_APPLICATION = 'tms_core.asgi.application'
+
+# Serve the dashboard, trip detail and account overview from management/async_views.py.
+# tms_core/asgi.py switches this on; under WSGI the sync views are used.
+ASYNC_VIEWS = os.environ.get('TMS_ASYNC_VIEWS', '0') == '1'
+# Worker threads the async views run their concurrent queries on (each keeps its own connection).
+ASYNC_QUERY_WORKERS = int(os.environ.get('TMS_ASYNC_QUERY_WORKERS', '8'))
 
 
 # Database
@@ -88,10 +100,105 @@ WSGI_APPLICATION = 'tms_core.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('TMS_DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# Reporting replica (see management/routers.py). Reports read from a periodic
+# snapshot of the primary; refresh it with `manage.py refresh_reporting_snapshot`.
+REPORTING_DATABASE_ALIAS = 'reporting'
+REPORTING_SNAPSHOT_PATH = Path(os.environ.get('TMS_REPORTING_SNAPSHOT', BASE_DIR / 'db.reporting.sqlite3'))
+# Default seconds a report may lag the primary before it falls back to it.
+REPORTING_MAX_STALENESS = 300
+
+DATABASES['reporting'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': f'file:{REPORTING_SNAPSHOT_PATH}?mode=ro',
+    # Re-open per request so a refreshed snapshot is picked up immediately.
+    'CONN_MAX_AGE': 0,
+    'OPTIONS': {'uri': True},
+    'TEST': {'MIRROR': 'default'},
+}
+
+DATABASE_ROUTERS = ['management.routers.ReportingRouter']
+
+# Dashboard: documents expiring within this many days are flagged.
+KPI_EXPIRY_WINDOW_DAYS = 30
+
+# Bank reconciliation (management/reconciliation.py): statement lines are matched to
+# ledger rows with the same amount dated within this many days, scoring at least this.
+RECONCILE_DATE_WINDOW_DAYS = 3
+RECONCILE_MIN_SCORE = 0.5
+
+# Fastag / diesel-card statements (management/wallets.py): a spend is booked to the trip
+# its vehicle started most recently, if that was at most this many days before.
+WALLET_TRIP_MAX_DAYS = 10
+# Line kind -> ExpenseCategory name the spends are booked under (created if missing)
+WALLET_EXPENSE_CATEGORIES = {'TOLL': 'Toll', 'FUEL': 'Diesel'}
+
+# Fleet analytics (management/fleet.py): TripExpense categories counted as fuel
+FUEL_EXPENSE_CATEGORIES = ('Diesel', 'Fuel')
+
+# Period close (management/periods.py): first month of the fiscal year (April, Indian FY)
+FISCAL_YEAR_START_MONTH = 4
+
+# Trip archive (management/archive.py): trips moved per transaction, and the default age
+# (in months) past which `manage.py archive_trips` moves completed trips
+TRIP_ARCHIVE_CHUNK_SIZE = 500
+TRIP_ARCHIVE_AFTER_MONTHS = 24
+
+# Admin changelists (management/admin.py): unfiltered lists of tables above this many rows
+# show the planner's row estimate instead of running COUNT(*); related-object filters page
+# their choices this many at a time
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+ADMIN_FILTER_PAGE_SIZE = 20
+
+# Client invoicing (management/invoicing.py). The seller's details printed on every invoice;
+# GSTIN state codes decide CGST+SGST (same state as the client) or IGST (different state).
+INVOICE_COMPANY_NAME = os.environ.get('TMS_COMPANY_NAME', 'TMS Logistics')
+INVOICE_COMPANY_ADDRESS = os.environ.get('TMS_COMPANY_ADDRESS', '')
+INVOICE_COMPANY_GST_NUMBER = os.environ.get('TMS_COMPANY_GSTIN', '')
+# GST on freight (goods transport agency services, forward charge), in percent
+INVOICE_GST_RATE = Decimal('12.00')
+# Account the invoice totals are posted to (created as a RECEIVABLE account if missing)
+INVOICE_RECEIVABLE_ACCOUNT = 'Sundry Debtors'
+# Rendered invoices: 'html', or 'pdf' (needs WeasyPrint), written under this directory
+# by a pool of this many worker processes (None: one per CPU for PDF, in-process for HTML)
+INVOICE_FORMAT = 'html'
+INVOICE_OUTPUT_DIR = Path(os.environ.get('TMS_INVOICE_DIR', BASE_DIR / 'invoices'))
+INVOICE_RENDER_WORKERS = None
+
+# Scheduled jobs (management/scheduler.py, management/jobs.py, `manage.py run_scheduler`):
+# job name -> cron spec overriding its default schedule (None disables the job), the
+# worker threads running them, and how many days of job history are kept
+SCHEDULED_JOBS = {}
+SCHEDULER_WORKERS = 2
+SCHEDULER_HISTORY_DAYS = 90
+# Nightly `sqlite_backup` job: copies of the database kept under this directory
+SQLITE_BACKUP_DIR = Path(os.environ.get('TMS_BACKUP_DIR', BASE_DIR / 'backups'))
+SQLITE_BACKUP_KEEP = 7
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# 'masterdata' is shared between worker processes (file-backed) and holds the
+# reference tables served by management.cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'masterdata': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('TMS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'tms_cache')),
+        'TIMEOUT': None,
+    },
+}
+
+MASTERDATA_CACHE_ALIAS = 'masterdata'
+# Seconds a process trusts its in-memory copy before re-checking the shared version counter.
+MASTERDATA_LOCAL_TTL = 2
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,156 @@
+"""
+Production settings profile for tms_core.
+
+Builds on tms_core/settings.py. Select it with
+    TMS_ENV=production
+(read by manage.py, wsgi.py and asgi.py), or DJANGO_SETTINGS_MODULE=tms_core.settings_production.
+
+Request path:
+  * DEBUG off, so Django no longer keeps every SQL statement of a request in
+    memory, and SQL is never logged.
+  * Templates are compiled once per process (cached loader, no debug info).
+  * Responses are compressed: Brotli, Zstandard or gzip with
+    django-compression-middleware when it is installed, else Django's gzip.
+  * Static files get content-hashed names (collectstatic writes a manifest).
+    With WhiteNoise installed the app serves them itself, pre-compressed and
+    cached forever by browsers; otherwise have the web server serve
+    STATIC_ROOT under STATIC_URL with a far-future Cache-Control header.
+  * The page, master-data and session caches live in TMS_CACHE_BACKEND:
+    'file' (default, shared by the worker processes of one host), 'redis'
+    or 'memcached' (TMS_CACHE_LOCATION), or 'locmem'.
+
+Database tuning for several clerks writing to the same SQLite file:
+  * WAL journal, so readers never block the writer (and vice versa).
+  * busy_timeout, so a writer waits for the lock instead of failing with
+    "database is locked".
+  * IMMEDIATE transactions, so atomic() blocks take the write lock up front
+    instead of deadlocking when two readers both try to upgrade.
+  * Persistent connections with health checks, so requests skip connection
+    setup and the pragmas above are paid once per connection.
+
+Run `python manage.py bench_sqlite` to compare the database settings with the
+defaults, and `python manage.py bench_settings` to compare request throughput
+of the two profiles.
+"""
+
+import os
+import tempfile
+from importlib.util import find_spec
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, MIDDLEWARE, TEMPLATES
+
+DEBUG = False
+SECRET_KEY = os.environ.get('TMS_SECRET_KEY', SECRET_KEY)  # noqa: F405
+ALLOWED_HOSTS = os.environ.get('TMS_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+# Applied on every new connection, in order.
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    # NORMAL is durable in WAL mode except for the last commits on power loss.
+    'PRAGMA synchronous = NORMAL',
+    f"PRAGMA mmap_size = {int(os.environ.get('TMS_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+    # Negative values are KiB: 64 MB of page cache per connection.
+    f"PRAGMA cache_size = {int(os.environ.get('TMS_SQLITE_CACHE_KB', -64000))}",
+    f"PRAGMA busy_timeout = {int(os.environ.get('TMS_SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+    'PRAGMA temp_store = MEMORY',
+]
+
+DATABASES = {
+    **DATABASES,  # noqa: F405 - keeps the 'reporting' replica from the base settings
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('TMS_DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('TMS_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+            # Seconds the Python driver waits on a locked database (matches busy_timeout).
+            'timeout': int(os.environ.get('TMS_SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000,
+        },
+    }
+}
+
+
+# Templates: parsed once per process and kept, rather than checked for changes
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [(
+            'django.template.loaders.cached.Loader',
+            ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader'],
+        )],
+    },
+}]
+
+# Optional packages: WhiteNoise serves the static files, django-compression-middleware adds Brotli/Zstandard
+WHITENOISE = find_spec('whitenoise') is not None
+COMPRESSION_MIDDLEWARE = (
+    'compression_middleware.middleware.CompressionMiddleware' if find_spec('compression_middleware')
+    else 'django.middleware.gzip.GZipMiddleware'
+)
+
+# Compression goes right after the security (and static file) middleware, so it sees
+# every page response last; WhiteNoise answers static requests with its own
+# pre-compressed files before that.
+_first, *_rest = MIDDLEWARE
+MIDDLEWARE = [
+    _first,
+    *(['whitenoise.middleware.WhiteNoiseMiddleware'] if WHITENOISE else []),
+    COMPRESSION_MIDDLEWARE,
+    *_rest,
+]
+
+# Hashed static file names, so they can be cached forever; run `manage.py collectstatic` on deploy
+STATIC_ROOT = os.environ.get('TMS_STATIC_ROOT', BASE_DIR / 'staticfiles')
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage' if WHITENOISE
+        else 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+    },
+}
+
+# Caches: one backend for the page cache ('default') and the master-data cache
+CACHE_BACKENDS = {
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+CACHE_BACKEND = os.environ.get('TMS_CACHE_BACKEND', 'file')
+# A directory for 'file', a server URL / address for 'redis' and 'memcached'
+CACHE_LOCATION = os.environ.get(
+    'TMS_CACHE_LOCATION', os.environ.get('TMS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'tms_cache'))
+)
+
+
+def _cache(name, timeout):
+    return {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.path.join(CACHE_LOCATION, name) if CACHE_BACKEND == 'file' else CACHE_LOCATION,
+        'KEY_PREFIX': name,
+        'TIMEOUT': timeout,
+    }
+
+
+CACHES = {
+    'default': _cache('pages', 300),
+    'masterdata': _cache('masterdata', None),
+}
+# Sessions are read on every request (branch selection, auth); keep them in the cache too
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Warnings and errors to stderr; SQL statements are never logged
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {
+        'django': {'handlers': ['console'], 'level': os.environ.get('TMS_LOG_LEVEL', 'WARNING')},
+        'django.db.backends': {'handlers': [], 'level': 'WARNING', 'propagate': False},
+    },
+}
@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tms_core.settings')
+from tms_core import settings_module
+
+# TMS_ENV=production selects tms_core/settings_production.py
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module())
 
 application = get_wsgi_application()